@@ -1,6 +1,8 @@
 import os
+import logging
 from jose import jwt
 from dotenv import load_dotenv
+from fastapi import Request, HTTPException
 
 # fetch data from .env
 load_dotenv()
@@ -18,9 +20,41 @@ def verify_token(token: str):
             algorithms=["HS256"],
             options={"verify_aud": False}
         )
-        print("✅ Token verified!")
         return payload  # This contains user info like 'sub', 'email', etc.
     
     except Exception as e:
-        print("❌ Token verification failed:", e)
-        raise ValueError(f"Invalid token: {e}")
\ No newline at end of file
+        logging.info(f"Token verification failed: {e}")
+        raise ValueError(f"Invalid token: {e}")
+
+# Token validation dependency for protected routes
+async def get_current_user_id(request: Request):
+    auth_header = request.headers.get("authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing or invalid token")
+    
+    token = auth_header.split(" ")[1]  # Bearer <token> <- to take just token part
+    payload = verify_token(token)  # verifying token
+    user_id = payload.get("sub")  # Supabase UID
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return user_id
+
+# Same check for event streams: browsers' EventSource cannot send headers,
+# so the token may also come as ?access_token=
+async def get_stream_user_id(request: Request):
+    auth_header = request.headers.get("authorization")
+    if auth_header and auth_header.startswith("Bearer "):
+        token = auth_header.split(" ")[1]
+    else:
+        token = request.query_params.get("access_token")
+    if not token:
+        raise HTTPException(status_code=401, detail="Missing or invalid token")
+
+    try:
+        payload = verify_token(token)
+    except ValueError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    user_id = payload.get("sub")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return user_id
\ No newline at end of file
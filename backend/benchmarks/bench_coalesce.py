@@ -0,0 +1,119 @@
+"""
+Concurrent syncs of the same GA property: duplicated vs. coalesced
+(ingestion/singleflight.py).
+
+--callers syncs of one property and date range start at once, half as
+tasks on one event loop (like concurrent /analytics/data requests) and
+half on threads with their own loops (like job workers), against the local
+stand-in API (benchmarks/fake_ga_server.py) with the REST backend.
+
+    off   SYNC_COALESCE=0: every caller fetches and writes the whole window
+    on    one sync runs, the others wait for it and share its report
+
+Reported per mode: wall time, runReport calls answered by the stand-in,
+records written and how many callers got a coalesced report. Catalog and
+fact writes (a short sleep per batch), watermarks and cache invalidation
+are stubbed, and the advisory locks are off (no database), so this
+measures the in-process single flight.
+
+    python -m benchmarks.bench_coalesce --callers 20 --metrics 100 --days 30 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+
+GA_PORT = 8807
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync coalescing benchmark")
+    parser.add_argument("--callers", type=int, default=20, help="Concurrent syncs of the same property")
+    parser.add_argument("--metrics", type=int, default=100)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stand-in server latency per request")
+    parser.add_argument("--write-latency", type=float, default=0.002, help="Seconds per batch write")
+    parser.add_argument("--modes", nargs="+", default=["off", "on"], choices=["off", "on"])
+    args = parser.parse_args()
+
+    os.environ["GA_DATA_API_URL"] = f"http://127.0.0.1:{GA_PORT}/"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from google.oauth2.credentials import Credentials
+    from benchmarks.fake_ga_server import FakeGAServer
+    import ingestion.pipeline as pipeline
+    import ingestion.singleflight as singleflight
+    import events.broker as broker
+    import google_analytics.source as source
+    from clients import registry
+
+    written = {"records": 0}
+    written_lock = threading.Lock()
+
+    class BenchSink:
+        def __init__(self, project_id: str, metric_ids: dict):
+            pass
+
+        def write(self, records: list) -> dict:
+            time.sleep(args.write_latency)
+            with written_lock:
+                written["records"] += len(records)
+            return {"written": len(records), "deleted": 0}
+
+    # No database: stub the catalog, sink, watermark, sync run and cache writes, skip sync locks and NOTIFY
+    source.GAFactSink = BenchSink
+    source.save_property_info = lambda *a: None
+    source.get_metric_ids = lambda property_id, descriptions: {name: i for i, name in enumerate(descriptions)}
+    source.catch_up_start = lambda project_id, name, stream, start, end, max_days: start
+    pipeline.bump_sync_version = lambda project_id: None
+    pipeline.set_watermark = lambda *a: None
+    pipeline.record_sync_run = lambda *a: None
+    singleflight.SYNC_LOCKS = False
+    broker.EVENTS_BACKEND = "local"
+
+    credentials = Credentials(token="bench-token")
+    property_info = {"display_name": "Bench Property", "account_name": "Bench Account"}
+
+    def new_source():
+        return source.create_source("bench-project", "100000", credentials, days=args.days,
+                                    property_info=dict(property_info))
+
+    async def on_loop(count: int) -> list:
+        return await asyncio.gather(*[pipeline.run_pipeline(new_source()) for _ in range(count)])
+
+    results = []
+    with FakeGAServer(GA_PORT, latency=args.latency, properties=1, metrics=args.metrics) as server:
+        for mode in args.modes:
+            singleflight.SYNC_COALESCE = mode == "on"
+            written["records"] = 0
+            calls_before = server.stats["runReport"]
+            on_threads = args.callers // 2
+            reports = []
+
+            def on_thread():
+                reports.append(asyncio.run(pipeline.run_pipeline(new_source())))
+
+            started = time.perf_counter()
+            threads = [threading.Thread(target=on_thread) for _ in range(on_threads)]
+            for thread in threads:
+                thread.start()
+            reports.extend(asyncio.run(on_loop(args.callers - on_threads)))
+            for thread in threads:
+                thread.join()
+            results.append({
+                "mode": mode,
+                "callers": args.callers,
+                "seconds": round(time.perf_counter() - started, 3),
+                "run_report_calls": server.stats["runReport"] - calls_before,
+                "records_written": written["records"],
+                "coalesced_reports": sum(1 for report in reports if report["coalesced"]),
+                "errors": sum(1 for report in reports if report["error"] is not None),
+            })
+    registry.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Alert evaluation benchmark on synthetic metric series (no database needed).
+
+    python -m benchmarks.bench_evaluator --projects 1000 10000 50000
+"""
+import argparse
+import json
+import time
+import numpy as np
+from notifications.evaluator import (
+    ALERT_METRICS, BASELINE_DAYS, MIN_BASELINE_VALUE, build_series_array, detect_anomalies
+)
+
+
+def synthetic_rows(projects: np.ndarray, metric_names: list, dates: np.ndarray, rng) -> list:
+    rows = []
+    for project_id in projects:
+        level = rng.uniform(50, 5000)
+        for metric_name in metric_names:
+            series = rng.normal(level, level * 0.1, len(dates))
+            # Roughly 2% of series get a spike on the last day
+            if rng.random() < 0.02:
+                series[-1] *= 3
+            for date, value in zip(dates, series):
+                rows.append({
+                    "project_id": project_id,
+                    "metric_name": metric_name,
+                    "date": str(date),
+                    "metric_value": max(value, 0.0),
+                })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Alert evaluation benchmark")
+    parser.add_argument("--projects", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    metric_names = [name for names in ALERT_METRICS.values() for name in names]
+    min_baseline = np.array([MIN_BASELINE_VALUE.get(name, 0.0) for name in metric_names])
+    dates = np.arange(np.datetime64("2025-01-01"), BASELINE_DAYS + 1)
+
+    results = []
+    for count in args.projects:
+        projects = np.array(sorted(f"project-{i:06d}" for i in range(count)), dtype=object)
+        rows = synthetic_rows(projects, metric_names, dates, rng)
+
+        started = time.perf_counter()
+        # Every project synced through the evaluated day
+        values = build_series_array(rows, projects, metric_names, dates, np.full(count, dates[-1]))
+        build_seconds = time.perf_counter() - started
+
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            scores = detect_anomalies(values, min_baseline)
+            timings.append(time.perf_counter() - started)
+
+        results.append({
+            "projects": count,
+            "rows": len(rows),
+            "build_ms": round(build_seconds * 1000, 2),
+            "detect_ms": round(min(timings) * 1000, 3),
+            "detect_ms_per_1000_projects": round(min(timings) * 1000 / (count / 1000), 3),
+            "alerts": int(scores["triggered"].sum()),
+        })
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
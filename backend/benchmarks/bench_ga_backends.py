@@ -0,0 +1,157 @@
+"""
+GA Data API backends on the same workload: REST (discovery client) vs.
+async gRPC (google_analytics/grpc_source.py).
+
+Both stand-ins (benchmarks/fake_ga_server.py and fake_ga_grpc_server.py)
+serve the same catalog and report values, in child processes so they do
+not compete with the client for the GIL. Each run syncs every property
+through fanout.sync_properties with the backend selected by GA_BACKEND,
+like an initial sync job. Catalog writes, fact writes (a short sleep per
+batch), watermarks and cache invalidation are stubbed; nothing else is.
+
+Reported per backend: wall time (median over --repeat), reports answered
+and reports/s, client CPU seconds and the records written with a checksum,
+which must match between backends. Pass --fixtures with a recorded metadata.json (saved from
+the real API) to replay a real property's metric catalog.
+
+    python -m benchmarks.bench_ga_backends --properties 20 --metrics 100 --days 30 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import statistics
+import time
+
+REST_PORT = 8797
+GRPC_PORT = 8799
+
+
+def serve(backend: str, port: int, options: dict):
+    """Child process: one of the stand-in servers"""
+    if backend == "rest":
+        import uvicorn
+        from benchmarks.fake_ga_server import create_app
+        uvicorn.run(create_app(**options), host="127.0.0.1", port=port, log_level="warning")
+    else:
+        from benchmarks.fake_ga_grpc_server import serve as serve_grpc
+        asyncio.run(serve_grpc(port, **options))
+
+def wait_until_up(port: int):
+    for _ in range(500):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.02)
+    raise RuntimeError(f"Stand-in server on port {port} did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GA REST vs. gRPC backend benchmark")
+    parser.add_argument("--properties", type=int, default=20)
+    parser.add_argument("--metrics", type=int, default=100, help="Metrics per property (ten per report)")
+    parser.add_argument("--bad-metrics", type=int, default=0, help="Incompatible metrics, found one by one")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stand-in server latency per request")
+    parser.add_argument("--concurrency", type=int, default=8, help="Properties synced at a time")
+    parser.add_argument("--write-latency", type=float, default=0.002, help="Seconds per batch write")
+    parser.add_argument("--fixtures", help="Directory with a recorded metadata.json")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backends", nargs="+", default=["rest", "grpc"], choices=["rest", "grpc"])
+    args = parser.parse_args()
+
+    os.environ["GA_DATA_API_URL"] = f"http://127.0.0.1:{REST_PORT}/"
+    os.environ["GA_GRPC_ENDPOINT"] = f"127.0.0.1:{GRPC_PORT}"
+    os.environ["GA_GRPC_INSECURE"] = "1"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    options = {"latency": args.latency, "properties": args.properties, "metrics": args.metrics,
+               "bad_metrics": args.bad_metrics, "fixtures": args.fixtures}
+    context = multiprocessing.get_context("spawn")
+    servers = [context.Process(target=serve, args=(backend, port, options), daemon=True)
+               for backend, port in (("rest", REST_PORT), ("grpc", GRPC_PORT))]
+    for server in servers:
+        server.start()
+
+    from google.oauth2.credentials import Credentials
+    import ingestion.pipeline as pipeline
+    import ingestion.singleflight as singleflight
+    import events.broker as broker
+    import google_analytics.source as source
+    import google_analytics.fanout as fanout
+    from google_analytics.quota import quota_snapshot
+    from clients import registry
+
+    # No database: stub the catalog, sink, watermark, sync run and cache writes, skip sync locks and NOTIFY
+    written = {"records": 0, "checksum": 0.0, "batches": 0}
+
+    class BenchSink:
+        def __init__(self, project_id: str, metric_ids: dict):
+            pass
+
+        def write(self, records: list) -> dict:
+            time.sleep(args.write_latency)
+            written["batches"] += 1
+            written["records"] += len(records)
+            written["checksum"] += sum(record.value for record in records)
+            return {"written": len(records), "deleted": 0}
+
+    source.GAFactSink = BenchSink
+    source.save_property_info = lambda *a: None
+    source.get_metric_ids = lambda property_id, descriptions: {name: i for i, name in enumerate(descriptions)}
+    source.catch_up_start = lambda project_id, name, stream, start, end, max_days: start
+    pipeline.bump_sync_version = lambda project_id: None
+    pipeline.set_watermark = lambda *a: None
+    pipeline.record_sync_run = lambda *a: None
+    singleflight.SYNC_LOCKS = False
+    broker.EVENTS_BACKEND = "local"
+
+    properties = [{"property_id": str(100000 + i), "display_name": f"Bench Property {i}",
+                   "account_name": "Bench Account"} for i in range(args.properties)]
+
+    def reports_answered() -> int:
+        return sum(q["requests"] for q in quota_snapshot())
+
+    results = []
+    try:
+        wait_until_up(REST_PORT)
+        wait_until_up(GRPC_PORT)
+        for backend in args.backends:
+            source.GA_BACKEND = fanout.GA_BACKEND = backend
+            runs = []
+            for _ in range(args.repeat):
+                written.update(records=0, checksum=0.0, batches=0)
+                credentials = Credentials(token="bench-token")
+                reports_before = reports_answered()
+                cpu_started, started = time.process_time(), time.perf_counter()
+                report = asyncio.run(fanout.sync_properties("bench-user", "bench-project", properties,
+                                                            days=args.days, credentials=credentials,
+                                                            concurrency=args.concurrency))
+                runs.append({"seconds": time.perf_counter() - started,
+                             "cpu_seconds": time.process_time() - cpu_started,
+                             "reports": reports_answered() - reports_before,
+                             "failed": report["failed"], **written})
+            seconds = statistics.median(run["seconds"] for run in runs)
+            results.append({
+                "backend": backend,
+                "seconds": round(seconds, 3),
+                "reports": runs[-1]["reports"],
+                "reports_per_second": round(runs[-1]["reports"] / seconds),
+                "cpu_seconds": round(statistics.median(run["cpu_seconds"] for run in runs), 3),
+                "failed_properties": runs[-1]["failed"],
+                "records": runs[-1]["records"],
+                "checksum": runs[-1]["checksum"],
+            })
+        registry.close()
+    finally:
+        for server in servers:
+            server.terminate()
+    print(json.dumps({"properties": args.properties, "metrics": args.metrics, "days": args.days,
+                      "latency": args.latency, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
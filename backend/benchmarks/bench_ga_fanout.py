@@ -0,0 +1,55 @@
+"""
+Multi-property GA sync benchmark: sequential vs. bounded fan-out.
+
+Each simulated property sync blocks for a random 0.2-1.0s, like the real
+Data API calls plus database writes. Nothing leaves the process.
+
+    python -m benchmarks.bench_ga_fanout --properties 50 --concurrency 1 8 50
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import events.broker as broker
+import google_analytics.fanout as fanout
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GA multi-property sync benchmark")
+    parser.add_argument("--properties", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 50])
+    parser.add_argument("--min-latency", type=float, default=0.2)
+    parser.add_argument("--max-latency", type=float, default=1.0)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    latencies = {str(i): rng.uniform(args.min_latency, args.max_latency) for i in range(args.properties)}
+    properties = [{"property_id": pid, "display_name": f"Property {pid}", "account_name": "Bench"} for pid in latencies]
+
+    async def fake_sync(user_id, project_id, property_id, days, **kwargs):
+        time.sleep(latencies[property_id])  # blocking, like the discovery client
+        return {"status": "success", "message": "ok", "metrics_stored": days}
+
+    fanout.get_analytics_data_internal = fake_sync
+    fanout.get_thread_client = lambda credentials: None
+    # No database: keep progress events in-process
+    broker.EVENTS_BACKEND = "local"
+
+    results = []
+    for concurrency in args.concurrency:
+        report = asyncio.run(fanout.sync_properties(
+            "user", "project", properties, days=1, credentials=object(), concurrency=concurrency
+        ))
+        results.append({
+            "concurrency": concurrency,
+            "properties": report["properties"],
+            "seconds": report["seconds"],
+            "sum_of_properties": round(sum(latencies.values()), 2),
+            "max_of_properties": round(max(latencies.values()), 2),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
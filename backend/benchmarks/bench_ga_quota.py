@@ -0,0 +1,128 @@
+"""
+GA quota limiter benchmark against a simulated Data API (no network needed).
+
+The fake property enforces an hourly token quota (refilling continuously,
+scaled so an "hour" passes in --hour-seconds) and a concurrency limit,
+returns propertyQuota like the real API, and answers 429 when either is
+exceeded. Compares unthrottled calls with calls through quota.run_report.
+
+    python -m benchmarks.bench_ga_quota --requests 400 --threads 16
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httplib2
+from googleapiclient.errors import HttpError
+import google_analytics.quota as quota
+
+
+class FakeProperty:
+    def __init__(self, tokens_per_hour: int, hour_seconds: float, concurrency: int, cost: int, latency: float):
+        self.capacity = tokens_per_hour
+        self.tokens = float(tokens_per_hour)
+        self.rate = tokens_per_hour / hour_seconds
+        self.concurrency = concurrency
+        self.cost = cost
+        self.latency = latency
+        self.active = 0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.rejected = 0
+
+    def run_report(self, body: dict) -> dict:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.active >= self.concurrency or self.tokens < self.cost:
+                self.rejected += 1
+                raise HttpError(httplib2.Response({"status": 429}), b'{"error": {"status": "RESOURCE_EXHAUSTED"}}')
+            self.tokens -= self.cost
+            self.active += 1
+            remaining = int(self.tokens)
+        time.sleep(self.latency)
+        with self.lock:
+            self.active -= 1
+        response = {"rows": []}
+        if body.get("returnPropertyQuota"):
+            response["propertyQuota"] = {
+                "tokensPerHour": {"consumed": self.cost, "remaining": remaining},
+                "tokensPerProjectPerHour": {"consumed": self.cost, "remaining": remaining},
+                "tokensPerDay": {"consumed": self.cost, "remaining": 10 ** 6},
+                "concurrentRequests": {"consumed": 0, "remaining": self.concurrency - self.active},
+                "serverErrorsPerProjectPerHour": {"consumed": 0, "remaining": 10},
+            }
+        return response
+
+
+class FakeAnalyticsData:
+    """Mimics build('analyticsdata', 'v1beta').properties().runReport(...).execute()"""
+    def __init__(self, prop: FakeProperty):
+        self.prop = prop
+
+    def properties(self):
+        return self
+
+    def runReport(self, property: str, body: dict):
+        prop = self.prop
+        return type("Request", (), {"execute": lambda _self: prop.run_report(body)})()
+
+
+def run(label: str, limited: bool, args) -> dict:
+    prop = FakeProperty(args.tokens_per_hour, args.hour_seconds, 10, args.cost, args.latency)
+    client = FakeAnalyticsData(prop)
+    quota._quotas.clear()
+
+    def one(i):
+        try:
+            if limited:
+                quota.run_report(client, "123", {}, "bench")
+            else:
+                client.properties().runReport(property="properties/123", body={}).execute()
+            return True
+        except (HttpError, quota.QuotaExhaustedError):
+            return False
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        ok = sum(pool.map(one, range(args.requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "mode": label,
+        "requests": args.requests,
+        "succeeded": ok,
+        "rejected_429": prop.rejected,
+        "seconds": round(elapsed, 2),
+        "successful_reports_per_second": round(ok / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GA quota limiter benchmark")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--tokens-per-hour", type=int, default=2000)
+    parser.add_argument("--hour-seconds", type=float, default=20.0, help="Simulated length of an hour")
+    parser.add_argument("--cost", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    # Scale the limiter to the simulated hour
+    quota.TOKENS_PER_HOUR = quota.TOKENS_PER_PROJECT_PER_HOUR = args.tokens_per_hour
+    quota.MAX_WAIT_SECONDS = args.hour_seconds
+    scale = 3600.0 / args.hour_seconds
+    original_bucket = quota.TokenBucket.__init__
+
+    def scaled_bucket(self, per_hour):
+        original_bucket(self, per_hour)
+        self.rate *= scale
+    quota.TokenBucket.__init__ = scaled_bucket
+
+    results = [run("unthrottled", False, args), run("quota limiter", True, args)]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Cold start of the API: time to `import main` and to the first response.
+
+Each run is a fresh interpreter (no warm module cache in the process), so
+the numbers include every import and everything the modules do at import
+time. Reported:
+
+    import_s         `import main` (median and min over --repeat runs)
+    first_request_s  startup (lifespan) plus GET / through TestClient
+    heavy_modules    which of the big SDKs were loaded by the import
+    slowest          top modules by cumulative time from `-X importtime`
+
+Dummy settings are used for anything not set in the environment; nothing
+connects anywhere (the embedded job worker is off).
+
+    python -m benchmarks.bench_import --repeat 5 --top 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from cryptography.fernet import Fernet
+
+HEAVY_MODULES = ["stripe", "supabase", "pyarrow", "googleapiclient.discovery",
+                 "google_auth_oauthlib.flow", "cryptography.fernet"]
+
+IMPORT_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter() - started
+print(json.dumps({"import_s": imported, "heavy_modules": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+FIRST_REQUEST_SCRIPT = """
+import json, time
+started = time.perf_counter()
+from fastapi.testclient import TestClient
+import main
+with TestClient(main.app) as client:
+    client.get("/").raise_for_status()
+    print(json.dumps({"first_request_s": time.perf_counter() - started}))
+"""
+
+
+def bench_environment() -> dict:
+    env = dict(os.environ)
+    defaults = {
+        "SUPABASE_URL": "http://127.0.0.1:9",
+        # supabase-py only accepts JWT-shaped keys
+        "SUPABASE_SERVICE_ROLE_KEY": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.bench",
+        "SUPABASE_JWT_SECRET": "bench-secret",
+        "SUPABASE_DB_URL": "postgresql://127.0.0.1:9/bench",
+        "ENCRYPTION_KEY": Fernet.generate_key().decode(),
+        "GOOGLE_CLIENT_ID": "bench", "GOOGLE_CLIENT_SECRET": "bench",
+        "GOOGLE_REDIRECT_URI": "http://localhost/callback",
+        "STRIPE_CLIENT_ID": "ca_bench", "STRIPE_SECRET_KEY": "sk_test_bench",
+        "STRIPE_REDIRECT_URI": "http://localhost/callback",
+    }
+    for name, value in defaults.items():
+        env.setdefault(name, value)
+    env["RUN_JOB_WORKER"] = "0"
+    env["LOG_LEVEL"] = "WARNING"
+    return env
+
+
+def run_script(script: str, env: dict, *flags) -> tuple:
+    result = subprocess.run([sys.executable, *flags, "-c", script], env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"Benchmark subprocess failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(stderr: str, top: int) -> list:
+    """Parse `-X importtime` lines: 'import time: self [us] | cumulative | module'"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), module.strip()))
+    rows.sort(reverse=True)
+    return [{"module": module, "cumulative_ms": round(us / 1000, 1)} for us, module in rows[:top]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API cold start benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list")
+    parser.add_argument("--no-request", action="store_true", help="Skip the first-request measurement")
+    args = parser.parse_args()
+
+    env = bench_environment()
+    imports = [run_script(IMPORT_SCRIPT, env)[0] for _ in range(args.repeat)]
+    times = [run["import_s"] for run in imports]
+    _, importtime = run_script(IMPORT_SCRIPT, env, "-X", "importtime")
+
+    report = {
+        "import_s": {"median": round(statistics.median(times), 3), "min": round(min(times), 3)},
+        "heavy_modules": imports[-1]["heavy_modules"],
+        "slowest": slowest_imports(importtime, args.top),
+    }
+    if not args.no_request:
+        requests = [run_script(FIRST_REQUEST_SCRIPT, env)[0]["first_request_s"] for _ in range(args.repeat)]
+        report["first_request_s"] = {"median": round(statistics.median(requests), 3),
+                                     "min": round(min(requests), 3)}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Logging overhead in the ingestion pipeline: blocking vs. queued + sampled.
+
+Runs run_pipeline over a synthetic source that logs one INFO line per data
+point (like the old GA write loop's `Processing metric: ...`), with
+
+    blocking   logging.basicConfig and a plain logger: every record is
+               built, formatted and written (and flushed) on the event loop
+    queued     logging_config.configure_logging and a SampledLogger: sampled
+               records go on a queue, a listener thread writes JSON lines
+    off        logging disabled (floor)
+
+Reported per mode: sync wall time, records/s, the longest event loop stall
+(heartbeat every 1 ms) and the lines written. Sink writes and cache/watermark
+updates are replaced by a short sleep; nothing leaves the process.
+
+    python -m benchmarks.bench_logging --pages 200 --rows 500 --log-file /tmp/bench.log
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+import ingestion.pipeline as pipeline
+import ingestion.singleflight as singleflight
+import events.broker as broker
+from ingestion.pipeline import MetricSource, MetricRecord, run_pipeline
+from logging_config import configure_logging, shutdown_logging, SampledLogger
+
+
+class SyntheticSource(MetricSource):
+    name = "synthetic"
+
+    def __init__(self, pages: int, rows: int, write_latency: float, log):
+        super().__init__("bench-project", "bench-stream")
+        self.log = log
+        self.page_count = pages
+        self.rows = rows
+        self.write_latency = write_latency
+
+    def window(self) -> tuple:
+        return "2024-01-01", "2024-12-31"
+
+    def prepare(self):
+        return self
+
+    def pages(self, start_date: str, end_date: str):
+        for page in range(self.page_count):
+            yield [(f"2024-01-{1 + i % 28:02d}", f"metric_{page % 50}", float(i)) for i in range(self.rows)]
+
+    def normalize(self, page) -> list:
+        records = []
+        for date, metric, value in page:
+            self.log.info(f"Processing metric: {metric} for date {date} with value {value}")
+            records.append(MetricRecord(date, metric, value))
+        return records
+
+    def write(self, batch: list) -> dict:
+        time.sleep(self.write_latency)
+        return {"written": len(batch), "deleted": 0}
+
+
+async def run_with_heartbeat(source: SyntheticSource) -> tuple:
+    stalls = []
+
+    async def heartbeat():
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            stalls.append(now - last - 0.001)
+            last = now
+
+    beat = asyncio.create_task(heartbeat())
+    report = await run_pipeline(source)
+    beat.cancel()
+    return report, max(stalls, default=0.0)
+
+
+def configure(mode: str, path: str):
+    root = logging.getLogger()
+    shutdown_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    logging.disable(logging.NOTSET)
+    if mode == "blocking":
+        logging.basicConfig(level=logging.INFO, filename=path, force=True)
+    elif mode == "queued":
+        configure_logging(stream=open(path, "a"), level="INFO")
+    else:
+        logging.disable(logging.CRITICAL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestion logging overhead benchmark")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=500, help="Data points per page")
+    parser.add_argument("--write-latency", type=float, default=0.002, help="Seconds per batch write")
+    parser.add_argument("--modes", nargs="+", default=["blocking", "queued", "off"],
+                        choices=["blocking", "queued", "off"])
+    parser.add_argument("--log-file", help="Where log lines go (default: a temporary file)")
+    args = parser.parse_args()
+
+    # No database: skip cache invalidation, watermarks, sync runs, sync locks and NOTIFY
+    pipeline.bump_sync_version = lambda project_id: None
+    pipeline.set_watermark = lambda *a: None
+    pipeline.record_sync_run = lambda *a: None
+    singleflight.SYNC_LOCKS = False
+    broker.EVENTS_BACKEND = "local"
+
+    results = []
+    for mode in args.modes:
+        path = args.log_file or os.path.join(tempfile.mkdtemp(), "bench.log")
+        open(path, "w").close()
+        configure(mode, path)
+        log = SampledLogger("ingestion.detail") if mode == "queued" else logging.getLogger("ingestion.detail")
+        source = SyntheticSource(args.pages, args.rows, args.write_latency, log)
+        started = time.perf_counter()
+        report, max_stall = asyncio.run(run_with_heartbeat(source))
+        seconds = time.perf_counter() - started
+        # Let the listener finish writing before counting lines
+        configure("off", path)
+        with open(path) as f:
+            lines = sum(1 for _ in f)
+        results.append({
+            "mode": mode,
+            "records": report["records"],
+            "seconds": round(seconds, 3),
+            "records_per_second": round(report["records"] / seconds),
+            "max_event_loop_stall_ms": round(max_stall * 1000, 1),
+            "log_lines": lines,
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Push sender throughput benchmark against the local stand-in push server.
+
+    python -m benchmarks.bench_push_sender --devices 50000 --latency 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from benchmarks.fake_push_server import FakePushServer, DEAD_TOKEN_MARKER
+
+
+def build_messages(devices: int, dead_share: float) -> list:
+    dead_every = int(1 / dead_share) if dead_share > 0 else 0
+    messages = []
+    for i in range(devices):
+        marker = DEAD_TOKEN_MARKER if dead_every and i % dead_every == 0 else "live"
+        messages.append({
+            "to": f"ExponentPushToken[{marker}-{i}]",
+            "title": "Traffic alert",
+            "body": "Sessions are up 42% compared to last week",
+            "data": {"project_id": f"project-{i % 500}"}
+        })
+    return messages
+
+
+async def run(args) -> dict:
+    # Import after EXPO_PUSH_BASE_URL is set so the sender targets the stand-in server
+    from notifications import sender
+
+    messages = build_messages(args.devices, args.dead_share)
+    pruned = []
+    client = sender.create_push_client(args.concurrency)
+    sender.MAX_CONCURRENT_REQUESTS = args.concurrency
+
+    try:
+        started = time.perf_counter()
+        report = await sender.send_push_notifications(messages, client=client, on_dead_tokens=pruned.extend)
+        send_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        receipts = await sender.fetch_push_receipts(report["tickets"], client=client)
+        receipt_seconds = time.perf_counter() - started
+    finally:
+        await client.aclose()
+
+    return {
+        "devices": args.devices,
+        "concurrency": args.concurrency,
+        "latency_s": args.latency,
+        "send_seconds": round(send_seconds, 3),
+        "messages_per_second": round(args.devices / send_seconds, 1),
+        "receipt_seconds": round(receipt_seconds, 3),
+        "sent": report["sent"],
+        "delivered": receipts["delivered"],
+        "dead_tokens_pruned": len(pruned),
+        "errors": len(report["errors"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Push sender throughput benchmark")
+    parser.add_argument("--devices", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.1, help="simulated push service latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="share of requests answered with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of tickets rate limited")
+    parser.add_argument("--dead-share", type=float, default=0.02, help="share of unregistered device tokens")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    with FakePushServer(port=args.port, latency=args.latency, error_rate=args.error_rate,
+                        rate_limit_rate=args.rate_limit_rate) as server:
+        os.environ["EXPO_PUSH_BASE_URL"] = server.base_url
+        result = asyncio.run(run(args))
+        result["server"] = server.stats
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Syncing many connected Stripe accounts at once (stripe_data/fanout.py).
+
+--accounts connections, each with its own access token, sync one day
+against the local stand-in Stripe API (fake_stripe_server.py), which
+allows each account --account-rps requests per second and answers 429
+beyond it. Each --concurrency value is one run. Reported per run: wall
+time, connections/s, requests sent, 429s received, requests per account
+and whether the stand-in saw exactly the accounts' own keys (no
+credentials crossed between concurrent syncs).
+
+Metric writes, watermarks, cache invalidation, sync runs and sync locks
+are stubbed; nothing but the stand-in API is contacted.
+
+    python -m benchmarks.bench_stripe_accounts --accounts 200 --concurrency 1 32 --latency 0.01
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from benchmarks.fake_stripe_server import FakeStripeServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-account Stripe sync benchmark")
+    parser.add_argument("--accounts", type=int, default=200, help="Connected accounts")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 32], help="Syncs at once, one run each")
+    parser.add_argument("--latency", type=float, default=0.01, help="Seconds added to every API request")
+    parser.add_argument("--objects", type=int, default=150, help="Objects per Stripe list endpoint")
+    parser.add_argument("--account-rps", type=int, default=25, help="Requests per second the API allows per account")
+    parser.add_argument("--client-rps", type=float, default=20, help="STRIPE_ACCOUNT_RPS")
+    args = parser.parse_args()
+
+    server = FakeStripeServer(latency=args.latency, objects=args.objects, account_rps=args.account_rps)
+    # Point the app at the stand-in before importing it
+    os.environ["STRIPE_API_BASE"] = server.base_url
+    os.environ["STRIPE_ACCOUNT_RPS"] = str(args.client_rps)
+    import ingestion.pipeline as pipeline
+    import ingestion.singleflight as singleflight
+    import ingestion.sinks as sinks
+    import ingestion.write_behind as write_behind
+    import events.broker as broker
+    from clients import get_cipher, registry
+    from stripe_data.fanout import sync_accounts
+
+    # No database: stub the writes, watermark, sync run and cache writes, skip sync locks and NOTIFY
+    sinks.write_rows = write_behind.write_rows = \
+        lambda table, batches: [{"written": len(rows), "unchanged": 0, "deleted": 0} for rows in batches]
+    write_behind.get_pool = lambda: None
+    pipeline.bump_sync_version = lambda project_id: None
+    pipeline.set_watermark = lambda *a: None
+    pipeline.record_sync_run = lambda *a: None
+    singleflight.SYNC_LOCKS = False
+    broker.EVENTS_BACKEND = "local"
+
+    target_date = datetime.now() - timedelta(days=2)
+    results = []
+    with server:
+        for run, concurrency in enumerate(args.concurrency):
+            tokens = [f"sk_test_bench_{run}_{i:04d}" for i in range(args.accounts)]
+            connections = [
+                {"user_id": "bench-user", "project_id": f"00000000-0000-0000-0000-{i:012d}",
+                 "stripe_account_id": f"acct_bench_{run}_{i:04d}", "account_name": f"Bench Account {i}",
+                 "access_token": get_cipher().encrypt(token.encode()).decode()}
+                for i, token in enumerate(tokens)
+            ]
+            before = server.stats
+            started = time.perf_counter()
+            report = asyncio.run(sync_accounts(connections, target_date, concurrency))
+            wall = time.perf_counter() - started
+            after = server.stats
+
+            per_account = {account: after["accounts"][account] - before["accounts"].get(account, 0)
+                           for account in after["accounts"] if account.startswith(f"sk_test_bench_{run}_")}
+            results.append({
+                "concurrency": concurrency,
+                "accounts": args.accounts,
+                "seconds": round(wall, 3),
+                "connections_per_second": round(args.accounts / wall, 1),
+                "requests": after["requests"] - before["requests"],
+                "rate_limited": after["rate_limited"] - before["rate_limited"],
+                "records": report["written"],
+                "failed": report["failed"],
+                "slowest_connection_seconds": report["slowest_connection_seconds"],
+                "requests_per_account": [min(per_account.values(), default=0), max(per_account.values(), default=0)],
+                # Requests arrived with every account's own key and no other
+                "isolated": set(per_account) == set(tokens)
+                            and sum(per_account.values()) == after["requests"] - before["requests"],
+            })
+    registry.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+End-to-end sync benchmark: Google Analytics and Stripe ingestion against
+the local stand-in APIs (fake_ga_server.py, fake_stripe_server.py) and a
+local Postgres database. Nothing talks to Google, Stripe or Supabase.
+
+The GA phase runs sync_properties (the path behind /analytics/fetch-initial-metrics
+and the sync jobs; with --concurrency 1 it is one get_all_analytics_data per
+property). The Stripe phase runs StripeSource through the same pipeline as
+get_stripe_metrics, once per day. Credentials come from the command line
+instead of the credentials tables.
+
+Reported per run: wall time, records/s, API calls per sync (counted by the
+fake servers), DB transactions and rows written per sync (pg_stat_database
+deltas) and peak Python memory (tracemalloc) / max RSS. The stand-ins
+return the same values on every run, so later runs show what re-syncing
+stored days costs: rows are only written when a value changed, plus one
+sync_runs row per sync.
+
+    createdb sync_bench
+    python -m benchmarks.bench_sync --db-url postgresql://localhost/sync_bench \\
+        --properties 20 --metrics 100 --days 30 --stripe-days 7 --stripe-objects 2000 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+import psycopg2
+from benchmarks.fake_ga_server import FakeGAServer
+from benchmarks.fake_stripe_server import FakeStripeServer
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "sync_schema.sql")
+BENCH_TABLES = ("ga_metric_facts, metric_catalog, ga_properties, stripe_metrics, project_sync_versions, "
+                "ingestion_watermarks, sync_runs")
+
+
+def db_counters(db_url: str) -> dict:
+    conn = psycopg2.connect(db_url)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_stat_clear_snapshot()")
+            cursor.execute("""
+                SELECT xact_commit, tup_inserted, tup_updated, tup_deleted
+                FROM pg_stat_database WHERE datname = current_database()
+            """)
+            commits, inserted, updated, deleted = cursor.fetchone()
+        return {"transactions": commits, "rows_inserted": inserted, "rows_updated": updated, "rows_deleted": deleted}
+    finally:
+        conn.close()
+
+def prepare_database(db_url: str, reset: bool):
+    conn = psycopg2.connect(db_url)
+    try:
+        with conn.cursor() as cursor:
+            with open(SCHEMA_PATH) as f:
+                cursor.execute(f.read())
+            if reset:
+                cursor.execute(f"TRUNCATE {BENCH_TABLES} RESTART IDENTITY")
+        conn.commit()
+    finally:
+        conn.close()
+
+def measure(label: str, run: int, syncs: int, api_stats_before: dict, api_stats_after: dict,
+            api_keys: list, db_url: str, work):
+    from database import close_pool
+
+    db_before = db_counters(db_url)
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = work()
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Pooled backends flush their statistics when they disconnect
+    close_pool()
+    time.sleep(0.5)
+    db_after = db_counters(db_url)
+    db = {key: db_after[key] - db_before[key] for key in db_after}
+    db["transactions"] -= 1  # the counter read itself
+
+    after = api_stats_after()
+    api_calls = {key: after[key] - api_stats_before[key] for key in api_keys}
+    calls = sum(api_calls.values())
+    return {
+        "phase": label,
+        "run": run,
+        "syncs": syncs,
+        "seconds": round(seconds, 3),
+        "records": result["records"],
+        "records_per_second": round(result["records"] / seconds, 1) if seconds else None,
+        "errors": result["errors"],
+        "api_calls": api_calls,
+        "api_calls_per_sync": round(calls / syncs, 1),
+        "db": db,
+        "db_transactions_per_sync": round(db["transactions"] / syncs, 1),
+        "db_rows_written_per_sync": round((db["rows_inserted"] + db["rows_updated"] + db["rows_deleted"]) / syncs, 1),
+        "peak_python_mb": round(peak / 2 ** 20, 1),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end GA and Stripe sync benchmark")
+    parser.add_argument("--db-url", default=os.getenv("BENCH_DB_URL"), help="Scratch Postgres database (or BENCH_DB_URL)")
+    parser.add_argument("--runs", type=int, default=2, help="Repeat the syncs (later runs find the rows stored)")
+    parser.add_argument("--reset", action="store_true", help="Truncate the benchmark tables first")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds added to every fake API call")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--properties", type=int, default=10)
+    parser.add_argument("--metrics", type=int, default=100, help="Metrics in each property's metadata")
+    parser.add_argument("--bad-metrics", type=int, default=0, help="Metrics whose reports fail with 400")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--ga-page-size", type=int, default=10000, help="Most rows per runReport response")
+    parser.add_argument("--concurrency", type=int, default=8, help="Properties synced at once")
+    parser.add_argument("--stripe-days", type=int, default=3)
+    parser.add_argument("--stripe-objects", type=int, default=500, help="Objects per Stripe list endpoint")
+    parser.add_argument("--stripe-page-size", type=int, default=100)
+    parser.add_argument("--fixtures", help="Directory with recorded GA / Stripe responses")
+    parser.add_argument("--skip", choices=["ga", "stripe"], action="append", default=[])
+    args = parser.parse_args()
+    if not args.db_url:
+        parser.error("--db-url (or BENCH_DB_URL) is required")
+
+    ga_server = FakeGAServer(latency=args.latency, error_rate=args.error_rate, page_size=args.ga_page_size,
+                             properties=args.properties, metrics=args.metrics, bad_metrics=args.bad_metrics,
+                             fixtures=args.fixtures)
+    stripe_server = FakeStripeServer(latency=args.latency, error_rate=args.error_rate,
+                                     page_size=args.stripe_page_size, objects=args.stripe_objects,
+                                     fixtures=args.fixtures)
+
+    # Point the app at the stand-ins and the scratch database before importing it
+    os.environ["SUPABASE_DB_URL"] = args.db_url
+    os.environ["GA_DATA_API_URL"] = os.environ["GA_ADMIN_API_URL"] = ga_server.base_url
+    os.environ["STRIPE_API_BASE"] = stripe_server.base_url
+    from google.oauth2.credentials import Credentials
+    import google_analytics.fetch_metrics  # noqa: F401 (same configuration as the API)
+    import stripe_data.fetch_metrics  # noqa: F401
+    from google_analytics.fanout import sync_properties
+    from ingestion.pipeline import run_pipeline
+    from stripe_data.source import StripeSource
+
+    prepare_database(args.db_url, args.reset)
+    project_id = str(uuid.uuid4())
+    credentials = Credentials(token="bench-token")
+    results = []
+
+    with ga_server, stripe_server:
+        for run in range(1, args.runs + 1):
+            if "ga" not in args.skip:
+                def ga_work():
+                    report = asyncio.run(sync_properties("bench-user", project_id, days=args.days,
+                                                         credentials=credentials, concurrency=args.concurrency))
+                    return {"records": report["metrics_stored"], "errors": [e["message"] for e in report["errors"]]}
+                before = dict(ga_server.stats)
+                results.append(measure("google_analytics", run, args.properties, before, lambda: ga_server.stats,
+                                       ["accountSummaries", "getMetadata", "runReport"], args.db_url, ga_work))
+
+            if "stripe" not in args.skip:
+                def stripe_work():
+                    records, errors = 0, []
+                    for offset in range(args.stripe_days):
+                        day = datetime.now() - timedelta(days=2 + offset)
+                        source = StripeSource("bench-user", project_id, "sk_test_bench", day,
+                                              account_name="Bench Account", account_id="acct_bench")
+                        report = asyncio.run(run_pipeline(source))
+                        records += report["records"]
+                        errors += [str(report["error"])] if report["error"] else []
+                        errors += [f"section {name} failed" for name in source.failed_sections]
+                    return {"records": records, "errors": errors}
+                before = dict(stripe_server.stats)
+                results.append(measure("stripe", run, args.stripe_days, before, lambda: stripe_server.stats,
+                                       ["requests"], args.db_url, stripe_work))
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Connection reuse of Stripe and Google SDK calls: SDK defaults vs. the
+shared keep-alive transports (transports.py).
+
+Drives the local stand-in APIs (run in child processes, so they do not
+compete with the client for the GIL) from a thread pool, like concurrent
+syncs:
+
+    stripe   Charge.list pages, one per call
+    google   runReport calls; every task builds its own Data API client,
+             as each property sync and job does
+
+    default  the SDKs' own HTTP clients: Stripe's RequestsClient and one
+             httplib2.Http per Google client
+    pooled   stripe.HTTPXClient and PooledHttp over the shared httpx pools
+
+With --tls the stand-ins serve HTTPS with a throwaway self-signed
+certificate, so every new connection also pays a TLS handshake. Over
+loopback a handshake costs almost nothing; against the real APIs it is
+one to three network round trips, which --connect-latency adds to the
+first request on each connection. Reported per mode and API: wall time,
+calls/s and the connections the server accepted (distinct client ports).
+
+    python -m benchmarks.bench_transports --tasks 200 --calls 5 --threads 16 --tls --connect-latency 0.06
+"""
+import argparse
+import asyncio
+import datetime
+import ipaddress
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+
+GA_PORT = 8787
+STRIPE_PORT = 8788
+
+
+def write_self_signed_cert(directory: str) -> tuple:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(minutes=5)).not_valid_after(now + datetime.timedelta(days=1))
+            .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]),
+                           critical=False)
+            .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+            .sign(key, hashes.SHA256()))
+    cert_path, key_path = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    return cert_path, key_path
+
+
+def serve(api: str, port: int, options: dict, cert: tuple, connect_latency: float):
+    """Child process: a stand-in server that also reports the connections it accepted"""
+    import uvicorn
+    if api == "google":
+        from benchmarks.fake_ga_server import create_app
+    else:
+        from benchmarks.fake_stripe_server import create_app
+    app = create_app(**options)
+    peers = set()
+
+    async def record_peer(request, call_next):
+        peer = (request.client.host, request.client.port)
+        if request.url.path != "/bench/peers" and peer not in peers:
+            peers.add(peer)
+            await asyncio.sleep(connect_latency)
+        return await call_next(request)
+
+    @app.post("/bench/peers")
+    def take_peers():
+        count = len(peers)
+        peers.clear()
+        return {"connections": count}
+
+    app.middleware("http")(record_peer)
+    ssl = {"ssl_certfile": cert[0], "ssl_keyfile": cert[1]} if cert else {}
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", **ssl)
+
+
+def take_peers(base_url: str) -> int:
+    return httpx.post(f"{base_url}/bench/peers", verify=False).json()["connections"]
+
+def wait_until_up(base_url: str):
+    for _ in range(500):
+        try:
+            take_peers(base_url)
+            return
+        except httpx.TransportError:
+            time.sleep(0.02)
+    raise RuntimeError(f"Stand-in server at {base_url} did not start")
+
+
+def run_tasks(task, tasks: int, threads: int) -> float:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(task, range(tasks)))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pooled HTTP transport benchmark")
+    parser.add_argument("--tasks", type=int, default=200, help="Syncs to simulate per API")
+    parser.add_argument("--calls", type=int, default=5, help="API calls per task")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.005, help="Stand-in server latency per request")
+    parser.add_argument("--connect-latency", type=float, default=0.0,
+                        help="Seconds added to the first request on each connection (network round trips)")
+    parser.add_argument("--page-size", type=int, default=10, help="Objects per Stripe list page")
+    parser.add_argument("--tls", action="store_true", help="Serve the stand-ins over HTTPS")
+    parser.add_argument("--modes", nargs="+", default=["default", "pooled"], choices=["default", "pooled"])
+    args = parser.parse_args()
+
+    scheme = "https" if args.tls else "http"
+    ga_url, stripe_url = f"{scheme}://127.0.0.1:{GA_PORT}", f"{scheme}://127.0.0.1:{STRIPE_PORT}"
+    cert = write_self_signed_cert(tempfile.mkdtemp()) if args.tls else None
+    if cert:
+        # Trust the throwaway certificate in every client under test
+        os.environ["SSL_CERT_FILE"] = os.environ["HTTPLIB2_CA_CERTS"] = cert[0]
+    os.environ["GA_DATA_API_URL"] = f"{ga_url}/"
+    os.environ["STRIPE_API_BASE"] = stripe_url
+    os.environ.setdefault("STRIPE_SECRET_KEY", "sk_test_bench")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    context = multiprocessing.get_context("spawn")
+    servers = [
+        context.Process(target=serve, args=("google", GA_PORT, {"latency": args.latency, "properties": 1,
+                                                              "metrics": 10}, cert, args.connect_latency),
+                        daemon=True),
+        context.Process(target=serve, args=("stripe", STRIPE_PORT, {"latency": args.latency, "objects": 100},
+                                            cert, args.connect_latency), daemon=True),
+    ]
+    for server in servers:
+        server.start()
+
+    import httplib2
+    import stripe
+    from google.oauth2.credentials import Credentials
+    from google_auth_httplib2 import AuthorizedHttp
+    from google_analytics.shared import build_data_client
+    from clients import get_stripe, registry
+
+    credentials = Credentials(token="bench-token")
+    report_body = {"dateRanges": [{"startDate": "2024-01-01", "endDate": "2024-01-07"}],
+                   "dimensions": [{"name": "date"}], "metrics": [{"name": "sessions"}]}
+
+    def google_task(mode: str):
+        def task(i):
+            if mode == "pooled":
+                client = build_data_client(credentials)
+            else:
+                client = build_data_client(http=AuthorizedHttp(credentials, http=httplib2.Http(timeout=60)))
+            for _ in range(args.calls):
+                client.properties().runReport(property="properties/1", body=report_body).execute()
+        return task
+
+    def stripe_task(i):
+        for _ in range(args.calls):
+            stripe.Charge.list(limit=args.page_size)
+
+    results = []
+    try:
+        wait_until_up(ga_url)
+        wait_until_up(stripe_url)
+        for mode in args.modes:
+            registry.close()
+            get_stripe()
+            if mode == "default":
+                stripe.ca_bundle_path = cert[0] if cert else stripe.ca_bundle_path
+                stripe.default_http_client = stripe.RequestsClient()
+            for api, task, base_url in (("stripe", stripe_task, stripe_url), ("google", google_task(mode), ga_url)):
+                take_peers(base_url)
+                seconds = run_tasks(task, args.tasks, args.threads)
+                calls = args.tasks * args.calls
+                results.append({
+                    "mode": mode,
+                    "api": api,
+                    "calls": calls,
+                    "seconds": round(seconds, 3),
+                    "calls_per_second": round(calls / seconds),
+                    "connections": take_peers(base_url),
+                })
+        registry.close()
+    finally:
+        for server in servers:
+            server.terminate()
+    print(json.dumps({"tls": args.tls, "connect_latency": args.connect_latency, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Metric writes per sync vs. the write-behind buffer (ingestion/write_behind.py).
+
+--syncs small syncs (like one Stripe day or a GA property with a few
+metrics per job) run at once, half as tasks on one event loop and half on
+threads with their own loops, over a synthetic source whose pages take
+--fetch-latency each. Every batch goes to a GAFactSink, whose database
+statement is replaced by a stand-in costing --round-trip seconds plus
+--row-cost per row, so
+
+    direct   WRITE_BEHIND=0: each sync writes each batch itself
+    buffer   batches of all syncs are written together by the flusher
+
+Reported per mode: wall time, records/s, write transactions (round trips)
+and rows per transaction. Watermarks, cache invalidation, sync runs and
+sync locks are stubbed; nothing leaves the process. bench_sync.py runs the
+buffer against a real database.
+
+    python -m benchmarks.bench_write_behind --syncs 200 --pages 5 --rows 40 --round-trip 0.004
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+import ingestion.pipeline as pipeline
+import ingestion.singleflight as singleflight
+import ingestion.sinks as sinks
+import ingestion.write_behind as write_behind
+import events.broker as broker
+from ingestion.pipeline import MetricSource, MetricRecord, run_pipeline
+from ingestion.sinks import GAFactSink
+from clients import registry
+
+
+class SyntheticSource(MetricSource):
+    name = "synthetic"
+
+    def __init__(self, stream: int, pages: int, rows: int, fetch_latency: float):
+        super().__init__("00000000-0000-0000-0000-000000000001", f"bench-stream-{stream}")
+        self.page_count = pages
+        self.rows = rows
+        self.fetch_latency = fetch_latency
+        self.metric_ids = {f"metric_{i}": stream * 1000 + i for i in range(rows)}
+
+    def window(self) -> tuple:
+        return "2024-01-01", "2024-01-31"
+
+    def prepare(self):
+        return GAFactSink(self.project_id, self.metric_ids)
+
+    def pages(self, start_date: str, end_date: str):
+        for page in range(self.page_count):
+            time.sleep(self.fetch_latency)
+            yield [(f"2024-01-{1 + page % 28:02d}", f"metric_{i}", float(i + 1)) for i in range(self.rows)]
+
+    def normalize(self, page) -> list:
+        return [MetricRecord(*row) for row in page]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write-behind buffer benchmark")
+    parser.add_argument("--syncs", type=int, default=200, help="Concurrent syncs")
+    parser.add_argument("--pages", type=int, default=5, help="Pages per sync")
+    parser.add_argument("--rows", type=int, default=40, help="Records per page")
+    parser.add_argument("--fetch-latency", type=float, default=0.02, help="Seconds per page fetched")
+    parser.add_argument("--round-trip", type=float, default=0.004, help="Seconds per write transaction")
+    parser.add_argument("--row-cost", type=float, default=0.000005, help="Seconds per row written")
+    parser.add_argument("--batch-size", type=int, default=pipeline.INGEST_BATCH_SIZE)
+    parser.add_argument("--modes", nargs="+", default=["direct", "buffer"], choices=["direct", "buffer"])
+    args = parser.parse_args()
+
+    writes = {"transactions": 0, "rows": 0}
+    # One database connection: writes queue up behind each other as on a busy pool
+    connection = threading.Lock()
+
+    def stand_in_write_rows(table: str, batches: list) -> list:
+        with connection:
+            rows = sum(len(rows) for rows in batches)
+            time.sleep(args.round_trip + rows * args.row_cost)
+            writes["transactions"] += 1
+            writes["rows"] += rows
+        return [{"written": len(rows), "unchanged": 0, "deleted": 0} for rows in batches]
+
+    # No database: stub the writes, watermark, sync run and cache writes, skip sync locks and NOTIFY
+    sinks.write_rows = write_behind.write_rows = stand_in_write_rows
+    write_behind.get_pool = lambda: None
+    pipeline.bump_sync_version = lambda project_id: None
+    pipeline.set_watermark = lambda *a: None
+    pipeline.record_sync_run = lambda *a: None
+    singleflight.SYNC_LOCKS = False
+    broker.EVENTS_BACKEND = "local"
+
+    async def on_loop(streams: range) -> list:
+        return await asyncio.gather(*[
+            run_pipeline(SyntheticSource(stream, args.pages, args.rows, args.fetch_latency), args.batch_size)
+            for stream in streams
+        ])
+
+    results = []
+    for mode in args.modes:
+        write_behind.WRITE_BEHIND = mode == "buffer"
+        writes.update(transactions=0, rows=0)
+        reports = []
+
+        def on_thread(stream: int):
+            source = SyntheticSource(stream, args.pages, args.rows, args.fetch_latency)
+            reports.append(asyncio.run(run_pipeline(source, args.batch_size)))
+
+        on_threads = args.syncs // 2
+        started = time.perf_counter()
+        threads = [threading.Thread(target=on_thread, args=(stream,)) for stream in range(on_threads)]
+        for thread in threads:
+            thread.start()
+        reports.extend(asyncio.run(on_loop(range(on_threads, args.syncs))))
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - started
+        records = sum(report["written"] for report in reports)
+        results.append({
+            "mode": mode,
+            "syncs": args.syncs,
+            "seconds": round(seconds, 3),
+            "records": records,
+            "records_per_second": round(records / seconds),
+            "write_transactions": writes["transactions"],
+            "rows_per_transaction": round(writes["rows"] / max(writes["transactions"], 1), 1),
+            "errors": sum(1 for report in reports if report["error"] is not None),
+        })
+    registry.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Local stand-in for the Google Analytics Data API (v1beta) over gRPC.
+
+Serves GetMetadata and RunReport from the same catalog and generated
+report values as the REST stand-in (benchmarks/fake_ga_server.py), so the
+two backends can be compared on identical workloads. Latency, page size,
+error rate and incompatible ("bad") metrics behave the same way; errors
+are gRPC statuses (UNAVAILABLE, INVALID_ARGUMENT) instead of HTTP ones.
+
+Run standalone:
+    python -m benchmarks.fake_ga_grpc_server --port 8769 --latency 0.05
+then point the backend at it with
+    GA_BACKEND=grpc GA_GRPC_ENDPOINT=127.0.0.1:8769 GA_GRPC_INSECURE=1
+"""
+import argparse
+import asyncio
+import random
+import threading
+import grpc
+from google.protobuf import json_format
+from google.analytics.data_v1beta.types import GetMetadataRequest, Metadata, RunReportRequest, RunReportResponse
+from .fake_ga_server import load_catalog, build_report
+
+SERVICE = "google.analytics.data.v1beta.BetaAnalyticsData"
+
+
+def create_server(port: int = 8769, latency: float = 0.0, error_rate: float = 0.0, page_size: int = 10000,
+                  properties: int = 10, metrics: int = 100, bad_metrics: int = 0, zero_share: float = 0.3,
+                  fixtures: str = None) -> tuple:
+    """(grpc.aio server, stats); options as in fake_ga_server.create_app"""
+    stats = {"getMetadata": 0, "runReport": 0, "rows": 0, "errors": 0}
+    metadata, _ = load_catalog(properties, metrics, bad_metrics, fixtures)
+
+    async def call(endpoint: str, context):
+        stats[endpoint] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if random.random() < error_rate:
+            stats["errors"] += 1
+            await context.abort(grpc.StatusCode.UNAVAILABLE, "The service is currently unavailable.")
+
+    async def get_metadata(request, context):
+        await call("getMetadata", context)
+        return json_format.ParseDict(dict(metadata, name=request.name), Metadata.pb()(), ignore_unknown_fields=True)
+
+    async def run_report(request, context):
+        await call("runReport", context)
+        property_id = request.property.split("/")[-1]
+        names = [metric.name for metric in request.metrics]
+        bad = [name for name in names if name.startswith("badMetric")]
+        if bad:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, f"{bad[0]} is not compatible with date")
+
+        response = build_report(property_id, json_format.MessageToDict(request), zero_share, page_size)
+        stats["rows"] += len(response["rows"])
+        return json_format.ParseDict(response, RunReportResponse.pb()(), ignore_unknown_fields=True)
+
+    handlers = {
+        "GetMetadata": grpc.unary_unary_rpc_method_handler(
+            get_metadata, request_deserializer=GetMetadataRequest.pb().FromString,
+            response_serializer=Metadata.pb().SerializeToString),
+        "RunReport": grpc.unary_unary_rpc_method_handler(
+            run_report, request_deserializer=RunReportRequest.pb().FromString,
+            response_serializer=RunReportResponse.pb().SerializeToString),
+    }
+    server = grpc.aio.server()
+    server.add_generic_rpc_handlers([grpc.method_handlers_generic_handler(SERVICE, handlers)])
+    server.add_insecure_port(f"127.0.0.1:{port}")
+    return server, stats
+
+
+async def serve(port: int = 8769, **options):
+    server, _ = create_server(port, **options)
+    await server.start()
+    await server.wait_for_termination()
+
+
+class FakeGAGrpcServer:
+    """
+    Runs the stand-in server on a background thread with its own event loop.
+    grpc.aio expects one event loop per process, so a client in the same
+    process may log harmless BlockingIOErrors; benchmarks run it in a child
+    process instead (see bench_ga_backends.py).
+    """
+
+    def __init__(self, port: int = 8769, **options):
+        self.port = port
+        self.options = options
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.server = None
+        self._stats = None
+
+    @property
+    def endpoint(self) -> str:
+        return f"127.0.0.1:{self.port}"
+
+    @property
+    def stats(self) -> dict:
+        return self._stats
+
+    def __enter__(self):
+        self.thread.start()
+
+        async def start():
+            self.server, self._stats = create_server(self.port, **self.options)
+            await self.server.start()
+
+        asyncio.run_coroutine_threadsafe(start(), self.loop).result()
+        return self
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self.server.stop(None), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in Google Analytics Data API gRPC server")
+    parser.add_argument("--port", type=int, default=8769)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--page-size", type=int, default=10000)
+    parser.add_argument("--metrics", type=int, default=100)
+    parser.add_argument("--bad-metrics", type=int, default=0)
+    parser.add_argument("--fixtures", help="Directory with a recorded metadata.json")
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.port, latency=args.latency, error_rate=args.error_rate, page_size=args.page_size,
+                      metrics=args.metrics, bad_metrics=args.bad_metrics, fixtures=args.fixtures))
@@ -0,0 +1,218 @@
+"""
+Local stand-in for the Google Analytics Admin and Data APIs (v1beta).
+
+Serves accountSummaries, properties/{id}/metadata and properties/{id}:runReport
+with configurable latency, page size and error rate. Metadata and account
+summaries are replayed from recorded responses when a fixtures directory is
+given (metadata.json, accountSummaries.json, saved from the real API);
+otherwise they are generated. Report values are generated per property,
+metric and day (deterministic, with a share of zero days like real data).
+
+Run standalone:
+    python -m benchmarks.fake_ga_server --port 8767 --latency 0.05
+then point the backend at it with
+    GA_DATA_API_URL=http://127.0.0.1:8767/ GA_ADMIN_API_URL=http://127.0.0.1:8767/
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Common GA4 metrics used before falling back to generated names
+CORE_METRICS = [
+    "activeUsers", "newUsers", "totalUsers", "sessions", "engagedSessions", "screenPageViews",
+    "eventCount", "conversions", "bounceRate", "engagementRate", "averageSessionDuration",
+    "userEngagementDuration", "sessionsPerUser", "screenPageViewsPerSession", "totalRevenue",
+    "purchaseRevenue", "transactions", "ecommercePurchases", "addToCarts", "checkouts",
+]
+
+
+def generate_metadata(metrics: int, bad_metrics: int) -> dict:
+    names = CORE_METRICS[:metrics] + [f"customEvent:bench_{i}" for i in range(max(0, metrics - len(CORE_METRICS)))]
+    names += [f"badMetric{i}" for i in range(bad_metrics)]
+    return {"metrics": [{"apiName": name, "description": f"Benchmark metric {name}"} for name in names]}
+
+def generate_account_summaries(properties: int, accounts: int = 1) -> dict:
+    per_account = max(1, -(-properties // accounts))
+    summaries = []
+    for a in range(accounts):
+        ids = range(a * per_account, min(properties, (a + 1) * per_account))
+        summaries.append({
+            "account": f"accounts/{1000 + a}",
+            "displayName": f"Bench Account {a}",
+            "propertySummaries": [
+                {"property": f"properties/{100000 + i}", "displayName": f"Bench Property {i}"} for i in ids
+            ]
+        })
+    return {"accountSummaries": summaries}
+
+def metric_value(property_id: str, metric: str, day: str, zero_share: float) -> float:
+    seed = zlib.crc32(f"{property_id}|{metric}|{day}".encode())
+    if (seed % 1000) / 1000 < zero_share:
+        return 0
+    return seed % 5000
+
+
+def load_catalog(properties: int, metrics: int, bad_metrics: int, fixtures: str = None) -> tuple:
+    """(metadata, account summaries): recorded responses from `fixtures` where present, else generated"""
+    metadata = generate_metadata(metrics, bad_metrics)
+    account_summaries = generate_account_summaries(properties)
+    if fixtures:
+        for name, target in (("metadata.json", "metadata"), ("accountSummaries.json", "summaries")):
+            path = os.path.join(fixtures, name)
+            if os.path.exists(path):
+                with open(path) as f:
+                    if target == "metadata":
+                        metadata = json.load(f)
+                    else:
+                        account_summaries = json.load(f)
+    return metadata, account_summaries
+
+def build_report(property_id: str, body: dict, zero_share: float, page_size: int) -> dict:
+    """runReport response (REST JSON shape) for a request body; bad metrics must be rejected before"""
+    names = [m["name"] for m in body.get("metrics", [])]
+    date_range = body["dateRanges"][0]
+    start = datetime.strptime(date_range["startDate"], "%Y-%m-%d")
+    end = datetime.strptime(date_range["endDate"], "%Y-%m-%d")
+    rows = []
+    for i in range((end - start).days + 1):
+        day = (start + timedelta(days=i)).strftime("%Y-%m-%d")
+        values = [metric_value(property_id, name, day, zero_share) for name in names]
+        if any(values) or body.get("keepEmptyRows"):
+            rows.append({
+                "dimensionValues": [{"value": day.replace("-", "")}],
+                "metricValues": [{"value": str(v)} for v in values]
+            })
+
+    offset = int(body.get("offset", 0))
+    limit = min(int(body.get("limit", 10000)), page_size)
+    response = {
+        "dimensionHeaders": [{"name": "date"}],
+        "metricHeaders": [{"name": name, "type": "TYPE_INTEGER"} for name in names],
+        "rows": rows[offset:offset + limit],
+        "rowCount": len(rows),
+        "kind": "analyticsData#runReport"
+    }
+    if body.get("returnPropertyQuota"):
+        response["propertyQuota"] = {
+            "tokensPerDay": {"consumed": 10, "remaining": 199000},
+            "tokensPerHour": {"consumed": 10, "remaining": 39000},
+            "tokensPerProjectPerHour": {"consumed": 10, "remaining": 13900},
+            "concurrentRequests": {"consumed": 0, "remaining": 10},
+            "serverErrorsPerProjectPerHour": {"consumed": 0, "remaining": 10},
+        }
+    return response
+
+
+def create_app(latency: float = 0.0, error_rate: float = 0.0, page_size: int = 10000,
+               properties: int = 10, metrics: int = 100, bad_metrics: int = 0,
+               zero_share: float = 0.3, fixtures: str = None, summaries_page_size: int = 50) -> FastAPI:
+    """
+    latency: seconds added to every request
+    error_rate: share of requests answered with HTTP 503
+    page_size: most rows returned by one runReport, whatever limit asks for
+    bad_metrics: extra metrics that make any report including them fail with 400
+    """
+    app = FastAPI()
+    app.state.stats = {"accountSummaries": 0, "getMetadata": 0, "runReport": 0, "rows": 0, "errors": 0}
+
+    metadata, account_summaries = load_catalog(properties, metrics, bad_metrics, fixtures)
+    summaries = account_summaries.get("accountSummaries", [])
+
+    async def call(endpoint: str):
+        app.state.stats[endpoint] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if random.random() < error_rate:
+            app.state.stats["errors"] += 1
+            return JSONResponse({"error": {"code": 503, "message": "The service is currently unavailable.",
+                                           "status": "UNAVAILABLE"}}, status_code=503)
+        return None
+
+    @app.get("/v1beta/accountSummaries")
+    async def list_account_summaries(pageToken: str = None):
+        if error := await call("accountSummaries"):
+            return error
+        start = int(pageToken or 0)
+        body = {"accountSummaries": summaries[start:start + summaries_page_size]}
+        if start + summaries_page_size < len(summaries):
+            body["nextPageToken"] = str(start + summaries_page_size)
+        return body
+
+    @app.get("/v1beta/properties/{property_id}/metadata")
+    async def get_metadata(property_id: str):
+        if error := await call("getMetadata"):
+            return error
+        return dict(metadata, name=f"properties/{property_id}/metadata")
+
+    @app.post("/v1beta/properties/{property_id}:runReport")
+    async def run_report(property_id: str, request: Request):
+        if error := await call("runReport"):
+            return error
+        body = await request.json()
+        names = [m["name"] for m in body.get("metrics", [])]
+        bad = [name for name in names if name.startswith("badMetric")]
+        if bad:
+            return JSONResponse({"error": {"code": 400, "status": "INVALID_ARGUMENT",
+                                           "message": f"{bad[0]} is not compatible with date"}}, status_code=400)
+
+        response = build_report(property_id, body, zero_share, page_size)
+        app.state.stats["rows"] += len(response["rows"])
+        return response
+
+    return app
+
+
+class FakeGAServer:
+    """Runs the stand-in server on a background thread"""
+
+    def __init__(self, port: int = 8767, **options):
+        self.app = create_app(**options)
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/"
+
+    @property
+    def stats(self) -> dict:
+        return self.app.state.stats
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in Google Analytics API server")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--page-size", type=int, default=10000)
+    parser.add_argument("--properties", type=int, default=10)
+    parser.add_argument("--metrics", type=int, default=100)
+    parser.add_argument("--bad-metrics", type=int, default=0)
+    parser.add_argument("--fixtures", help="Directory with recorded metadata.json / accountSummaries.json")
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(args.latency, args.error_rate, args.page_size, args.properties, args.metrics,
+                   args.bad_metrics, fixtures=args.fixtures),
+        host="127.0.0.1", port=args.port, log_level="warning"
+    )
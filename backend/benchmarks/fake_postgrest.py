@@ -0,0 +1,174 @@
+"""
+In-memory stand-in for the Supabase REST API (PostgREST), enough for the
+routes exercised by benchmarks/loadtest.py: select with `eq.` filters,
+limit, one level of embedded resources (`projects(project_name)`), single
+object responses, insert and upsert (`on_conflict`). Tables are plain
+lists of dicts seeded through the same REST calls a real PostgREST takes.
+
+Run standalone:
+    python -m benchmarks.fake_postgrest --port 54329 --latency 0.01
+then point the backend at it with SUPABASE_URL=http://127.0.0.1:54329
+"""
+import argparse
+import asyncio
+import re
+import threading
+import time
+import uuid
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+# Embedded resource -> (child table, join column)
+RELATIONS = {"projects": ("projects", "project_id")}
+
+EMBED_PATTERN = re.compile(r"(\w+)\(([^)]*)\)")
+
+
+def parse_select(select: str) -> tuple:
+    """Plain columns and {relation: [columns]} from a select= parameter"""
+    embeds = {name: [c.strip() for c in cols.split(",") if c.strip()] for name, cols in EMBED_PATTERN.findall(select)}
+    plain = [c.strip() for c in EMBED_PATTERN.sub("", select).split(",") if c.strip()]
+    return plain, embeds
+
+def parse_filters(params) -> list:
+    filters = []
+    for key, value in params.multi_items():
+        if key in ("select", "limit", "offset", "order", "on_conflict", "columns"):
+            continue
+        operator, _, operand = value.partition(".")
+        filters.append((key, operator, operand))
+    return filters
+
+def matches(row: dict, filters: list) -> bool:
+    for column, operator, operand in filters:
+        value = row.get(column)
+        if operator == "eq" and str(value) != operand:
+            return False
+        if operator == "in" and str(value) not in operand.strip("()").split(","):
+            return False
+        if operator == "gte" and not (value is not None and str(value) >= operand):
+            return False
+        if operator == "lte" and not (value is not None and str(value) <= operand):
+            return False
+    return True
+
+
+def create_app(latency: float = 0.0) -> FastAPI:
+    """latency: seconds added to every request (the round trip to Supabase)"""
+    app = FastAPI()
+    app.state.tables = {}
+    app.state.stats = {"requests": 0}
+
+    def table(name: str) -> list:
+        return app.state.tables.setdefault(name, [])
+
+    def project(row: dict, plain: list, embeds: dict) -> dict:
+        out = dict(row) if not plain or "*" in plain else {c: row.get(c) for c in plain}
+        for name, columns in embeds.items():
+            child_table, key = RELATIONS.get(name, (name, f"{name.rstrip('s')}_id"))
+            child = next((r for r in table(child_table) if r.get(key) == row.get(key)), None)
+            out[name] = {c: child.get(c) for c in columns} if child else None
+        return out
+
+    def respond(request: Request, rows: list):
+        if "vnd.pgrst.object+json" in request.headers.get("accept", ""):
+            if len(rows) != 1:
+                return JSONResponse({"code": "PGRST116", "message": "JSON object requested, multiple (or no) rows returned",
+                                     "details": f"The result contains {len(rows)} rows", "hint": None}, status_code=406)
+            return JSONResponse(rows[0])
+        return JSONResponse(rows)
+
+    @app.middleware("http")
+    async def add_latency(request: Request, call_next):
+        app.state.stats["requests"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        return await call_next(request)
+
+    @app.get("/rest/v1/{name}")
+    async def select(name: str, request: Request):
+        params = request.query_params
+        plain, embeds = parse_select(params.get("select", "*"))
+        rows = [row for row in table(name) if matches(row, parse_filters(params))]
+        offset = int(params.get("offset", 0))
+        if params.get("limit"):
+            rows = rows[offset:offset + int(params["limit"])]
+        return respond(request, [project(row, plain, embeds) for row in rows])
+
+    @app.post("/rest/v1/{name}")
+    async def insert(name: str, request: Request):
+        body = await request.json()
+        rows = body if isinstance(body, list) else [body]
+        prefer = request.headers.get("prefer", "")
+        conflict = [c.strip(" '\"") for c in request.query_params.get("on_conflict", "").strip("[]").split(",") if c.strip(" '\"")]
+        stored = []
+        for row in rows:
+            existing = None
+            if conflict and "resolution=" in prefer:
+                existing = next((r for r in table(name) if all(r.get(c) == row.get(c) for c in conflict)), None)
+            if existing is not None:
+                if "merge-duplicates" in prefer:
+                    existing.update(row)
+                stored.append(existing)
+            else:
+                row = dict(row)
+                row.setdefault("id", str(uuid.uuid4()))
+                table(name).append(row)
+                stored.append(row)
+        if "return=representation" in prefer:
+            return JSONResponse(stored, status_code=201)
+        return Response(status_code=201)
+
+    @app.patch("/rest/v1/{name}")
+    async def update(name: str, request: Request):
+        body = await request.json()
+        rows = [row for row in table(name) if matches(row, parse_filters(request.query_params))]
+        for row in rows:
+            row.update(body)
+        return JSONResponse(rows)
+
+    @app.delete("/rest/v1/{name}")
+    async def delete(name: str, request: Request):
+        filters = parse_filters(request.query_params)
+        app.state.tables[name] = [row for row in table(name) if not matches(row, filters)]
+        return Response(status_code=204)
+
+    return app
+
+
+class FakePostgREST:
+    """Runs the stand-in server on a background thread"""
+
+    def __init__(self, port: int = 54329, **options):
+        self.app = create_app(**options)
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def stats(self) -> dict:
+        return self.app.state.stats
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-memory PostgREST stand-in")
+    parser.add_argument("--port", type=int, default=54329)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.latency), host="127.0.0.1", port=args.port, log_level="warning")
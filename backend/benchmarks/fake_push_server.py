@@ -0,0 +1,129 @@
+"""
+Local stand-in for the Expo push service.
+
+Serves /--/api/v2/push/send and /--/api/v2/push/getReceipts with configurable
+latency and failure rates so the sender can be exercised without real devices.
+
+Run standalone:
+    python -m benchmarks.fake_push_server --port 8765 --latency 0.05
+then point the backend at it with
+    EXPO_PUSH_BASE_URL=http://127.0.0.1:8765/--/api/v2/push
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+import uuid
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Tokens containing this marker are reported as DeviceNotRegistered
+DEAD_TOKEN_MARKER = "dead"
+
+
+def create_app(latency: float = 0.0, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+               max_batch_size: int = 100) -> FastAPI:
+    """
+    latency: seconds added to every request
+    error_rate: share of requests answered with HTTP 503
+    rate_limit_rate: share of tickets answered with MessageRateExceeded
+    """
+    app = FastAPI()
+    app.state.stats = {"send_requests": 0, "receipt_requests": 0, "messages": 0, "errors": 0}
+    app.state.receipts = {}
+
+    @app.post("/--/api/v2/push/send")
+    async def send(request: Request):
+        app.state.stats["send_requests"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if random.random() < error_rate:
+            app.state.stats["errors"] += 1
+            return JSONResponse({"errors": [{"code": "INTERNAL", "message": "Unavailable"}]}, status_code=503)
+
+        messages = await request.json()
+        if isinstance(messages, dict):
+            messages = [messages]
+        if len(messages) > max_batch_size:
+            return JSONResponse({"errors": [{
+                "code": "PUSH_TOO_MANY_NOTIFICATIONS",
+                "message": f"You are trying to send more than {max_batch_size} push notifications in one request"
+            }]}, status_code=400)
+
+        tickets = []
+        for message in messages:
+            token = message.get("to", "")
+            if DEAD_TOKEN_MARKER in token:
+                tickets.append({
+                    "status": "error",
+                    "message": f"\"{token}\" is not a registered push notification recipient",
+                    "details": {"error": "DeviceNotRegistered"}
+                })
+            elif random.random() < rate_limit_rate:
+                tickets.append({
+                    "status": "error",
+                    "message": "Too many messages",
+                    "details": {"error": "MessageRateExceeded"}
+                })
+            else:
+                ticket_id = str(uuid.uuid4())
+                app.state.receipts[ticket_id] = {"status": "ok"}
+                tickets.append({"status": "ok", "id": ticket_id})
+
+        app.state.stats["messages"] += len(messages)
+        return {"data": tickets}
+
+    @app.post("/--/api/v2/push/getReceipts")
+    async def get_receipts(request: Request):
+        app.state.stats["receipt_requests"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        body = await request.json()
+        receipts = {i: app.state.receipts[i] for i in body.get("ids", []) if i in app.state.receipts}
+        return {"data": receipts}
+
+    return app
+
+
+class FakePushServer:
+    """Runs the stand-in server on a background thread"""
+
+    def __init__(self, port: int = 8765, **options):
+        self.app = create_app(**options)
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/--/api/v2/push"
+
+    @property
+    def stats(self) -> dict:
+        return self.app.state.stats
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in Expo push server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(args.latency, args.error_rate, args.rate_limit_rate),
+        host="127.0.0.1", port=args.port, log_level="warning"
+    )
@@ -0,0 +1,200 @@
+"""
+Local stand-in for the Stripe API list endpoints used by the Stripe sync.
+
+Serves /v1/balance and the paginated list endpoints (charges, payouts,
+customers, subscriptions, ...) with configurable latency, page size and
+error rate. With `account_rps`, each account (the bearer key, or the
+Stripe-Account header when given) may make that many requests per second
+and is answered 429 with Retry-After beyond it, like Stripe's per-account
+limits. Each list holds `objects` generated objects, or the objects of
+a recorded list response (<resource>.json in a fixtures directory, e.g.
+charges.json saved from `GET /v1/charges`). Filters are ignored; every
+list answers for "the day being synced".
+
+Run standalone:
+    python -m benchmarks.fake_stripe_server --port 8768 --objects 1000
+then point the backend at it with
+    STRIPE_API_BASE=http://127.0.0.1:8768
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Resource path -> (object type, id prefix, statuses)
+RESOURCES = {
+    "charges": ("charge", "ch", ["succeeded", "succeeded", "succeeded", "failed"]),
+    "payouts": ("payout", "po", ["paid"]),
+    "customers": ("customer", "cus", [None]),
+    "subscriptions": ("subscription", "sub", ["active", "canceled"]),
+    "disputes": ("dispute", "dp", ["needs_response", "won", "lost"]),
+    "refunds": ("refund", "re", ["succeeded"]),
+    "products": ("product", "prod", [None]),
+    "prices": ("price", "price", [None]),
+    "invoices": ("invoice", "in", ["draft", "open", "paid", "paid", "void"]),
+    "payment_intents": ("payment_intent", "pi", ["succeeded", "requires_payment_method", "canceled"]),
+    "checkout/sessions": ("checkout.session", "cs", ["complete", "open", "expired"]),
+    "promotion_codes": ("promotion_code", "promo", [None]),
+    "files": ("file", "file", [None]),
+    "setup_intents": ("setup_intent", "seti", ["succeeded", "requires_payment_method"]),
+}
+
+
+def generate_objects(resource: str, count: int) -> list:
+    object_type, prefix, statuses = RESOURCES[resource]
+    rng = random.Random(resource)
+    objects = []
+    for i in range(count):
+        obj = {"id": f"{prefix}_{i:08d}", "object": object_type, "created": 1700000000 + i, "livemode": False}
+        status = statuses[i % len(statuses)]
+        if status:
+            obj["status"] = status
+        if object_type in ("charge", "payout", "refund", "payment_intent"):
+            obj["amount"] = rng.randint(100, 50000)
+            obj["currency"] = "usd"
+        if object_type == "charge":
+            obj["payment_method_details"] = {"type": rng.choice(["card", "card", "sepa_debit", "link"])}
+        if object_type == "invoice":
+            obj["total"] = rng.randint(100, 50000)
+        if object_type == "promotion_code":
+            obj["times_redeemed"] = i % 3
+        objects.append(obj)
+    return objects
+
+
+def create_app(latency: float = 0.0, error_rate: float = 0.0, page_size: int = 100,
+               objects: int = 200, fixtures: str = None, account_rps: int = 0) -> FastAPI:
+    """
+    latency: seconds added to every request
+    error_rate: share of requests answered with HTTP 500
+    account_rps: requests per second allowed per account (0: no limit)
+    page_size: most objects returned per page, whatever limit asks for
+    objects: objects per list endpoint
+    """
+    app = FastAPI()
+    app.state.stats = {"requests": 0, "objects": 0, "errors": 0, "rate_limited": 0}
+    app.state.endpoints = {}
+    # account -> requests; account -> (second, requests in it)
+    app.state.accounts = {}
+    windows = {}
+
+    lists = {}
+    for resource in RESOURCES:
+        path = os.path.join(fixtures, resource.replace("/", "_") + ".json") if fixtures else None
+        if path and os.path.exists(path):
+            with open(path) as f:
+                lists[resource] = json.load(f).get("data", [])
+        else:
+            lists[resource] = generate_objects(resource, objects)
+
+    async def call(endpoint: str, request: Request):
+        app.state.stats["requests"] += 1
+        app.state.endpoints[endpoint] = app.state.endpoints.get(endpoint, 0) + 1
+        account = request.headers.get("stripe-account") or request.headers.get("authorization", "")[7:]
+        app.state.accounts[account] = app.state.accounts.get(account, 0) + 1
+        if account_rps:
+            second = int(time.monotonic())
+            window, count = windows.get(account, (second, 0))
+            count = count + 1 if window == second else 1
+            windows[account] = (second, count)
+            if count > account_rps:
+                app.state.stats["rate_limited"] += 1
+                return JSONResponse({"error": {"type": "invalid_request_error", "code": "rate_limit",
+                                               "message": "Too many requests"}},
+                                    status_code=429, headers={"Retry-After": "1"})
+        if latency:
+            await asyncio.sleep(latency)
+        if random.random() < error_rate:
+            app.state.stats["errors"] += 1
+            return JSONResponse({"error": {"type": "api_error", "message": "Internal error"}}, status_code=500)
+        return None
+
+    @app.get("/v1/balance")
+    async def balance(request: Request):
+        if error := await call("balance", request):
+            return error
+        return {
+            "object": "balance",
+            "livemode": False,
+            "available": [{"amount": 1234567, "currency": "usd"}, {"amount": 76543, "currency": "eur"}],
+            "pending": [{"amount": 23456, "currency": "usd"}],
+        }
+
+    def list_route(resource: str):
+        async def list_objects(request: Request):
+            if error := await call(resource, request):
+                return error
+            params = request.query_params
+            data = lists[resource]
+            start = 0
+            if params.get("starting_after"):
+                ids = [obj["id"] for obj in data]
+                start = ids.index(params["starting_after"]) + 1 if params["starting_after"] in ids else len(data)
+            limit = min(int(params.get("limit", 10)), page_size)
+            page = data[start:start + limit]
+            app.state.stats["objects"] += len(page)
+            return {
+                "object": "list",
+                "url": f"/v1/{resource}",
+                "data": page,
+                "has_more": start + limit < len(data),
+                "total_count": len(data),
+            }
+        return list_objects
+
+    for resource in RESOURCES:
+        app.add_api_route(f"/v1/{resource}", list_route(resource), methods=["GET"])
+
+    return app
+
+
+class FakeStripeServer:
+    """Runs the stand-in server on a background thread"""
+
+    def __init__(self, port: int = 8768, **options):
+        self.app = create_app(**options)
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def stats(self) -> dict:
+        return dict(self.app.state.stats, endpoints=dict(self.app.state.endpoints),
+                    accounts=dict(self.app.state.accounts))
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in Stripe API server")
+    parser.add_argument("--port", type=int, default=8768)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--objects", type=int, default=200)
+    parser.add_argument("--fixtures", help="Directory with recorded list responses (<resource>.json)")
+    parser.add_argument("--account-rps", type=int, default=0, help="Requests per second per account (0: no limit)")
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(args.latency, args.error_rate, args.page_size, args.objects, args.fixtures, args.account_rps),
+        host="127.0.0.1", port=args.port, log_level="warning"
+    )
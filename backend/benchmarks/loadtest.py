@@ -0,0 +1,265 @@
+"""
+HTTP API load test for the mobile-facing routes.
+
+Signs test JWTs with a local secret, seeds users, projects, GA summary rows
+and notification preferences through the Supabase REST API (the in-memory
+stand-in in fake_postgrest.py by default, or a real PostgREST on a local
+Postgres with --supabase-url), then drives the app with a weighted mix of
+requests at each concurrency level and reports p50/p95/p99 latency,
+throughput and error rates as JSON.
+
+Targets: the app served by uvicorn on a background thread (default), the
+app in-process over ASGI (--target inprocess, no sockets; client and app
+share one event loop), or an already running server (--base-url, which
+must use the same SUPABASE_JWT_SECRET and Supabase).
+
+    python -m benchmarks.loadtest --users 200 --projects-per-user 3 --concurrency 1 10 50 \\
+        --duration 20 --db-latency 0.01 --output loadtest.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+import httpx
+import numpy as np
+from jose import jwt
+
+DEFAULT_SECRET = "loadtest-jwt-secret"
+
+# Request mix: name -> (method, path, json body builder)
+ENDPOINTS = {
+    "projects": ("GET", lambda user: "/api/projects", None),
+    "summary": ("POST", lambda user: "/api/summary",
+                lambda user: {"project_id": random.choice(user["projects"])}),
+    "preferences": ("GET", lambda user: "/api/notification-preferences", None),
+    "preferences_put": ("PUT", lambda user: "/api/notification-preferences",
+                        lambda user: {"frequency": random.choice(["daily", "weekly"]), "trafficEnabled": True,
+                                      "sessionDurationEnabled": random.random() < 0.5, "timezone": "Europe/Riga"}),
+}
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition(":")
+        if name not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint {name!r}; use {', '.join(ENDPOINTS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+def sign_token(user_id: str, secret: str, role: str = "authenticated") -> str:
+    now = datetime.now(timezone.utc)
+    return jwt.encode({"sub": user_id, "role": role, "aud": "authenticated",
+                       "iat": int(now.timestamp()), "exp": int((now + timedelta(hours=6)).timestamp())},
+                      secret, algorithm="HS256")
+
+
+#1. Test data
+def build_users(users: int, projects_per_user: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    return [
+        {"user_id": str(uuid.UUID(int=rng.getrandbits(128))),
+         "projects": [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(projects_per_user)]}
+        for _ in range(users)
+    ]
+
+def seed_supabase(supabase, users: list, rows_per_project: int):
+    projects, links, ga_rows, preferences = [], [], [], []
+    today = datetime.now(timezone.utc).date()
+    for user in users:
+        for i, project_id in enumerate(user["projects"]):
+            projects.append({"project_id": project_id, "project_name": f"Load test project {i}", "user_id": user["user_id"]})
+            links.append({"project_id": project_id, "user_id": user["user_id"]})
+            for r in range(rows_per_project):
+                ga_rows.append({"project_id": project_id, "name": f"metric_{r % 10}", "value": r,
+                                "date_collected": (today - timedelta(days=r // 10)).isoformat()})
+        preferences.append({"user_id": user["user_id"], "frequency": "daily", "traffic": True,
+                            "session_duration": False, "timezone": "UTC", "next_send_at": None})
+
+    for table, rows in (("projects", projects), ("project_to_user", links), ("ga_data", ga_rows),
+                        ("notification_preference", preferences)):
+        for i in range(0, len(rows), 1000):
+            supabase.table(table).insert(rows[i:i + 1000]).execute()
+
+
+#2. Load generation
+async def run_level(client: httpx.AsyncClient, users: list, tokens: dict, weights: dict,
+                    concurrency: int, duration: float, max_requests: int) -> dict:
+    names = list(weights)
+    cumulative = list(np.cumsum([weights[n] for n in names]))
+    samples = {name: [] for name in names}
+    statuses = {name: {} for name in names}
+    errors = {name: 0 for name in names}
+    sent = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal sent
+        while time.perf_counter() < deadline and (not max_requests or sent < max_requests):
+            sent += 1
+            user = random.choice(users)
+            name = random.choices(names, cum_weights=cumulative)[0]
+            method, path, body = ENDPOINTS[name]
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path(user), json=body(user) if body else None,
+                                                headers={"Authorization": f"Bearer {tokens[user['user_id']]}"})
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            samples[name].append((time.perf_counter() - started) * 1000)
+            statuses[name][str(status)] = statuses[name].get(str(status), 0) + 1
+            if not isinstance(status, int) or status >= 500:
+                errors[name] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    def summarize(latencies: list, error_count: int, status_counts: dict = None) -> dict:
+        count = len(latencies)
+        summary = {
+            "requests": count,
+            "throughput_rps": round(count / elapsed, 1),
+            "errors": error_count,
+            "error_rate": round(error_count / count, 4) if count else 0,
+        }
+        if count:
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            summary["latency_ms"] = {"p50": round(p50, 2), "p95": round(p95, 2), "p99": round(p99, 2),
+                                     "mean": round(float(np.mean(latencies)), 2), "max": round(max(latencies), 2)}
+        if status_counts is not None:
+            summary["status_codes"] = status_counts
+        return summary
+
+    all_latencies = [value for name in names for value in samples[name]]
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        **summarize(all_latencies, sum(errors.values())),
+        "endpoints": {name: summarize(samples[name], errors[name], statuses[name]) for name in names},
+    }
+
+
+#3. Targets
+@contextlib.contextmanager
+def uvicorn_server(app, port: int):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                           access_log=False, lifespan="off"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+def configure_environment(supabase_url: str, secret: str):
+    """Point the app at the test Supabase and secret; routes under test do not need the other keys"""
+    from dotenv import load_dotenv
+    from cryptography.fernet import Fernet
+    load_dotenv()
+    os.environ["SUPABASE_URL"] = supabase_url
+    os.environ["SUPABASE_JWT_SECRET"] = secret
+    os.environ["SUPABASE_SERVICE_ROLE_KEY"] = sign_token("service", secret, role="service_role")
+    os.environ["RUN_JOB_WORKER"] = "0"
+    for key, value in (("ENCRYPTION_KEY", Fernet.generate_key().decode()), ("GOOGLE_CLIENT_ID", "loadtest"),
+                       ("GOOGLE_CLIENT_SECRET", "loadtest"), ("GOOGLE_REDIRECT_URI", "http://127.0.0.1/callback"),
+                       ("STRIPE_CLIENT_ID", "ca_loadtest"), ("STRIPE_SECRET_KEY", "sk_test_loadtest"),
+                       ("STRIPE_REDIRECT_URI", "http://127.0.0.1/callback")):
+        os.environ.setdefault(key, value)
+
+
+async def drive(base_url: str, transport, users: list, tokens: dict, args) -> list:
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=base_url, transport=transport, limits=limits, timeout=args.timeout) as client:
+        results = []
+        for concurrency in args.concurrency:
+            if args.warmup:
+                await run_level(client, users, tokens, args.weights, concurrency, args.warmup, 0)
+            results.append(await run_level(client, users, tokens, args.weights, concurrency,
+                                           args.duration, args.requests))
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API load test")
+    parser.add_argument("--target", choices=["uvicorn", "inprocess"], default="uvicorn")
+    parser.add_argument("--base-url", help="Load test an already running server instead")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--supabase-url", help="Real PostgREST to use instead of the in-memory stand-in")
+    parser.add_argument("--db-latency", type=float, default=0.005, help="Stand-in round trip per Supabase call (s)")
+    parser.add_argument("--jwt-secret", default=os.getenv("LOADTEST_JWT_SECRET", DEFAULT_SECRET))
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--projects-per-user", type=int, default=3)
+    parser.add_argument("--rows-per-project", type=int, default=30, help="ga_data rows per project")
+    parser.add_argument("--no-seed", action="store_true", help="Data is already in --supabase-url")
+    parser.add_argument("--mix", default="projects:4,summary:3,preferences:2,preferences_put:1")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per concurrency level")
+    parser.add_argument("--requests", type=int, default=0, help="Stop a level after this many requests")
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+    args.weights = parse_mix(args.mix)
+
+    users = build_users(args.users, args.projects_per_user)
+    tokens = {user["user_id"]: sign_token(user["user_id"], args.jwt_secret) for user in users}
+
+    with contextlib.ExitStack() as stack:
+        supabase_url = args.supabase_url
+        if not supabase_url:
+            from benchmarks.fake_postgrest import FakePostgREST
+            supabase_url = stack.enter_context(FakePostgREST(latency=args.db_latency)).base_url
+
+        configure_environment(supabase_url, args.jwt_secret)
+        if not args.no_seed:
+            from supabase import create_client
+            seed_supabase(create_client(supabase_url, os.environ["SUPABASE_SERVICE_ROLE_KEY"]), users,
+                          args.rows_per_project)
+
+        # The routes print debugging output; keep stdout for the report
+        stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+        transport = None
+        base_url = args.base_url
+        if not base_url:
+            from main import app
+            if args.target == "inprocess":
+                transport = httpx.ASGITransport(app=app)
+                base_url = "http://loadtest"
+            else:
+                base_url = stack.enter_context(uvicorn_server(app, args.port))
+
+        results = asyncio.run(drive(base_url, transport, users, tokens, args))
+
+    report = {
+        "config": {
+            "target": "external" if args.base_url else args.target,
+            "supabase": "postgrest" if args.supabase_url else f"stand-in ({args.db_latency}s latency)",
+            "users": args.users,
+            "projects_per_user": args.projects_per_user,
+            "mix": args.weights,
+            "duration_s": args.duration,
+        },
+        "levels": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+-- Tables the sync pipeline writes, for a scratch Postgres database used by
+-- benchmarks/bench_sync.py (the real tables come from Supabase and ../migrations)
+CREATE TABLE IF NOT EXISTS ga_properties (
+    property_id TEXT PRIMARY KEY,
+    property_display_name TEXT,
+    account_name TEXT,
+    last_synced_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS metric_catalog (
+    metric_id SERIAL PRIMARY KEY,
+    property_id TEXT NOT NULL REFERENCES ga_properties (property_id) ON DELETE CASCADE,
+    metric_name TEXT NOT NULL,
+    metric_description TEXT,
+    UNIQUE (property_id, metric_name)
+);
+
+CREATE TABLE IF NOT EXISTS ga_metric_facts (
+    project_id UUID NOT NULL,
+    metric_id INTEGER NOT NULL REFERENCES metric_catalog (metric_id) ON DELETE CASCADE,
+    date DATE NOT NULL,
+    metric_value DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (project_id, metric_id, date)
+);
+
+CREATE TABLE IF NOT EXISTS stripe_metrics (
+    id BIGSERIAL PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    project_id UUID NOT NULL,
+    date DATE NOT NULL,
+    metric_name TEXT NOT NULL,
+    metric_value DOUBLE PRECISION,
+    account_name TEXT,
+    metric_description TEXT,
+    first_synced_at TIMESTAMPTZ,
+    last_synced_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS stripe_metrics_project_date_idx ON stripe_metrics (project_id, date, metric_name);
+
+CREATE TABLE IF NOT EXISTS project_sync_versions (
+    project_id UUID PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS ingestion_watermarks (
+    project_id UUID NOT NULL,
+    source TEXT NOT NULL,
+    stream_key TEXT NOT NULL,
+    watermark DATE NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (project_id, source, stream_key)
+);
+
+CREATE TABLE IF NOT EXISTS sync_runs (
+    run_id BIGSERIAL PRIMARY KEY,
+    project_id UUID NOT NULL,
+    source TEXT NOT NULL,
+    stream_key TEXT NOT NULL,
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    status TEXT NOT NULL,
+    pages INTEGER NOT NULL DEFAULT 0,
+    records INTEGER NOT NULL DEFAULT 0,
+    written INTEGER NOT NULL DEFAULT 0,
+    unchanged INTEGER NOT NULL DEFAULT 0,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    started_at TIMESTAMPTZ NOT NULL,
+    finished_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
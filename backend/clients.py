@@ -0,0 +1,149 @@
+"""
+Shared clients for the whole process, created on first use.
+
+    get_supabase()          Supabase (PostgREST) client with metrics/tracing hooks
+    get_cipher()            Fernet cipher for stored OAuth tokens
+    get_stripe()            the stripe module, configured once (key, API base, HTTP client)
+    get_google_http()       httplib2-style transport for Google API clients and token refreshes
+    google_discovery_doc()  parsed Google API discovery documents, so building a
+                            per-credentials client skips reading and parsing them
+    stripe_http / google_http   pooled keep-alive httpx clients (see transports.py)
+    database pool           see database.get_pool()
+
+Nothing is built at import and heavy SDKs are only imported by the
+factories, which keeps cold starts short (benchmarks/bench_import.py). The
+app's lifespan checks the environment on startup and closes everything
+on shutdown; scripts and workers can call registry.close() themselves.
+"""
+import os
+import json
+import logging
+import threading
+from dotenv import load_dotenv
+import transports
+
+# Load environment variables
+load_dotenv()
+
+# Needed by the API; checked once on startup instead of at import
+REQUIRED_ENV = (
+    "SUPABASE_URL", "SUPABASE_SERVICE_ROLE_KEY", "SUPABASE_JWT_SECRET", "ENCRYPTION_KEY",
+    "GOOGLE_CLIENT_ID", "GOOGLE_CLIENT_SECRET", "GOOGLE_REDIRECT_URI",
+    "STRIPE_CLIENT_ID", "STRIPE_SECRET_KEY", "STRIPE_REDIRECT_URI",
+)
+
+
+def require_env(*names) -> list:
+    values = [os.getenv(name) for name in names]
+    missing = [name for name, value in zip(names, values) if not value]
+    if missing:
+        raise ValueError(f"Missing environment variables: {', '.join(missing)}")
+    return values
+
+def check_environment():
+    require_env(*REQUIRED_ENV)
+
+
+class ClientRegistry:
+    """Named clients built by their factory on first get(), closed in reverse order"""
+
+    def __init__(self):
+        self._factories = {}
+        self._clients = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory, close=None):
+        self._factories[name] = (factory, close)
+
+    def get(self, name: str):
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = self._factories[name][0]()
+                    self._clients[name] = client
+        return client
+
+    def created(self) -> list:
+        return list(self._clients)
+
+    def discard(self, name: str):
+        """Close one client; the next get() builds a new one"""
+        with self._lock:
+            client = self._clients.pop(name, None)
+        close = self._factories.get(name, (None, None))[1]
+        if client is not None and close is not None:
+            try:
+                close(client)
+            except Exception as e:
+                logging.error(f"Error closing {name} client: {str(e)}")
+
+    def close(self):
+        for name in reversed(self.created()):
+            self.discard(name)
+
+registry = ClientRegistry()
+
+
+#1. Factories
+def create_supabase():
+    from supabase import create_client
+    from monitoring import instrument_supabase
+    url, key = require_env("SUPABASE_URL", "SUPABASE_SERVICE_ROLE_KEY")
+    return instrument_supabase(create_client(url, key))
+
+def close_supabase(client):
+    client.postgrest.session.close()
+
+def create_cipher():
+    from cryptography.fernet import Fernet
+    key, = require_env("ENCRYPTION_KEY")
+    return Fernet(key)
+
+def create_stripe():
+    import stripe
+    stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+    # Optional API base, e.g. the local stand-in in benchmarks/fake_stripe_server.py
+    if os.getenv("STRIPE_API_BASE"):
+        stripe.api_base = os.getenv("STRIPE_API_BASE")
+    stripe.default_http_client = transports.stripe_http_client(registry.get("stripe_http"))
+    return stripe
+
+def close_stripe(stripe):
+    # Its pool is closed next; the next get_stripe() sets up a new one
+    stripe.default_http_client = None
+
+def create_google_discovery() -> dict:
+    return {}
+
+registry.register("supabase", create_supabase, close_supabase)
+registry.register("cipher", create_cipher)
+registry.register("stripe_http", transports.create_stripe_http, transports.close_http_client)
+registry.register("stripe", create_stripe, close_stripe)
+registry.register("google_http", transports.create_google_http, transports.close_http_client)
+registry.register("google_discovery", create_google_discovery)
+
+
+#2. Accessors
+def get_supabase():
+    return registry.get("supabase")
+
+def get_cipher():
+    return registry.get("cipher")
+
+def get_stripe():
+    return registry.get("stripe")
+
+def get_google_http() -> transports.PooledHttp:
+    return transports.PooledHttp(registry.get("google_http"))
+
+def google_discovery_doc(service: str, version: str) -> dict:
+    """Discovery document bundled with googleapiclient, parsed once per process"""
+    documents = registry.get("google_discovery")
+    document = documents.get((service, version))
+    if document is None:
+        from googleapiclient.discovery_cache import get_static_doc
+        document = json.loads(get_static_doc(service, version))
+        documents[(service, version)] = document
+    return document
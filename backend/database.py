@@ -1,30 +1,122 @@
 import os
+import time
+from contextlib import contextmanager
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
+from monitoring import DB_TRANSACTION_DURATION
+from clients import registry
 
 # Get environmental variables
-load_dotenv() 
+load_dotenv()
 DATABASE_URL = os.getenv("SUPABASE_DB_URL")
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Exports hold a connection while the client downloads, so they get their own pool
+DB_EXPORT_POOL_MAX = int(os.getenv("DB_EXPORT_POOL_MAX", "4"))
 
-# Connection with PostgreSQL Supabase and allows SQL execution
-conn = psycopg2.connect(DATABASE_URL)
-cursor = conn.cursor()
-
-# Test query
-cursor.execute("SELECT version();")
-result = cursor.fetchone()
-print("Connected to:", result[0])
-
-# Test table with one data point
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS test_table (
-    id SERIAL PRIMARY KEY,
-    message TEXT NOT NULL
-);
-""")
-cursor.execute("INSERT INTO test_table (message) VALUES (%s);", ("Hello from Python!",))
-conn.commit()
-
-# Close the cursor and the database connection
-cursor.close()
-conn.close()
\ No newline at end of file
+# Connection pool with PostgreSQL Supabase, created on first use (see clients.py)
+def create_pool() -> ThreadedConnectionPool:
+    if not DATABASE_URL:
+        raise ValueError("Missing SUPABASE_DB_URL environment variable")
+    return ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, DATABASE_URL)
+
+registry.register("db_pool", create_pool, lambda pool: pool.closeall())
+
+def get_pool() -> ThreadedConnectionPool:
+    return registry.get("db_pool")
+
+# Separate pool for exports (exports/queries.py), so slow downloads cannot use up
+# the connections job claims, the scheduler and sync writes need
+def create_export_pool() -> ThreadedConnectionPool:
+    if not DATABASE_URL:
+        raise ValueError("Missing SUPABASE_DB_URL environment variable")
+    return ThreadedConnectionPool(0, DB_EXPORT_POOL_MAX, DATABASE_URL)
+
+registry.register("db_export_pool", create_export_pool, lambda pool: pool.closeall())
+
+def get_export_pool() -> ThreadedConnectionPool:
+    return registry.get("db_export_pool")
+
+# Autocommit session outside the pool, for advisory locks and LISTEN
+def connect_autocommit():
+    if not DATABASE_URL:
+        raise ValueError("Missing SUPABASE_DB_URL environment variable")
+    conn = psycopg2.connect(DATABASE_URL)
+    conn.autocommit = True
+    return conn
+
+# One session per process for advisory locks held longer than a transaction
+# (see ingestion/singleflight.py), so they do not tie up pool connections
+def create_lock_connection():
+    return connect_autocommit()
+
+registry.register("db_lock_connection", create_lock_connection, lambda conn: conn.close())
+
+def get_lock_connection():
+    return registry.get("db_lock_connection")
+
+def discard_lock_connection():
+    # A broken session has lost its locks anyway; the next call reconnects
+    registry.discard("db_lock_connection")
+
+# Borrow a pooled connection (default: the main pool); commits on success and rolls back on error
+@contextmanager
+def get_connection(pool: ThreadedConnectionPool = None):
+    pool = pool or get_pool()
+    conn = pool.getconn()
+    started = time.perf_counter()
+    status = "commit"
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        # Also covers GeneratorExit when a streaming response is closed early
+        status = "rollback"
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+        DB_TRANSACTION_DURATION.labels(status).observe(time.perf_counter() - started)
+
+# PostgREST caps responses (1000 rows by default), so read large results page by page
+SUPABASE_PAGE_SIZE = 1000
+
+def fetch_all_rows(build_query) -> list:
+    """Run the Supabase query from `build_query()` with increasing ranges until all rows are read"""
+    rows = []
+    offset = 0
+    while True:
+        page = build_query().range(offset, offset + SUPABASE_PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < SUPABASE_PAGE_SIZE:
+            return rows
+        offset += SUPABASE_PAGE_SIZE
+
+def close_pool():
+    registry.discard("db_pool")
+
+
+if __name__ == "__main__":
+    # Connection with PostgreSQL Supabase and allows SQL execution
+    conn = psycopg2.connect(DATABASE_URL)
+    cursor = conn.cursor()
+
+    # Test query
+    cursor.execute("SELECT version();")
+    result = cursor.fetchone()
+    print("Connected to:", result[0])
+
+    # Test table with one data point
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS test_table (
+        id SERIAL PRIMARY KEY,
+        message TEXT NOT NULL
+    );
+    """)
+    cursor.execute("INSERT INTO test_table (message) VALUES (%s);", ("Hello from Python!",))
+    conn.commit()
+
+    # Close the cursor and the database connection
+    cursor.close()
+    conn.close()
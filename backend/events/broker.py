@@ -0,0 +1,243 @@
+"""
+Live events of a project (sync progress, fresh data), for the SSE stream in
+events/routes.py.
+
+    sync-started          a sync of one stream (a GA property, a Stripe account)
+                          began; stream None: a multi-property GA sync
+    sync-progress         pages and records fetched so far by a stream (at most
+                          every EVENTS_PROGRESS_INTERVAL seconds), or properties
+                          done of a multi-property GA sync
+    sync-completed        a sync finished: status and rows written / unchanged / removed
+    data-version-changed  stored metrics of the project changed (new sync version)
+    resync                events may have been missed; clients should refetch
+
+The ingestion code calls publish() from any thread or event loop; it never
+blocks and never raises. Subscribers are asyncio queues on the loop that
+subscribed (one per SSE connection). With EVENTS_BACKEND=postgres (the
+default) events go out with NOTIFY on EVENTS_CHANNEL from a notifier
+thread and come back through one LISTEN session per process, so a sync in
+a job worker reaches streams served by every API worker. EVENTS_BACKEND=local
+delivers in-process only (a single worker). Events are best effort: a
+subscriber that falls EVENTS_QUEUE_SIZE events behind, or whose process
+lost its LISTEN session, gets "resync" instead of the missed events.
+"""
+import os
+import json
+import queue
+import time
+import select
+import logging
+import asyncio
+import threading
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from psycopg2 import sql
+from clients import registry
+from database import get_pool, get_connection, connect_autocommit
+from monitoring import EVENTS_PUBLISHED, EVENTS_DROPPED
+
+# Load environment variables
+load_dotenv()
+
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "postgres")
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "project_events")
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))
+EVENTS_PROGRESS_INTERVAL = float(os.getenv("EVENTS_PROGRESS_INTERVAL", "1"))
+
+# NOTIFY payloads must be shorter than 8000 bytes
+MAX_PAYLOAD = 7900
+# Events sent with one NOTIFY statement
+NOTIFY_BATCH = 100
+# Seconds the listener waits for notifications before checking whether it should stop
+LISTEN_POLL = 1.0
+RECONNECT_DELAY = 1.0
+
+log = logging.getLogger("events")
+
+
+class Subscription:
+    """Events of one project for one consumer, read on the loop that subscribed"""
+
+    def __init__(self, project_id: str):
+        self.project_id = project_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+
+    def deliver(self, message: dict):
+        # On the subscriber's loop
+        if self.queue.full():
+            # Too far behind: replace what is queued with one resync
+            EVENTS_DROPPED.inc(self.queue.qsize())
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            message = event_message(self.project_id, "resync", {"reason": "behind"})
+        self.queue.put_nowait(message)
+
+    async def get(self) -> dict:
+        return await self.queue.get()
+
+
+def event_message(project_id: str, event: str, data: dict) -> dict:
+    return {"project_id": project_id, "event": event, "data": data,
+            "at": datetime.now(timezone.utc).isoformat(timespec="milliseconds")}
+
+
+class EventBroker:
+    def __init__(self):
+        if EVENTS_BACKEND == "postgres":
+            # Created after the pool, so registry.close() sends what is left before the pool closes
+            get_pool()
+        # project_id -> subscriptions
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.closed = False
+        self.outbox = queue.SimpleQueue()
+        self.notifier = None
+        self.listener = None
+        self.listening = threading.Event()
+
+    #1. Publishing
+    def publish(self, project_id: str, event: str, data: dict):
+        message = event_message(project_id, event, data)
+        EVENTS_PUBLISHED.labels(event).inc()
+        if EVENTS_BACKEND != "postgres":
+            self.dispatch(message)
+            return
+        with self.lock:
+            if self.closed:
+                return
+            if self.notifier is None:
+                self.notifier = threading.Thread(target=self.notify, name="events-notify", daemon=True)
+                self.notifier.start()
+        self.outbox.put(message)
+
+    def notify(self):
+        while True:
+            message = self.outbox.get()
+            if message is None:
+                return
+            batch = [message]
+            while len(batch) < NOTIFY_BATCH:
+                try:
+                    message = self.outbox.get_nowait()
+                except queue.Empty:
+                    break
+                if message is None:
+                    self.send(batch)
+                    return
+                batch.append(message)
+            self.send(batch)
+
+    def send(self, batch: list):
+        payloads = []
+        for message in batch:
+            payload = json.dumps(message, default=str)
+            if len(payload.encode()) > MAX_PAYLOAD:
+                log.warning(f"Dropping {message['event']} event for project {message['project_id']}: "
+                            f"{len(payload)} bytes is too large to NOTIFY")
+                continue
+            payloads.append(payload)
+        if not payloads:
+            return
+        try:
+            with get_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload",
+                                   (EVENTS_CHANNEL, payloads))
+        except Exception as e:
+            EVENTS_DROPPED.inc(len(payloads))
+            log.error(f"Error sending {len(payloads)} events: {str(e)}")
+
+    #2. Delivering to this process's subscribers
+    def dispatch(self, message: dict):
+        with self.lock:
+            subscriptions = list(self.subscribers.get(message["project_id"], ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # Its loop is closed; the stream is going away
+                pass
+
+    def resync_all(self, reason: str):
+        with self.lock:
+            projects = list(self.subscribers)
+        for project_id in projects:
+            self.dispatch(event_message(project_id, "resync", {"reason": reason}))
+
+    def listen(self):
+        reconnecting = False
+        while not self.closed:
+            conn = None
+            try:
+                conn = connect_autocommit()
+                with conn.cursor() as cursor:
+                    cursor.execute(sql.SQL("LISTEN {}").format(sql.Identifier(EVENTS_CHANNEL)))
+                self.listening.set()
+                if reconnecting:
+                    # Whatever was sent while the session was down is lost
+                    self.resync_all("reconnected")
+                    reconnecting = False
+                while not self.closed:
+                    if select.select([conn], [], [], LISTEN_POLL) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notification = conn.notifies.pop(0)
+                        try:
+                            self.dispatch(json.loads(notification.payload))
+                        except ValueError:
+                            log.warning(f"Ignoring malformed event on {EVENTS_CHANNEL}")
+            except Exception as e:
+                self.listening.clear()
+                if self.closed:
+                    break
+                log.warning(f"Event listener lost its session, reconnecting in {RECONNECT_DELAY}s: {str(e)}")
+                reconnecting = True
+                time.sleep(RECONNECT_DELAY)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    #3. Subscribing
+    async def subscribe(self, project_id: str) -> Subscription:
+        subscription = Subscription(project_id)
+        with self.lock:
+            self.subscribers.setdefault(project_id, set()).add(subscription)
+            if EVENTS_BACKEND == "postgres" and self.listener is None:
+                self.listener = threading.Thread(target=self.listen, name="events-listen", daemon=True)
+                self.listener.start()
+        if EVENTS_BACKEND == "postgres":
+            # Events published before LISTEN took effect would not arrive
+            await asyncio.to_thread(self.listening.wait, 5)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self.lock:
+            subscriptions = self.subscribers.get(subscription.project_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.subscribers[subscription.project_id]
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+        if self.notifier is not None:
+            self.outbox.put(None)
+            self.notifier.join()
+        if self.listener is not None:
+            self.listener.join()
+
+registry.register("events", EventBroker, EventBroker.close)
+
+
+def get_broker() -> EventBroker:
+    return registry.get("events")
+
+def publish(project_id: str, event: str, data: dict):
+    """Send an event to the project's live streams; failures are logged, never raised"""
+    try:
+        get_broker().publish(project_id, event, data)
+    except Exception as e:
+        log.error(f"Error publishing {event} event: {str(e)}")
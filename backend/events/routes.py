@@ -0,0 +1,74 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+import os
+import json
+import asyncio
+import logging
+from dotenv import load_dotenv
+from auth import get_stream_user_id
+from exports.queries import has_project_access
+from metric_cache import get_sync_version
+from .broker import get_broker, event_message
+
+# Load environment variables
+load_dotenv()
+
+# Seconds between keep-alive comments on an idle stream (proxies close silent connections)
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+# Milliseconds EventSource waits before reconnecting
+RETRY_MS = 3000
+
+# Create router
+router = APIRouter()
+
+
+def format_event(message: dict) -> str:
+    data = dict(message["data"], at=message["at"])
+    return f"event: {message['event']}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def event_stream(request: Request, subscription, version: int):
+    """
+    Server-sent events of one project until the client disconnects. Starts
+    with the current data version, so a client that reconnects can tell
+    whether it missed a change.
+    """
+    broker = get_broker()
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        yield format_event(event_message(subscription.project_id, "data-version-changed", {"version": version}))
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.get(), EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event(message)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+# Live sync progress and data changes of a project (text/event-stream)
+@router.get("/projects/{project_id}/events")
+async def stream_project_events(project_id: str, request: Request, user_id: str = Depends(get_stream_user_id)):
+    if not await asyncio.to_thread(has_project_access, user_id, project_id):
+        raise HTTPException(status_code=403, detail="You do not have access to this project.")
+
+    subscription = await get_broker().subscribe(project_id)
+    try:
+        version = await asyncio.to_thread(get_sync_version, project_id)
+    except Exception as e:
+        get_broker().unsubscribe(subscription)
+        logging.error(f"Error reading sync version for project {project_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
+    return StreamingResponse(
+        event_stream(request, subscription, version),
+        media_type="text/event-stream",
+        # No caching or proxy buffering, so events arrive as they are sent
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also when the client left before the stream started
+        background=BackgroundTask(get_broker().unsubscribe, subscription)
+    )
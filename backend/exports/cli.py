@@ -0,0 +1,46 @@
+"""
+Export or restore a project's metric history from the command line.
+
+    python -m exports.cli export <project_id> out.parquet [--start YYYY-MM-DD] [--end YYYY-MM-DD] [--metric NAME ...]
+    python -m exports.cli export <project_id> out.arrow
+    python -m exports.cli import in.parquet [--project-id ID] [--user-id ID]
+"""
+import argparse
+import time
+from .columnar import write_parquet, write_arrow_stream, import_metrics
+from logging_config import configure_logging
+
+
+def main():
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Columnar export and bulk import of metric history")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Write a project's metrics to Parquet or Arrow")
+    export_parser.add_argument("project_id")
+    export_parser.add_argument("path", help="Output file; .arrow/.arrows writes an Arrow IPC stream, anything else Parquet")
+    export_parser.add_argument("--start", help="YYYY-MM-DD, inclusive")
+    export_parser.add_argument("--end", help="YYYY-MM-DD, inclusive")
+    export_parser.add_argument("--metric", action="append", help="Limit to a metric name (repeatable)")
+
+    import_parser = commands.add_parser("import", help="Bulk-load a Parquet file or Arrow stream")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--project-id", help="Target project (defaults to the one recorded in the file)")
+    import_parser.add_argument("--user-id", help="Owner for newly inserted Stripe rows")
+
+    args = parser.parse_args()
+    started = time.perf_counter()
+
+    if args.command == "export":
+        writer = write_arrow_stream if args.path.endswith((".arrow", ".arrows")) else write_parquet
+        with open(args.path, "wb") as f:
+            rows = writer(args.project_id, f, args.start, args.end, args.metric)
+        print(f"Exported {rows} rows to {args.path} in {time.perf_counter() - started:.2f}s")
+    else:
+        result = import_metrics(args.path, args.project_id, args.user_id)
+        print(f"Imported {result['rows']} rows into project {result['project_id']} "
+              f"in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Columnar (Parquet / Arrow IPC stream) export and bulk import of project metric history.
+
+Files hold one row per stored metric value with dictionary-encoded
+source, property and metric name columns:
+    source, property_id, date, metric_name, metric_value
+Google Analytics rows are sparse (days without a row are zero), exactly as stored.
+"""
+import io
+import logging
+import tempfile
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from database import get_connection
+from metric_cache import bump_sync_version
+from .queries import iter_export_chunks
+
+# Rows per Arrow record batch / Parquet row group
+COLUMNAR_CHUNK_ROWS = 100_000
+
+FORMAT_VERSION = "1"
+
+EXPORT_SCHEMA = pa.schema([
+    ("source", pa.dictionary(pa.int32(), pa.string())),
+    ("property_id", pa.dictionary(pa.int32(), pa.string())),
+    ("date", pa.date32()),
+    ("metric_name", pa.dictionary(pa.int32(), pa.string())),
+    ("metric_value", pa.float64()),
+])
+
+# Same columns without dictionary encoding, used when loading into Postgres
+PLAIN_SCHEMA = pa.schema([
+    ("source", pa.string()),
+    ("property_id", pa.string()),
+    ("date", pa.date32()),
+    ("metric_name", pa.string()),
+    ("metric_value", pa.float64()),
+])
+
+
+def export_schema(project_id: str) -> pa.Schema:
+    return EXPORT_SCHEMA.with_metadata({"project_id": project_id, "format_version": FORMAT_VERSION})
+
+def rows_to_batch(rows: list, schema: pa.Schema) -> pa.RecordBatch:
+    sources, property_ids, dates, names, values = zip(*rows)
+    return pa.record_batch([
+        pa.array(sources, pa.string()).dictionary_encode(),
+        pa.array(property_ids, pa.string()).dictionary_encode(),
+        pa.array(dates, pa.date32()),
+        pa.array(names, pa.string()).dictionary_encode(),
+        pa.array(values, pa.float64()),
+    ], schema=schema)
+
+def iter_export_batches(project_id: str, start: str = None, end: str = None, metrics: list = None,
+                        connection=None):
+    schema = export_schema(project_id)
+    for rows in iter_export_chunks(project_id, start, end, metrics, COLUMNAR_CHUNK_ROWS, connection):
+        yield rows_to_batch(rows, schema)
+
+
+#1. Export
+def write_parquet(project_id: str, sink, start: str = None, end: str = None, metrics: list = None,
+                  connection=None) -> int:
+    """Write a project's metric history to `sink` (path or binary file) as Parquet; returns row count"""
+    rows = 0
+    with pq.ParquetWriter(sink, export_schema(project_id), compression="zstd") as writer:
+        for batch in iter_export_batches(project_id, start, end, metrics, connection):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    logging.info(f"Wrote {rows} metric rows for project {project_id} as Parquet")
+    return rows
+
+def write_arrow_stream(project_id: str, sink, start: str = None, end: str = None, metrics: list = None) -> int:
+    """Write a project's metric history to `sink` as an Arrow IPC stream; returns row count"""
+    rows = 0
+    with pa.ipc.new_stream(sink, export_schema(project_id)) as writer:
+        for batch in iter_export_batches(project_id, start, end, metrics):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+def stream_parquet(project_id: str, start: str = None, end: str = None, metrics: list = None,
+                   connection=None, read_size: int = 1024 * 1024):
+    """Generator for HTTP responses; Parquet needs its footer written before the file can be sent"""
+    with tempfile.SpooledTemporaryFile(max_size=32 * 1024 * 1024) as buffer:
+        write_parquet(project_id, buffer, start, end, metrics, connection)
+        buffer.seek(0)
+        while True:
+            data = buffer.read(read_size)
+            if not data:
+                break
+            yield data
+
+def stream_arrow(project_id: str, start: str = None, end: str = None, metrics: list = None,
+                 connection=None):
+    """Generator for HTTP responses yielding each Arrow record batch as soon as it is encoded"""
+    buffer = io.BytesIO()
+    with pa.ipc.new_stream(buffer, export_schema(project_id)) as writer:
+        for batch in iter_export_batches(project_id, start, end, metrics, connection):
+            writer.write_batch(batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+#2. Bulk import
+def iter_import_batches(source, batch_rows: int = COLUMNAR_CHUNK_ROWS):
+    """Yields (project_id from file metadata, record batch) from a Parquet file or Arrow IPC stream"""
+    name = source if isinstance(source, str) else getattr(source, "name", "")
+    if str(name).endswith((".arrow", ".arrows")):
+        reader = pa.ipc.open_stream(source)
+        metadata = reader.schema.metadata or {}
+        batches = iter(reader)
+    else:
+        parquet_file = pq.ParquetFile(source)
+        metadata = parquet_file.schema_arrow.metadata or {}
+        batches = parquet_file.iter_batches(batch_size=batch_rows)
+
+    project_id = metadata.get(b"project_id", b"").decode() or None
+    for batch in batches:
+        yield project_id, batch
+
+def copy_batch(cursor, batch: pa.RecordBatch):
+    """COPY one batch into the import staging table (rows keep file order in its seq column)"""
+    table = pa.Table.from_batches([batch]).select(PLAIN_SCHEMA.names).cast(PLAIN_SCHEMA)
+    buffer = io.BytesIO()
+    pacsv.write_csv(table, buffer, pacsv.WriteOptions(include_header=False))
+    buffer.seek(0)
+    cursor.copy_expert(
+        "COPY metric_import_staging (source, property_id, date, metric_name, metric_value) "
+        "FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+
+def import_metrics(source, project_id: str = None, user_id: str = None) -> dict:
+    """
+    Bulk-load a Parquet file or Arrow stream into ga_metric_facts and stripe_metrics.
+    The target project defaults to the one recorded in the file; new Stripe rows
+    are attributed to `user_id` or else a member of the project. Everything is
+    staged with COPY and merged with set-based statements in one transaction.
+    A key that appears more than once in the file is stored from its last
+    row, as sinks do within a batch; a zero GA value removes the stored fact.
+    """
+    rows = 0
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                CREATE TEMP TABLE metric_import_staging (
+                    seq BIGINT GENERATED ALWAYS AS IDENTITY,
+                    source TEXT, property_id TEXT, date DATE, metric_name TEXT, metric_value DOUBLE PRECISION
+                ) ON COMMIT DROP
+            """)
+            for file_project_id, batch in iter_import_batches(source):
+                project_id = project_id or file_project_id
+                # Skip rows without values so the sparse layout holds
+                batch = batch.filter(pc.invert(pc.is_null(batch.column("metric_value"))))
+                copy_batch(cursor, batch)
+                rows += batch.num_rows
+
+            if not project_id:
+                raise ValueError("No project_id given and none recorded in the file")
+
+            # One row per key, the last in the file; an upsert cannot touch a row twice
+            cursor.execute("""
+                CREATE TEMP TABLE metric_import ON COMMIT DROP AS
+                SELECT DISTINCT ON (source, property_id, date, metric_name)
+                       source, property_id, date, metric_name, metric_value
+                FROM metric_import_staging
+                ORDER BY source, property_id, date, metric_name, seq DESC
+            """)
+            duplicates = rows - cursor.rowcount
+
+            # Google Analytics: catalog entries first, then sparse facts
+            cursor.execute("""
+                INSERT INTO ga_properties (property_id)
+                SELECT DISTINCT property_id FROM metric_import
+                WHERE source = 'google_analytics' AND property_id IS NOT NULL
+                ON CONFLICT (property_id) DO NOTHING
+            """)
+            cursor.execute("""
+                INSERT INTO metric_catalog (property_id, metric_name)
+                SELECT DISTINCT property_id, metric_name FROM metric_import
+                WHERE source = 'google_analytics' AND property_id IS NOT NULL
+                ON CONFLICT (property_id, metric_name) DO NOTHING
+            """)
+            cursor.execute("""
+                INSERT INTO ga_metric_facts (project_id, metric_id, date, metric_value)
+                SELECT %s, c.metric_id, i.date, i.metric_value
+                FROM metric_import i
+                JOIN metric_catalog c ON c.property_id = i.property_id AND c.metric_name = i.metric_name
+                WHERE i.source = 'google_analytics' AND i.metric_value <> 0
+                ON CONFLICT (project_id, metric_id, date) DO UPDATE SET metric_value = EXCLUDED.metric_value
+                WHERE ga_metric_facts.metric_value IS DISTINCT FROM EXCLUDED.metric_value
+            """, (project_id,))
+            ga_rows = cursor.rowcount
+            # Zero GA values are not stored: remove the fact, as GAFactSink does
+            cursor.execute("""
+                DELETE FROM ga_metric_facts f
+                USING metric_import i
+                JOIN metric_catalog c ON c.property_id = i.property_id AND c.metric_name = i.metric_name
+                WHERE i.source = 'google_analytics' AND i.metric_value = 0
+                  AND f.project_id = %s AND f.metric_id = c.metric_id AND f.date = i.date
+            """, (project_id,))
+            ga_deleted = cursor.rowcount
+
+            # Stripe: refresh matching (date, metric) rows whose value differs, insert the rest
+            cursor.execute("""
+                UPDATE stripe_metrics s
+                SET metric_value = i.metric_value, last_synced_at = now()
+                FROM metric_import i
+                WHERE i.source = 'stripe' AND s.project_id = %s
+                  AND s.date = i.date AND s.metric_name = i.metric_name
+                  AND s.metric_value IS DISTINCT FROM i.metric_value
+            """, (project_id,))
+            stripe_rows = cursor.rowcount
+            cursor.execute("""
+                INSERT INTO stripe_metrics (user_id, project_id, date, metric_name, metric_value,
+                                            first_synced_at, last_synced_at)
+                SELECT COALESCE(%s, (SELECT user_id FROM project_to_user WHERE project_id = %s LIMIT 1)),
+                       %s, i.date, i.metric_name, i.metric_value, now(), now()
+                FROM metric_import i
+                WHERE i.source = 'stripe' AND NOT EXISTS (
+                    SELECT 1 FROM stripe_metrics s
+                    WHERE s.project_id = %s AND s.date = i.date AND s.metric_name = i.metric_name
+                )
+            """, (user_id, project_id, project_id, project_id))
+            stripe_rows += cursor.rowcount
+
+    # Counts are rows inserted or changed; re-importing the same values leaves the cache valid
+    if ga_rows or ga_deleted or stripe_rows:
+        try:
+            bump_sync_version(project_id)
+        except Exception as e:
+            logging.error(f"Error bumping sync version: {str(e)}")
+
+    logging.info(f"Imported {rows} rows into project {project_id} ({ga_rows} GA facts changed, {ga_deleted} removed, "
+                 f"{stripe_rows} Stripe metrics changed, {duplicates} repeated keys)")
+    return {"project_id": project_id, "rows": rows, "duplicates": duplicates,
+            "google_analytics": ga_rows, "google_analytics_deleted": ga_deleted, "stripe": stripe_rows}
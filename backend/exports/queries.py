@@ -0,0 +1,116 @@
+import uuid
+import logging
+import threading
+from psycopg2 import errors
+from database import get_connection, get_export_pool
+
+# Rows fetched from the server-side cursor per round trip
+EXPORT_CHUNK_ROWS = 5000
+
+# (source, property_id, date, metric_name, metric_value)
+EXPORT_COLUMNS = ["source", "property_id", "date", "metric_name", "metric_value"]
+
+
+#1. Queries, one per source; Google Analytics facts are sparse (missing days are zero)
+def build_export_queries(project_id: str, start: str = None, end: str = None, metrics: list = None) -> list:
+    queries = []
+    for source, sql, date_col, name_col in [
+        (
+            "google_analytics",
+            """SELECT 'google_analytics', c.property_id, f.date, c.metric_name, f.metric_value::float8
+               FROM ga_metric_facts f
+               JOIN metric_catalog c ON c.metric_id = f.metric_id
+               WHERE f.project_id = %s""",
+            "f.date", "c.metric_name",
+        ),
+        (
+            "stripe",
+            """SELECT 'stripe', NULL, s.date::date, s.metric_name, s.metric_value::float8
+               FROM stripe_metrics s
+               WHERE s.project_id = %s""",
+            "s.date", "s.metric_name",
+        ),
+    ]:
+        params = [project_id]
+        if start:
+            sql += f" AND {date_col} >= %s"
+            params.append(start)
+        if end:
+            sql += f" AND {date_col} <= %s"
+            params.append(end)
+        if metrics:
+            sql += f" AND {name_col} = ANY(%s)"
+            params.append(list(metrics))
+        sql += f" ORDER BY {date_col}, {name_col}"
+        queries.append((source, sql, params))
+    return queries
+
+def has_project_access(user_id: str, project_id: str) -> bool:
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM project_to_user WHERE user_id = %s AND project_id = %s LIMIT 1",
+                    (user_id, project_id)
+                )
+                return cursor.fetchone() is not None
+    except errors.InvalidTextRepresentation:
+        # Not a UUID, so not a project anyone can access
+        return False
+
+
+#2. Connections for downloads
+class ExportConnection:
+    """
+    A connection from the export pool, held while one download streams.
+    Taken before the response starts, so a full pool can still be answered
+    with 503 (PoolError); release() may be called more than once.
+    """
+
+    def __init__(self):
+        self.pool = get_export_pool()
+        self.conn = self.pool.getconn()
+        self.lock = threading.Lock()
+
+    def release(self):
+        with self.lock:
+            conn, self.conn = self.conn, None
+        if conn is None:
+            return
+        try:
+            # Exports only read; end the transaction before the connection goes back
+            conn.rollback()
+            self.pool.putconn(conn)
+        except Exception as e:
+            logging.error(f"Error releasing export connection: {str(e)}")
+            self.pool.putconn(conn, close=True)
+
+
+#3. Read rows from server-side cursors in fixed-size chunks
+def read_chunks(conn, project_id: str, start: str, end: str, metrics: list, chunk_rows: int):
+    for source, sql, params in build_export_queries(project_id, start, end, metrics):
+        # Named cursor = server-side cursor; rows stay in Postgres until fetched
+        with conn.cursor(name=f"export_{source}_{uuid.uuid4().hex}") as cursor:
+            cursor.itersize = chunk_rows
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield rows
+
+def iter_export_chunks(project_id: str, start: str = None, end: str = None, metrics: list = None,
+                       chunk_rows: int = EXPORT_CHUNK_ROWS, connection: ExportConnection = None):
+    """
+    Yields lists of at most `chunk_rows` rows, so memory stays flat regardless
+    of export size. Reads through `connection` and releases it when done, or
+    through a connection borrowed from the export pool.
+    """
+    if connection is None:
+        with get_connection(get_export_pool()) as conn:
+            yield from read_chunks(conn, project_id, start, end, metrics, chunk_rows)
+        return
+    try:
+        yield from read_chunks(connection.conn, project_id, start, end, metrics, chunk_rows)
+    finally:
+        connection.release()
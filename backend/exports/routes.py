@@ -0,0 +1,131 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from psycopg2.pool import PoolError
+from datetime import datetime
+import csv
+import io
+import json
+import asyncio
+import logging
+from functools import partial
+from auth import get_current_user_id
+from .queries import EXPORT_CHUNK_ROWS, EXPORT_COLUMNS, ExportConnection, iter_export_chunks, has_project_access
+
+# Create router
+router = APIRouter()
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+#1. Row formatting
+def format_csv(rows: list, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(
+        (source, property_id or "", str(day), name, value)
+        for source, property_id, day, name, value in rows
+    )
+    return buffer.getvalue()
+
+def format_ndjson(rows: list, header: bool = False) -> str:
+    return "".join(
+        json.dumps({
+            "source": source,
+            "property_id": property_id,
+            "date": str(day),
+            "metric_name": name,
+            "metric_value": float(value) if value is not None else None
+        }) + "\n"
+        for source, property_id, day, name, value in rows
+    )
+
+FORMATTERS = {
+    "csv": format_csv,
+    "ndjson": format_ndjson,
+}
+
+# Binary formats encode whole record batches rather than formatting rows
+# (exports/columnar.py, and pyarrow with it, is imported on the first such export)
+COLUMNAR_STREAMS = {
+    "parquet": "stream_parquet",
+    "arrow": "stream_arrow",
+}
+
+
+#2. Stream rows from server-side cursors in fixed-size chunks
+def stream_export(project_id: str, export_format: str, start: str = None, end: str = None,
+                  metrics: list = None, chunk_rows: int = EXPORT_CHUNK_ROWS, connection: ExportConnection = None):
+    """
+    Generator yielding the export in chunks. Memory stays flat: at most
+    `chunk_rows` rows are held at once regardless of export size.
+    """
+    formatter = FORMATTERS[export_format]
+    header = True
+    exported = 0
+
+    for rows in iter_export_chunks(project_id, start, end, metrics, chunk_rows, connection):
+        exported += len(rows)
+        yield formatter(rows, header)
+        header = False
+
+    # Empty CSV exports still get a header
+    if header and export_format == "csv":
+        yield formatter([], True)
+
+    logging.info(f"Exported {exported} metric rows for project {project_id} as {export_format}")
+
+
+#3. Export endpoint
+@router.get("/projects/{project_id}/export")
+async def export_project_metrics(
+    project_id: str,
+    format: str = "csv",
+    start: str = None,  # YYYY-MM-DD, inclusive
+    end: str = None,  # YYYY-MM-DD, inclusive
+    metric: list[str] = Query(default=None),
+    user_id: str = Depends(get_current_user_id)
+):
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported format. Use one of: {', '.join(MEDIA_TYPES)}")
+
+    try:
+        for value in (start, end):
+            if value:
+                datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+
+    if not await asyncio.to_thread(has_project_access, user_id, project_id):
+        raise HTTPException(status_code=403, detail="You do not have access to this project.")
+
+    if format in COLUMNAR_STREAMS:
+        from . import columnar
+        stream = getattr(columnar, COLUMNAR_STREAMS[format])
+    else:
+        stream = partial(stream_export, export_format=format)
+
+    # Taken now rather than when streaming starts, so a full export pool is a 503 and not a broken download
+    try:
+        connection = await asyncio.to_thread(ExportConnection)
+    except PoolError:
+        raise HTTPException(status_code=503, detail="Too many exports in progress. Try again shortly.",
+                            headers={"Retry-After": "10"})
+
+    content = stream(project_id, start=start, end=end, metrics=metric, connection=connection)
+
+    filename = f"project-{project_id}-metrics.{format}"
+    return StreamingResponse(
+        content,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        # Also when the client left before the stream started
+        background=BackgroundTask(connection.release)
+    )
@@ -2,7 +2,6 @@ from fastapi import APIRouter, Request as FastAPIRequest
 from fastapi.responses import JSONResponse, RedirectResponse
 import os
 from dotenv import load_dotenv
-from google_auth_oauthlib.flow import Flow
 from google.oauth2.credentials import Credentials
 from datetime import datetime, timezone
 import logging
@@ -10,9 +9,12 @@ import jwt
 from jwt.exceptions import InvalidTokenError
 from auth import verify_token
 from .fetch_metrics import get_all_analytics_data, get_valid_credentials
+from jobs.kinds import GA_INITIAL_SYNC
+from jobs.runner import enqueue_job
+from clients import get_supabase
 # Import from shared module
 from .shared import (
-    supabase, ENCRYPTION_KEY, CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, 
+    ENCRYPTION_KEY, CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, 
     SCOPES, encrypt_token, decrypt_token, refresh_access_token
 )
 
@@ -32,6 +34,7 @@ def verify_scopes(granted_scopes: list) -> bool:
 
 # Create oauth flow
 def create_oauth_flow():
+    from google_auth_oauthlib.flow import Flow
     logging.info("Creating OAuth flow")
     flow = Flow.from_client_config(
         {
@@ -54,13 +57,9 @@ def create_oauth_flow():
 async def get_auth_url(request: FastAPIRequest):
     """Generate Google OAuth URL"""
     logging.info("Generating Google OAuth URL")
-    
-    # For debugging, print the headers
-    logging.info(f"Request headers: {dict(request.headers)}")
-    
+
     # Get authorization header
     auth_header = request.headers.get('Authorization')
-    logging.info(f"Auth header: {auth_header}")
     
     project_id = request.query_params.get("project_id")
     if not project_id:
@@ -70,7 +69,7 @@ async def get_auth_url(request: FastAPIRequest):
     # Get the user_id who owns this project
     try:
         # Query project_to_user table to find the user
-        project_owner_query = supabase.table("project_to_user").select("user_id").eq(
+        project_owner_query = get_supabase().table("project_to_user").select("user_id").eq(
             "project_id", project_id).execute()
         
         logging.info(f"Query response: {project_owner_query}")
@@ -168,13 +167,13 @@ async def google_callback(request: FastAPIRequest):
         
         # Check if credentials already exist for this user and project
         logging.info("Checking for existing credentials")
-        result = supabase.table("google_analytics_credentials").select("*").eq(
+        result = get_supabase().table("google_analytics_credentials").select("*").eq(
             "user_id", user_id).eq("project_id", project_id).execute()
         
         if result.data:
             # Update existing credentials
             logging.info("Updating existing credentials")
-            supabase.table("google_analytics_credentials").update({
+            get_supabase().table("google_analytics_credentials").update({
                 "access_token": encrypted_token,
                 "refresh_token": encrypted_refresh_token,
                 "token_uri": "https://oauth2.googleapis.com/token",  # Fixed token URI for Google OAuth
@@ -183,7 +182,7 @@ async def google_callback(request: FastAPIRequest):
         else:
             # Create new credentials
             logging.info("Creating new credentials")
-            supabase.table("google_analytics_credentials").insert({
+            get_supabase().table("google_analytics_credentials").insert({
                 "user_id": user_id,
                 "project_id": project_id,
                 "access_token": encrypted_token,
@@ -197,7 +196,7 @@ async def google_callback(request: FastAPIRequest):
         
         # Update project record to indicate Google Analytics is connected
         try:
-            project_update = supabase.table("projects").update({
+            project_update = get_supabase().table("projects").update({
                 "google_analytics": True
                 # Remove the updated_at line
             }).eq("project_id", project_id).execute()
@@ -208,53 +207,20 @@ async def google_callback(request: FastAPIRequest):
     
         logging.info("Google account connected successfully")
         
-        # Fetch initial metrics using the function from fetch_metrics.py
+        # Sync existing metrics in the background so the redirect is immediate;
+        # the frontend polls /api/jobs/{job_id} for per-property progress
+        job_id = None
         try:
-            import asyncio
-            from googleapiclient.discovery import build
-            from types import SimpleNamespace
-        
-            # Get valid credentials
-            credentials = await get_valid_credentials(user_id, project_id)
-            
-            if credentials:
-                # Get property information from Google Analytics
-                analytics_admin = build('analyticsadmin', 'v1beta', credentials=credentials)
-                account_summaries = analytics_admin.accountSummaries().list().execute()
-                
-                # For each property, fetch metrics
-                for account in account_summaries.get('accountSummaries', []):
-                    for prop in account.get('propertySummaries', []):
-                        property_id = prop.get("property", "").split('/')[-1]
-                        
-                        logging.info(f"Fetching initial metrics for property: {property_id}")
-                        
-                        # Use direct parameters instead of mocking the request object
-                        from google_analytics.fetch_metrics import get_analytics_data_internal
-                        
-                        # Call internal version that doesn't need request headers
-                        fetch_result = await get_analytics_data_internal(
-                            user_id=user_id,
-                            project_id=project_id,
-                            property_id=property_id,
-                            days=1
-                        )
-                        logging.info(f"Initial metrics fetch complete: {fetch_result.get('message', 'No message')}")
-                
-                logging.info("All initial metrics fetched successfully")
-            else:
-                logging.warning("Could not get valid credentials for initial metrics fetch")
-                
-        except Exception as fetch_err:
-            logging.error(f"Error fetching initial metrics: {str(fetch_err)}")
-            import traceback
-            logging.error(traceback.format_exc())
+            job_id = enqueue_job(GA_INITIAL_SYNC, user_id, project_id, {"days": 1})
+            logging.info(f"Queued initial metrics sync job {job_id}")
+        except Exception as job_err:
+            logging.error(f"Error queueing initial metrics sync: {str(job_err)}")
             # Continue anyway - connection was successful
-        
-        
+
         # Redirect to frontend
         frontend_url = f"http://localhost:3000/profile/projects/{project_id}"
-        return RedirectResponse(url=f"{frontend_url}?connection=success")
+        sync_param = f"&sync_job={job_id}" if job_id else ""
+        return RedirectResponse(url=f"{frontend_url}?connection=success{sync_param}")
         
     except Exception as e:
         logging.error(f"Error processing callback: {str(e)}")
@@ -274,7 +240,7 @@ def refresh_token_endpoint(user_id: str, project_id: str):
     
     try:
         # Get stored credentials from database
-        credentials_query = supabase.table("google_analytics_credentials") \
+        credentials_query = get_supabase().table("google_analytics_credentials") \
             .select("*") \
             .eq("user_id", user_id) \
             .eq("project_id", project_id) \
@@ -300,7 +266,7 @@ def refresh_token_endpoint(user_id: str, project_id: str):
         
         # Update in database
         logging.info("Updating database with refreshed token")
-        response = supabase.table("google_analytics_credentials").update({
+        response = get_supabase().table("google_analytics_credentials").update({
             "access_token": encrypted_access_token,
             "updated_at": datetime.now(timezone.utc).isoformat()
         }).eq("user_id", user_id).eq("project_id", project_id).execute()
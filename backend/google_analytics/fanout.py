@@ -0,0 +1,197 @@
+"""
+Concurrent multi-property Google Analytics sync.
+
+Properties are synced on a bounded thread pool (GA_SYNC_CONCURRENCY) with
+one shared set of credentials. Each worker thread builds its Data API
+client once and reuses it for every property it handles; all of them send
+requests through the shared keep-alive connection pool (transports.py),
+so connections and TLS sessions outlive a single property. Per-property
+quota is still enforced by google_analytics/quota.py. Total time is
+roughly the slowest property rather than the sum of all of them.
+
+With GA_BACKEND=grpc the properties instead run as asyncio tasks in the
+caller's event loop (still GA_SYNC_CONCURRENCY at a time), sharing the
+account's gRPC channel (see grpc_source.py); only database work uses threads.
+
+The project's live event stream (events/broker.py) gets sync-started and
+sync-completed for the whole run (stream None) and sync-progress after
+each property, besides the per-property events of the pipeline.
+"""
+import os
+import time
+import asyncio
+import itertools
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from jobs.runner import is_permanent, retry_after_seconds
+from .fetch_metrics import get_valid_credentials, get_analytics_data_internal
+from .shared import build_data_client, build_admin_client, GA_BACKEND
+from monitoring import track_upstream
+from events.broker import publish
+
+GA_SYNC_CONCURRENCY = int(os.getenv("GA_SYNC_CONCURRENCY", "16"))
+
+_thread_state = threading.local()
+
+
+def list_properties(credentials) -> list:
+    """All GA4 properties visible to the credentials, across every page of account summaries"""
+    analytics_admin = build_admin_client(credentials)
+    properties = []
+    page_token = None
+    while True:
+        with track_upstream("google_analytics", "accountSummaries.list"):
+            response = analytics_admin.accountSummaries().list(pageToken=page_token).execute()
+        for account in response.get('accountSummaries', []):
+            for prop in account.get('propertySummaries', []):
+                properties.append({
+                    "property_id": prop.get("property", "").split('/')[-1],
+                    "display_name": prop.get("displayName", "Unnamed Property"),
+                    "account_name": account.get("displayName", "Unknown Account"),
+                })
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return properties
+
+def get_thread_client(credentials):
+    """Data API client for the current thread, built once per thread and credentials"""
+    if getattr(_thread_state, "credentials", None) is not credentials:
+        _thread_state.client = build_data_client(credentials)
+        _thread_state.credentials = credentials
+    return _thread_state.client
+
+
+def run_callback(callback, *args):
+    # Progress reporting must not fail the sync
+    if callback is None:
+        return
+    try:
+        callback(*args)
+    except Exception as e:
+        logging.error(f"Error in GA sync progress callback: {str(e)}")
+
+
+#1. One property
+async def sync_property_result(user_id: str, project_id: str, prop: dict, days: int, credentials,
+                               analytics_data=None) -> dict:
+    property_id = prop["property_id"]
+    started = time.perf_counter()
+    result = {"property_id": property_id, "display_name": prop.get("display_name")}
+    try:
+        response = await get_analytics_data_internal(
+            user_id=user_id,
+            project_id=project_id,
+            property_id=property_id,
+            days=days,
+            raise_errors=True,
+            credentials=credentials,
+            analytics_data=analytics_data,
+            property_info=prop
+        )
+        result.update(status="success", message=response.get("message"),
+                      metrics_stored=response.get("metrics_stored", 0))
+    except Exception as e:
+        result.update(status="error", message=f"{type(e).__name__}: {str(e)}", error=e)
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+def sync_one(user_id: str, project_id: str, prop: dict, days: int, credentials,
+             on_start=None, on_result=None) -> dict:
+    """On a pool thread, in its own event loop (REST backend)"""
+    run_callback(on_start, prop["property_id"])
+    result = asyncio.run(sync_property_result(user_id, project_id, prop, days, credentials,
+                                              analytics_data=get_thread_client(credentials)))
+    run_callback(on_result, prop["property_id"], result)
+    return result
+
+async def sync_one_async(user_id: str, project_id: str, prop: dict, days: int, credentials,
+                         on_start=None, on_result=None) -> dict:
+    """As a task on the caller's loop (gRPC backend); the callbacks may block, so they run in threads"""
+    await asyncio.to_thread(run_callback, on_start, prop["property_id"])
+    result = await sync_property_result(user_id, project_id, prop, days, credentials)
+    await asyncio.to_thread(run_callback, on_result, prop["property_id"], result)
+    return result
+
+async def run_properties(user_id: str, project_id: str, properties: list, days: int, credentials,
+                         concurrency: int, on_start, on_result) -> list:
+    """Results of every property, `concurrency` at a time"""
+    if GA_BACKEND == "grpc":
+        limit = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(prop):
+            async with limit:
+                return await sync_one_async(user_id, project_id, prop, days, credentials, on_start, on_result)
+
+        return await asyncio.gather(*[run(prop) for prop in properties])
+
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(properties))),
+                            thread_name_prefix="ga-sync") as executor:
+        return await asyncio.gather(*[
+            # Each property runs in a copy of the caller's context, so its spans join the caller's trace
+            loop.run_in_executor(executor, contextvars.copy_context().run, sync_one, user_id, project_id, prop,
+                                 days, credentials, on_start, on_result)
+            for prop in properties
+        ])
+
+
+#2. Fan out over all properties and aggregate
+async def sync_properties(user_id: str, project_id: str, properties: list = None, days: int = 1,
+                          credentials=None, concurrency: int = GA_SYNC_CONCURRENCY,
+                          on_start=None, on_result=None) -> dict:
+    """
+    Sync every property (default: all properties of the connected account).
+    `on_start(property_id)` and `on_result(property_id, result)` run on
+    worker threads, e.g. to record job progress. Returns one report; errors
+    are collected per property instead of stopping the others.
+    """
+    if credentials is None:
+        credentials = await get_valid_credentials(user_id, project_id)
+    if not credentials:
+        return {"status": "error", "message": "No Google Analytics connection found"}
+    if properties is None:
+        properties = await asyncio.to_thread(list_properties, credentials)
+
+    started = time.perf_counter()
+    publish(project_id, "sync-started", {"source": "google_analytics", "stream": None,
+                                         "properties_total": len(properties)})
+    done = itertools.count(1)
+
+    def property_done(property_id: str, result: dict):
+        publish(project_id, "sync-progress", {
+            "source": "google_analytics", "stream": property_id, "status": result["status"],
+            "properties_done": next(done), "properties_total": len(properties)})
+        if on_result is not None:
+            on_result(property_id, result)
+
+    results = await run_properties(user_id, project_id, properties, days, credentials, concurrency,
+                                   on_start, property_done)
+
+    failed = [r for r in results if r["status"] != "success"]
+    report = {
+        "status": "success" if not failed else ("error" if len(failed) == len(results) else "partial"),
+        "properties": len(results),
+        "succeeded": len(results) - len(failed),
+        "failed": len(failed),
+        "metrics_stored": sum(r.get("metrics_stored", 0) for r in results),
+        "seconds": round(time.perf_counter() - started, 3),
+        "slowest_property_seconds": max((r["seconds"] for r in results), default=0),
+        "results": [{k: v for k, v in r.items() if k != "error"} for r in results],
+        "errors": [
+            {
+                "property_id": r["property_id"],
+                "message": r["message"],
+                "permanent": is_permanent(r["error"]),
+                "retry_after": retry_after_seconds(r["error"]),
+            }
+            for r in failed
+        ],
+    }
+    logging.info(f"GA sync for project {project_id}: {report['succeeded']}/{report['properties']} properties "
+                 f"in {report['seconds']}s (slowest {report['slowest_property_seconds']}s)")
+    publish(project_id, "sync-completed", {
+        "source": "google_analytics", "stream": None,
+        **{key: report[key] for key in ("status", "properties", "succeeded", "failed", "metrics_stored", "seconds")}})
+    return report
@@ -1,14 +1,18 @@
-from fastapi import APIRouter, Request as FastAPIRequest
+from fastapi import APIRouter, Depends, HTTPException, Request as FastAPIRequest
 from fastapi.responses import JSONResponse
 import logging
+import asyncio
 import os
 from dotenv import load_dotenv
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from datetime import datetime, timedelta, timezone
-from auth import verify_token
-from .shared import supabase, decrypt_token, refresh_access_token, encrypt_token
+from auth import verify_token, get_current_user_id
+from exports.queries import has_project_access
+from clients import get_supabase
+from .shared import decrypt_token, refresh_access_token, encrypt_token, build_admin_client
+from ingestion.pipeline import run_pipeline
+from .quota import quota_snapshot, QuotaExhaustedError
+from .source import create_source
+from monitoring import track_upstream
 
 # Load environment variables
 load_dotenv()
@@ -23,7 +27,7 @@ async def get_valid_credentials(user_id: str, project_id: str):
     
     try:
         #query for encrypted credentials
-        result = supabase.table("google_analytics_credentials").select("*").eq(
+        result = get_supabase().table("google_analytics_credentials").select("*").eq(
             "user_id", user_id).eq("project_id", project_id).execute()
         
         if not result.data:
@@ -53,32 +57,6 @@ async def get_valid_credentials(user_id: str, project_id: str):
         logging.error(f"Error getting credentials: {str(e)}")
         return None
 
-#1.1 filter out incompatible metric and dimension combinations
-def filter_compatible_metrics(metrics, dimensions):
-    
-    incompatible_metrics = [
-        # Cohort metrics need cohort specs
-        "cohortActiveUsers", "cohortTotalUsers", "cohortLTV",
-        
-        # Ad metrics not compatible with basic dimensions
-        "advertiserAdCostPerClick", "advertiserAdCostPerKeyEvent", 
-        "advertiserAdClicks", "advertiserAdCost",
-        
-        # Item metrics with compatibility issues
-        "itemDiscountAmount", "grossItemRevenue", "itemListViewEvents",
-        
-        # Return on ad spend metrics
-        "returnOnAdSpend"
-    ]
-    
-    # Filter metrics
-    compatible = []
-    for metric in metrics:
-        if metric.get("name") not in incompatible_metrics:
-            compatible.append(metric)
-            
-    return compatible
-
 #2. endpoint for GA properties. List all Google Analytics properties 
 # the user has access to
 @router.get("/properties")
@@ -120,10 +98,11 @@ async def list_properties(request: FastAPIRequest):
             }, status_code=404)
         
         #build the Analytics Admin API service
-        analytics_admin = build('analyticsadmin', 'v1beta', credentials=credentials)
+        analytics_admin = build_admin_client(credentials)
         
         # First, get the account summaries which include properties
-        account_summaries = analytics_admin.accountSummaries().list().execute()
+        with track_upstream("google_analytics", "accountSummaries.list"):
+            account_summaries = analytics_admin.accountSummaries().list().execute()
         
         # Format response
         properties = []
@@ -180,7 +159,7 @@ async def get_all_analytics_data(request: FastAPIRequest):
     if not user_id and project_id:
         try:
             # Query project_to_user table to find the owner
-            project_owner_query = supabase.table("project_to_user").select("user_id").eq(
+            project_owner_query = get_supabase().table("project_to_user").select("user_id").eq(
                 "project_id", project_id).execute()
             
             if project_owner_query.data:
@@ -212,161 +191,27 @@ async def get_all_analytics_data(request: FastAPIRequest):
                 "message": "No Google Analytics connection found"
             }, status_code=404)
         
-        # Build the Analytics Data API service
-        analytics_data = build('analyticsdata', 'v1beta', credentials=credentials)
-        
-        # Get property information to include display name
-        try:
-            analytics_admin = build('analyticsadmin', 'v1beta', credentials=credentials)
-            account_summaries = analytics_admin.accountSummaries().list().execute()
-            
-            # Find the matching property
-            property_display_name = "Unknown Property"
-            account_name = "Unknown Account"
-            
-            for account in account_summaries.get('accountSummaries', []):
-                for prop in account.get('propertySummaries', []):
-                    if prop.get("property", "").split('/')[-1] == property_id:
-                        property_display_name = prop.get("displayName", "Unnamed Property")
-                        account_name = account.get("displayName", "Unknown Account")
-                        break
-            
-            logging.info(f"Found property: {property_display_name} in account: {account_name}")
-        except Exception as prop_err:
-            logging.error(f"Error getting property info: {str(prop_err)}")
-            property_display_name = "Unknown Property"
-            account_name = "Unknown Account"
-        
-        # First get all available metrics for this property
-        metadata = analytics_data.properties().getMetadata(
-            name=f"properties/{property_id}/metadata"
-        ).execute()
+        # Sync every compatible metric of the property through the ingestion pipeline
+        source = create_source(project_id, property_id, credentials, days=days)
+        report = await run_pipeline(source)
         
-        # Extract all available metrics and their descriptions
-        all_metrics = [{"name": metric["apiName"]} for metric in metadata.get("metrics", [])]
-        
-        # Create a lookup dictionary for descriptions
-        metric_descriptions = {}
-        for metric in metadata.get("metrics", []):
-            api_name = metric.get("apiName")
-            description = metric.get("description", "No description available")
-            metric_descriptions[api_name] = description
-            
-        logging.info(f"Found {len(all_metrics)} metrics with descriptions")
-        
-        # Calculate date range
-        end_date = datetime.now() - timedelta(days=2) #get latest full data 2 days ago
-        if days > 1:
-            start_date = end_date - timedelta(days=days-1)
-        else:
-            start_date = end_date
-        
-        logging.info(f"Collecting data from {start_date.strftime('%Y-%m-%d')}")
-        
-        metrics_stored = 0
-        
-        # Process metrics individually instead of in batches to avoid batch failures
-        for i, metric in enumerate(all_metrics):
-            batch_metrics = filter_compatible_metrics([metric], [{"name": "date"}])
-            if not batch_metrics:
-                logging.info(f"Skipping incompatible metric: {metric.get('name')}")
-                continue
-            
-            logging.info(f"Processing metric {i+1}/{len(all_metrics)}: {metric.get('name')}")
-            
-            request_body = {
-                "dateRanges": [{
-                    "startDate": start_date.strftime("%Y-%m-%d"),
-                    "endDate": end_date.strftime("%Y-%m-%d")
-                }],
-                "metrics": batch_metrics,
-                "dimensions": [{"name": "date"}],  # Only date dimension
-                "keepEmptyRows": True
-            }
-            
-            try:
-                # Execute request for this batch
-                batch_response = analytics_data.properties().runReport(
-                    property=f"properties/{property_id}",
-                    body=request_body
-                ).execute()
-                
-                # Process batch response
-                batch_data = process_analytics_response(batch_response)
-                
-                # Store each metric separately
-                for data_point in batch_data:
-                    # Get date from data point
-                    record_date = data_point.get("date")
-                    
-                    # For each metric, create a separate record
-                    for key, value in data_point.items():
-                        # Skip dimension fields
-                        if key not in ["date"]:
-                            # Create metric record
-                            metric_record = {
-                                "user_id": user_id,
-                                "project_id": project_id,
-                                "property_id": property_id,
-                                "property_display_name": property_display_name,
-                                "account_name": account_name,
-                                "date": record_date,
-                                "metric_name": key,
-                                "metric_description": metric_descriptions.get(key, "No description available"),
-                                "metric_value": value,
-                                "last_synced_at": datetime.now().isoformat()
-                            }
-                            
-                            logging.info(f"Processing metric: {key} for date {record_date} with value {value}")
-
-                            # Check if this metric exists
-                            result = supabase.table("google_analytics_metrics").select("id").eq(
-                                "user_id", user_id).eq("project_id", project_id).eq(
-                                "property_id", property_id).eq("date", record_date).eq(
-                                "metric_name", key).execute()
-                                
-                            if not result.data:
-                                # New metric - set first synced time
-                                metric_record["first_synced_at"] = metric_record["last_synced_at"]
-                                
-                                try:
-                                    supabase.table("google_analytics_metrics").insert(metric_record).execute()
-                                    metrics_stored += 1
-                                except Exception as insert_err:
-                                    logging.error(f"Error inserting metric: {str(insert_err)}")
-                            else:
-                                # Update existing metric
-                                try:
-                                    supabase.table("google_analytics_metrics").update({
-                                        "metric_value": value,
-                                        "property_display_name": property_display_name,
-                                        "account_name": account_name,
-                                        "metric_description": metric_descriptions.get(key, "No description available"),
-                                        "last_synced_at": metric_record["last_synced_at"]
-                                    }).eq("user_id", user_id).eq("project_id", project_id).eq(
-                                        "property_id", property_id).eq("date", record_date).eq(
-                                        "metric_name", key).execute()
-                                    metrics_stored += 1
-                                except Exception as update_err:
-                                    logging.error(f"Error updating metric: {str(update_err)}")
-                    
-            except Exception as batch_err:
-                logging.error(f"Error processing metric {i+1}/{len(all_metrics)}: {str(batch_err)}")
-                # Continue with next batch even if this one fails
+        quota_note = None
+        if isinstance(report["error"], QuotaExhaustedError):
+            # Remaining metrics would fail the same way; report what was synced
+            logging.warning(f"Stopped sync for property {property_id}: {str(report['error'])}")
+            quota_note = str(report["error"])
+        elif report["error"] is not None:
+            raise report["error"]
         
         return {
             "status": "success",
-            "message": f"Synced {metrics_stored} metrics",
-            "property_info": {
-                "display_name": property_display_name,
-                "account_name": account_name,
-                "property_id": property_id
-            },
-            "date_range": {
-                "start": start_date.strftime("%Y-%m-%d"),
-                "end": end_date.strftime("%Y-%m-%d")
-            },
-            "note": "Data collection uses complete days only (ending 2 days ago)"
+            "message": f"Synced {report['written'] + report['unchanged']} metrics ({report['written']} changed)",
+            "property_info": dict(report["details"]["property_info"], property_id=property_id),
+            "date_range": report["date_range"],
+            "note": "Data collection uses complete days only (ending 2 days ago)",
+            "quota": quota_note,
+            # True when this call joined a sync of the same property and dates already running
+            "coalesced": report["coalesced"]
         }
         
     except Exception as e:
@@ -374,61 +219,6 @@ async def get_all_analytics_data(request: FastAPIRequest):
         return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
 
 
-#4: Function to process GA API response
-def process_analytics_response(response):
-    
-    if not response or 'rows' not in response:
-        return []
-    
-    # Extract dimension and metric headers
-    dimension_headers = [h.get('name') for h in response.get('dimensionHeaders', [])]
-    metric_headers = [h.get('name') for h in response.get('metricHeaders', [])]
-    
-    # Process each row
-    formatted_data = []
-    for row in response.get('rows', []):
-        data_point = {}
-        
-        # Process dimensions (usually dates)
-        dimensions = row.get('dimensionValues', [])
-        for i, dimension in enumerate(dimensions):
-            if i < len(dimension_headers):
-                header = dimension_headers[i]
-                value = dimension.get('value', '')
-                
-                # Format date if it's a date dimension
-                if header == 'date' and len(value) == 8:  # YYYYMMDD format
-                    try:
-                        formatted_date = f"{value[0:4]}-{value[4:6]}-{value[6:8]}"
-                        data_point[header] = formatted_date
-                    except:
-                        data_point[header] = value
-                else:
-                    data_point[header] = value
-        
-        # Process metrics
-        metrics = row.get('metricValues', [])
-        for i, metric in enumerate(metrics):
-            if i < len(metric_headers):
-                header = metric_headers[i]
-                value = metric.get('value', '0')
-                
-                # Convert numeric values
-                try:
-                    if header == 'averageSessionDuration':
-                        # Convert to seconds with 2 decimal places
-                        data_point[header] = round(float(value), 2)
-                    else:
-                        # Integer for counts
-                        data_point[header] = int(value)
-                except:
-                    data_point[header] = value
-        
-        formatted_data.append(data_point)
-    
-    return formatted_data
-
-
 # Test endpoints
 @router.get("/test")
 async def test():
@@ -467,140 +257,46 @@ async def test_credentials():
         }
 
 # Internal function for fetching metrics without request object
-async def get_analytics_data_internal(user_id: str, project_id: str, property_id: str, days: int = 7):
+async def get_analytics_data_internal(user_id: str, project_id: str, property_id: str, days: int = 7,
+                                     raise_errors: bool = False, credentials=None, analytics_data=None,
+                                     property_info: dict = None):
     """
     Internal version of get_all_analytics_data that doesn't rely on FastAPI request object.
-    This can be called directly from other functions.
+    This can be called directly from other functions. Background jobs pass
+    raise_errors=True so upstream failures reach the retry logic; multi-property
+    syncs pass shared credentials, a per-thread client and the property's names.
     """
     logging.info(f"Fetching analytics data internally for user {user_id}, project {project_id}, property {property_id}")
     
     try:
         # Get credentials
-        credentials = await get_valid_credentials(user_id, project_id)
+        if credentials is None:
+            credentials = await get_valid_credentials(user_id, project_id)
         if not credentials:
             return {
                 "status": "error", 
                 "message": "No Google Analytics connection found"
             }
         
-        # Build the Analytics Data API service
-        analytics_data = build('analyticsdata', 'v1beta', credentials=credentials)
-        
-        # Get property information to include display name
-        try:
-            analytics_admin = build('analyticsadmin', 'v1beta', credentials=credentials)
-            account_summaries = analytics_admin.accountSummaries().list().execute()
-            
-            # Find the matching property
-            property_display_name = "Unknown Property"
-            account_name = "Unknown Account"
-            
-            for account in account_summaries.get('accountSummaries', []):
-                for prop in account.get('propertySummaries', []):
-                    if prop.get("property", "").split('/')[-1] == property_id:
-                        property_display_name = prop.get("displayName", "Unnamed Property")
-                        account_name = account.get("displayName", "Unknown Account")
-                        break
-            
-            logging.info(f"Found property: {property_display_name} in account: {account_name}")
-        except Exception as prop_err:
-            logging.error(f"Error getting property info: {str(prop_err)}")
-            property_display_name = "Unknown Property"
-            account_name = "Unknown Account"
-        
-        # Get some basic metrics
-        basic_metrics = [
-            {"name": "activeUsers"}, 
-            {"name": "newUsers"}, 
-            {"name": "sessions"},
-            {"name": "screenPageViews"}
-        ]
-        
-        # Calculate date range
-        end_date = datetime.now() - timedelta(days=2)  # get latest full data 2 days ago
-        start_date = end_date - timedelta(days=days-1) if days > 1 else end_date
-        
-        logging.info(f"Collecting data from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}")
-        
-        # Run the report
-        report = analytics_data.properties().runReport(
-            property=f"properties/{property_id}",
-            body={
-                "dateRanges": [
-                    {"startDate": start_date.strftime("%Y-%m-%d"), "endDate": end_date.strftime("%Y-%m-%d")}
-                ],
-                "dimensions": [{"name": "date"}],
-                "metrics": basic_metrics
-            }
-        ).execute()
-        
-        # Log the response for debugging
-        logging.info(f"Got report data with {len(report.get('rows', []))} rows")
-        
-        # Store metrics in the database
-        metrics_stored = 0
-        for row in report.get('rows', []):
-            date_value = row['dimensionValues'][0]['value']  # Get the date
-            # Format date if it's in YYYYMMDD format
-            if len(date_value) == 8:
-                date_value = f"{date_value[0:4]}-{date_value[4:6]}-{date_value[6:8]}"
-            
-            # Get metric values
-            active_users = int(row['metricValues'][0]['value'])
-            new_users = int(row['metricValues'][1]['value'])
-            sessions = int(row['metricValues'][2]['value'])
-            page_views = int(row['metricValues'][3]['value'])
-            
-            # Store in database
-            try:
-                # First check if metrics already exist for this date and property
-                existing = supabase.table("google_analytics_metrics").select("*").eq(
-                    "property_id", property_id).eq("date", date_value).eq("project_id", project_id).execute()
-                
-                if existing.data:
-                    # Update existing record
-                    supabase.table("google_analytics_metrics").update({
-                        "active_users": active_users,
-                        "new_users": new_users,
-                        "sessions": sessions,
-                        "page_views": page_views,
-                        "updated_at": datetime.now(timezone.utc).isoformat()
-                    }).eq("property_id", property_id).eq("date", date_value).eq("project_id", project_id).execute()
-                else:
-                    # Insert new record
-                    supabase.table("google_analytics_metrics").insert({
-                        "project_id": project_id,
-                        "property_id": property_id,
-                        "date": date_value,
-                        "active_users": active_users,
-                        "new_users": new_users,
-                        "sessions": sessions,
-                        "page_views": page_views,
-                        "created_at": datetime.now(timezone.utc).isoformat(),
-                        "updated_at": datetime.now(timezone.utc).isoformat()
-                    }).execute()
-                
-                metrics_stored += 1
-                logging.info(f"Stored metrics for date {date_value}")
-            except Exception as store_err:
-                logging.error(f"Error storing metrics for date {date_value}: {str(store_err)}")
+        source = create_source(project_id, property_id, credentials, days=days,
+                               analytics_data=analytics_data, property_info=property_info)
+        report = await run_pipeline(source)
+        if report["error"] is not None:
+            raise report["error"]
         
         return {
             "status": "success",
-            "message": f"Synced {metrics_stored} days of metrics",
-            "property_info": {
-                "display_name": property_display_name,
-                "account_name": account_name,
-                "property_id": property_id
-            },
-            "date_range": {
-                "start": start_date.strftime("%Y-%m-%d"),
-                "end": end_date.strftime("%Y-%m-%d")
-            },
-            "metrics_stored": metrics_stored
+            "message": f"Synced {report['written'] + report['unchanged']} metrics ({report['written']} changed)",
+            "property_info": dict(report["details"]["property_info"], property_id=property_id),
+            "date_range": report["date_range"],
+            "metrics_stored": report["written"] + report["unchanged"],
+            "metrics_changed": report["written"],
+            "coalesced": report["coalesced"]
         }
         
     except Exception as e:
+        if raise_errors:
+            raise
         logging.error(f"Error syncing analytics data internally: {str(e)}")
         import traceback
         logging.error(traceback.format_exc())
@@ -637,31 +333,26 @@ async def fetch_initial_metrics(request: FastAPIRequest):
         credentials = await get_valid_credentials(user_id, project_id)
         
         if credentials:
-            # Get property information from Google Analytics
-            analytics_admin = build('analyticsadmin', 'v1beta', credentials=credentials)
-            account_summaries = analytics_admin.accountSummaries().list().execute()
-            
-            # For each property, fetch metrics
-            for account in account_summaries.get('accountSummaries', []):
-                for prop in account.get('propertySummaries', []):
-                    property_id = prop.get("property", "").split('/')[-1]
-                    
-                    logging.info(f"Fetching initial metrics for property: {property_id}")
-                    
-                    # Call internal version that doesn't need request headers
-                    fetch_result = await get_analytics_data_internal(
-                        user_id=user_id,
-                        project_id=project_id,
-                        property_id=property_id,
-                        days=7
-                    )
-                    logging.info(f"Initial metrics fetch complete: {fetch_result.get('message', 'No message')}")
+            # Sync all properties concurrently (imported here; fanout imports this module)
+            from .fanout import sync_properties
+            report = await sync_properties(user_id, project_id, days=7, credentials=credentials)
             
-            logging.info("All initial metrics fetched successfully")
-            return JSONResponse({"status": "success", "message": "Initial metrics fetch complete"})
+            logging.info("All initial metrics fetched")
+            return JSONResponse({
+                "status": "success" if report["status"] != "error" else "error",
+                "message": f"Initial metrics fetch complete for {report['succeeded']}/{report['properties']} properties",
+                "report": report
+            })
         else:
             logging.warning("Could not get valid credentials for initial metrics fetch")
             return JSONResponse({"status": "error", "message": "Invalid credentials"}, status_code=401)
     except Exception as e:
         logging.error(f"Error fetching initial metrics: {str(e)}")
-        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
\ No newline at end of file
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
+
+# Remaining GA Data API quota and throttling per property used by a project (this process's view)
+@router.get("/quota")
+async def get_quota(project_id: str, user_id: str = Depends(get_current_user_id)):
+    if not await asyncio.to_thread(has_project_access, user_id, project_id):
+        raise HTTPException(status_code=403, detail="You do not have access to this project.")
+    return {"properties": quota_snapshot(project_id)}
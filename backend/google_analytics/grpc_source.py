@@ -0,0 +1,227 @@
+"""
+Google Analytics source over the async gRPC Data API client (GA_BACKEND=grpc).
+
+Window, metric catalog, zero days and quota handling are those of the
+REST source (source.py); the transport differs:
+- One gRPC channel (HTTP/2, requests multiplexed) per credential, kept
+  open across syncs and jobs and shared by every property of the account.
+  grpc.aio channels belong to the event loop they were created on and each
+  job runs in its own loop, so channels live on one background loop thread
+  ("ga-grpc") and calls are handed to it. The GA_GRPC_MAX_CHANNELS most
+  recently used channels are kept; older ones are closed.
+- Reports arrive as protobuf messages and are read field by field, with no
+  JSON encoding, parsing or dict building on the way.
+- A property's metric groups are requested concurrently on the event loop
+  (GA_GRPC_CONCURRENCY reports at a time, within the per-property quota
+  limits) instead of one after another on a thread.
+
+GA_GRPC_ENDPOINT overrides the API host (host:port). With GA_GRPC_INSECURE=1
+it is reached without TLS or credentials, e.g. the local stand-in in
+benchmarks/fake_ga_grpc_server.py.
+"""
+import os
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from clients import registry
+from monitoring import track_upstream
+from tracing import span
+from .metric_store import chunk
+from .quota import run_report_async
+from .source import GoogleAnalyticsSource, METRICS_PER_REPORT, REPORT_ROW_LIMIT
+
+# Load environment variables
+load_dotenv()
+
+GA_GRPC_ENDPOINT = os.getenv("GA_GRPC_ENDPOINT", "analyticsdata.googleapis.com")
+GA_GRPC_INSECURE = os.getenv("GA_GRPC_INSECURE", "0") == "1"
+# Reports in flight per property sync
+GA_GRPC_CONCURRENCY = int(os.getenv("GA_GRPC_CONCURRENCY", "4"))
+GA_GRPC_MAX_CHANNELS = int(os.getenv("GA_GRPC_MAX_CHANNELS", "64"))
+# Seconds calls still in flight get when their channel is closed
+CHANNEL_CLOSE_GRACE = 5.0
+
+# End of pages marker
+_DONE = object()
+
+
+#1. Channels, one per credential, on a background event loop
+class GrpcChannels:
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="ga-grpc", daemon=True)
+        self.thread.start()
+        # credential -> BetaAnalyticsDataAsyncClient, least recently used first (only touched on self.loop)
+        self.clients = OrderedDict()
+
+    def client(self, credentials):
+        from google.analytics.data_v1beta import BetaAnalyticsDataAsyncClient
+        from google.analytics.data_v1beta.services.beta_analytics_data.transports import (
+            BetaAnalyticsDataGrpcAsyncIOTransport)
+
+        # A sync builds new Credentials for the stored tokens; the refresh token identifies the grant
+        key = credentials.refresh_token or credentials.token
+        client = self.clients.get(key)
+        if client is not None:
+            self.clients.move_to_end(key)
+            return client
+
+        if GA_GRPC_INSECURE:
+            import grpc
+            channel = grpc.aio.insecure_channel(GA_GRPC_ENDPOINT, options=[
+                ("grpc.max_send_message_length", -1),
+                ("grpc.max_receive_message_length", -1),
+            ])
+            transport = BetaAnalyticsDataGrpcAsyncIOTransport(host=GA_GRPC_ENDPOINT, channel=channel)
+        else:
+            transport = BetaAnalyticsDataGrpcAsyncIOTransport(host=GA_GRPC_ENDPOINT, credentials=credentials)
+        client = BetaAnalyticsDataAsyncClient(transport=transport)
+        self.clients[key] = client
+
+        if len(self.clients) > GA_GRPC_MAX_CHANNELS:
+            _, evicted = self.clients.popitem(last=False)
+            self.loop.create_task(evicted.transport.grpc_channel.close(CHANNEL_CLOSE_GRACE))
+        return client
+
+    async def _call(self, credentials, method: str, request):
+        response = await getattr(self.client(credentials), method)(request=request)
+        # The protobuf message itself, without proto-plus wrappers
+        return type(response).pb(response)
+
+    async def call(self, credentials, method: str, request):
+        """Run one RPC on the channel loop from any event loop; returns the response protobuf"""
+        with span(f"google grpc {method}"):
+            future = asyncio.run_coroutine_threadsafe(self._call(credentials, method, request), self.loop)
+            return await asyncio.wrap_future(future)
+
+    def close(self):
+        async def close_channels():
+            clients = list(self.clients.values())
+            self.clients.clear()
+            await asyncio.gather(*[client.transport.grpc_channel.close(CHANNEL_CLOSE_GRACE) for client in clients],
+                                 return_exceptions=True)
+
+        try:
+            asyncio.run_coroutine_threadsafe(close_channels(), self.loop).result()
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+
+registry.register("ga_grpc", GrpcChannels, GrpcChannels.close)
+
+
+class GrpcDataClient:
+    """Data API calls for one set of credentials, over its shared channel"""
+
+    def __init__(self, credentials):
+        self.credentials = credentials
+        self.channels = registry.get("ga_grpc")
+
+    async def get_metadata(self, name: str):
+        from google.analytics.data_v1beta.types import GetMetadataRequest
+        return await self.channels.call(self.credentials, "get_metadata", GetMetadataRequest(name=name))
+
+    async def run_report(self, request):
+        return await self.channels.call(self.credentials, "run_report", request)
+
+
+#2. The source
+class GrpcGoogleAnalyticsSource(GoogleAnalyticsSource):
+
+    def __init__(self, project_id: str, property_id: str, credentials, days: int = 1,
+                 metrics: list = None, property_info: dict = None):
+        super().__init__(project_id, property_id, credentials, days=days, metrics=metrics,
+                         property_info=property_info)
+        self.client = GrpcDataClient(credentials)
+
+    async def prepare(self):
+        with track_upstream("google_analytics", "getMetadata"):
+            metadata = await self.client.get_metadata(f"properties/{self.property_id}/metadata")
+        descriptions = {
+            metric.api_name: metric.description or "No description available"
+            for metric in metadata.metrics
+        }
+        # Catalog writes block
+        return await asyncio.to_thread(self.prepare_sink, descriptions)
+
+    async def pages(self, start_date: str, end_date: str):
+        """Pages of all metric groups as they arrive; the first error stops the rest and is raised"""
+        queue = asyncio.Queue(maxsize=GA_GRPC_CONCURRENCY)
+        limit = asyncio.Semaphore(GA_GRPC_CONCURRENCY)
+        failed = []
+
+        async def fetch_group(group):
+            async with limit:
+                async for page in self.report_pages(group, start_date, end_date):
+                    await queue.put(page)
+
+        async def fetch_all():
+            try:
+                async with asyncio.TaskGroup() as tasks:
+                    for group in chunk(self.metrics, METRICS_PER_REPORT):
+                        tasks.create_task(fetch_group(group))
+            except* Exception as errors:
+                failed.append(errors.exceptions[0])
+            await queue.put(_DONE)
+
+        runner = asyncio.create_task(fetch_all())
+        try:
+            while (page := await queue.get()) is not _DONE:
+                yield page
+            if failed:
+                raise failed[0]
+        finally:
+            if not runner.done():
+                runner.cancel()
+                try:
+                    await runner
+                except asyncio.CancelledError:
+                    pass
+
+    async def report_pages(self, group: list, start_date: str, end_date: str):
+        from google.api_core.exceptions import InvalidArgument
+        from google.analytics.data_v1beta.types import DateRange, Dimension, Metric, RunReportRequest
+
+        offset = 0
+        while True:
+            request = RunReportRequest(
+                property=f"properties/{self.property_id}",
+                date_ranges=[DateRange(start_date=start_date, end_date=end_date)],
+                metrics=[Metric(name=name) for name in group],
+                dimensions=[Dimension(name="date")],
+                keep_empty_rows=False,  # Days without data are zero and are not stored
+                limit=REPORT_ROW_LIMIT,
+                offset=offset,
+                return_property_quota=True
+            )
+            try:
+                response = await run_report_async(self.client, self.property_id, request, self.project_id)
+            except InvalidArgument as e:
+                if offset:
+                    raise
+                if len(group) > 1:
+                    # One incompatible metric fails the whole report; find it by asking one by one
+                    for name in group:
+                        async for page in self.report_pages([name], start_date, end_date):
+                            yield page
+                    return
+                logging.info(f"Skipping metric {group[0]} for property {self.property_id}: {str(e)}")
+                self.skipped.append(group[0])
+                return
+
+            rows = len(response.rows)
+            offset += rows
+            last = not rows or offset >= response.row_count
+            yield {"response": response, "metrics": group, "start": start_date, "end": end_date, "last": last}
+            if last:
+                return
+
+    def response_values(self, response):
+        headers = [header.name for header in response.metric_headers]
+        for row in response.rows:
+            day = row.dimension_values[0].value
+            for name, metric in zip(headers, row.metric_values):
+                yield day, name, metric.value
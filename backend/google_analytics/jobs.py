@@ -0,0 +1,93 @@
+"""
+Google Analytics background jobs (see jobs/runner.py):
+- ga_initial_sync: sync every property (concurrently) after a user connects their
+  account, with progress recorded per property so the OAuth callback can redirect right away
+- ga_sync: sync one property
+- ga_token_refresh: refresh and store the access token
+"""
+import logging
+from datetime import datetime, timezone
+from jobs.kinds import GA_INITIAL_SYNC, GA_SYNC, GA_TOKEN_REFRESH
+from jobs.runner import register_handler, PermanentJobError, TransientJobError
+from jobs.store import set_job_items, update_job_item
+from .fetch_metrics import get_valid_credentials, get_analytics_data_internal
+from .fanout import list_properties, sync_properties
+from clients import get_supabase
+from .shared import encrypt_token, refresh_access_token
+
+
+async def sync_property(user_id: str, project_id: str, property_id: str, days: int) -> dict:
+    result = await get_analytics_data_internal(
+        user_id=user_id,
+        project_id=project_id,
+        property_id=property_id,
+        days=days,
+        raise_errors=True
+    )
+    if result.get("status") != "success":
+        # Only returned when no connection exists
+        raise PermanentJobError(result.get("message", "Sync failed"))
+    return result
+
+
+#1. Initial sync after OAuth, all properties in parallel
+async def run_initial_sync(job: dict):
+    job_id = job["job_id"]
+    user_id = job["user_id"]
+    project_id = job["project_id"]
+
+    credentials = await get_valid_credentials(user_id, project_id)
+    if not credentials:
+        raise PermanentJobError("Could not get valid credentials for initial metrics fetch")
+
+    properties = list_properties(credentials)
+    # A retried job resumes with the properties that are not done yet
+    items = (job.get("progress") or {}).get("items")
+    if items:
+        properties = [p for p in properties if items.get(p["property_id"], {}).get("status") != "done"]
+    else:
+        set_job_items(job_id, [p["property_id"] for p in properties])
+    logging.info(f"Initial sync for project {project_id}: {len(properties)} properties to sync")
+
+    report = await sync_properties(
+        user_id, project_id, properties, job["payload"].days, credentials,
+        on_start=lambda property_id: update_job_item(job_id, property_id, "running"),
+        on_result=lambda property_id, result: update_job_item(
+            job_id, property_id, "done" if result["status"] == "success" else "error", result["message"]
+        )
+    )
+
+    # Retry the properties that failed for reasons that can pass; permanent failures stay on the progress
+    retryable = [e for e in report["errors"] if not e["permanent"]]
+    if retryable:
+        retry_after = max((e["retry_after"] or 0 for e in retryable), default=0) or None
+        raise TransientJobError(f"{len(retryable)} properties failed: {retryable[0]['message']}", retry_after)
+    if report["errors"] and not report["succeeded"]:
+        raise PermanentJobError(f"All {report['failed']} properties failed: {report['errors'][0]['message']}")
+
+
+#2. Single-property sync
+async def run_sync(job: dict):
+    await sync_property(job["user_id"], job["project_id"], job["payload"].property_id, job["payload"].days)
+
+
+#3. Token refresh
+async def run_token_refresh(job: dict):
+    user_id = job["user_id"]
+    project_id = job["project_id"]
+    result = get_supabase().table("google_analytics_credentials").select("refresh_token") \
+        .eq("user_id", user_id).eq("project_id", project_id).execute()
+    if not result.data or not result.data[0].get("refresh_token"):
+        raise PermanentJobError("No refresh token stored")
+
+    refreshed = refresh_access_token(result.data[0]["refresh_token"])
+    get_supabase().table("google_analytics_credentials").update({
+        "access_token": encrypt_token(refreshed["access_token"]),
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }).eq("user_id", user_id).eq("project_id", project_id).execute()
+    logging.info(f"Refreshed Google access token for project {project_id}")
+
+
+register_handler(GA_INITIAL_SYNC, run_initial_sync)
+register_handler(GA_SYNC, run_sync)
+register_handler(GA_TOKEN_REFRESH, run_token_refresh)
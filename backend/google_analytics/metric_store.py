@@ -0,0 +1,95 @@
+"""
+Storage for Google Analytics metrics.
+
+Property names live in ga_properties and metric names/descriptions in
+metric_catalog (once per property, with integer ids). Daily values go to
+ga_metric_facts as (project_id, metric_id, date, value), written by
+ingestion/sinks.py; zero values are not stored, so readers must treat a
+missing row as zero.
+"""
+import logging
+from datetime import datetime, timedelta
+from psycopg2.extras import execute_values
+from database import get_connection, fetch_all_rows
+from clients import get_supabase
+
+# Keep `in` filters to a reasonable size
+QUERY_CHUNK = 100
+
+
+def chunk(items: list, size: int) -> list:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def date_range(start_date: str, end_date: str) -> list:
+    """All YYYY-MM-DD dates from start_date to end_date inclusive"""
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    return [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((end - start).days + 1)]
+
+
+#1. Property and metric catalog (direct SQL, so a sync only needs the database connection)
+def save_property_info(property_id: str, display_name: str, account_name: str):
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO ga_properties (property_id, property_display_name, account_name, last_synced_at, updated_at)
+                VALUES (%s, %s, %s, now(), now())
+                ON CONFLICT (property_id) DO UPDATE
+                SET property_display_name = EXCLUDED.property_display_name,
+                    account_name = EXCLUDED.account_name,
+                    last_synced_at = now(), updated_at = now()
+                WHERE (ga_properties.property_display_name, ga_properties.account_name)
+                      IS DISTINCT FROM (EXCLUDED.property_display_name, EXCLUDED.account_name)
+            """, (property_id, display_name, account_name))
+
+def get_metric_ids(property_id: str, descriptions: dict) -> dict:
+    """
+    Returns {metric_name: metric_id} for the property, adding catalog
+    entries for metric names seen for the first time and updating
+    descriptions that changed.
+    """
+    rows = [(property_id, name, description) for name, description in descriptions.items()]
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            if rows:
+                execute_values(cursor, """
+                    INSERT INTO metric_catalog (property_id, metric_name, metric_description)
+                    VALUES %s
+                    ON CONFLICT (property_id, metric_name) DO UPDATE
+                    SET metric_description = EXCLUDED.metric_description
+                    WHERE EXCLUDED.metric_description IS NOT NULL
+                      AND metric_catalog.metric_description IS DISTINCT FROM EXCLUDED.metric_description
+                """, rows, page_size=len(rows))
+                if cursor.rowcount:
+                    logging.info(f"Added or updated {cursor.rowcount} catalog entries for property {property_id}")
+            cursor.execute("SELECT metric_name, metric_id FROM metric_catalog WHERE property_id = %s", (property_id,))
+            return dict(cursor.fetchall())
+
+
+#2. Reads
+def load_metric_facts(project_ids: list, metric_names: list = None,
+                      start_date: str = None, end_date: str = None) -> list:
+    """
+    Returns [{"project_id", "property_id", "date", "metric_name", "metric_value"}]
+    for the stored (non-zero) facts. Days without a row are zero.
+    """
+    rows = []
+    for ids in chunk(list(project_ids), QUERY_CHUNK):
+        def build_query():
+            query = get_supabase().table("ga_metric_facts") \
+                .select("project_id, date, metric_value, metric_catalog!inner(property_id, metric_name)") \
+                .in_("project_id", ids)
+            if metric_names:
+                query = query.in_("metric_catalog.metric_name", list(metric_names))
+            if start_date:
+                query = query.gte("date", start_date)
+            if end_date:
+                query = query.lte("date", end_date)
+            return query.order("project_id").order("metric_id").order("date")
+
+        for row in fetch_all_rows(build_query):
+            catalog = row.pop("metric_catalog")
+            row["property_id"] = catalog["property_id"]
+            row["metric_name"] = catalog["metric_name"]
+            rows.append(row)
+    return rows
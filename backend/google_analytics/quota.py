@@ -0,0 +1,285 @@
+"""
+Quota-aware rate limiting for the GA4 Data API.
+
+Every runReport goes through `run_report` (or `run_report_async` for the
+gRPC backend), which asks for
+`returnPropertyQuota` and feeds the returned quota state back in:
+- tokensPerHour (per property) and tokensPerProjectPerHour (per Google
+  Cloud project on that property) each get a token bucket that refills at
+  the hourly limit / 3600 and is reset to what Google reports as remaining
+  after each response, so the limiter never drifts from the server's view.
+- Request cost is a running average of the tokens reported as consumed.
+- concurrentRequests is enforced with a per-property semaphore.
+- When daily tokens or hourly server-error allowances run low the property
+  is paused until the quota resets. Waits longer than GA_QUOTA_MAX_WAIT
+  raise QuotaExhaustedError (a TransientJobError with retry_after), so a
+  queued sync is deferred instead of holding a worker thread.
+
+State is per process; every response re-syncs it to Google's numbers.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from googleapiclient.errors import HttpError
+from jobs.runner import TransientJobError
+from monitoring import track_upstream
+
+# Published GA4 standard property limits (raise them for GA4 360 properties);
+# responses report what is consumed and remaining, not the limits
+TOKENS_PER_HOUR = int(os.getenv("GA_TOKENS_PER_HOUR", "40000"))
+TOKENS_PER_PROJECT_PER_HOUR = int(os.getenv("GA_TOKENS_PER_PROJECT_PER_HOUR", "14000"))
+TOKENS_PER_DAY = int(os.getenv("GA_TOKENS_PER_DAY", "200000"))
+CONCURRENT_REQUESTS = int(os.getenv("GA_CONCURRENT_REQUESTS", "10"))
+
+# Safety margins: keep this share of each quota unused, and stay below the concurrency limit
+QUOTA_RESERVE = float(os.getenv("GA_QUOTA_RESERVE", "0.1"))
+MAX_CONCURRENT_PER_PROPERTY = int(os.getenv("GA_MAX_CONCURRENT_PER_PROPERTY", "8"))
+SERVER_ERROR_RESERVE = 2
+MAX_WAIT_SECONDS = float(os.getenv("GA_QUOTA_MAX_WAIT", "30"))
+
+# Starting guess for tokens per report until responses say otherwise
+DEFAULT_REQUEST_COST = 10.0
+COST_SMOOTHING = 0.2
+
+# Daily quotas reset at midnight Pacific time
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+
+
+class QuotaExhaustedError(TransientJobError):
+    """Raised instead of waiting when a property's quota will not allow a request soon"""
+
+
+class TokenBucket:
+    def __init__(self, per_hour: int):
+        self.reserve = per_hour * QUOTA_RESERVE
+        self.capacity = per_hour - self.reserve
+        self.rate = per_hour / 3600.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float, now: float) -> float:
+        self.refill(now)
+        return 0.0 if self.tokens >= cost else (cost - self.tokens) / self.rate
+
+    def observe(self, remaining: int, in_flight_cost: float, now: float):
+        """Reset to the remaining quota Google reported, less the reserve and requests still in flight"""
+        self.refill(now)
+        self.tokens = min(self.capacity, remaining - self.reserve - in_flight_cost)
+
+
+class PropertyQuota:
+    def __init__(self, property_id: str):
+        self.property_id = property_id
+        self.hourly = TokenBucket(TOKENS_PER_HOUR)
+        self.project_hourly = TokenBucket(TOKENS_PER_PROJECT_PER_HOUR)
+        self.semaphore = threading.BoundedSemaphore(min(MAX_CONCURRENT_PER_PROPERTY, CONCURRENT_REQUESTS))
+        self.cost = DEFAULT_REQUEST_COST
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.pause_reason = None
+        self.last_quota = {}
+        self.requests = 0
+        self.throttled_seconds = 0.0
+        self.project_ids = set()
+
+
+_quotas = {}
+_lock = threading.Lock()
+
+
+def get_property_quota(property_id: str) -> PropertyQuota:
+    with _lock:
+        if property_id not in _quotas:
+            _quotas[property_id] = PropertyQuota(property_id)
+        return _quotas[property_id]
+
+def seconds_until_daily_reset() -> float:
+    now = datetime.now(QUOTA_TIMEZONE)
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight - now).total_seconds()
+
+def seconds_until_next_hour() -> float:
+    now = time.time()
+    return 3600 - now % 3600
+
+
+#1. Before a request: wait for tokens, or give up early
+def reserve(quota: PropertyQuota) -> float:
+    """Take tokens for one request; returns the seconds to wait first"""
+    with _lock:
+        now = time.monotonic()
+        if quota.paused_until > now:
+            return quota.paused_until - now
+        wait = max(quota.hourly.wait_time(quota.cost, now), quota.project_hourly.wait_time(quota.cost, now))
+        if wait == 0:
+            quota.hourly.tokens -= quota.cost
+            quota.project_hourly.tokens -= quota.cost
+            quota.in_flight += 1
+        return wait
+
+def take_tokens(quota: PropertyQuota, waited: float, max_wait: float) -> float:
+    """Reserve tokens for one request; returns the seconds to wait before trying again (0 once reserved)"""
+    wait = reserve(quota)
+    if wait and waited + wait > max_wait:
+        raise QuotaExhaustedError(
+            f"GA quota for property {quota.property_id} is low ({quota.pause_reason or 'hourly tokens'}); "
+            f"retry in {wait:.0f}s",
+            retry_after=wait
+        )
+    return wait
+
+def acquire(property_id: str, project_id: str = None, max_wait: float = MAX_WAIT_SECONDS) -> PropertyQuota:
+    quota = get_property_quota(property_id)
+    if project_id:
+        quota.project_ids.add(project_id)
+
+    waited = 0.0
+    while wait := take_tokens(quota, waited, max_wait):
+        time.sleep(wait)
+        waited += wait
+        quota.throttled_seconds += wait
+
+    quota.semaphore.acquire()
+    return quota
+
+async def acquire_async(property_id: str, project_id: str = None,
+                        max_wait: float = MAX_WAIT_SECONDS) -> PropertyQuota:
+    """acquire() for coroutines: waits without holding a thread"""
+    quota = get_property_quota(property_id)
+    if project_id:
+        quota.project_ids.add(project_id)
+
+    waited = 0.0
+    while wait := take_tokens(quota, waited, max_wait):
+        await asyncio.sleep(wait)
+        waited += wait
+        quota.throttled_seconds += wait
+
+    # The semaphore is shared with threads; poll instead of blocking the loop
+    try:
+        while not quota.semaphore.acquire(blocking=False):
+            await asyncio.sleep(0.005)
+    except asyncio.CancelledError:
+        with _lock:
+            quota.in_flight -= 1
+        raise
+    return quota
+
+def release(quota: PropertyQuota):
+    with _lock:
+        quota.in_flight -= 1
+    quota.semaphore.release()
+
+
+#2. After a response: sync with what Google reports
+def observe(quota: PropertyQuota, property_quota: dict):
+    if not property_quota:
+        return
+    now = time.monotonic()
+    with _lock:
+        quota.requests += 1
+        quota.last_quota = property_quota
+
+        hourly = property_quota.get("tokensPerHour", {})
+        project_hourly = property_quota.get("tokensPerProjectPerHour", {})
+        daily = property_quota.get("tokensPerDay", {})
+        server_errors = property_quota.get("serverErrorsPerProjectPerHour", {})
+
+        consumed = hourly.get("consumed")
+        if consumed:
+            quota.cost = (1 - COST_SMOOTHING) * quota.cost + COST_SMOOTHING * consumed
+
+        in_flight_cost = quota.in_flight * quota.cost
+        if "remaining" in hourly:
+            quota.hourly.observe(hourly["remaining"], in_flight_cost, now)
+        if "remaining" in project_hourly:
+            quota.project_hourly.observe(project_hourly["remaining"], in_flight_cost, now)
+
+        # Pause before running out rather than after
+        if "remaining" in daily and daily["remaining"] < TOKENS_PER_DAY * QUOTA_RESERVE:
+            pause(quota, seconds_until_daily_reset(), "daily tokens")
+        elif "remaining" in server_errors and server_errors["remaining"] <= SERVER_ERROR_RESERVE:
+            pause(quota, seconds_until_next_hour(), "server errors per hour")
+
+def pause(quota: PropertyQuota, seconds: float, reason: str):
+    until = time.monotonic() + seconds
+    if until > quota.paused_until:
+        quota.paused_until = until
+        quota.pause_reason = reason
+        logging.warning(f"Pausing GA requests for property {quota.property_id} for {seconds:.0f}s ({reason})")
+
+
+#3. The wrapper every report goes through
+def run_report(analytics_data, property_id: str, body: dict, project_id: str = None) -> dict:
+    quota = acquire(property_id, project_id)
+    try:
+        with track_upstream("google_analytics", "runReport"):
+            response = analytics_data.properties().runReport(
+                property=f"properties/{property_id}",
+                body=dict(body, returnPropertyQuota=True)
+            ).execute()
+    except HttpError as e:
+        if e.resp.status == 429:
+            # Quota ran out anyway (e.g. another app on the property); back off until the hour turns
+            with _lock:
+                pause(quota, min(seconds_until_next_hour(), 600), "429 from the Data API")
+        raise
+    finally:
+        release(quota)
+
+    observe(quota, response.get("propertyQuota"))
+    return response
+
+async def run_report_async(client, property_id: str, request, project_id: str = None):
+    """
+    run_report for the async gRPC backend: `client.run_report(request)` returns
+    the RunReportResponse protobuf (see grpc_source.py); the request must ask
+    for return_property_quota.
+    """
+    from google.api_core.exceptions import ResourceExhausted
+    from google.protobuf.json_format import MessageToDict
+
+    quota = await acquire_async(property_id, project_id)
+    try:
+        with track_upstream("google_analytics", "runReport"):
+            response = await client.run_report(request)
+    except ResourceExhausted:
+        with _lock:
+            pause(quota, min(seconds_until_next_hour(), 600), "429 from the Data API")
+        raise
+    finally:
+        release(quota)
+
+    # Same camelCase shape as the REST responses
+    if response.HasField("property_quota"):
+        observe(quota, MessageToDict(response.property_quota))
+    return response
+
+
+#4. Remaining quota for monitoring
+def quota_snapshot(project_id: str = None) -> list:
+    now = time.monotonic()
+    with _lock:
+        quotas = [q for q in _quotas.values() if project_id is None or project_id in q.project_ids]
+        return [
+            {
+                "property_id": q.property_id,
+                "requests": q.requests,
+                "estimated_request_cost": round(q.cost, 1),
+                "hourly_tokens_available": round(q.hourly.tokens, 1),
+                "project_hourly_tokens_available": round(q.project_hourly.tokens, 1),
+                "paused_for_seconds": round(max(0.0, q.paused_until - now), 1),
+                "pause_reason": q.pause_reason if q.paused_until > now else None,
+                "throttled_seconds": round(q.throttled_seconds, 1),
+                "reported": q.last_quota,
+            }
+            for q in quotas
+        ]
@@ -1,48 +1,60 @@
 import os
 from dotenv import load_dotenv
-from supabase import create_client
-from cryptography.fernet import Fernet
 import logging
 from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request as google_requests
+from google_auth_httplib2 import AuthorizedHttp, Request as google_requests
+from clients import get_cipher, get_google_http, google_discovery_doc
+from tracing import google_request_builder, traced
+from logging_config import configure_logging
 
 # Load env vars from .env file
 load_dotenv()
 
 # Initialize logging
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 
-# Encryption key assign and check
-ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY")
-if not ENCRYPTION_KEY:
-    raise ValueError("Missing ENCRYPTION_KEY environment variable")
-cipher = Fernet(ENCRYPTION_KEY)
-
-# Assign .env variables
+# Assign .env variables (checked on startup, see clients.py)
 CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI")
 SCOPES = ["https://www.googleapis.com/auth/analytics.readonly"]
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY")
 JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
 
-# Validate environment variables
-if not all([CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY]):
-    raise ValueError("Missing one or more required environment variables")
-if not JWT_SECRET:
-    raise ValueError("Missing SUPABASE_JWT_SECRET environment variable")
+# Optional API endpoints, e.g. the local stand-ins in benchmarks/fake_ga_server.py
+GA_DATA_API_URL = os.getenv("GA_DATA_API_URL")
+GA_ADMIN_API_URL = os.getenv("GA_ADMIN_API_URL")
+
+# Data API transport for syncs: rest (discovery client) or grpc (async gRPC client, see grpc_source.py)
+GA_BACKEND = os.getenv("GA_BACKEND", "rest").lower()
+
+# Build a client from the shared, already parsed discovery document; requests go
+# through the shared keep-alive pool unless `http` is given (see transports.py)
+def build_client(service: str, version: str, api_endpoint: str = None, credentials=None, http=None):
+    from googleapiclient.discovery import build_from_document
+    options = {"api_endpoint": api_endpoint} if api_endpoint else None
+    if http is None:
+        http = AuthorizedHttp(credentials, http=get_google_http())
+    return build_from_document(google_discovery_doc(service, version), http=http, client_options=options,
+                               requestBuilder=google_request_builder())
+
+# Data API client (pass `http` for an AuthorizedHttp of your own instead of credentials)
+def build_data_client(credentials=None, http=None):
+    return build_client('analyticsdata', 'v1beta', GA_DATA_API_URL, credentials=credentials, http=http)
 
-# Create supabase client
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+# Admin API client
+def build_admin_client(credentials):
+    return build_client('analyticsadmin', 'v1beta', GA_ADMIN_API_URL, credentials=credentials)
 
 # Encrypt token
+@traced("fernet.encrypt")
 def encrypt_token(token: str) -> str:
-    return cipher.encrypt(token.encode()).decode()
+    return get_cipher().encrypt(token.encode()).decode()
 
 # Decrypt token
+@traced("fernet.decrypt")
 def decrypt_token(token: str) -> str:
-    return cipher.decrypt(token.encode()).decode()
+    return get_cipher().decrypt(token.encode()).decode()
 
 # Refresh an expired access token using the refresh token
 def refresh_access_token(refresh_token: str) -> dict:
@@ -54,7 +66,7 @@ def refresh_access_token(refresh_token: str) -> dict:
             client_id=CLIENT_ID,
             client_secret=CLIENT_SECRET,
         )
-        credentials.refresh(google_requests())
+        credentials.refresh(google_requests(get_google_http()))
         return {
             "access_token": credentials.token,
             "refresh_token": refresh_token
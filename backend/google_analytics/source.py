@@ -0,0 +1,226 @@
+"""
+Google Analytics as an ingestion source (see ingestion/pipeline.py).
+
+One source is one property for a project. Pages are runReport responses
+for groups of up to GA_METRICS_PER_REPORT metrics by date (paged by row
+offset), throttled by google_analytics/quota.py. Records go to
+ga_metric_facts; days a metric has no row for are written as zero, which
+removes any stored fact for that day.
+
+create_source() picks the transport by GA_BACKEND: rest (discovery
+client, this module) or grpc (async gRPC client, grpc_source.py).
+"""
+import os
+import logging
+from datetime import datetime, timedelta
+from googleapiclient.errors import HttpError
+from ingestion.pipeline import MetricSource, MetricRecord
+from ingestion.sinks import GAFactSink
+from ingestion.watermarks import catch_up_start
+from .metric_store import save_property_info, get_metric_ids, chunk, date_range
+from .quota import run_report
+from monitoring import track_upstream
+from .shared import build_data_client, build_admin_client, GA_BACKEND
+
+# The Data API accepts up to 10 metrics per report
+METRICS_PER_REPORT = int(os.getenv("GA_METRICS_PER_REPORT", "10"))
+REPORT_ROW_LIMIT = 10000
+# How far back a sync reaches to fill days missed since the last complete sync
+MAX_CATCH_UP_DAYS = int(os.getenv("GA_MAX_CATCH_UP_DAYS", "30"))
+
+# Not compatible with a plain date report
+INCOMPATIBLE_METRICS = {
+    # Cohort metrics need cohort specs
+    "cohortActiveUsers", "cohortTotalUsers", "cohortLTV",
+
+    # Ad metrics not compatible with basic dimensions
+    "advertiserAdCostPerClick", "advertiserAdCostPerKeyEvent",
+    "advertiserAdClicks", "advertiserAdCost",
+
+    # Item metrics with compatibility issues
+    "itemDiscountAmount", "grossItemRevenue", "itemListViewEvents",
+
+    # Return on ad spend metrics
+    "returnOnAdSpend"
+}
+
+
+# filter out incompatible metric and dimension combinations
+def filter_compatible_metrics(metrics, dimensions):
+    return [metric for metric in metrics if metric.get("name") not in INCOMPATIBLE_METRICS]
+
+def get_property_info(credentials, property_id: str) -> dict:
+    """Display and account name of a property, from the account summaries"""
+    try:
+        analytics_admin = build_admin_client(credentials)
+        with track_upstream("google_analytics", "accountSummaries.list"):
+            account_summaries = analytics_admin.accountSummaries().list().execute()
+        for account in account_summaries.get('accountSummaries', []):
+            for prop in account.get('propertySummaries', []):
+                if prop.get("property", "").split('/')[-1] == property_id:
+                    return {
+                        "display_name": prop.get("displayName", "Unnamed Property"),
+                        "account_name": account.get("displayName", "Unknown Account")
+                    }
+    except Exception as prop_err:
+        logging.error(f"Error getting property info: {str(prop_err)}")
+    return {"display_name": "Unknown Property", "account_name": "Unknown Account"}
+
+def parse_date(value: str) -> str:
+    # YYYYMMDD from the date dimension
+    return f"{value[0:4]}-{value[4:6]}-{value[6:8]}" if len(value) == 8 else value
+
+
+class GoogleAnalyticsSource(MetricSource):
+    name = "google_analytics"
+
+    def __init__(self, project_id: str, property_id: str, credentials, days: int = 1,
+                 metrics: list = None, analytics_data=None, property_info: dict = None):
+        super().__init__(project_id, property_id)
+        self.property_id = property_id
+        self.credentials = credentials
+        self.days = days
+        # Metric names to sync; default is every compatible metric of the property
+        self.metrics = metrics
+        self._analytics_data = analytics_data
+        self.property_info = property_info
+        self.skipped = []
+        # Dates seen per metric for the report being paged through
+        self._seen = {}
+
+    @property
+    def analytics_data(self):
+        # Data API (REST) client, built on first use
+        if self._analytics_data is None:
+            self._analytics_data = build_data_client(self.credentials)
+        return self._analytics_data
+
+    #1. Window: complete days only (ending 2 days ago), reaching back to the watermark
+    def window(self) -> tuple:
+        end_date = datetime.now() - timedelta(days=2)
+        start_date = end_date - timedelta(days=self.days - 1) if self.days > 1 else end_date
+        start, end = start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
+        try:
+            start = catch_up_start(self.project_id, self.name, self.stream_key, start, end, MAX_CATCH_UP_DAYS)
+        except Exception as e:
+            logging.error(f"Error reading GA watermark: {str(e)}")
+        return start, end
+
+    #2. Property names and metric catalog
+    def prepare(self) -> GAFactSink:
+        with track_upstream("google_analytics", "getMetadata"):
+            metadata = self.analytics_data.properties().getMetadata(
+                name=f"properties/{self.property_id}/metadata"
+            ).execute()
+        descriptions = {
+            metric["apiName"]: metric.get("description", "No description available")
+            for metric in metadata.get("metrics", [])
+        }
+        return self.prepare_sink(descriptions)
+
+    def prepare_sink(self, descriptions: dict) -> GAFactSink:
+        """Store property names and the metric catalog; `descriptions` maps metric API names to descriptions"""
+        if not self.property_info:
+            self.property_info = get_property_info(self.credentials, self.property_id)
+        self.property_info.setdefault("display_name", "Unnamed Property")
+        self.property_info.setdefault("account_name", "Unknown Account")
+
+        if self.metrics is None:
+            self.metrics = list(descriptions)
+        self.metrics = [m["name"] for m in filter_compatible_metrics(
+            [{"name": name} for name in self.metrics], [{"name": "date"}])]
+        logging.info(f"Syncing {len(self.metrics)} metrics for property {self.property_id}")
+
+        save_property_info(self.property_id, self.property_info["display_name"], self.property_info["account_name"])
+        metric_ids = get_metric_ids(self.property_id, {name: descriptions.get(name) for name in self.metrics})
+        return GAFactSink(self.project_id, metric_ids)
+
+    #3. Fetch: one report per metric group
+    def pages(self, start_date: str, end_date: str):
+        for group in chunk(self.metrics, METRICS_PER_REPORT):
+            yield from self.report_pages(group, start_date, end_date)
+
+    def report_pages(self, group: list, start_date: str, end_date: str):
+        offset = 0
+        while True:
+            body = {
+                "dateRanges": [{"startDate": start_date, "endDate": end_date}],
+                "metrics": [{"name": name} for name in group],
+                "dimensions": [{"name": "date"}],
+                "keepEmptyRows": False,  # Days without data are zero and are not stored
+                "limit": REPORT_ROW_LIMIT,
+                "offset": offset
+            }
+            try:
+                response = run_report(self.analytics_data, self.property_id, body, self.project_id)
+            except HttpError as e:
+                if e.resp.status != 400 or offset:
+                    raise
+                if len(group) > 1:
+                    # One incompatible metric fails the whole report; find it by asking one by one
+                    for name in group:
+                        yield from self.report_pages([name], start_date, end_date)
+                    return
+                logging.info(f"Skipping metric {group[0]} for property {self.property_id}: {str(e)}")
+                self.skipped.append(group[0])
+                return
+
+            rows = response.get("rows", [])
+            offset += len(rows)
+            last = not rows or offset >= response.get("rowCount", 0)
+            yield {"response": response, "metrics": group, "start": start_date, "end": end_date, "last": last}
+            if last:
+                return
+
+    def details(self) -> dict:
+        property_info = self.property_info or {}
+        return {
+            "property_info": {
+                "display_name": property_info.get("display_name", "Unknown Property"),
+                "account_name": property_info.get("account_name", "Unknown Account"),
+            },
+            "skipped_metrics": list(self.skipped),
+        }
+
+    #4. Normalize rows to records, with zeros for the days a report has no row for
+    def response_values(self, response):
+        """(YYYYMMDD, metric, value string) for every cell of a runReport response"""
+        headers = [h.get("name") for h in response.get("metricHeaders", [])]
+        for row in response.get("rows", []):
+            day = row["dimensionValues"][0]["value"]
+            for name, metric in zip(headers, row.get("metricValues", [])):
+                yield day, name, metric.get("value", 0)
+
+    def normalize(self, page: dict) -> list:
+        records = []
+        for day, name, value in self.response_values(page["response"]):
+            try:
+                value = float(value)
+            except ValueError:
+                continue
+            day = parse_date(day)
+            records.append(MetricRecord(day, name, value))
+            self._seen.setdefault(name, set()).add(day)
+
+        if page["last"]:
+            for name in page["metrics"]:
+                seen = self._seen.pop(name, set())
+                records.extend(
+                    MetricRecord(day, name, 0.0)
+                    for day in date_range(page["start"], page["end"]) if day not in seen
+                )
+        return records
+
+
+#5. Backend selection (GA_BACKEND)
+def create_source(project_id: str, property_id: str, credentials, days: int = 1, metrics: list = None,
+                  analytics_data=None, property_info: dict = None) -> GoogleAnalyticsSource:
+    """GoogleAnalyticsSource over REST (default), or over the async gRPC client with GA_BACKEND=grpc"""
+    if GA_BACKEND == "grpc":
+        from .grpc_source import GrpcGoogleAnalyticsSource
+        return GrpcGoogleAnalyticsSource(project_id, property_id, credentials, days=days, metrics=metrics,
+                                         property_info=property_info)
+    if GA_BACKEND != "rest":
+        raise ValueError(f"Unknown GA_BACKEND {GA_BACKEND!r}; use rest or grpc")
+    return GoogleAnalyticsSource(project_id, property_id, credentials, days=days, metrics=metrics,
+                                 analytics_data=analytics_data, property_info=property_info)
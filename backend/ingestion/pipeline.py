@@ -0,0 +1,294 @@
+"""
+Streaming ingestion pipeline shared by every metric source.
+
+    fetch pages -> normalize to (date, metric, value) -> batch -> write-behind buffer -> watermark, sync run
+
+Each stage runs as its own task and hands work to the next over a bounded
+asyncio.Queue, so a slow writer holds fetching back instead of the whole
+sync being buffered in memory. Blocking API calls and database writes run
+in threads. Sources (google_analytics/source.py, stripe_data/source.py)
+only implement MetricSource; batching, writing, cache invalidation and
+watermarks live here and in ingestion/sinks.py, so every source gets them.
+Batches are written together with other syncs' batches by the process's
+write-behind buffer (ingestion/write_behind.py), and a sync waits for its
+rows to be committed before its watermark moves. Sinks only write values
+that changed; each sync is recorded once in sync_runs (ingestion/runs.py).
+Start, progress and completion of each sync are published to the project's
+live event stream (events/broker.py).
+"""
+import os
+import time
+import asyncio
+import inspect
+import logging
+from datetime import datetime, timezone
+from typing import NamedTuple
+from metric_cache import bump_sync_version
+from monitoring import record_sync
+from tracing import span
+from logging_config import SampledLogger
+from events.broker import publish, EVENTS_PROGRESS_INTERVAL
+from .watermarks import set_watermark
+from .runs import record_sync_run
+from . import write_behind
+from .singleflight import coalesce, advisory_lock
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+
+# End of stream marker passed down the queues
+_DONE = object()
+
+# Per-page and per-batch lines are sampled (LOG_SAMPLE_RATES); each run ends with one summary line
+log = logging.getLogger("ingestion")
+detail_log = SampledLogger("ingestion.detail")
+
+
+class MetricRecord(NamedTuple):
+    date: str  # YYYY-MM-DD
+    metric: str
+    value: float
+
+
+class MetricSource:
+    """
+    One stream of metrics (a GA property, a Stripe account) for a project.
+    Methods other than normalize() may block; the pipeline runs them in threads.
+    prepare() may instead be a coroutine and pages() an async generator
+    (google_analytics/grpc_source.py); those run on the event loop.
+    """
+    name = "source"
+
+    def __init__(self, project_id: str, stream_key: str):
+        self.project_id = project_id
+        self.stream_key = stream_key
+
+    def window(self) -> tuple:
+        """(start_date, end_date) to sync, as YYYY-MM-DD"""
+        raise NotImplementedError
+
+    def prepare(self):
+        """Look up catalog data and return the sink records are written to"""
+        raise NotImplementedError
+
+    def pages(self, start_date: str, end_date: str):
+        """Generator (or async generator) of raw API pages"""
+        raise NotImplementedError
+
+    def normalize(self, page) -> list:
+        """MetricRecords for one page"""
+        raise NotImplementedError
+
+    def details(self) -> dict:
+        """Source-specific results for the sync report"""
+        return {}
+
+    def complete(self) -> bool:
+        """False when the source skipped part of the window; the run is then partial and the watermark stays"""
+        return True
+
+
+#1. Stages
+async def fetch_stage(source: MetricSource, start_date: str, end_date: str,
+                      pages_queue: asyncio.Queue, stats: dict):
+    pages = source.pages(start_date, end_date)
+    is_async = hasattr(pages, "__anext__")
+    progress_at = time.monotonic()
+    try:
+        while True:
+            if is_async:
+                page = await anext(pages, _DONE)
+            else:
+                page = await asyncio.to_thread(next, pages, _DONE)
+            if page is _DONE:
+                break
+            stats["pages"] += 1
+            detail_log.info(f"{source.name} {source.stream_key}: fetched page {stats['pages']}",
+                            extra={"source": source.name, "stream": source.stream_key, "page": stats["pages"]})
+            if time.monotonic() - progress_at >= EVENTS_PROGRESS_INTERVAL:
+                progress_at = time.monotonic()
+                publish(source.project_id, "sync-progress", {"source": source.name, "stream": source.stream_key,
+                                                             "pages": stats["pages"], "records": stats["records"]})
+            # Blocks while the later stages are behind
+            await pages_queue.put(page)
+    except Exception as e:
+        # Let what was already fetched be written, then report the error
+        stats["error"] = e
+    finally:
+        # Also when cancelled, so an async source stops its requests
+        if is_async:
+            await pages.aclose()
+    if not is_async:
+        pages.close()
+    await pages_queue.put(_DONE)
+
+async def normalize_stage(source: MetricSource, pages_queue: asyncio.Queue,
+                          records_queue: asyncio.Queue, stats: dict):
+    while (page := await pages_queue.get()) is not _DONE:
+        records = source.normalize(page)
+        if records:
+            stats["records"] += len(records)
+            await records_queue.put(records)
+    await records_queue.put(_DONE)
+
+async def write_stage(sink, records_queue: asyncio.Queue, batch_size: int, stats: dict):
+    # Batches go to the process's write-behind buffer and are written with other syncs' batches;
+    # sinks without a table (benchmark stand-ins) or WRITE_BEHIND=0 write each batch here
+    buffer = write_behind.get_write_behind() if write_behind.WRITE_BEHIND and getattr(sink, "table", None) else None
+    # (batch number, records, Future of its counts) handed to the buffer
+    pending = []
+
+    def count(number: int, records: int, counts: dict):
+        stats["written"] += counts.get("written", 0)
+        stats["unchanged"] += counts.get("unchanged", 0)
+        stats["deleted"] += counts.get("deleted", 0)
+        detail_log.info(f"Wrote batch {number} ({records} records)",
+                        extra={"batch": number, "records": records, **counts})
+
+    async def flush(batch):
+        stats["batches"] += 1
+        if buffer is None:
+            count(stats["batches"], len(batch), await asyncio.to_thread(sink.write, batch))
+            return
+        # Stop early if a batch of this sync already failed
+        for _, _, future in pending:
+            if future.done() and future.exception() is not None:
+                raise future.exception()
+        rows = sink.rows(batch)
+        # Blocks while the buffer is full
+        future = await asyncio.to_thread(buffer.submit, sink.table, rows)
+        pending.append((stats["batches"], len(batch), future))
+
+    batch = []
+    while (records := await records_queue.get()) is not _DONE:
+        batch.extend(records)
+        while len(batch) >= batch_size:
+            await flush(batch[:batch_size])
+            batch = batch[batch_size:]
+    if batch:
+        await flush(batch)
+
+    # The sync is done (and its watermark may advance) once all its rows are committed
+    for number, records, future in pending:
+        count(number, records, await asyncio.wrap_future(future))
+
+
+#2. Running a source
+async def run_pipeline(source: MetricSource, batch_size: int = INGEST_BATCH_SIZE,
+                       queue_size: int = INGEST_QUEUE_SIZE) -> dict:
+    """
+    Sync one source. Returns a report; a fetch error does not raise but is
+    returned as report["error"] after the pages fetched before it are
+    written. The watermark only advances when the whole window was synced.
+    Concurrent syncs of the same stream and window run once and share the
+    report (report["coalesced"] is True for the callers that waited; see
+    ingestion/singleflight.py).
+    """
+    start_date, end_date = await asyncio.to_thread(source.window)
+    key = (source.name, source.project_id, source.stream_key, start_date, end_date)
+    report, coalesced = await coalesce(key, lambda: sync_window(source, key, batch_size, queue_size))
+    if coalesced:
+        log.info(f"{source.name} sync {source.stream_key} for project {source.project_id}: "
+                 f"joined the sync in flight ({report['status']})",
+                 extra={"project_id": source.project_id, "source": source.name, "stream": source.stream_key,
+                        "start_date": start_date, "end_date": end_date, "coalesced": True})
+        return dict(report, coalesced=True)
+    return report
+
+async def sync_window(source: MetricSource, key: tuple, batch_size: int, queue_size: int) -> dict:
+    started, started_at = time.perf_counter(), datetime.now(timezone.utc)
+    start_date, end_date = key[-2:]
+    attributes = {"source": source.name, "stream": source.stream_key, "project_id": source.project_id}
+    stats = {"pages": 0, "records": 0, "batches": 0, "written": 0, "unchanged": 0, "deleted": 0,
+             "error": None}
+    async with advisory_lock(key, source) as synced_elsewhere:
+        if synced_elsewhere:
+            # Another process synced this window while we waited for its lock
+            report = sync_report(source, start_date, end_date, stats, started, coalesced=True)
+            log.info(f"{source.name} sync {source.stream_key} for project {source.project_id}: "
+                     f"synced by another process", extra={"project_id": source.project_id, **report_fields(report)})
+            return report
+        publish(source.project_id, "sync-started", {"source": source.name, "stream": source.stream_key,
+                                                    "start_date": start_date, "end_date": end_date})
+        await run_stages(source, start_date, end_date, batch_size, queue_size, stats, attributes)
+
+        # Invalidate cached metric history for this project
+        if stats["written"] or stats["deleted"]:
+            try:
+                bump_sync_version(source.project_id)
+            except Exception as version_err:
+                logging.error(f"Error bumping sync version: {str(version_err)}")
+
+        if stats["error"] is None and source.complete():
+            try:
+                set_watermark(source.project_id, source.name, source.stream_key, end_date)
+            except Exception as watermark_err:
+                logging.error(f"Error updating {source.name} watermark: {str(watermark_err)}")
+
+    report = sync_report(source, start_date, end_date, stats, started)
+    log.info(f"{source.name} sync {source.stream_key} for project {source.project_id}: "
+             f"{report['pages']} pages, {report['written']} written, {report['unchanged']} unchanged, "
+             f"{report['deleted']} removed in {report['seconds']}s ({report['status']})",
+             extra={"project_id": source.project_id, "start_date": start_date, "end_date": end_date,
+                    **report_fields(report)})
+    record_sync(report)
+    publish(source.project_id, "sync-completed", event_fields(report))
+    try:
+        await asyncio.to_thread(record_sync_run, source.project_id, report, started_at)
+    except Exception as run_err:
+        logging.error(f"Error recording {source.name} sync run: {str(run_err)}")
+    return report
+
+async def run_stages(source: MetricSource, start_date: str, end_date: str, batch_size: int, queue_size: int,
+                     stats: dict, attributes: dict):
+    with span("ingestion.prepare", **attributes):
+        if inspect.iscoroutinefunction(source.prepare):
+            sink = await source.prepare()
+        else:
+            sink = await asyncio.to_thread(source.prepare)
+
+    pages_queue = asyncio.Queue(maxsize=queue_size)
+    records_queue = asyncio.Queue(maxsize=queue_size)
+    with span("ingestion.sync", start_date=start_date, end_date=end_date, **attributes) as current:
+        try:
+            async with asyncio.TaskGroup() as group:
+                group.create_task(fetch_stage(source, start_date, end_date, pages_queue, stats))
+                group.create_task(normalize_stage(source, pages_queue, records_queue, stats))
+                group.create_task(write_stage(sink, records_queue, batch_size, stats))
+        except* Exception as errors:
+            # A normalize or write failure; fetch errors are kept in stats
+            stats["error"] = errors.exceptions[0]
+        current.set_attribute("records", stats["records"])
+        if stats["error"] is not None:
+            current.record_exception(stats["error"])
+
+def sync_report(source: MetricSource, start_date: str, end_date: str, stats: dict, started: float,
+                coalesced: bool = False) -> dict:
+    return {
+        "status": "success" if stats["error"] is None and source.complete() else (
+            "partial" if stats["written"] or stats["unchanged"] else "error"),
+        "source": source.name,
+        "stream": source.stream_key,
+        "date_range": {"start": start_date, "end": end_date},
+        "pages": stats["pages"],
+        "records": stats["records"],
+        "batches": stats["batches"],
+        "written": stats["written"],
+        "unchanged": stats["unchanged"],
+        "deleted": stats["deleted"],
+        "seconds": round(time.perf_counter() - started, 3),
+        "error": stats["error"],
+        "coalesced": coalesced,
+        # Source-specific results (e.g. GA property names, failed Stripe sections)
+        "details": source.details(),
+    }
+
+def report_fields(report: dict) -> dict:
+    """Report entries for structured log lines"""
+    return {key: value for key, value in report.items() if key not in ("date_range", "error", "details")}
+
+def event_fields(report: dict) -> dict:
+    """Report entries for the sync-completed event"""
+    error = report["error"]
+    return dict(report_fields(report), start_date=report["date_range"]["start"], end_date=report["date_range"]["end"],
+                error=f"{type(error).__name__}: {str(error)[:500]}" if error is not None else None)
@@ -0,0 +1,43 @@
+"""
+One row per sync in sync_runs (see migrations/008_sync_runs.sql): when each
+stream of a project was last synced, over which window and with what
+outcome. This is where freshness lives now that metric rows are only
+written when their value changes.
+"""
+from database import get_connection
+
+
+def record_sync_run(project_id: str, report: dict, started_at):
+    error = report["error"]
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO sync_runs (project_id, source, stream_key, start_date, end_date, status, pages,
+                                       records, written, unchanged, deleted, error, started_at, finished_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, now())
+            """, (project_id, report["source"], report["stream"], report["date_range"]["start"],
+                  report["date_range"]["end"], report["status"], report["pages"], report["records"],
+                  report["written"], report["unchanged"], report["deleted"],
+                  str(error) if error is not None else None, started_at))
+
+def latest_sync_runs(project_id: str) -> list:
+    """The most recent run of each stream of the project, newest first"""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT DISTINCT ON (source, stream_key)
+                       source, stream_key, start_date, end_date, status, written, unchanged, deleted, finished_at,
+                       (SELECT max(s.finished_at) FROM sync_runs s
+                        WHERE s.project_id = r.project_id AND s.source = r.source
+                          AND s.stream_key = r.stream_key AND s.status = 'success') AS last_success_at
+                FROM sync_runs r
+                WHERE project_id = %s
+                ORDER BY source, stream_key, finished_at DESC
+            """, (project_id,))
+            columns = [column.name for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    for row in rows:
+        for field in ("start_date", "end_date", "finished_at", "last_success_at"):
+            if row[field] is not None:
+                row[field] = row[field].isoformat()
+    return sorted(rows, key=lambda row: row["finished_at"], reverse=True)
@@ -0,0 +1,163 @@
+"""
+Coalescing of concurrent syncs of the same stream and date range.
+
+Project members, the frontend, schedulers and jobs can all ask for the
+same sync at once. run_pipeline() passes every sync through coalesce()
+with the key (source, project, stream, start date, end date):
+
+    in process        the first caller runs the sync; callers arriving
+                      while it runs wait for it and get the same report
+                      (from any thread or event loop), marked coalesced
+    across processes  the running caller holds a Postgres advisory lock on
+                      the key. A caller in another process waits for the
+                      lock; when the holder's sync completed the window in
+                      the meantime (its watermark reached end_date) the
+                      caller is done without fetching anything, otherwise
+                      it syncs as usual
+
+The locks are session locks on one autocommit connection per process
+(database.get_lock_connection), polled every SYNC_LOCK_POLL_SECONDS for up
+to SYNC_LOCK_TIMEOUT seconds before SyncInProgressError (a transient job
+error). If the database cannot be reached for the lock, syncs are only
+coalesced in process. SYNC_LOCKS=0 turns the advisory locks off (one
+process, or no database as in the benchmarks); SYNC_COALESCE=0 turns
+coalescing off altogether.
+"""
+import os
+import asyncio
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from database import get_lock_connection, discard_lock_connection
+from jobs.runner import TransientJobError
+from .watermarks import watermark_reached_since
+
+SYNC_COALESCE = os.getenv("SYNC_COALESCE", "1") == "1"
+SYNC_LOCKS = os.getenv("SYNC_LOCKS", "1") == "1"
+SYNC_LOCK_POLL_SECONDS = float(os.getenv("SYNC_LOCK_POLL_SECONDS", "0.5"))
+SYNC_LOCK_TIMEOUT = float(os.getenv("SYNC_LOCK_TIMEOUT", "600"))
+
+# key -> Future of the report of the sync in flight
+_flights = {}
+_flights_lock = threading.Lock()
+# The lock connection runs one statement at a time
+_connection_lock = threading.Lock()
+
+
+class SyncInProgressError(TransientJobError):
+    """Another process held the same sync past SYNC_LOCK_TIMEOUT"""
+
+class LeaderCancelled(Exception):
+    """The sync being waited on was cancelled; a waiting caller runs it instead"""
+
+
+def lock_id(key: tuple) -> int:
+    """Signed 64-bit advisory lock id for a key"""
+    digest = hashlib.blake2b("|".join(map(str, key)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+#1. Advisory locks (across processes)
+def run_on_lock_connection(query: str, lock: int) -> tuple:
+    with _connection_lock:
+        conn = get_lock_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(query, (lock,))
+                return cursor.fetchone()
+        except Exception:
+            discard_lock_connection()
+            raise
+
+def try_advisory_lock(lock: int) -> tuple:
+    """(acquired, database time of the attempt)"""
+    return run_on_lock_connection("SELECT pg_try_advisory_lock(%s), now()", lock)
+
+def advisory_unlock(lock: int):
+    run_on_lock_connection("SELECT pg_advisory_unlock(%s)", lock)
+
+@asynccontextmanager
+async def advisory_lock(key: tuple, source):
+    """
+    Hold the key's advisory lock for the block. Yields True when another
+    process synced the window (key[-1] is its end date) while this one waited.
+    """
+    lock = lock_id(key)
+    acquired = None
+    if SYNC_COALESCE and SYNC_LOCKS:
+        try:
+            acquired, waiting_since = await asyncio.to_thread(try_advisory_lock, lock)
+        except Exception as e:
+            logging.warning(f"No sync lock for {source.name} {source.stream_key}, coalescing in process only: "
+                            f"{str(e)}")
+    if acquired is None:
+        yield False
+        return
+
+    waited = 0.0
+    while not acquired:
+        if waited >= SYNC_LOCK_TIMEOUT:
+            raise SyncInProgressError(
+                f"{source.name} {source.stream_key} for project {source.project_id} is being synced by another "
+                f"process", retry_after=SYNC_LOCK_POLL_SECONDS * 10
+            )
+        await asyncio.sleep(SYNC_LOCK_POLL_SECONDS)
+        waited += SYNC_LOCK_POLL_SECONDS
+        acquired, _ = await asyncio.to_thread(try_advisory_lock, lock)
+
+    try:
+        synced = False
+        if waited:
+            synced = await asyncio.to_thread(watermark_reached_since, source.project_id, source.name,
+                                             source.stream_key, key[-1], waiting_since)
+        yield synced
+    finally:
+        try:
+            await asyncio.to_thread(advisory_unlock, lock)
+        except Exception as e:
+            logging.error(f"Error releasing sync lock: {str(e)}")
+
+
+#2. Single flight (in process)
+async def coalesce(key: tuple, run) -> tuple:
+    """
+    Await `run()` unless a sync with the same key is in flight, in which case
+    wait for that one instead. Returns (report, coalesced).
+    """
+    if not SYNC_COALESCE:
+        return await run(), False
+
+    while True:
+        with _flights_lock:
+            flight = _flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _flights[key] = Future()
+        if leader:
+            break
+        try:
+            # Shielded: a waiting caller that goes away must not cancel the sync for the others
+            return await asyncio.shield(asyncio.wrap_future(flight)), True
+        except LeaderCancelled:
+            continue
+
+    def land():
+        # Callers arriving from now on start a new sync
+        with _flights_lock:
+            _flights.pop(key, None)
+
+    try:
+        report = await run()
+    except asyncio.CancelledError:
+        land()
+        flight.set_exception(LeaderCancelled())
+        raise
+    except BaseException as e:
+        land()
+        flight.set_exception(e)
+        raise
+    land()
+    flight.set_result(report)
+    return report, False
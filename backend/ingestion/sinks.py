@@ -0,0 +1,174 @@
+"""
+Batch writers for the ingestion pipeline. A sink turns MetricRecords into
+rows keyed by their primary key (rows()); write_rows() stores the rows of
+one or more batches of the same table with set-based statements in one
+transaction and returns {"written": n, "unchanged": n, "deleted": n} per
+batch. The pipeline hands batches to the write-behind buffer
+(ingestion/write_behind.py), which writes batches of many syncs together;
+write() stores a single batch directly.
+
+Most of a sync re-reads days that are already stored with the same values,
+so rows are only inserted or updated when the value differs from the
+stored one (IS DISTINCT FROM in the statement itself, no read round trip);
+unchanged rows get no new row version, WAL or index entries. When a stream
+was last synced is kept once per sync in sync_runs (ingestion/runs.py),
+not stamped on every metric row.
+
+Every row carries the index of the batch it came from, and the statements
+return it for the rows they changed, so the counts are per batch even when
+several syncs share one statement.
+"""
+import logging
+from collections import Counter
+from psycopg2.extras import execute_values
+from database import get_connection
+
+
+class MetricSink:
+    table = None
+
+    def rows(self, records: list) -> dict:
+        """{primary key: row} for a batch; the last record wins if a batch repeats a key"""
+        raise NotImplementedError
+
+    def write(self, records: list) -> dict:
+        return write_rows(self.table, [self.rows(records)])[0]
+
+
+#1. Google Analytics facts (sparse: a zero value removes the row)
+class GAFactSink(MetricSink):
+    table = "ga_metric_facts"
+
+    def __init__(self, project_id: str, metric_ids: dict):
+        self.project_id = project_id
+        self.metric_ids = metric_ids
+
+    def rows(self, records: list) -> dict:
+        rows = {}
+        for record in records:
+            metric_id = self.metric_ids.get(record.metric)
+            if metric_id is None:
+                logging.error(f"Metric {record.metric} missing from catalog")
+                continue
+            rows[(self.project_id, metric_id, record.date)] = record.value
+        return rows
+
+def write_ga_facts(cursor, rows: list) -> dict:
+    """rows: (batch, (project_id, metric_id, date), value); returns {count: Counter of rows per batch}"""
+    upserts = [(batch, *key, value) for batch, key, value in rows if value]
+    zeros = [(batch, *key) for batch, key, value in rows if not value]
+    written, deleted = Counter(), Counter()
+    if upserts:
+        written.update(batch for batch, in execute_values(cursor, """
+            WITH v (batch, project_id, metric_id, date, metric_value) AS (VALUES %s),
+            upserted AS (
+                INSERT INTO ga_metric_facts (project_id, metric_id, date, metric_value)
+                SELECT project_id, metric_id, date, metric_value FROM v
+                ON CONFLICT (project_id, metric_id, date)
+                DO UPDATE SET metric_value = EXCLUDED.metric_value
+                WHERE ga_metric_facts.metric_value IS DISTINCT FROM EXCLUDED.metric_value
+                RETURNING project_id, metric_id, date
+            )
+            SELECT v.batch FROM upserted JOIN v USING (project_id, metric_id, date)
+        """, upserts, template="(%s, %s::uuid, %s::int, %s::date, %s::double precision)",
+            page_size=len(upserts), fetch=True))
+    if zeros:
+        deleted.update(batch for batch, in execute_values(cursor, """
+            WITH z (batch, project_id, metric_id, date) AS (VALUES %s),
+            removed AS (
+                DELETE FROM ga_metric_facts f
+                USING z
+                WHERE f.project_id = z.project_id AND f.metric_id = z.metric_id AND f.date = z.date
+                RETURNING f.project_id, f.metric_id, f.date
+            )
+            SELECT z.batch FROM removed JOIN z USING (project_id, metric_id, date)
+        """, zeros, template="(%s, %s::uuid, %s::int, %s::date)", page_size=len(zeros), fetch=True))
+    # Zeros that were not stored count as neither
+    unchanged = Counter(batch for batch, *_ in upserts) - written
+    return {"written": written, "unchanged": unchanged, "deleted": deleted}
+
+
+#2. Stripe metrics (one row per metric and day, zeros included)
+class StripeMetricSink(MetricSink):
+    table = "stripe_metrics"
+
+    def __init__(self, user_id: str, project_id: str, account_name: str, descriptions: dict):
+        self.user_id = user_id
+        self.project_id = project_id
+        self.account_name = account_name
+        # Filled in by the source while normalizing, before records reach the sink
+        self.descriptions = descriptions
+
+    def rows(self, records: list) -> dict:
+        rows = {}
+        for record in records:
+            rows[(self.user_id, self.project_id, record.date, record.metric)] = (
+                record.value, self.account_name, self.descriptions.get(record.metric))
+        return rows
+
+def write_stripe_metrics(cursor, rows: list) -> dict:
+    """rows: (batch, (user_id, project_id, date, metric_name), (value, account_name, description))"""
+    written = Counter()
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS stripe_metric_rows (
+            batch INTEGER, user_id TEXT, project_id UUID, date DATE, metric_name TEXT,
+            metric_value DOUBLE PRECISION, account_name TEXT, metric_description TEXT
+        ) ON COMMIT DELETE ROWS
+    """)
+    execute_values(cursor, "INSERT INTO stripe_metric_rows VALUES %s",
+                   [(batch, *key, *values) for batch, key, values in rows], page_size=len(rows))
+    cursor.execute("""
+        UPDATE stripe_metrics s
+        SET metric_value = b.metric_value, last_synced_at = now()
+        FROM stripe_metric_rows b
+        WHERE s.user_id = b.user_id AND s.project_id = b.project_id
+          AND s.date = b.date AND s.metric_name = b.metric_name
+          AND s.metric_value IS DISTINCT FROM b.metric_value
+        RETURNING b.batch
+    """)
+    written.update(batch for batch, in cursor.fetchall())
+    cursor.execute("""
+        WITH inserted AS (
+            INSERT INTO stripe_metrics (user_id, project_id, date, metric_name, metric_value,
+                                        account_name, metric_description, first_synced_at, last_synced_at)
+            SELECT b.user_id, b.project_id, b.date, b.metric_name, b.metric_value, b.account_name,
+                   b.metric_description, now(), now()
+            FROM stripe_metric_rows b
+            WHERE NOT EXISTS (
+                SELECT 1 FROM stripe_metrics s
+                WHERE s.user_id = b.user_id AND s.project_id = b.project_id
+                  AND s.date = b.date AND s.metric_name = b.metric_name
+            )
+            RETURNING user_id, project_id, date, metric_name
+        )
+        SELECT b.batch FROM inserted JOIN stripe_metric_rows b USING (user_id, project_id, date, metric_name)
+    """)
+    written.update(batch for batch, in cursor.fetchall())
+    unchanged = Counter(batch for batch, _, _ in rows) - written
+    return {"written": written, "unchanged": unchanged, "deleted": Counter()}
+
+
+TABLE_WRITERS = {
+    "ga_metric_facts": write_ga_facts,
+    "stripe_metrics": write_stripe_metrics,
+}
+
+def write_rows(table: str, batches: list) -> list:
+    """
+    Store the rows of several batches ({primary key: row} each, oldest first)
+    in one transaction; a key in more than one batch is written from the
+    last one. Returns the counts of each batch.
+    """
+    merged = {}
+    for batch, rows in enumerate(batches):
+        for key, row in rows.items():
+            merged[key] = (batch, row)
+    # In key order, so concurrent writers lock rows in the same order
+    rows = [(batch, key, row) for key, (batch, row) in sorted(merged.items())]
+
+    counts = {"written": Counter(), "unchanged": Counter(), "deleted": Counter()}
+    if rows:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                counts = TABLE_WRITERS[table](cursor, rows)
+    return [{name: counter[batch] for name, counter in counts.items()} for batch in range(len(batches))]
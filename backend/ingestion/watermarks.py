@@ -0,0 +1,67 @@
+"""
+Per-stream sync watermarks: the last date a source synced completely for a
+project (see migrations/007_ingestion_watermarks.sql). Sources use them to
+catch up on days missed while syncs were not running.
+"""
+from datetime import date, datetime, timedelta
+from database import get_connection
+
+
+def get_watermark(project_id: str, source: str, stream_key: str):
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT watermark FROM ingestion_watermarks
+                WHERE project_id = %s AND source = %s AND stream_key = %s
+            """, (project_id, source, stream_key))
+            row = cursor.fetchone()
+    return row[0] if row else None
+
+def set_watermark(project_id: str, source: str, stream_key: str, watermark: str):
+    # Never moves backwards, so re-syncing an old day does not trigger another catch-up
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO ingestion_watermarks (project_id, source, stream_key, watermark)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (project_id, source, stream_key) DO UPDATE
+                SET watermark = GREATEST(ingestion_watermarks.watermark, EXCLUDED.watermark),
+                    updated_at = now()
+            """, (project_id, source, stream_key, watermark))
+
+def get_watermarks(project_ids: list, source: str) -> dict:
+    """Returns {project_id: {stream_key: watermark}} for the source's streams of the given projects"""
+    watermarks = {}
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT project_id::text, stream_key, watermark FROM ingestion_watermarks
+                WHERE project_id = ANY(%s::uuid[]) AND source = %s
+            """, (list(project_ids), source))
+            for project_id, stream_key, watermark in cursor.fetchall():
+                watermarks.setdefault(project_id, {})[stream_key] = watermark
+    return watermarks
+
+def watermark_reached_since(project_id: str, source: str, stream_key: str, end_date: str, since) -> bool:
+    """Whether a sync finished after `since` (a database timestamp) with the watermark at end_date or later"""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT 1 FROM ingestion_watermarks
+                WHERE project_id = %s AND source = %s AND stream_key = %s
+                  AND watermark >= %s AND updated_at >= %s
+            """, (project_id, source, stream_key, end_date, since))
+            return cursor.fetchone() is not None
+
+def catch_up_start(project_id: str, source: str, stream_key: str, start_date: str, end_date: str,
+                   max_days: int) -> str:
+    """
+    Move start_date back to the day after the watermark when days were missed,
+    keeping the window at most max_days long.
+    """
+    start = datetime.strptime(start_date, "%Y-%m-%d").date()
+    end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    watermark = get_watermark(project_id, source, stream_key)
+    if isinstance(watermark, date) and watermark + timedelta(days=1) < start:
+        start = max(watermark + timedelta(days=1), end - timedelta(days=max_days - 1))
+    return start.strftime("%Y-%m-%d")
@@ -0,0 +1,135 @@
+"""
+Write-behind buffer for metric rows, one per process.
+
+The write stage of every sync in the process (API requests, jobs, fan-out
+threads) hands its batches to the buffer and keeps fetching. A flusher
+thread writes the buffered batches of a table together, in one
+transaction with one statement per kind of change (ingestion/sinks.py),
+when the table has WRITE_BEHIND_ROWS rows buffered or its oldest batch
+waited WRITE_BEHIND_MAX_AGE seconds. Many small syncs (a Stripe day, a
+GA property with few metrics) then share a round trip instead of each
+making their own.
+
+    submit()   blocks while WRITE_BEHIND_CAPACITY rows are buffered or being
+               written (backpressure on the fetching syncs) and returns a
+               Future of the batch's counts, set once its rows are committed
+    close()    stops taking batches, writes everything buffered and stops
+               the flusher (registry.close() on shutdown)
+
+A sync waits for the Futures of all its batches before it advances its
+watermark, so rows are durable before a sync counts as done; if the
+process dies first, the next sync fetches the window again. When writing
+several batches together fails, each is retried alone so only the failing
+sync sees the error. WRITE_BEHIND=0 writes each batch directly from the
+sync instead.
+"""
+import os
+import time
+import logging
+import threading
+from concurrent.futures import Future
+from dotenv import load_dotenv
+from clients import registry
+from database import get_pool
+from .sinks import write_rows
+
+# Load environment variables
+load_dotenv()
+
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "1") == "1"
+WRITE_BEHIND_ROWS = int(os.getenv("WRITE_BEHIND_ROWS", "5000"))
+WRITE_BEHIND_MAX_AGE = float(os.getenv("WRITE_BEHIND_MAX_AGE", "0.2"))
+WRITE_BEHIND_CAPACITY = int(os.getenv("WRITE_BEHIND_CAPACITY", "50000"))
+
+log = logging.getLogger("ingestion.write_behind")
+
+
+class WriteBehindBuffer:
+    def __init__(self):
+        # Created after the pool, so registry.close() flushes before the pool closes
+        get_pool()
+        self.condition = threading.Condition()
+        # table -> [(rows, future)], oldest first
+        self.pending = {}
+        self.pending_rows = {}
+        self.oldest = {}
+        # Rows buffered or being written, all tables
+        self.rows = 0
+        self.closed = False
+        self.stats = {"batches": 0, "flushes": 0, "rows": 0}
+        self.thread = threading.Thread(target=self.run, name="write-behind", daemon=True)
+        self.thread.start()
+
+    def submit(self, table: str, rows: dict) -> Future:
+        future = Future()
+        with self.condition:
+            # An oversized batch still goes in once the buffer is empty
+            while not self.closed and self.rows and self.rows + len(rows) > WRITE_BEHIND_CAPACITY:
+                self.condition.wait()
+            if self.closed:
+                raise RuntimeError("Write-behind buffer is closed")
+            self.pending.setdefault(table, []).append((rows, future))
+            self.pending_rows[table] = self.pending_rows.get(table, 0) + len(rows)
+            self.oldest.setdefault(table, time.monotonic())
+            self.rows += len(rows)
+            self.stats["batches"] += 1
+            self.condition.notify_all()
+        return future
+
+    def due(self) -> tuple:
+        """(table to flush or None, seconds until the next one is due)"""
+        now = time.monotonic()
+        wait = None
+        for table, since in self.oldest.items():
+            if self.closed or self.pending_rows[table] >= WRITE_BEHIND_ROWS or now - since >= WRITE_BEHIND_MAX_AGE:
+                return table, 0
+            left = since + WRITE_BEHIND_MAX_AGE - now
+            wait = left if wait is None else min(wait, left)
+        return None, wait
+
+    def run(self):
+        while True:
+            with self.condition:
+                table, wait = self.due()
+                while table is None:
+                    if self.closed:
+                        return
+                    self.condition.wait(wait)
+                    table, wait = self.due()
+                batch = self.pending.pop(table)
+                del self.pending_rows[table], self.oldest[table]
+            try:
+                self.flush(table, batch)
+            finally:
+                with self.condition:
+                    self.rows -= sum(len(rows) for rows, _ in batch)
+                    self.condition.notify_all()
+
+    def flush(self, table: str, batch: list):
+        try:
+            counts = write_rows(table, [rows for rows, _ in batch])
+        except Exception as e:
+            if len(batch) > 1:
+                log.warning(f"Writing {len(batch)} {table} batches together failed, retrying one by one: {str(e)}")
+                for item in batch:
+                    self.flush(table, [item])
+                return
+            log.error(f"Error writing {table} batch: {str(e)}")
+            batch[0][1].set_exception(e)
+            return
+        self.stats["flushes"] += 1
+        self.stats["rows"] += sum(len(rows) for rows, _ in batch)
+        for (_, future), batch_counts in zip(batch, counts):
+            future.set_result(batch_counts)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+
+registry.register("write_behind", WriteBehindBuffer, WriteBehindBuffer.close)
+
+
+def get_write_behind() -> WriteBehindBuffer:
+    return registry.get("write_behind")
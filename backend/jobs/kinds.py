@@ -0,0 +1,39 @@
+"""
+Job kinds and their payloads. Payloads are validated when a job is queued
+and again when it runs; handlers live with their feature (see
+google_analytics/jobs.py, stripe_data/jobs.py, notifications/jobs.py).
+"""
+from pydantic import BaseModel
+
+GA_INITIAL_SYNC = "ga_initial_sync"
+GA_SYNC = "ga_sync"
+GA_TOKEN_REFRESH = "ga_token_refresh"
+STRIPE_SYNC = "stripe_sync"
+NOTIFICATION_SEND = "notification_send"
+
+
+class EmptyPayload(BaseModel):
+    pass
+
+class GAInitialSyncPayload(BaseModel):
+    days: int = 1
+
+class GASyncPayload(BaseModel):
+    property_id: str
+    days: int = 7
+
+class StripeSyncPayload(BaseModel):
+    date: str | None = None  # YYYY-MM-DD, defaults to two days ago
+
+class NotificationSendPayload(BaseModel):
+    user_ids: list[str]
+
+
+# kind -> (payload model, max attempts)
+JOB_KINDS = {
+    GA_INITIAL_SYNC: (GAInitialSyncPayload, 5),
+    GA_SYNC: (GASyncPayload, 6),
+    GA_TOKEN_REFRESH: (EmptyPayload, 5),
+    STRIPE_SYNC: (StripeSyncPayload, 6),
+    NOTIFICATION_SEND: (NotificationSendPayload, 4),
+}
@@ -0,0 +1,69 @@
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, ValidationError
+import uuid
+import asyncio
+import logging
+from auth import get_current_user_id
+from exports.queries import has_project_access
+from .kinds import GA_INITIAL_SYNC, GA_SYNC, GA_TOKEN_REFRESH, STRIPE_SYNC
+from .runner import enqueue_job
+from .store import get_job, list_project_jobs
+
+# Create router
+router = APIRouter()
+
+# Jobs a project member may queue directly
+USER_JOB_KINDS = {GA_INITIAL_SYNC, GA_SYNC, GA_TOKEN_REFRESH, STRIPE_SYNC}
+
+# Structure of the enqueue request
+class JobRequest(BaseModel):
+    kind: str
+    payload: dict = {}
+
+
+def can_view_job(user_id: str, job: dict) -> bool:
+    if job["user_id"] and str(job["user_id"]) == user_id:
+        return True
+    return bool(job["project_id"]) and has_project_access(user_id, str(job["project_id"]))
+
+# Status and per-item progress of a job (the frontend polls this after connecting Google Analytics)
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str, user_id: str = Depends(get_current_user_id)):
+    try:
+        uuid.UUID(job_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    try:
+        job = await asyncio.to_thread(get_job, job_id)
+    except Exception as e:
+        logging.error(f"Error reading job {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
+    if not job or not await asyncio.to_thread(can_view_job, user_id, job):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# Recent jobs of a project, newest first
+@router.get("/projects/{project_id}/jobs")
+async def get_project_jobs(project_id: str, kind: str = None, user_id: str = Depends(get_current_user_id)):
+    if not await asyncio.to_thread(has_project_access, user_id, project_id):
+        raise HTTPException(status_code=403, detail="You do not have access to this project.")
+    return {"jobs": await asyncio.to_thread(list_project_jobs, project_id, kind)}
+
+# Queue a sync for a project; returns the job id to poll
+@router.post("/projects/{project_id}/jobs", status_code=202)
+async def create_project_job(project_id: str, request: JobRequest, user_id: str = Depends(get_current_user_id)):
+    if request.kind not in USER_JOB_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unsupported job kind. Use one of: {', '.join(sorted(USER_JOB_KINDS))}")
+    if not await asyncio.to_thread(has_project_access, user_id, project_id):
+        raise HTTPException(status_code=403, detail="You do not have access to this project.")
+
+    try:
+        job_id = await asyncio.to_thread(enqueue_job, request.kind, user_id, project_id, request.payload)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid payload: {e}")
+    except Exception as e:
+        logging.error(f"Error queueing {request.kind} job: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+    return {"job_id": job_id}
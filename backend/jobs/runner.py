@@ -0,0 +1,163 @@
+"""
+Job kinds, enqueueing and execution of a single claimed job.
+
+Kinds and payload models are declared in jobs/kinds.py; each kind's
+feature module registers an async handler that receives the job dict
+with its payload parsed into the model.
+
+A handler that returns normally completes the job. Transient failures
+(TransientJobError, 429, 5xx, connection errors and timeouts) are retried
+with exponential backoff and full jitter, honouring Retry-After, until
+max_attempts. Everything else (PermanentJobError, invalid payloads, other
+4xx responses and unexpected errors) is dead-lettered straight away.
+"""
+import os
+import sys
+import random
+import asyncio
+import logging
+import httpx
+import psycopg2
+import requests
+import google.auth.exceptions
+from googleapiclient.errors import HttpError
+from pydantic import ValidationError
+from .kinds import JOB_KINDS
+from .store import create_job, complete_job, retry_job, dead_letter_job
+from tracing import span
+
+# Retry settings
+BACKOFF_BASE_SECONDS = float(os.getenv("JOB_BACKOFF_BASE_SECONDS", "5"))
+BACKOFF_MAX_SECONDS = float(os.getenv("JOB_BACKOFF_MAX_SECONDS", "1800"))
+
+# kind -> async handler(job)
+handlers = {}
+
+
+class PermanentJobError(Exception):
+    """Raised by handlers when retrying cannot help (bad input, revoked access)"""
+
+class TransientJobError(Exception):
+    """Raised by handlers for failures worth retrying; may carry a Retry-After in seconds"""
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+#1. Registration and enqueueing
+def register_handler(kind: str, handler):
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    handlers[kind] = handler
+
+def enqueue_job(kind: str, user_id: str = None, project_id: str = None, payload: dict = None,
+                delay_seconds: float = 0) -> str:
+    """Validate the payload against the kind's model and put the job on the queue; returns the job id"""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    payload_model, max_attempts = JOB_KINDS[kind]
+    payload = payload_model(**(payload or {})).model_dump(mode="json")
+    job_id = create_job(kind, user_id, project_id, payload, max_attempts, delay_seconds)
+    logging.info(f"Queued {kind} job {job_id}")
+    return job_id
+
+
+#2. Error classification
+def is_stripe_error(error: Exception, *names) -> bool:
+    """isinstance check against stripe's error classes, without importing the SDK (no SDK, no Stripe errors)"""
+    stripe = sys.modules.get("stripe")
+    return stripe is not None and isinstance(error, tuple(getattr(stripe, name) for name in names or ("StripeError",)))
+
+def error_status(error: Exception):
+    """HTTP status of an upstream error, if it carries one"""
+    if isinstance(error, HttpError):
+        return error.resp.status
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code
+    if is_stripe_error(error):
+        return error.http_status
+    # google-api-core errors (gRPC Data API backend) carry the HTTP equivalent of their status
+    api_core = sys.modules.get("google.api_core.exceptions")
+    if api_core is not None and isinstance(error, api_core.GoogleAPICallError):
+        return error.code
+    return None
+
+def retry_after_seconds(error: Exception):
+    if isinstance(error, TransientJobError):
+        return error.retry_after
+    headers = None
+    if isinstance(error, HttpError):
+        headers = error.resp
+    elif isinstance(error, (httpx.HTTPStatusError, requests.HTTPError)) and error.response is not None:
+        headers = error.response.headers
+    elif is_stripe_error(error):
+        headers = error.headers
+    value = headers.get("retry-after") if headers else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+def is_permanent(error: Exception) -> bool:
+    if isinstance(error, (PermanentJobError, ValidationError, google.auth.exceptions.RefreshError)):
+        return True
+    status = error_status(error)
+    return status is not None and 400 <= status < 500 and status not in (408, 409, 429)
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, (TransientJobError, httpx.TransportError, requests.ConnectionError, requests.Timeout,
+                          google.auth.exceptions.TransportError, psycopg2.OperationalError,
+                          ConnectionError, TimeoutError)):
+        return True
+    if is_stripe_error(error, "APIConnectionError", "RateLimitError"):
+        return True
+    status = error_status(error)
+    return status is not None and (status == 429 or status >= 500)
+
+def backoff_delay(attempt: int, retry_after: float = None) -> float:
+    """Exponential backoff with full jitter; attempt is 1 for the first run"""
+    if retry_after:
+        return min(retry_after, BACKOFF_MAX_SECONDS)
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** (attempt - 1))))
+
+
+#3. Execute one claimed job (called on a worker thread)
+def execute_job(job: dict, worker_id: str) -> str:
+    """Run the job's handler and record the outcome; returns succeeded, retrying or dead"""
+    job_id = str(job["job_id"])
+    handler = handlers.get(job["kind"])
+
+    if handler is None:
+        dead_letter_job(job_id, worker_id, f"Unknown job kind: {job['kind']}")
+        return "dead"
+    if job["attempts"] > job["max_attempts"]:
+        # The last attempt's worker died or timed out
+        dead_letter_job(job_id, worker_id, f"Gave up after {job['max_attempts']} attempts: {job.get('error')}")
+        return "dead"
+
+    try:
+        payload_model = JOB_KINDS[job["kind"]][0]
+        job = dict(job, job_id=job_id, payload=payload_model(**(job["payload"] or {})))
+        job["user_id"] = str(job["user_id"]) if job["user_id"] else None
+        job["project_id"] = str(job["project_id"]) if job["project_id"] else None
+        logging.info(f"Running {job['kind']} job {job_id} (attempt {job['attempts']}/{job['max_attempts']})")
+        with span(f"job {job['kind']}", job_id=job_id, attempt=job["attempts"]):
+            asyncio.run(handler(job))
+    except Exception as e:
+        error = f"{type(e).__name__}: {str(e)}"
+        # Unexpected errors (bugs, bad data) would fail the same way on every attempt
+        if is_permanent(e) or not is_transient(e) or job["attempts"] >= job["max_attempts"]:
+            logging.error(f"Job {job_id} dead-lettered: {error}")
+            dead_letter_job(job_id, worker_id, error)
+            return "dead"
+
+        delay = backoff_delay(job["attempts"], retry_after_seconds(e))
+        logging.warning(f"Job {job_id} failed with transient error ({error}), retrying in {delay:.1f}s")
+        retry_job(job_id, worker_id, delay, error)
+        return "retrying"
+
+    complete_job(job_id, worker_id)
+    logging.info(f"Finished {job['kind']} job {job_id}")
+    return "succeeded"
@@ -0,0 +1,174 @@
+"""
+Job rows in the jobs table, which doubles as a durable queue.
+
+Workers claim due jobs with FOR UPDATE SKIP LOCKED and hold them until
+`locked_until` (the visibility timeout); a job whose worker died becomes
+claimable again once its lock expires. State changes made by a worker
+check `locked_by`, so a worker that lost its lock cannot overwrite the
+job. Progress is a JSON document with one entry per item (for the
+initial Google Analytics sync, one per property):
+    {"items": {"<item>": {"status": "pending|running|done|error", "message": ...}},
+     "total": n, "completed": n}
+"""
+from psycopg2.extras import Json, RealDictCursor
+from database import get_connection
+
+JOB_COLUMNS = "job_id, kind, user_id, project_id, payload, status, progress, error, " \
+              "attempts, max_attempts, run_at, locked_by, locked_until, " \
+              "created_at, started_at, finished_at, updated_at"
+
+# Item statuses that count towards "completed"
+FINISHED_ITEM_STATUSES = ("done", "error")
+
+
+#1. Enqueueing
+def create_job(kind: str, user_id: str = None, project_id: str = None, payload: dict = None,
+               max_attempts: int = 5, delay_seconds: float = 0) -> str:
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO jobs (kind, user_id, project_id, payload, max_attempts, run_at)
+                VALUES (%s, %s, %s, %s, %s, now() + make_interval(secs => %s))
+                RETURNING job_id
+            """, (kind, user_id, project_id, Json(payload or {}), max_attempts, delay_seconds))
+            return str(cursor.fetchone()[0])
+
+def requeue_job(job_id: str) -> bool:
+    """Put a dead-lettered job back on the queue with a fresh set of attempts"""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                UPDATE jobs
+                SET status = 'queued', attempts = 0, run_at = now(), error = NULL,
+                    locked_by = NULL, locked_until = NULL, finished_at = NULL, updated_at = now()
+                WHERE job_id = %s AND status = 'dead'
+            """, (job_id,))
+            return cursor.rowcount == 1
+
+
+#2. Claiming and finishing (worker side)
+def claim_jobs(worker_id: str, limit: int, visibility_seconds: float) -> list:
+    """Lock up to `limit` due jobs for this worker; concurrent workers skip each other's rows"""
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("""
+                WITH due AS (
+                    SELECT job_id FROM jobs
+                    WHERE (status = 'queued' AND run_at <= now())
+                       OR (status = 'running' AND locked_until < now())
+                    ORDER BY run_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE jobs j
+                SET status = 'running',
+                    attempts = j.attempts + 1,
+                    locked_by = %s,
+                    locked_until = now() + make_interval(secs => %s),
+                    started_at = COALESCE(j.started_at, now()),
+                    updated_at = now()
+                FROM due
+                WHERE j.job_id = due.job_id
+                RETURNING j.*
+            """, (limit, worker_id, visibility_seconds))
+            return [dict(row) for row in cursor.fetchall()]
+
+def extend_locks(job_ids: list, worker_id: str, visibility_seconds: float):
+    """Heartbeat for jobs that are still running"""
+    if not job_ids:
+        return
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                UPDATE jobs SET locked_until = now() + make_interval(secs => %s)
+                WHERE job_id = ANY(%s::uuid[]) AND locked_by = %s AND status = 'running'
+            """, (visibility_seconds, list(job_ids), worker_id))
+
+def complete_job(job_id: str, worker_id: str):
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                UPDATE jobs
+                SET status = 'succeeded', error = NULL, locked_by = NULL, locked_until = NULL,
+                    finished_at = now(), updated_at = now()
+                WHERE job_id = %s AND locked_by = %s
+            """, (job_id, worker_id))
+
+def retry_job(job_id: str, worker_id: str, delay_seconds: float, error: str):
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                UPDATE jobs
+                SET status = 'queued', error = %s, run_at = now() + make_interval(secs => %s),
+                    locked_by = NULL, locked_until = NULL, updated_at = now()
+                WHERE job_id = %s AND locked_by = %s
+            """, (error, delay_seconds, job_id, worker_id))
+
+def dead_letter_job(job_id: str, worker_id: str, error: str):
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                UPDATE jobs
+                SET status = 'dead', error = %s, locked_by = NULL, locked_until = NULL,
+                    finished_at = now(), updated_at = now()
+                WHERE job_id = %s AND locked_by = %s
+            """, (error, job_id, worker_id))
+
+
+#3. Progress
+def set_job_items(job_id: str, items: list):
+    """Record the items a job will work through, all pending"""
+    progress = {
+        "items": {str(item): {"status": "pending"} for item in items},
+        "total": len(items),
+        "completed": 0,
+    }
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "UPDATE jobs SET progress = %s, updated_at = now() WHERE job_id = %s",
+                (Json(progress), job_id)
+            )
+
+def update_job_item(job_id: str, item: str, status: str, message: str = None):
+    """Set one item's status; "completed" is recounted so retried items are not counted twice"""
+    entry = {"status": status}
+    if message:
+        entry["message"] = message
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                UPDATE jobs j
+                SET progress = s.progress || jsonb_build_object('completed', (
+                        SELECT count(*) FROM jsonb_each(s.progress->'items') e
+                        WHERE e.value->>'status' = ANY(%s)
+                    )),
+                    updated_at = now()
+                FROM (
+                    SELECT job_id, jsonb_set(progress, ARRAY['items', %s], %s, true) AS progress
+                    FROM jobs WHERE job_id = %s
+                ) s
+                WHERE j.job_id = s.job_id
+            """, (list(FINISHED_ITEM_STATUSES), str(item), Json(entry), job_id))
+
+
+#4. Reads
+def get_job(job_id: str) -> dict:
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE job_id = %s", (job_id,))
+            row = cursor.fetchone()
+    return dict(row) if row else None
+
+def list_project_jobs(project_id: str, kind: str = None, limit: int = 20) -> list:
+    sql = f"SELECT {JOB_COLUMNS} FROM jobs WHERE project_id = %s"
+    params = [project_id]
+    if kind:
+        sql += " AND kind = %s"
+        params.append(kind)
+    sql += " ORDER BY created_at DESC LIMIT %s"
+    params.append(limit)
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(sql, params)
+            return [dict(row) for row in cursor.fetchall()]
@@ -0,0 +1,131 @@
+"""
+Job worker: claims due jobs from Postgres and runs them.
+
+Run one or more worker processes next to the API:
+    python -m jobs.worker [--concurrency 8]
+Put a dead-lettered job back on the queue:
+    python -m jobs.worker requeue <job_id>
+
+Each claimed job runs on a worker thread in its own event loop, so
+blocking provider clients never stall the loop that polls and heartbeats.
+Locks of running jobs are extended every third of the visibility timeout;
+if a worker dies its jobs become claimable again once the timeout passes.
+The API process can also run an embedded worker (RUN_JOB_WORKER=1).
+"""
+import os
+import uuid
+import socket
+import asyncio
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from .store import claim_jobs, extend_locks, requeue_job
+from .runner import execute_job
+from logging_config import configure_logging
+from clients import registry
+
+# Job kinds register their handlers on import
+import google_analytics.jobs
+import stripe_data.jobs
+import notifications.jobs
+
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))
+VISIBILITY_TIMEOUT_SECONDS = float(os.getenv("JOB_VISIBILITY_TIMEOUT", "300"))
+POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+RUN_JOB_WORKER = os.getenv("RUN_JOB_WORKER", "1") == "1"
+
+_embedded_stop = None
+_embedded_task = None
+
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+async def run_worker(concurrency: int = JOB_CONCURRENCY, stop: asyncio.Event = None,
+                     worker_id: str = None, poll_interval: float = POLL_INTERVAL_SECONDS,
+                     visibility_timeout: float = VISIBILITY_TIMEOUT_SECONDS):
+    worker_id = worker_id or new_worker_id()
+    stop = stop or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="job")
+    running = {}  # future -> job_id
+    last_heartbeat = loop.time()
+    logging.info(f"Job worker {worker_id} started (concurrency {concurrency})")
+
+    try:
+        while not stop.is_set():
+            #1. Claim as many jobs as there are free slots
+            free = concurrency - len(running)
+            if free > 0:
+                try:
+                    jobs = await asyncio.to_thread(claim_jobs, worker_id, free, visibility_timeout)
+                except Exception as e:
+                    logging.error(f"Error claiming jobs: {str(e)}")
+                    jobs = []
+                for job in jobs:
+                    future = loop.run_in_executor(executor, execute_job, job, worker_id)
+                    running[future] = str(job["job_id"])
+
+            #2. Heartbeat so long jobs keep their lock
+            if running and loop.time() - last_heartbeat >= visibility_timeout / 3:
+                try:
+                    await asyncio.to_thread(extend_locks, list(running.values()), worker_id, visibility_timeout)
+                    last_heartbeat = loop.time()
+                except Exception as e:
+                    logging.error(f"Error extending job locks: {str(e)}")
+
+            #3. Wait for a job to finish, the next poll, or a stop request
+            waiters = list(running) + [asyncio.ensure_future(stop.wait())]
+            done, _ = await asyncio.wait(waiters, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED)
+            waiters[-1].cancel()
+            for future in done:
+                job_id = running.pop(future, None)
+                if job_id and future.exception():
+                    logging.error(f"Error recording outcome of job {job_id}: {str(future.exception())}")
+    finally:
+        # Let running jobs finish; anything unfinished is reclaimed after its lock expires
+        if running:
+            logging.info(f"Job worker {worker_id} waiting for {len(running)} running jobs")
+            await asyncio.wait(list(running))
+        executor.shutdown(wait=False)
+        logging.info(f"Job worker {worker_id} stopped")
+
+
+#4. Embedded worker for the API process
+def start_embedded_worker():
+    global _embedded_stop, _embedded_task
+    if not RUN_JOB_WORKER or _embedded_task is not None:
+        return
+    _embedded_stop = asyncio.Event()
+    _embedded_task = asyncio.create_task(run_worker(stop=_embedded_stop))
+
+async def stop_embedded_worker():
+    global _embedded_stop, _embedded_task
+    if _embedded_task is None:
+        return
+    _embedded_stop.set()
+    await _embedded_task
+    _embedded_stop = None
+    _embedded_task = None
+
+
+if __name__ == "__main__":
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Postgres-backed job worker")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "requeue"])
+    parser.add_argument("job_id", nargs="?")
+    parser.add_argument("--concurrency", type=int, default=JOB_CONCURRENCY)
+    args = parser.parse_args()
+
+    if args.command == "requeue":
+        if not args.job_id:
+            parser.error("requeue needs a job_id")
+        print("Requeued" if requeue_job(args.job_id) else "No dead job with that id")
+    else:
+        try:
+            asyncio.run(run_worker(args.concurrency))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # Writes what the write-behind buffer still holds, then closes the pool and clients
+            registry.close()
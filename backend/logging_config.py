@@ -0,0 +1,156 @@
+"""
+Process-wide logging: non-blocking, structured and sampled.
+
+Log calls only put the record on an in-memory queue (QueueHandler); a
+listener thread formats and writes it, so request handlers and ingestion
+loops never wait for log I/O. Records are JSON lines (LOG_FORMAT=json, the
+default) with any `extra={...}` fields as keys, or plain text
+(LOG_FORMAT=text).
+
+Chatty loggers are sampled below WARNING, per logger name and its children:
+
+    LOG_SAMPLE_RATES="ingestion.detail=0.01,httpx=0.05"
+
+Hot loops log through SampledLogger, which drops records before they are
+built; other loggers (httpx) are sampled by the queue handler. Per-page and
+per-batch ingestion lines go to `ingestion.detail`; each sync ends with one
+unsampled summary line on `ingestion`.
+"""
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+DEFAULT_SAMPLE_RATES = "ingestion.detail=0.01,httpx=0.05"
+
+# Attributes every LogRecord has; anything else came from `extra`
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener = None
+
+
+def parse_sample_rates(value: str) -> dict:
+    rates = {}
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        name, _, rate = part.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+# logger name -> share of records below WARNING kept
+sample_rates = parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", DEFAULT_SAMPLE_RATES))
+_rate_cache = {}
+# Loggers sampled by SampledLogger, which the queue handler must not sample again
+_presampled = set()
+
+def rate_for(name: str) -> float:
+    rate = _rate_cache.get(name)
+    if rate is None:
+        rate, prefix = 1.0, name
+        while prefix:
+            if prefix in sample_rates:
+                rate = sample_rates[prefix]
+                break
+            prefix = prefix.rpartition(".")[0]
+        _rate_cache[name] = rate
+    return rate
+
+def keep(level: int, name: str) -> bool:
+    if level >= logging.WARNING:
+        return True
+    rate = rate_for(name)
+    return rate >= 1.0 or random.random() < rate
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a share of the records below WARNING from the configured loggers"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.name in _presampled or keep(record.levelno, record.name)
+
+
+class SampledLogger(logging.LoggerAdapter):
+    """Logger for per-page and per-row lines: sampled before the record is built"""
+
+    def __init__(self, name: str):
+        super().__init__(logging.getLogger(name), {})
+        _presampled.add(name)
+
+    def isEnabledFor(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level) and keep(level, self.logger.name)
+
+    def process(self, msg, kwargs):
+        # Keep the caller's `extra` (LoggerAdapter would replace it)
+        return msg, kwargs
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Classic `LEVEL:logger:message` lines with `extra` fields appended as key=value"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extra = " ".join(f"{k}={v}" for k, v in vars(record).items() if k not in _RECORD_FIELDS)
+        return f"{line} {extra}" if extra else line
+
+
+def configure_logging(stream=None, level: str = None, fmt: str = None, rates: str = None):
+    """Install the queue handler on the root logger; later calls are no-ops unless it was shut down"""
+    global _listener
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    fmt = (fmt or LOG_FORMAT).lower()
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter("%(levelname)s:%(name)s:%(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    if rates is not None:
+        sample_rates.clear()
+        sample_rates.update(parse_sample_rates(rates))
+        _rate_cache.clear()
+    queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(level or LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+def shutdown_logging():
+    """Write out queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+atexit.register(shutdown_logging)
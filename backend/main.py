@@ -1,57 +1,56 @@
-from fastapi import Request, HTTPException, FastAPI, Depends, APIRouter
+from contextlib import asynccontextmanager
+from fastapi import Request, HTTPException, FastAPI, Depends, APIRouter, Query
 from fastapi.middleware.cors import CORSMiddleware
-from auth import verify_token # function from auth.py
-from supabase import create_client
+from auth import get_current_user_id # functions from auth.py
 import os
+import asyncio
 from dotenv import load_dotenv
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel  # For request validation
 from google_analytics.connect import router as ga_router
 from google_analytics.fetch_metrics import router as analytics_router
 from stripe_data.connect import router as stripe_connect_router
 from stripe_data.fetch_metrics import router as stripe_metrics_router
+from notifications.routes import router as notifications_router
+from notifications.sender import close_push_client
+from notifications.scheduler import compute_next_send_at
+from metric_cache import query_metrics
+from ingestion.runs import latest_sync_runs
+from exports.routes import router as exports_router
+from jobs.routes import router as jobs_router
+from events.routes import router as events_router
+from jobs.worker import start_embedded_worker, stop_embedded_worker
+from clients import registry, get_supabase, check_environment
+from monitoring import metrics_middleware, render_metrics, METRICS_TOKEN
+from tracing import tracing_middleware
+from logging_config import configure_logging
 
 # Load environment variables
 load_dotenv()
 
-# Create the FastAPI app
-app = FastAPI()
-
-# Loading Supabase connection to retrieve data
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
-
-# Allow frontend/mobile access
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"], # frontend server
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Queued, structured logging (see logging_config.py)
+configure_logging()
+
+# Routes defined in this module, mounted by create_app()
+router = APIRouter()
+
 # Test Route
-@app.get("/")
+@router.get("/")
 def read_root():
     return {"message": "Hello from FastAPI!"}
 
-# Token validation 
-async def get_current_user_id(request: Request):
-    auth_header = request.headers.get("authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing or invalid token")
-    
-    token = auth_header.split(" ")[1]  # Bearer <token> <- to take just token part
-    payload = verify_token(token)  # verifying token using function from auth.py
-    user_id = payload.get("sub")  # Supabase UID
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    return user_id
+# Prometheus scrape endpoint (Bearer METRICS_TOKEN when set)
+@router.get("/metrics", include_in_schema=False)
+def get_metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 class ProjectRequest(BaseModel):
     project_id: str
 
-@app.post("/api/summary")
+@router.post("/api/summary")
 async def get_summary(
     request: ProjectRequest,
     user_id: str = Depends(get_current_user_id)  # function that handles request
@@ -59,7 +58,7 @@ async def get_summary(
     project_id = request.project_id
     try:
         # Check if user has access to the project
-        access_check = supabase.table("project_to_user")\
+        access_check = get_supabase().table("project_to_user")\
             .select("id")\
             .eq("user_id", user_id)\
             .eq("project_id", project_id)\
@@ -69,7 +68,7 @@ async def get_summary(
         if not access_check.data:
             raise HTTPException(status_code=403, detail="You do not have access to this project.")
         
-        response = supabase.table("ga_data") \
+        response = get_supabase().table("ga_data") \
             .select("name, value, date_collected") \
             .eq("project_id", project_id) \
             .execute()
@@ -84,22 +83,69 @@ async def get_summary(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
 
+# Metric history for a project, served from the shared memory-mapped cache
+@router.get("/api/projects/{project_id}/metrics")
+async def get_project_metrics(
+    project_id: str,
+    start: str = None,  # YYYY-MM-DD, inclusive
+    end: str = None,  # YYYY-MM-DD, inclusive
+    metric: list[str] = Query(default=None),
+    user_id: str = Depends(get_current_user_id)
+):
+    try:
+        access_check = get_supabase().table("project_to_user")\
+            .select("id")\
+            .eq("user_id", user_id)\
+            .eq("project_id", project_id)\
+            .limit(1)\
+            .execute()
+
+        if not access_check.data:
+            raise HTTPException(status_code=403, detail="You do not have access to this project.")
+
+        metrics = await asyncio.to_thread(query_metrics, project_id, start, end, metric)
+        return {"project_id": project_id, "metrics": metrics}
+
+    except HTTPException:
+        raise
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
+# When each data source of a project last synced (one sync_runs row per sync)
+@router.get("/api/projects/{project_id}/sync-status")
+async def get_sync_status(project_id: str, user_id: str = Depends(get_current_user_id)):
+    try:
+        access_check = get_supabase().table("project_to_user")\
+            .select("id")\
+            .eq("user_id", user_id)\
+            .eq("project_id", project_id)\
+            .limit(1)\
+            .execute()
+
+        if not access_check.data:
+            raise HTTPException(status_code=403, detail="You do not have access to this project.")
+
+        streams = await asyncio.to_thread(latest_sync_runs, project_id)
+        return {"project_id": project_id, "streams": streams}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
 # Retrieving project data for the user
-@app.get("/api/projects")
+@router.get("/api/projects")
 async def get_summary(user_id: str = Depends(get_current_user_id)): # function that handles request
     try:
         # Data retrieving
-        query = supabase.table("project_to_user") \
+        query = get_supabase().table("project_to_user") \
             .select("project_id, projects(project_name)") \
             .eq("user_id", user_id)
         response = query.execute()
 
-        # Debugging: Print the full Supabase response and the project list
-        print("Supabase raw response:", response)
-        print("Supabase response data:", response.data)
-
         project_list = response.data
-        print("Final project_list to return:", project_list)
 
         if not project_list or len(project_list) == 0:
             raise HTTPException(status_code=404, detail="No projects found")
@@ -111,11 +157,11 @@ async def get_summary(user_id: str = Depends(get_current_user_id)): # function t
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
     
 # Notification preference retrieval if user has one already
-@app.get("/api/notification-preferences")
+@router.get("/api/notification-preferences")
 async def get_notification_preferences(user_id: str = Depends(get_current_user_id)):
     try:
-        response = supabase.table("notification_preference") \
-            .select("frequency, traffic, session_duration") \
+        response = get_supabase().table("notification_preference") \
+            .select("frequency, traffic, session_duration, timezone, next_send_at") \
             .eq("user_id", user_id) \
             .single() \
             .execute()
@@ -125,6 +171,8 @@ async def get_notification_preferences(user_id: str = Depends(get_current_user_i
                 "frequency": response.data.get("frequency"),
                 "traffic_enabled": response.data.get("traffic"),
                 "session_duration_enabled": response.data.get("session_duration"),
+                "timezone": response.data.get("timezone"),
+                "next_send_at": response.data.get("next_send_at"),
             }
         else:
             raise HTTPException(status_code=404, detail="Preferences not found")
@@ -137,25 +185,41 @@ class NotificationPreferences(BaseModel):
     frequency: str
     trafficEnabled: bool
     sessionDurationEnabled: bool
+    timezone: str | None = None  # IANA name, e.g. "Europe/Riga"
 
 # Notification preference update
-@app.put("/api/notification-preferences")
+@router.put("/api/notification-preferences")
 async def update_notification_preferences(
     preferences: NotificationPreferences,
     user_id: str = Depends(get_current_user_id)
 ):
     try:
-        # Insert or update the data in the Supabase table
-        response = supabase.table("notification_preference").upsert({
+        record = {
             "user_id": user_id,
             "frequency": preferences.frequency,
             "traffic": preferences.trafficEnabled,
             "session_duration": preferences.sessionDurationEnabled
-        }, on_conflict = ["user_id"]).execute()
+        }
+        timezone_name = preferences.timezone
+        if timezone_name:
+            record["timezone"] = timezone_name
+        else:
+            # Keep scheduling in the timezone stored earlier
+            existing = get_supabase().table("notification_preference").select("timezone") \
+                .eq("user_id", user_id).limit(1).execute()
+            timezone_name = existing.data[0].get("timezone") if existing.data else None
+
+        # Schedule the next notification (none if every alert type is off)
+        next_send_at = None
+        if preferences.trafficEnabled or preferences.sessionDurationEnabled:
+            next_send_at = compute_next_send_at(preferences.frequency, timezone_name or "UTC")
+        record["next_send_at"] = next_send_at.isoformat() if next_send_at else None
+
+        # Insert or update the data in the Supabase table
+        response = get_supabase().table("notification_preference").upsert(
+            record, on_conflict = ["user_id"]
+        ).execute()
 
-        # Debugging: Print the Supabase response
-        print("Supabase response:", response)
-        
         if 'error' in response and response['error'] is not None:
             raise HTTPException(status_code=500, detail="Failed to update preferences: " + str(response['error']))
 
@@ -165,11 +229,65 @@ async def update_notification_preferences(
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
 
 
+# Startup and shutdown of the shared clients and the embedded job worker
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fail fast on a missing setting; clients themselves are built on first use
+    check_environment()
+    # Run an embedded job worker in the API process (RUN_JOB_WORKER=1, the default);
+    # standalone workers run with `python -m jobs.worker`
+    start_embedded_worker()
+    try:
+        yield
+    finally:
+        # Let running jobs finish; queued jobs stay in the table for the next worker
+        await stop_embedded_worker()
+        # Close pooled push client connections, then Supabase, the database pool, ...
+        await close_push_client()
+        registry.close()
+
+
+# Create the FastAPI app
+def create_app() -> FastAPI:
+    app = FastAPI(lifespan=lifespan)
+
+    # Allow frontend/mobile access
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"], # frontend server
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Request latency by route and status, scraped from /metrics
+    app.middleware("http")(metrics_middleware)
+
+    # Span per request (exported when TRACING_EXPORTER is set), sampled profiles of slow requests
+    app.middleware("http")(tracing_middleware)
+
+    app.include_router(router)
+
+    #mount google analytics routes under /google
+    app.include_router(ga_router, prefix="/google")
+    app.include_router(analytics_router, prefix="/analytics", tags=["Analytics"])
+
+    #mount stripe routes under /stripe
+    app.include_router(stripe_connect_router, prefix="/stripe")
+    app.include_router(stripe_metrics_router, prefix="/stripe/metrics")
+
+    #mount metric export routes under /api
+    app.include_router(exports_router, prefix="/api")
+
+    #mount background job status routes under /api
+    app.include_router(jobs_router, prefix="/api")
+
+    #mount live project event streams under /api
+    app.include_router(events_router, prefix="/api")
+
+    #mount notification routes under /api/notifications
+    app.include_router(notifications_router, prefix="/api/notifications")
 
-#mount google analytics routes under /google
-app.include_router(ga_router, prefix="/google")
-app.include_router(analytics_router, prefix="/analytics", tags=["Analytics"])
+    return app
 
-#mount stripe routes under /stripe
-app.include_router(stripe_connect_router, prefix="/stripe")
-app.include_router(stripe_metrics_router, prefix="/stripe/metrics")
\ No newline at end of file
+app = create_app()
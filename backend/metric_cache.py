@@ -0,0 +1,242 @@
+"""
+Read-through metric cache shared by all workers on a host.
+
+Each project's metric history is stored as fixed-width columns
+(date ordinal int32, metric id int32, value float64) in .npy files that
+every worker opens with mmap, so reads come from the page cache without
+copies or network calls. Files live under a directory named after the
+project's sync version, so a sync (which bumps the version) invalidates
+them and tells the project's live streams (data-version-changed). Rows are sorted by date, so range queries are binary searches.
+Google Analytics facts are stored sparsely, so a missing day means zero.
+Metrics are keyed by source, GA property and name, so the properties of a
+project keep separate series.
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+import numpy as np
+from dotenv import load_dotenv
+from monitoring import record_cache
+from clients import get_supabase
+from database import get_connection, fetch_all_rows
+from google_analytics.metric_store import load_metric_facts
+from events.broker import publish
+
+# Load environment variables
+load_dotenv()
+
+# Cache settings
+METRIC_CACHE_DIR = os.getenv("METRIC_CACHE_DIR", "/tmp/metric_cache")
+VERSION_TTL_SECONDS = float(os.getenv("METRIC_CACHE_VERSION_TTL", "5"))
+MAX_OPEN_PROJECTS = int(os.getenv("METRIC_CACHE_MAX_OPEN", "256"))
+
+COLUMNS = ("dates", "metric_ids", "values")
+# Subdirectory for the current file layout; files of older layouts are never read
+CACHE_LAYOUT = "by-property"
+
+# Per-process state: open memory maps and recently seen versions
+_open_series = OrderedDict()   # project_id -> (version, series)
+_versions = {}                 # project_id -> (version, checked_at)
+_lock = threading.Lock()
+stats = {"hits": 0, "misses": 0}
+
+
+#1. Sync versions
+def bump_sync_version(project_id: str) -> int:
+    """Called after a sync writes metrics for a project; invalidates cached copies"""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO project_sync_versions (project_id, version, updated_at)
+                VALUES (%s, 1, now())
+                ON CONFLICT (project_id)
+                DO UPDATE SET version = project_sync_versions.version + 1, updated_at = now()
+                RETURNING version
+            """, (project_id,))
+            version = cursor.fetchone()[0]
+
+    with _lock:
+        _versions[project_id] = (version, time.monotonic())
+    # Live dashboards refetch when the version changes
+    publish(project_id, "data-version-changed", {"version": version})
+    return version
+
+def get_sync_version(project_id: str) -> int:
+    with _lock:
+        cached = _versions.get(project_id)
+    if cached and time.monotonic() - cached[1] < VERSION_TTL_SECONDS:
+        record_cache("sync_version", True)
+        return cached[0]
+    record_cache("sync_version", False)
+
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT version FROM project_sync_versions WHERE project_id = %s", (project_id,))
+            row = cursor.fetchone()
+
+    version = row[0] if row else 0
+    with _lock:
+        _versions[project_id] = (version, time.monotonic())
+    return version
+
+
+#2. Building the columnar files
+def load_rows_from_supabase(project_id: str) -> list:
+    # Google Analytics facts are sparse; missing days are zero
+    rows = [
+        ("google_analytics", row["property_id"], row["date"], row["metric_name"], row["metric_value"])
+        for row in load_metric_facts([project_id])
+    ]
+    for row in fetch_all_rows(
+        lambda: get_supabase().table("stripe_metrics").select("date, metric_name, metric_value")
+            .eq("project_id", project_id)
+            .order("date").order("metric_name")
+    ):
+        rows.append(("stripe", None, row["date"], row["metric_name"], row["metric_value"]))
+    return rows
+
+def build_columns(rows: list):
+    """
+    Turn (source, property_id, date, metric_name, value) rows into sorted columns
+    plus the metric catalog of (source, property_id, metric_name)
+    """
+    catalog = sorted({(source, property_id, name) for source, property_id, _, name, _ in rows},
+                     key=lambda key: (key[0], key[1] or "", key[2]))
+    metric_ids = {key: i for i, key in enumerate(catalog)}
+
+    dates = np.array([date.fromisoformat(str(r[2])[:10]).toordinal() for r in rows], dtype=np.int32)
+    ids = np.array([metric_ids[(r[0], r[1], r[3])] for r in rows], dtype=np.int32)
+    values = np.array([float(r[4] or 0) for r in rows], dtype=np.float64)
+
+    order = np.lexsort((ids, dates))
+    return {"dates": dates[order], "metric_ids": ids[order], "values": values[order]}, catalog
+
+def project_cache_dir(project_id: str) -> str:
+    return os.path.join(METRIC_CACHE_DIR, CACHE_LAYOUT, project_id)
+
+def write_series(project_id: str, version: int, columns: dict, catalog: list) -> str:
+    """Write into a temp directory then rename, so readers never see partial files"""
+    project_dir = project_cache_dir(project_id)
+    final_dir = os.path.join(project_dir, f"v{version}")
+    tmp_dir = os.path.join(project_dir, f".tmp-{os.getpid()}-{uuid.uuid4().hex}")
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    try:
+        for name in COLUMNS:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), columns[name])
+        with open(os.path.join(tmp_dir, "catalog.json"), "w") as f:
+            json.dump(catalog, f)
+        os.rename(tmp_dir, final_dir)
+    except OSError:
+        # Another worker published this version first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(final_dir):
+            raise
+
+    # Older versions can go; workers that still map them keep their pages until they let go.
+    # Newer ones stay: a worker that read a stale version must not remove a fresh build
+    for entry in os.listdir(project_dir):
+        if entry.startswith("v") and entry[1:].isdigit() and int(entry[1:]) < version:
+            shutil.rmtree(os.path.join(project_dir, entry), ignore_errors=True)
+
+    return final_dir
+
+def open_series(path: str) -> dict:
+    series = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in COLUMNS}
+    with open(os.path.join(path, "catalog.json")) as f:
+        series["catalog"] = [tuple(item) for item in json.load(f)]
+    return series
+
+
+#3. Read-through access
+def get_series(project_id: str, retry: bool = True) -> dict:
+    version = get_sync_version(project_id)
+
+    with _lock:
+        cached = _open_series.get(project_id)
+        if cached and cached[0] == version:
+            _open_series.move_to_end(project_id)
+            stats["hits"] += 1
+            record_cache("metric_cache", True)
+            return cached[1]
+
+    path = os.path.join(project_cache_dir(project_id), f"v{version}")
+    if os.path.isdir(path):
+        # Another worker already built this version
+        with _lock:
+            stats["hits"] += 1
+        record_cache("metric_cache", True)
+    else:
+        with _lock:
+            stats["misses"] += 1
+        record_cache("metric_cache", False)
+        started = time.perf_counter()
+        columns, catalog = build_columns(load_rows_from_supabase(project_id))
+        path = write_series(project_id, version, columns, catalog)
+        logging.info(f"Built metric cache for project {project_id} v{version} "
+                     f"({len(columns['dates'])} rows, {time.perf_counter() - started:.3f}s)")
+
+    try:
+        series = open_series(path)
+    except FileNotFoundError:
+        # Our version was superseded and cleaned up by another worker; look again
+        with _lock:
+            _versions.pop(project_id, None)
+        if not retry:
+            raise
+        return get_series(project_id, retry=False)
+
+    with _lock:
+        _open_series[project_id] = (version, series)
+        _open_series.move_to_end(project_id)
+        while len(_open_series) > MAX_OPEN_PROJECTS:
+            _open_series.popitem(last=False)
+    return series
+
+def to_ordinal(value) -> int:
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    return date.fromisoformat(str(value)[:10]).toordinal()
+
+def query_metrics(project_id: str, start_date=None, end_date=None, metric_names: list = None) -> list:
+    """
+    Return [{"date", "source", "property_id", "metric_name", "value"}] for a
+    project between start_date and end_date (inclusive), optionally limited to
+    some metric names. property_id is the GA property (None for Stripe).
+    """
+    series = get_series(project_id)
+    dates = series["dates"]
+
+    # Binary search for the date range
+    lo = np.searchsorted(dates, to_ordinal(start_date), side="left") if start_date else 0
+    hi = np.searchsorted(dates, to_ordinal(end_date), side="right") if end_date else len(dates)
+
+    ids = series["metric_ids"][lo:hi]
+    values = series["values"][lo:hi]
+    day_ordinals = dates[lo:hi]
+    catalog = series["catalog"]
+
+    if metric_names:
+        names = set(metric_names)
+        wanted = np.array([i for i, (_, _, name) in enumerate(catalog) if name in names], dtype=np.int32)
+        mask = np.isin(ids, wanted)
+        ids, values, day_ordinals = ids[mask], values[mask], day_ordinals[mask]
+
+    return [
+        {
+            "date": date.fromordinal(int(d)).isoformat(),
+            "source": catalog[i][0],
+            "property_id": catalog[i][1],
+            "metric_name": catalog[i][2],
+            "value": float(v),
+        }
+        for d, i, v in zip(day_ordinals.tolist(), ids.tolist(), values.tolist())
+    ]
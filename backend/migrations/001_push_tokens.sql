@@ -0,0 +1,11 @@
+-- Expo push tokens registered by the mobile app, one row per device
+CREATE TABLE IF NOT EXISTS push_tokens (
+    id BIGSERIAL PRIMARY KEY,
+    user_id UUID NOT NULL,
+    token TEXT NOT NULL UNIQUE,
+    platform TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS push_tokens_user_id_idx ON push_tokens (user_id);
@@ -0,0 +1,15 @@
+-- Per-user due time for notifications, derived from frequency and timezone
+ALTER TABLE notification_preference
+    ADD COLUMN IF NOT EXISTS timezone TEXT NOT NULL DEFAULT 'UTC',
+    ADD COLUMN IF NOT EXISTS next_send_at TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS last_sent_at TIMESTAMPTZ;
+
+-- Existing preferences become due on the next scheduler tick
+UPDATE notification_preference
+SET next_send_at = now()
+WHERE next_send_at IS NULL AND (traffic OR session_duration);
+
+-- Scheduler ticks only ever scan the due part of this index
+CREATE INDEX IF NOT EXISTS notification_preference_next_send_at_idx
+    ON notification_preference (next_send_at)
+    WHERE next_send_at IS NOT NULL;
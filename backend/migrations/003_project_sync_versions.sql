@@ -0,0 +1,6 @@
+-- Bumped after every sync that writes metrics for a project; used to invalidate caches
+CREATE TABLE IF NOT EXISTS project_sync_versions (
+    project_id UUID PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
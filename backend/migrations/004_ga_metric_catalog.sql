@@ -0,0 +1,55 @@
+-- Property names stored once per property instead of on every metric row
+CREATE TABLE IF NOT EXISTS ga_properties (
+    property_id TEXT PRIMARY KEY,
+    property_display_name TEXT,
+    account_name TEXT,
+    last_synced_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Integer ids for metric names; descriptions stored once per property
+CREATE TABLE IF NOT EXISTS metric_catalog (
+    metric_id SERIAL PRIMARY KEY,
+    property_id TEXT NOT NULL REFERENCES ga_properties (property_id) ON DELETE CASCADE,
+    metric_name TEXT NOT NULL,
+    metric_description TEXT,
+    UNIQUE (property_id, metric_name)
+);
+
+CREATE INDEX IF NOT EXISTS metric_catalog_metric_name_idx ON metric_catalog (metric_name);
+
+-- Sparse daily facts: zero values are not stored, readers treat missing rows as zero
+CREATE TABLE IF NOT EXISTS ga_metric_facts (
+    project_id UUID NOT NULL,
+    metric_id INTEGER NOT NULL REFERENCES metric_catalog (metric_id) ON DELETE CASCADE,
+    date DATE NOT NULL,
+    metric_value DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (project_id, metric_id, date)
+);
+
+CREATE INDEX IF NOT EXISTS ga_metric_facts_project_date_idx ON ga_metric_facts (project_id, date);
+
+-- Backfill from the long google_analytics_metrics rows
+INSERT INTO ga_properties (property_id, property_display_name, account_name, last_synced_at)
+SELECT DISTINCT ON (property_id) property_id, property_display_name, account_name, last_synced_at
+FROM google_analytics_metrics
+WHERE metric_name IS NOT NULL
+ORDER BY property_id, last_synced_at DESC
+ON CONFLICT (property_id) DO NOTHING;
+
+INSERT INTO metric_catalog (property_id, metric_name, metric_description)
+SELECT DISTINCT ON (property_id, metric_name) property_id, metric_name, metric_description
+FROM google_analytics_metrics
+WHERE metric_name IS NOT NULL
+ORDER BY property_id, metric_name, last_synced_at DESC
+ON CONFLICT (property_id, metric_name) DO NOTHING;
+
+INSERT INTO ga_metric_facts (project_id, metric_id, date, metric_value)
+SELECT m.project_id, c.metric_id, m.date, m.metric_value
+FROM google_analytics_metrics m
+JOIN metric_catalog c ON c.property_id = m.property_id AND c.metric_name = m.metric_name
+WHERE m.metric_name IS NOT NULL AND m.metric_value <> 0
+ON CONFLICT (project_id, metric_id, date) DO NOTHING;
+
+-- The long rows are now redundant
+DELETE FROM google_analytics_metrics WHERE metric_name IS NOT NULL;
@@ -0,0 +1,18 @@
+-- Background jobs (e.g. the initial Google Analytics sync after OAuth) with per-item progress
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    kind TEXT NOT NULL,
+    user_id UUID,
+    project_id UUID,
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'succeeded', 'failed')),
+    -- {"items": {"<property_id>": {"status": ..., "message": ...}}, "total": n, "completed": n}
+    progress JSONB NOT NULL DEFAULT '{}'::jsonb,
+    error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS jobs_project_id_idx ON jobs (project_id, created_at DESC);
@@ -0,0 +1,18 @@
+-- Turn jobs into a durable queue: workers claim rows with FOR UPDATE SKIP LOCKED,
+-- hold them for a visibility timeout, and retry with backoff until max_attempts
+ALTER TABLE jobs
+    ADD COLUMN IF NOT EXISTS attempts INT NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS max_attempts INT NOT NULL DEFAULT 5,
+    ADD COLUMN IF NOT EXISTS run_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    ADD COLUMN IF NOT EXISTS locked_by TEXT,
+    ADD COLUMN IF NOT EXISTS locked_until TIMESTAMPTZ;
+
+-- Jobs that exhaust their attempts (or fail permanently) are dead-lettered
+UPDATE jobs SET status = 'dead' WHERE status = 'failed';
+ALTER TABLE jobs DROP CONSTRAINT IF EXISTS jobs_status_check;
+ALTER TABLE jobs ADD CONSTRAINT jobs_status_check
+    CHECK (status IN ('queued', 'running', 'succeeded', 'dead'));
+
+-- Claim paths: due queued jobs, and running jobs whose lock expired
+CREATE INDEX IF NOT EXISTS jobs_queued_run_at_idx ON jobs (run_at) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS jobs_running_locked_until_idx ON jobs (locked_until) WHERE status = 'running';
@@ -0,0 +1,55 @@
+-- Last date each ingestion stream (a GA property, a Stripe account) synced completely per project
+CREATE TABLE IF NOT EXISTS ingestion_watermarks (
+    project_id UUID NOT NULL,
+    source TEXT NOT NULL,
+    stream_key TEXT NOT NULL,
+    watermark DATE NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (project_id, source, stream_key)
+);
+
+-- Google Analytics metrics are stored only as ga_metric_facts now; the wide
+-- per-day rows (active_users, sessions, ...) are no longer written
+INSERT INTO ga_properties (property_id)
+SELECT DISTINCT property_id FROM google_analytics_metrics
+ON CONFLICT (property_id) DO NOTHING;
+
+INSERT INTO metric_catalog (property_id, metric_name)
+SELECT DISTINCT m.property_id, c.metric_name
+FROM google_analytics_metrics m
+CROSS JOIN (VALUES ('activeUsers'), ('newUsers'), ('sessions'), ('screenPageViews')) AS c (metric_name)
+ON CONFLICT (property_id, metric_name) DO NOTHING;
+
+INSERT INTO ga_metric_facts (project_id, metric_id, date, metric_value)
+SELECT m.project_id, c.metric_id, m.date, v.metric_value
+FROM google_analytics_metrics m
+CROSS JOIN LATERAL (VALUES
+    ('activeUsers', m.active_users),
+    ('newUsers', m.new_users),
+    ('sessions', m.sessions),
+    ('screenPageViews', m.page_views)
+) AS v (metric_name, metric_value)
+JOIN metric_catalog c ON c.property_id = m.property_id AND c.metric_name = v.metric_name
+WHERE v.metric_value IS NOT NULL AND v.metric_value <> 0
+ON CONFLICT (project_id, metric_id, date) DO NOTHING;
+
+-- Only the wide rows whose non-zero values all made it into ga_metric_facts
+-- (a fact that already existed counts); anything else stays for inspection
+DELETE FROM google_analytics_metrics m
+WHERE m.metric_name IS NULL
+  AND NOT EXISTS (
+      SELECT 1
+      FROM (VALUES
+          ('activeUsers', m.active_users),
+          ('newUsers', m.new_users),
+          ('sessions', m.sessions),
+          ('screenPageViews', m.page_views)
+      ) AS v (metric_name, metric_value)
+      WHERE v.metric_value IS NOT NULL AND v.metric_value <> 0
+        AND NOT EXISTS (
+            SELECT 1 FROM ga_metric_facts f
+            JOIN metric_catalog c ON c.metric_id = f.metric_id
+            WHERE f.project_id = m.project_id AND f.date = m.date
+              AND c.property_id = m.property_id AND c.metric_name = v.metric_name
+        )
+  );
@@ -0,0 +1,25 @@
+-- One row per ingestion sync (a GA property or Stripe account of a project).
+-- Syncs now only write metric rows whose value changed, so freshness is read
+-- from here: ga_metric_facts has no timestamp and stripe_metrics.last_synced_at
+-- is only set when a row's value changes.
+CREATE TABLE IF NOT EXISTS sync_runs (
+    run_id BIGSERIAL PRIMARY KEY,
+    project_id UUID NOT NULL,
+    source TEXT NOT NULL,
+    stream_key TEXT NOT NULL,
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    status TEXT NOT NULL,
+    pages INTEGER NOT NULL DEFAULT 0,
+    records INTEGER NOT NULL DEFAULT 0,
+    written INTEGER NOT NULL DEFAULT 0,
+    unchanged INTEGER NOT NULL DEFAULT 0,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    started_at TIMESTAMPTZ NOT NULL,
+    finished_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS sync_runs_stream_idx ON sync_runs (project_id, source, stream_key, finished_at DESC);
+
+-- ga_properties.last_synced_at is only set when the property's names change
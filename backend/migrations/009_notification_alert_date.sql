@@ -0,0 +1,4 @@
+-- Evaluated day of the last alert pushed to a user; alerts are daily, so
+-- users on an hourly schedule are alerted at most once per evaluated day
+ALTER TABLE notification_preference
+    ADD COLUMN IF NOT EXISTS last_alert_date DATE;
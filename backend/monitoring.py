@@ -0,0 +1,158 @@
+"""
+Prometheus metrics for the API and the sync workers, served at /metrics.
+
+    http_request_duration_seconds   per route template, method and status
+    upstream_request_duration_seconds   per provider (google_analytics,
+        stripe, expo), operation (runReport, Charge.list, ...) and status
+    supabase_requests_total / supabase_request_duration_seconds
+        PostgREST calls per table, operation and status
+    db_transaction_duration_seconds   pooled psycopg2 transactions by outcome
+    cache_requests_total   per cache and result (hit / miss)
+    sync_duration_seconds / sync_records_total   per source and status
+    events_published_total / events_dropped_total   live project events
+        (events/broker.py) by type, and those that never reached a stream
+
+Statuses are "ok", an HTTP status code, or "error" for failures without
+one. With several worker processes set PROMETHEUS_MULTIPROC_DIR to an empty
+directory shared by the workers; /metrics then aggregates all of them.
+"""
+import os
+import re
+import time
+from contextlib import contextmanager
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+from dotenv import load_dotenv
+from tracing import supabase_span_hooks
+
+# Load environment variables
+load_dotenv()
+
+# Bearer token required to read /metrics (open when unset)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SYNC_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "API request latency",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "upstream_request_duration_seconds", "Latency of calls to Google Analytics, Stripe and Expo",
+    ["provider", "operation", "status"], buckets=LATENCY_BUCKETS)
+SUPABASE_REQUESTS = Counter(
+    "supabase_requests_total", "Supabase REST calls",
+    ["table", "operation", "status"])
+SUPABASE_REQUEST_DURATION = Histogram(
+    "supabase_request_duration_seconds", "Supabase REST latency (until response headers)",
+    ["table", "operation"], buckets=LATENCY_BUCKETS)
+DB_TRANSACTION_DURATION = Histogram(
+    "db_transaction_duration_seconds", "Pooled Postgres transactions, from checkout to commit or rollback",
+    ["status"], buckets=LATENCY_BUCKETS)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups",
+    ["cache", "result"])
+SYNC_DURATION = Histogram(
+    "sync_duration_seconds", "Ingestion pipeline runs",
+    ["source", "status"], buckets=SYNC_BUCKETS)
+SYNC_RECORDS = Counter(
+    "sync_records_total", "Records written by ingestion pipeline runs",
+    ["source"])
+SYNC_UNCHANGED = Counter(
+    "sync_records_unchanged_total", "Records ingestion pipeline runs found already stored with the same value",
+    ["source"])
+
+EVENTS_PUBLISHED = Counter(
+    "events_published_total", "Live project events published",
+    ["event"])
+EVENTS_DROPPED = Counter(
+    "events_dropped_total", "Live project events dropped (slow subscribers, NOTIFY failures)")
+
+SUPABASE_OPERATIONS = {"GET": "select", "HEAD": "count", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+SUPABASE_PATH = re.compile(r"/rest/v1/(?:rpc/)?([^/?]+)")
+
+
+def status_label(error: Exception = None) -> str:
+    if error is None:
+        return "ok"
+    from jobs.runner import error_status  # jobs imports modules that import this one
+    status = error_status(error)
+    return str(status) if status else "error"
+
+
+#1. Upstream APIs
+@contextmanager
+def track_upstream(provider: str, operation: str):
+    """Time one call (or one paged listing) to an external API"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        UPSTREAM_REQUEST_DURATION.labels(provider, operation, status_label(e)).observe(time.perf_counter() - started)
+        raise
+    UPSTREAM_REQUEST_DURATION.labels(provider, operation, "ok").observe(time.perf_counter() - started)
+
+def observe_upstream(provider: str, operation: str, status, seconds: float):
+    UPSTREAM_REQUEST_DURATION.labels(provider, operation, str(status)).observe(seconds)
+
+
+#2. Supabase
+def instrument_supabase(client):
+    """Count (and trace) the PostgREST calls of a supabase client by table, operation and status"""
+    def on_request(request):
+        request.extensions["metrics_started"] = time.perf_counter()
+
+    def on_response(response):
+        request = response.request
+        match = SUPABASE_PATH.search(request.url.path)
+        table = match.group(1) if match else "other"
+        operation = "rpc" if "/rpc/" in request.url.path else SUPABASE_OPERATIONS.get(request.method, request.method)
+        if operation == "insert" and "resolution=" in request.headers.get("prefer", ""):
+            operation = "upsert"
+        status = "ok" if response.status_code < 400 else str(response.status_code)
+        SUPABASE_REQUESTS.labels(table, operation, status).inc()
+        started = request.extensions.get("metrics_started")
+        if started is not None:
+            SUPABASE_REQUEST_DURATION.labels(table, operation).observe(time.perf_counter() - started)
+
+    span_request, span_response = supabase_span_hooks()
+    hooks = client.postgrest.session.event_hooks
+    hooks["request"] += [on_request, span_request]
+    hooks["response"] += [on_response, span_response]
+    return client
+
+
+#3. Caches and syncs
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+def record_sync(report: dict):
+    SYNC_DURATION.labels(report["source"], report["status"]).observe(report["seconds"])
+    SYNC_RECORDS.labels(report["source"]).inc(report["written"])
+    SYNC_UNCHANGED.labels(report["source"]).inc(report["unchanged"])
+
+
+#4. Exposition
+def route_label(request) -> str:
+    """Route template (/api/projects/{project_id}/metrics), so ids do not create new series"""
+    route = request.scope.get("route")
+    return getattr(route, "path_format", None) or getattr(route, "path", None) or "unmatched"
+
+async def metrics_middleware(request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_REQUEST_DURATION.labels(request.method, route_label(request), str(status)).observe(
+            time.perf_counter() - started)
+
+def render_metrics() -> tuple:
+    """(body, content type) for a scrape"""
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,254 @@
+import logging
+import warnings
+from datetime import datetime, timedelta
+import numpy as np
+from google_analytics.metric_store import load_metric_facts
+from ingestion.watermarks import get_watermarks
+from clients import get_supabase
+from database import fetch_all_rows
+from .sender import chunk
+
+# Notification type -> GA metrics that drive it
+ALERT_METRICS = {
+    "traffic": ["sessions", "activeUsers"],
+    "session_duration": ["averageSessionDuration"],
+}
+
+# Metrics that are averages rather than counts, combined across properties by mean instead of sum
+AVERAGED_METRICS = {"averageSessionDuration"}
+
+# Detection settings
+BASELINE_DAYS = 14          # trailing window used for the baseline
+MIN_BASELINE_POINTS = 7     # days of history required before alerting
+Z_SCORE_THRESHOLD = 3.0     # |z| at or above this triggers an alert
+PCT_CHANGE_THRESHOLD = 0.5  # |change vs. baseline mean| at or above 50% triggers an alert
+MIN_BASELINE_VALUE = {      # ignore projects too small for changes to be meaningful
+    "sessions": 20,
+    "activeUsers": 20,
+    "averageSessionDuration": 5.0,
+}
+
+# Keep `in` filters well below URL length limits
+PROJECT_QUERY_CHUNK = 100
+
+
+#1. Load who wants which alerts, per project
+def load_subscriptions(user_ids: list = None) -> dict:
+    """
+    Returns {project_id: {"traffic": [user_ids], "session_duration": [user_ids]}}
+    for users that enabled at least one alert type.
+    """
+    def preferences_query():
+        query = get_supabase().table("notification_preference").select("user_id, traffic, session_duration")
+        query = query.or_("traffic.eq.true,session_duration.eq.true")
+        return query.in_("user_id", ids) if user_ids is not None else query
+
+    preferences = []
+    if user_ids is None:
+        ids = None
+        preferences = fetch_all_rows(preferences_query)
+    else:
+        for ids in chunk(list(user_ids), PROJECT_QUERY_CHUNK):
+            preferences.extend(fetch_all_rows(preferences_query))
+
+    enabled = {row["user_id"]: row for row in preferences}
+    if not enabled:
+        return {}
+
+    memberships = []
+    for ids in chunk(list(enabled), PROJECT_QUERY_CHUNK):
+        memberships.extend(fetch_all_rows(
+            lambda: get_supabase().table("project_to_user").select("project_id, user_id").in_("user_id", ids)
+        ))
+
+    subscriptions = {}
+    for row in memberships:
+        prefs = enabled[row["user_id"]]
+        project = subscriptions.setdefault(row["project_id"], {alert_type: [] for alert_type in ALERT_METRICS})
+        for alert_type in ALERT_METRICS:
+            if prefs.get(alert_type):
+                project[alert_type].append(row["user_id"])
+
+    return subscriptions
+
+
+#2. Load recent metric series for many projects into one dense array
+def load_metric_series(project_ids: list, metric_names: list, end_date, days: int):
+    """
+    Returns (project_ids, dates, values, synced_until) where values has shape
+    (projects, metrics, days). Facts are sparse, so days missing after a
+    project's first stored day are zero, but only up to the day all of the
+    project's GA properties synced completely (synced_until); days before
+    the first stored day or after synced_until are NaN (unknown).
+    """
+    start_date = end_date - timedelta(days=days - 1)
+    rows = load_metric_facts(
+        project_ids, metric_names, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
+    )
+    watermarks = get_watermarks(project_ids, "google_analytics")
+
+    projects = np.array(sorted(project_ids), dtype=object)
+    dates = np.arange(np.datetime64(start_date.strftime("%Y-%m-%d")), days)
+    synced_until = sync_coverage(rows, projects, watermarks)
+    return projects, dates, build_series_array(rows, projects, metric_names, dates, synced_until), synced_until
+
+
+def sync_coverage(rows: list, projects: np.ndarray, watermarks: dict) -> np.ndarray:
+    """
+    Last day every GA property of each project synced completely: the
+    lowest watermark among the properties with a watermark or stored facts.
+    NaT when a property has facts but no watermark, or nothing synced yet.
+    """
+    streams = {project_id: dict(watermarks.get(project_id, {})) for project_id in projects}
+    for row in rows:
+        streams[row["project_id"]].setdefault(row["property_id"], None)
+
+    synced_until = np.full(len(projects), np.datetime64("NaT"), dtype="datetime64[D]")
+    for i, project_id in enumerate(projects):
+        days = streams[project_id].values()
+        if days and None not in days:
+            synced_until[i] = np.datetime64(min(days), "D")
+    return synced_until
+
+
+def build_series_array(rows: list, projects: np.ndarray, metric_names: list, dates: np.ndarray,
+                       synced_until: np.ndarray) -> np.ndarray:
+    """
+    Scatter (project, date, metric, value) rows into a (projects, metrics, days)
+    array; synced_until (projects,) is the last day known to be complete
+    """
+    values = np.full((len(projects), len(metric_names), len(dates)), np.nan)
+    if not rows:
+        return values
+
+    row_projects = np.array([r["project_id"] for r in rows], dtype=object)
+    row_metrics = np.array([r["metric_name"] for r in rows], dtype=object)
+    row_dates = np.array([r["date"] for r in rows], dtype="datetime64[D]")
+    row_values = np.array([r["metric_value"] for r in rows], dtype=np.float64)
+
+    # Map labels to array positions without per-row Python lookups
+    p = np.searchsorted(projects, row_projects)
+    metric_order = np.argsort(np.array(metric_names, dtype=object))
+    m = metric_order[np.searchsorted(np.array(metric_names, dtype=object)[metric_order], row_metrics)]
+    d = (row_dates - dates[0]).astype(np.int64)
+    keep = (d >= 0) & (d < len(dates))
+    p, m, d, row_values = p[keep], m[keep], d[keep], row_values[keep]
+
+    # Several properties can feed one project: sum counts, average the averaged metrics
+    totals = np.zeros(values.shape)
+    counts = np.zeros(values.shape)
+    np.add.at(totals, (p, m, d), row_values)
+    np.add.at(counts, (p, m, d), 1)
+
+    averaged = np.array([name in AVERAGED_METRICS for name in metric_names])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        combined = np.where(averaged[None, :, None], totals / counts, totals)
+    combined = np.where(counts > 0, combined, 0.0)
+
+    # Zero values are not stored: missing days count as zero once a project has any data,
+    # up to its last synced day (later days may simply not have synced yet)
+    has_data = counts.sum(axis=1) > 0
+    first_day = np.where(has_data.any(axis=1), has_data.argmax(axis=1), len(dates))
+    covered = (np.arange(len(dates))[None, :] >= first_day[:, None]) & (dates[None, :] <= synced_until[:, None])
+    return np.where(covered[:, None, :], combined, np.nan)
+
+
+#3. Score the latest day of every series against its trailing baseline in one pass
+def detect_anomalies(values: np.ndarray, min_baseline: np.ndarray,
+                     baseline_days: int = BASELINE_DAYS,
+                     min_points: int = MIN_BASELINE_POINTS,
+                     z_threshold: float = Z_SCORE_THRESHOLD,
+                     pct_threshold: float = PCT_CHANGE_THRESHOLD) -> dict:
+    """
+    values: (projects, metrics, days) array, last day is the one evaluated.
+    min_baseline: (metrics,) minimum baseline mean required to alert.
+    Returns arrays of shape (projects, metrics): triggered, latest, baseline, z_score, pct_change.
+    """
+    latest = values[..., -1]
+    window = values[..., -(baseline_days + 1):-1]
+
+    points = np.sum(~np.isnan(window), axis=-1)
+    # Series without any history produce NaN baselines, which are filtered out below
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        baseline = np.nanmean(window, axis=-1)
+        spread = np.nanstd(window, axis=-1)
+        z_score = np.where(spread > 0, (latest - baseline) / spread, 0.0)
+        pct_change = np.where(baseline > 0, (latest - baseline) / baseline, 0.0)
+
+    eligible = (points >= min_points) & ~np.isnan(latest) & (baseline >= min_baseline[None, :])
+    triggered = eligible & ((np.abs(z_score) >= z_threshold) | (np.abs(pct_change) >= pct_threshold))
+
+    return {
+        "triggered": triggered,
+        "latest": latest,
+        "baseline": baseline,
+        "z_score": z_score,
+        "pct_change": pct_change,
+    }
+
+
+#4. Evaluate all opted-in projects and return alert candidates for the sender
+def evaluate_alerts(user_ids: list = None, end_date=None) -> list:
+    """
+    Returns a list of alert candidates:
+    {"project_id", "alert_type", "metric_name", "date", "value", "baseline",
+     "z_score", "pct_change", "direction", "user_ids"}
+    """
+    subscriptions = load_subscriptions(user_ids)
+    if not subscriptions:
+        return []
+
+    # GA data is complete up to 2 days ago
+    end_date = end_date or (datetime.now() - timedelta(days=2))
+    metric_names = [name for names in ALERT_METRICS.values() for name in names]
+
+    started = datetime.now()
+    projects, dates, values, synced_until = load_metric_series(
+        list(subscriptions), metric_names, end_date, BASELINE_DAYS + 1
+    )
+    loaded = datetime.now()
+
+    # Projects whose evaluated day has not synced (yet) are skipped: their latest values are NaN
+    stale = int(np.sum(~(synced_until >= dates[-1])))
+    if stale:
+        logging.info(f"Skipping {stale} projects not synced through {dates[-1]}")
+
+    min_baseline = np.array([MIN_BASELINE_VALUE.get(name, 0.0) for name in metric_names])
+    scores = detect_anomalies(values, min_baseline)
+
+    # Only the triggered cells are turned back into Python objects
+    metric_alert_type = {name: alert_type for alert_type, names in ALERT_METRICS.items() for name in names}
+    candidates = []
+    seen = set()
+    for p, m in zip(*np.nonzero(scores["triggered"])):
+        project_id = projects[p]
+        metric_name = metric_names[m]
+        alert_type = metric_alert_type[metric_name]
+        recipients = subscriptions[project_id][alert_type]
+
+        # One alert per project and type; sessions outrank activeUsers for traffic
+        if not recipients or (project_id, alert_type) in seen:
+            continue
+        seen.add((project_id, alert_type))
+
+        pct_change = float(scores["pct_change"][p, m])
+        candidates.append({
+            "project_id": project_id,
+            "alert_type": alert_type,
+            "metric_name": metric_name,
+            "date": str(dates[-1]),
+            "value": float(scores["latest"][p, m]),
+            "baseline": round(float(scores["baseline"][p, m]), 2),
+            "z_score": round(float(scores["z_score"][p, m]), 2),
+            "pct_change": round(pct_change, 4),
+            "direction": "up" if pct_change >= 0 else "down",
+            "user_ids": recipients,
+        })
+
+    logging.info(
+        f"Evaluated {len(projects)} projects: {len(candidates)} alert candidates "
+        f"(load {(loaded - started).total_seconds():.3f}s, "
+        f"score {(datetime.now() - loaded).total_seconds():.3f}s)"
+    )
+    return candidates
@@ -0,0 +1,26 @@
+"""
+Notification background jobs (see jobs/runner.py):
+- notification_send: evaluate and push alerts for a batch of users; the
+  scheduler queues one when a tick fails so the batch is retried with backoff
+"""
+import logging
+from jobs.kinds import NOTIFICATION_SEND
+from jobs.runner import register_handler, TransientJobError
+from .scheduler import send_alerts, mark_sent
+from .sender import create_push_client
+
+
+async def run_notification_send(job: dict):
+    # Each job runs in its own event loop (asyncio.run), so it cannot reuse the
+    # shared client, whose connections belong to the loop that created them
+    async with create_push_client() as client:
+        result = await send_alerts(set(job["payload"].user_ids), client=client)
+    mark_sent(result["sent_user_ids"], result["alert_date"])
+
+    report = result["report"]
+    logging.info(f"Notification job {job['job_id']}: {len(result['alerts'])} alerts, {report['sent']} pushes sent")
+    if result["messages"] and not report["sent"] and report["errors"]:
+        raise TransientJobError(f"No pushes accepted: {report['errors'][0]}")
+
+
+register_handler(NOTIFICATION_SEND, run_notification_send)
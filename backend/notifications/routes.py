@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+import logging
+from auth import get_current_user_id
+from .tokens import save_device_token, delete_device_token
+
+# Create router
+router = APIRouter()
+
+# Structure of the push token registration request
+class PushTokenRequest(BaseModel):
+    token: str
+    platform: str | None = None
+
+# Register the Expo push token of the signed-in device
+@router.post("/push-tokens")
+async def register_push_token(
+    request: PushTokenRequest,
+    user_id: str = Depends(get_current_user_id)
+):
+    try:
+        save_device_token(user_id, request.token, request.platform)
+        return {"message": "Push token registered"}
+    except Exception as e:
+        logging.error(f"Error registering push token: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
+# Remove the push token of a device (e.g. on sign out)
+@router.delete("/push-tokens")
+async def unregister_push_token(
+    request: PushTokenRequest,
+    user_id: str = Depends(get_current_user_id)
+):
+    try:
+        delete_device_token(user_id, request.token)
+        return {"message": "Push token removed"}
+    except Exception as e:
+        logging.error(f"Error removing push token: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
@@ -0,0 +1,259 @@
+"""
+Notification scheduler.
+
+Every user with alerts enabled has a `next_send_at` in notification_preference.
+Each tick claims only the rows that are due (indexed, FOR UPDATE SKIP LOCKED) and
+moves their `next_send_at` forward in one short transaction, then evaluates and
+sends their alerts, so the cost of a tick follows the number of due users and
+several schedulers can run side by side.
+
+Run with:
+    python -m notifications.scheduler
+"""
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from psycopg2.extras import execute_values
+from database import get_connection
+from clients import get_supabase
+from .evaluator import evaluate_alerts
+from .sender import send_push_notifications, close_push_client
+from .tokens import get_device_tokens, prune_device_tokens
+from jobs.kinds import NOTIFICATION_SEND
+from jobs.runner import enqueue_job
+from logging_config import configure_logging
+
+# Scheduler settings
+TICK_INTERVAL_SECONDS = int(os.getenv("NOTIFICATION_TICK_SECONDS", "60"))
+CLAIM_BATCH_SIZE = int(os.getenv("NOTIFICATION_CLAIM_BATCH", "500"))
+
+# Local hour at which daily and weekly notifications go out
+SEND_HOUR = int(os.getenv("NOTIFICATION_SEND_HOUR", "9"))
+
+# Frequencies that never schedule a notification
+DISABLED_FREQUENCIES = {None, "", "never", "off", "none"}
+
+ALERT_TITLES = {
+    "traffic": "Traffic",
+    "session_duration": "Session duration",
+}
+
+
+#1. Next due time from frequency and the user's timezone
+def compute_next_send_at(frequency: str, tz_name: str = "UTC", now: datetime = None):
+    """Returns the next UTC send time strictly after `now`, or None if notifications are off"""
+    frequency = (frequency or "").strip().lower()
+    if frequency in DISABLED_FREQUENCIES:
+        return None
+
+    try:
+        tz = ZoneInfo(tz_name or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        tz = timezone.utc
+
+    now = now or datetime.now(timezone.utc)
+    local_now = now.astimezone(tz)
+
+    if frequency == "hourly":
+        next_local = local_now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    elif frequency == "weekly":
+        # Mondays at SEND_HOUR local time
+        next_local = local_now.replace(hour=SEND_HOUR, minute=0, second=0, microsecond=0)
+        next_local += timedelta(days=(7 - next_local.weekday()) % 7)
+        if next_local <= local_now:
+            next_local += timedelta(days=7)
+    elif frequency == "monthly":
+        next_local = local_now.replace(day=1, hour=SEND_HOUR, minute=0, second=0, microsecond=0)
+        if next_local <= local_now:
+            next_local = (next_local + timedelta(days=32)).replace(day=1)
+    else:
+        # Daily is the default for unknown values
+        next_local = local_now.replace(hour=SEND_HOUR, minute=0, second=0, microsecond=0)
+        if next_local <= local_now:
+            next_local += timedelta(days=1)
+
+    # ZoneInfo resolves the offset for the new wall time, so DST changes are respected
+    return next_local.astimezone(timezone.utc)
+
+
+#2. Claim due rows; they stay locked until they are rescheduled and committed
+def claim_due_preferences(cursor, limit: int = CLAIM_BATCH_SIZE) -> list:
+    cursor.execute("""
+        SELECT user_id, frequency, timezone
+        FROM notification_preference
+        WHERE next_send_at IS NOT NULL AND next_send_at <= now()
+        ORDER BY next_send_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (limit,))
+    return [
+        {"user_id": str(user_id), "frequency": frequency, "timezone": tz_name}
+        for user_id, frequency, tz_name in cursor.fetchall()
+    ]
+
+def reschedule(cursor, claimed: list):
+    now = datetime.now(timezone.utc)
+    rows = [
+        (row["user_id"], compute_next_send_at(row["frequency"], row["timezone"], now))
+        for row in claimed
+    ]
+    execute_values(cursor, """
+        UPDATE notification_preference AS np
+        SET next_send_at = v.next_send_at
+        FROM (VALUES %s) AS v (user_id, next_send_at)
+        WHERE np.user_id = v.user_id::uuid
+    """, rows, template="(%s, %s::timestamptz)")
+
+
+#3. Turn alert candidates into push messages for the claimed users
+def get_project_names(project_ids: list) -> dict:
+    if not project_ids:
+        return {}
+    result = get_supabase().table("projects").select("project_id, project_name").in_("project_id", project_ids).execute()
+    return {row["project_id"]: row["project_name"] for row in result.data or []}
+
+def format_alert(candidate: dict, project_name: str) -> dict:
+    change = abs(candidate["pct_change"]) * 100
+    title = f"{project_name}: {ALERT_TITLES.get(candidate['alert_type'], 'Metric')} {candidate['direction']} {change:.0f}%"
+    if candidate["alert_type"] == "session_duration":
+        body = (f"Average session duration was {candidate['value']:.0f}s on {candidate['date']} "
+                f"(usually {candidate['baseline']:.0f}s)")
+    else:
+        body = (f"{candidate['value']:.0f} {candidate['metric_name']} on {candidate['date']} "
+                f"(usually {candidate['baseline']:.0f})")
+    return {"title": title, "body": body}
+
+def build_messages(candidates: list, user_ids: set) -> list:
+    recipients = {uid for c in candidates for uid in c["user_ids"] if uid in user_ids}
+    if not recipients:
+        return []
+
+    tokens = get_device_tokens(list(recipients))
+    project_names = get_project_names(list({c["project_id"] for c in candidates}))
+
+    messages = []
+    for candidate in candidates:
+        alert = format_alert(candidate, project_names.get(candidate["project_id"], "Your project"))
+        for user_id in candidate["user_ids"]:
+            if user_id not in user_ids:
+                continue
+            for token in tokens.get(user_id, []):
+                messages.append({
+                    "to": token,
+                    "title": alert["title"],
+                    "body": alert["body"],
+                    "sound": "default",
+                    "data": {
+                        "project_id": candidate["project_id"],
+                        "alert_type": candidate["alert_type"],
+                        "user_id": user_id,
+                    }
+                })
+    return messages
+
+
+#4. Evaluate and send alerts for a set of users
+async def send_alerts(user_ids: set, client=None) -> dict:
+    """
+    Returns the alert candidates, their evaluated day, the sender report and
+    the users that got at least one push. `client` is the push client to send
+    with (default: the shared one, for the scheduler's long-lived loop).
+    """
+    # Evaluation and message building read Supabase synchronously
+    alerts = await asyncio.to_thread(evaluate_alerts, list(user_ids))
+    alert_date = alerts[0]["date"] if alerts else None
+    if alert_date:
+        # Alerts are daily: users already alerted for this day (hourly schedules) are left out
+        user_ids = set(user_ids) - await asyncio.to_thread(get_alerted_users, user_ids, alert_date)
+    messages = await asyncio.to_thread(build_messages, alerts, user_ids)
+    report = {"sent": 0, "tickets": {}, "dead_tokens": [], "errors": []}
+    if messages:
+        report = await send_push_notifications(messages, client=client, on_dead_tokens=prune_device_tokens)
+    sent_tokens = set(report["tickets"].values())
+    sent_user_ids = {m["data"]["user_id"] for m in messages if m["to"] in sent_tokens}
+    return {"alerts": alerts, "alert_date": alert_date, "messages": messages, "report": report,
+            "sent_user_ids": sent_user_ids}
+
+def get_alerted_users(user_ids: set, alert_date: str) -> set:
+    """Users that were already sent an alert for `alert_date`"""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT user_id::text FROM notification_preference
+                WHERE user_id = ANY(%s::uuid[]) AND last_alert_date >= %s::date
+            """, (list(user_ids), alert_date))
+            return {row[0] for row in cursor.fetchall()}
+
+def mark_sent(user_ids: set, alert_date: str = None):
+    if not user_ids:
+        return
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                UPDATE notification_preference
+                SET last_sent_at = now(), last_alert_date = GREATEST(last_alert_date, %s::date)
+                WHERE user_id = ANY(%s::uuid[])
+            """, (alert_date, list(user_ids)))
+
+
+#5. One scheduler tick
+def claim_and_reschedule(limit: int) -> list:
+    # Committed before anything is sent, so row locks and the connection are held only briefly
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            claimed = claim_due_preferences(cursor, limit)
+            if claimed:
+                reschedule(cursor, claimed)
+    return claimed
+
+async def run_tick(limit: int = CLAIM_BATCH_SIZE) -> dict:
+    claimed = await asyncio.to_thread(claim_and_reschedule, limit)
+    if not claimed:
+        return {"claimed": 0, "alerts": 0, "sent": 0}
+
+    user_ids = {row["user_id"] for row in claimed}
+    result = {"alerts": [], "report": {"sent": 0}, "sent_user_ids": set()}
+
+    try:
+        result = await send_alerts(user_ids)
+    except Exception as e:
+        # Hand the batch to the job queue, which retries with backoff; the users are
+        # already rescheduled, so other instances don't retry it in a loop
+        logging.error(f"Error running notification tick: {str(e)}")
+        try:
+            await asyncio.to_thread(enqueue_job, NOTIFICATION_SEND, payload={"user_ids": sorted(user_ids)})
+        except Exception as job_err:
+            logging.error(f"Error queueing notification retry: {str(job_err)}")
+
+    try:
+        await asyncio.to_thread(mark_sent, result["sent_user_ids"], result.get("alert_date"))
+    except Exception as e:
+        logging.error(f"Error recording sent notifications: {str(e)}")
+
+    alerts, sent = len(result["alerts"]), result["report"]["sent"]
+    logging.info(f"Notification tick: {len(claimed)} due users, {alerts} alerts, {sent} pushes sent")
+    return {"claimed": len(claimed), "alerts": alerts, "sent": sent}
+
+
+#6. Scheduler loop
+async def run_scheduler(interval: int = TICK_INTERVAL_SECONDS):
+    logging.info(f"Notification scheduler started (tick every {interval}s)")
+    try:
+        while True:
+            try:
+                result = await run_tick()
+                # A full batch means more rows are probably due, so go again right away
+                if result["claimed"] >= CLAIM_BATCH_SIZE:
+                    continue
+            except Exception as e:
+                logging.error(f"Notification scheduler tick failed: {str(e)}")
+            await asyncio.sleep(interval)
+    finally:
+        await close_push_client()
+
+
+if __name__ == "__main__":
+    configure_logging()
+    asyncio.run(run_scheduler())
@@ -0,0 +1,255 @@
+import os
+import time
+import asyncio
+import random
+import logging
+import httpx
+from dotenv import load_dotenv
+from monitoring import observe_upstream
+
+# Load environment variables
+load_dotenv()
+
+# Expo push service endpoints (overridable so a local stand-in server can be used)
+EXPO_PUSH_BASE_URL = os.getenv("EXPO_PUSH_BASE_URL", "https://exp.host/--/api/v2/push").rstrip("/")
+EXPO_ACCESS_TOKEN = os.getenv("EXPO_ACCESS_TOKEN")
+
+# Expo accepts at most 100 messages per send request and 1000 ids per receipts request
+MAX_BATCH_SIZE = 100
+MAX_RECEIPT_BATCH_SIZE = 1000
+
+# Number of batch requests in flight at once
+MAX_CONCURRENT_REQUESTS = int(os.getenv("EXPO_PUSH_CONCURRENCY", "16"))
+
+# Retry settings for transient failures (network errors, 429 and 5xx responses)
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+
+# Ticket/receipt errors that mean the device token will never work again
+DEAD_TOKEN_ERRORS = {"DeviceNotRegistered"}
+
+# Ticket errors worth sending again later
+TRANSIENT_TICKET_ERRORS = {"MessageRateExceeded"}
+
+# Shared pooled client, created on first use
+_client = None
+
+
+class PushServiceError(Exception):
+    """Raised when the push service keeps failing after all retries"""
+
+
+#1. Pooled HTTP client shared by all sends
+def create_push_client(max_connections: int = MAX_CONCURRENT_REQUESTS) -> httpx.AsyncClient:
+    headers = {
+        "Accept": "application/json",
+        "Accept-Encoding": "gzip, deflate",
+        "Content-Type": "application/json",
+    }
+    if EXPO_ACCESS_TOKEN:
+        headers["Authorization"] = f"Bearer {EXPO_ACCESS_TOKEN}"
+
+    return httpx.AsyncClient(
+        http2=EXPO_PUSH_BASE_URL.startswith("https://"),
+        headers=headers,
+        timeout=httpx.Timeout(30.0, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        ),
+    )
+
+def get_push_client() -> httpx.AsyncClient:
+    """Shared client for the API's and scheduler's long-lived loop; code running in its own loop creates its own"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_push_client()
+    return _client
+
+async def close_push_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+# Split a list into chunks of at most `size` items
+def chunk(items: list, size: int) -> list:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+# Exponential backoff with full jitter, honouring Retry-After when the server sends it
+def backoff_delay(attempt: int, retry_after: str = None) -> float:
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX_SECONDS)
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+
+#2. POST with retries on transient failures
+async def post_with_retry(client: httpx.AsyncClient, url: str, payload) -> dict:
+    last_error = None
+
+    for attempt in range(MAX_RETRIES + 1):
+        retry_after = None
+        operation = url.rsplit("/", 1)[-1]  # send or getReceipts
+        started = time.perf_counter()
+        try:
+            response = await client.post(url, json=payload)
+            observe_upstream("expo", operation, response.status_code if response.status_code >= 400 else "ok",
+                             time.perf_counter() - started)
+
+            if response.status_code == 429 or response.status_code >= 500:
+                last_error = f"HTTP {response.status_code}"
+                retry_after = response.headers.get("Retry-After")
+            else:
+                response.raise_for_status()
+                return response.json()
+
+        except httpx.TransportError as e:
+            observe_upstream("expo", operation, "error", time.perf_counter() - started)
+            last_error = f"{type(e).__name__}: {str(e)}"
+
+        if attempt < MAX_RETRIES:
+            delay = backoff_delay(attempt, retry_after)
+            logging.warning(f"Push request failed ({last_error}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    raise PushServiceError(f"Push request failed after {MAX_RETRIES + 1} attempts: {last_error}")
+
+
+#3. Send one batch (max 100 messages) and sort its tickets
+async def send_batch(client: httpx.AsyncClient, batch: list, semaphore: asyncio.Semaphore) -> dict:
+    result = {"tickets": {}, "dead_tokens": [], "retry": [], "errors": []}
+
+    async with semaphore:
+        try:
+            body = await post_with_retry(client, f"{EXPO_PUSH_BASE_URL}/send", batch)
+        except Exception as e:
+            logging.error(f"Push batch of {len(batch)} messages failed: {str(e)}")
+            result["errors"] = [{"to": m.get("to"), "error": str(e)} for m in batch]
+            return result
+
+    # Request-level errors reject the whole batch
+    if body.get("errors") and not body.get("data"):
+        message = "; ".join(str(err.get("message", err)) for err in body["errors"])
+        result["errors"] = [{"to": m.get("to"), "error": message} for m in batch]
+        return result
+
+    # Tickets come back in the same order as the messages
+    tickets = body.get("data", [])
+    for message, ticket in zip(batch, tickets):
+        token = message.get("to")
+        if ticket.get("status") == "ok":
+            result["tickets"][ticket.get("id")] = token
+            continue
+
+        error = (ticket.get("details") or {}).get("error")
+        if error in DEAD_TOKEN_ERRORS:
+            result["dead_tokens"].append(token)
+        elif error in TRANSIENT_TICKET_ERRORS:
+            result["retry"].append(message)
+        else:
+            result["errors"].append({"to": token, "error": error or ticket.get("message")})
+
+    # Missing tickets are treated as transient
+    result["retry"].extend(batch[len(tickets):])
+    return result
+
+
+#4. Send any number of messages in concurrent batches
+async def send_push_notifications(messages: list, client: httpx.AsyncClient = None,
+                                  on_dead_tokens=None) -> dict:
+    """
+    Send push messages ({"to", "title", "body", "data"}) through the Expo push service.
+    Returns ticket ids mapped to tokens, dead tokens and per-message errors.
+    `on_dead_tokens` is called with the list of dead tokens so they can be pruned.
+    """
+    client = client or get_push_client()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    report = {"sent": 0, "tickets": {}, "dead_tokens": [], "errors": []}
+    pending = [m for m in messages if m.get("to")]
+
+    for attempt in range(MAX_RETRIES + 1):
+        if not pending:
+            break
+        if attempt > 0:
+            delay = backoff_delay(attempt)
+            logging.info(f"Retrying {len(pending)} rate-limited push messages in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+        results = await asyncio.gather(
+            *(send_batch(client, batch, semaphore) for batch in chunk(pending, MAX_BATCH_SIZE))
+        )
+
+        pending = []
+        for result in results:
+            report["tickets"].update(result["tickets"])
+            report["dead_tokens"].extend(result["dead_tokens"])
+            report["errors"].extend(result["errors"])
+            pending.extend(result["retry"])
+
+    report["errors"].extend({"to": m.get("to"), "error": "MessageRateExceeded"} for m in pending)
+    report["sent"] = len(report["tickets"])
+
+    if report["dead_tokens"] and on_dead_tokens:
+        try:
+            await asyncio.to_thread(on_dead_tokens, report["dead_tokens"])
+        except Exception as e:
+            logging.error(f"Error pruning dead push tokens: {str(e)}")
+
+    logging.info(
+        f"Push send complete: {report['sent']} sent, {len(report['dead_tokens'])} dead tokens, "
+        f"{len(report['errors'])} errors"
+    )
+    return report
+
+
+#5. Check delivery receipts for previously returned tickets
+async def fetch_push_receipts(tickets: dict, client: httpx.AsyncClient = None,
+                              on_dead_tokens=None) -> dict:
+    """
+    Look up receipts for {ticket_id: token}. Receipts that are not ready yet are
+    returned in "pending" so they can be checked again later.
+    """
+    client = client or get_push_client()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    report = {"delivered": 0, "pending": {}, "dead_tokens": [], "errors": []}
+
+    async def fetch(ids):
+        async with semaphore:
+            return ids, await post_with_retry(client, f"{EXPO_PUSH_BASE_URL}/getReceipts", {"ids": ids})
+
+    results = await asyncio.gather(
+        *(fetch(ids) for ids in chunk(list(tickets), MAX_RECEIPT_BATCH_SIZE)),
+        return_exceptions=True
+    )
+
+    for result in results:
+        if isinstance(result, Exception):
+            logging.error(f"Error fetching push receipts: {str(result)}")
+            continue
+
+        ids, body = result
+        receipts = body.get("data", {})
+        for ticket_id in ids:
+            receipt = receipts.get(ticket_id)
+            token = tickets[ticket_id]
+            if receipt is None:
+                report["pending"][ticket_id] = token
+            elif receipt.get("status") == "ok":
+                report["delivered"] += 1
+            elif (receipt.get("details") or {}).get("error") in DEAD_TOKEN_ERRORS:
+                report["dead_tokens"].append(token)
+            else:
+                report["errors"].append({"to": token, "error": receipt.get("message")})
+
+    if report["dead_tokens"] and on_dead_tokens:
+        try:
+            await asyncio.to_thread(on_dead_tokens, report["dead_tokens"])
+        except Exception as e:
+            logging.error(f"Error pruning dead push tokens: {str(e)}")
+
+    return report
@@ -0,0 +1,40 @@
+import logging
+from datetime import datetime, timezone
+from clients import get_supabase
+from database import fetch_all_rows
+from .sender import chunk
+
+# Keep `in` filters well below URL length limits
+TOKEN_QUERY_CHUNK = 200
+
+# Store (or refresh) a device push token for a user
+def save_device_token(user_id: str, token: str, platform: str = None):
+    now = datetime.now(timezone.utc).isoformat()
+    get_supabase().table("push_tokens").upsert({
+        "user_id": user_id,
+        "token": token,
+        "platform": platform,
+        "updated_at": now
+    }, on_conflict="token").execute()
+
+# Remove a single device token for a user (e.g. on sign out)
+def delete_device_token(user_id: str, token: str):
+    get_supabase().table("push_tokens").delete().eq("user_id", user_id).eq("token", token).execute()
+
+# Get all device tokens for the given users as {user_id: [tokens]}
+def get_device_tokens(user_ids: list) -> dict:
+    tokens = {}
+    for ids in chunk(list(user_ids), TOKEN_QUERY_CHUNK):
+        rows = fetch_all_rows(
+            lambda: get_supabase().table("push_tokens").select("user_id, token").in_("user_id", ids)
+        )
+        for row in rows:
+            tokens.setdefault(row["user_id"], []).append(row["token"])
+    return tokens
+
+# Delete tokens the push service reported as no longer registered
+def prune_device_tokens(tokens: list):
+    unique_tokens = list(set(tokens))
+    for batch in chunk(unique_tokens, TOKEN_QUERY_CHUNK):
+        get_supabase().table("push_tokens").delete().in_("token", batch).execute()
+    logging.info(f"Pruned {len(unique_tokens)} dead push tokens")
@@ -54,21 +54,27 @@ def create_creds():
 
     return BetaAnalyticsDataClient(credentials=creds)
 
-client = create_creds()
+# Sample report for GOOGLE_PROPERTY_ID; nothing runs on import
+def main():
+    client = create_creds()
 
-# API query
-request = RunReportRequest(
-    property=f"properties/{property_id}",
-    dimensions=[Dimension(name="date")],
-    metrics=[Metric(name="sessions"), Metric(name="totalUsers")],
-    date_ranges=[DateRange(start_date="2024-01-01", end_date="2024-01-04")],
-)
+    # API query
+    request = RunReportRequest(
+        property=f"properties/{property_id}",
+        dimensions=[Dimension(name="date")],
+        metrics=[Metric(name="sessions"), Metric(name="totalUsers")],
+        date_ranges=[DateRange(start_date="2024-01-01", end_date="2024-01-04")],
+    )
 
-response = client.run_report(request)
+    response = client.run_report(request)
 
-# Console print
-for row in response.rows:
-    date = row.dimension_values[0].value
-    sessions = row.metric_values[0].value
-    users = row.metric_values[1].value
-    print(f"{date}: Sessions = {sessions}, Users = {users}")
\ No newline at end of file
+    # Console print
+    for row in response.rows:
+        date = row.dimension_values[0].value
+        sessions = row.metric_values[0].value
+        users = row.metric_values[1].value
+        print(f"{date}: Sessions = {sessions}, Users = {users}")
+
+
+if __name__ == "__main__":
+    main()
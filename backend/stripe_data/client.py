@@ -0,0 +1,164 @@
+"""
+Per-account Stripe clients, so syncs of many connected accounts can run
+at once in one process.
+
+Every call goes through a stripe.StripeClient bound to one account: the
+account's OAuth access token, or the platform key with the Stripe-Account
+header when only the account id is known. Nothing sets the process-wide
+stripe.api_key per account, so concurrent requests for different projects
+cannot pick up each other's credentials. Clients are built once per
+account (building one takes tens of milliseconds) and the
+STRIPE_MAX_CLIENTS most recently used are kept, each with its account's
+limiter. All of them send through the shared keep-alive pool
+(transports.py).
+
+Requests are rate limited per account with a token bucket of
+STRIPE_ACCOUNT_RPS requests per second (bursts of STRIPE_ACCOUNT_BURST),
+below Stripe's per-account limits, shared by every sync in the process
+that touches the account (several days, several projects). A 429 that
+still arrives holds the account back for its Retry-After (or an
+exponential backoff) and is retried up to STRIPE_RATE_LIMIT_RETRIES times.
+"""
+import os
+import time
+import weakref
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+import stripe
+from clients import registry
+import transports
+
+# Load environment variables
+load_dotenv()
+
+# Stripe allows 100 read requests/s per account in live mode and 25 in test mode
+STRIPE_ACCOUNT_RPS = float(os.getenv("STRIPE_ACCOUNT_RPS", "20"))
+STRIPE_ACCOUNT_BURST = int(os.getenv("STRIPE_ACCOUNT_BURST", "10"))
+STRIPE_RATE_LIMIT_RETRIES = int(os.getenv("STRIPE_RATE_LIMIT_RETRIES", "3"))
+STRIPE_MAX_CLIENTS = int(os.getenv("STRIPE_MAX_CLIENTS", "256"))
+# Seconds before the first retry of a 429 without Retry-After, doubled per retry
+RATE_LIMIT_BACKOFF = 1.0
+
+PLATFORM = "platform"
+
+
+#1. Per-account rate limits
+class AccountLimiter:
+    """Token bucket for one account; callers block (on their own thread) until a request may go out"""
+
+    def __init__(self):
+        self.tokens = float(STRIPE_ACCOUNT_BURST)
+        self.updated = time.monotonic()
+        self.held_until = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(STRIPE_ACCOUNT_BURST, self.tokens + (now - self.updated) * STRIPE_ACCOUNT_RPS)
+                self.updated = now
+                delay = self.held_until - now
+                if delay <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    delay = (1 - self.tokens) / STRIPE_ACCOUNT_RPS
+            time.sleep(delay)
+
+    def hold(self, seconds: float):
+        """Send nothing for the account for `seconds` (after a 429)"""
+        with self.lock:
+            self.held_until = max(self.held_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+class AccountHTTPClient(stripe.HTTPClient):
+    """The shared pooled client, behind one account's limiter"""
+    name = "pooled-httpx-account"
+
+    def __init__(self, pooled, limiter: AccountLimiter, account: str):
+        super().__init__()
+        self.pooled = pooled
+        self.limiter = limiter
+        self.account = account
+
+    def request(self, method, url, headers, post_data=None, *, _usage=None):
+        for attempt in range(STRIPE_RATE_LIMIT_RETRIES + 1):
+            self.limiter.wait()
+            content, status, response_headers = self.pooled.request(method, url, headers, post_data)
+            if status != 429 or attempt == STRIPE_RATE_LIMIT_RETRIES:
+                return content, status, response_headers
+            retry_after = float(response_headers.get("retry-after") or RATE_LIMIT_BACKOFF * 2 ** attempt)
+            logging.warning(f"Stripe rate limited account {self.account}, retrying in {retry_after}s")
+            self.limiter.hold(retry_after)
+
+    def request_stream(self, method, url, headers, post_data=None, *, _usage=None):
+        self.limiter.wait()
+        return self.pooled.request_stream(method, url, headers, post_data)
+
+    def close(self):
+        # The pool belongs to the registry ("stripe_http")
+        pass
+
+
+#2. Clients, one per account
+class StripeAccounts:
+    def __init__(self):
+        # Created after the pool, so the registry closes this first
+        self.pooled = transports.stripe_http_client(registry.get("stripe_http"))
+        self.api_base = os.getenv("STRIPE_API_BASE")
+        # (account id, access token) -> StripeClient, least recently used first
+        self.clients = OrderedDict()
+        # account -> limiter, kept while a cached client or a running sync still uses it
+        self.limiters = weakref.WeakValueDictionary()
+        self.lock = threading.Lock()
+
+    def limiter(self, account: str) -> AccountLimiter:
+        limiter = self.limiters.get(account)
+        if limiter is None:
+            limiter = self.limiters[account] = AccountLimiter()
+        return limiter
+
+    def client(self, access_token: str = None, account_id: str = None) -> stripe.StripeClient:
+        key = (account_id, access_token)
+        with self.lock:
+            client = self.clients.get(key)
+            if client is not None:
+                self.clients.move_to_end(key)
+                return client
+
+            # An account connected without a known id is told apart by its token
+            account = account_id or (
+                hashlib.blake2b(access_token.encode(), digest_size=8).hexdigest() if access_token else PLATFORM)
+            options = {"base_addresses": {"api": self.api_base}} if self.api_base else {}
+            client = stripe.StripeClient(
+                access_token or os.getenv("STRIPE_SECRET_KEY"),
+                # The platform key acts for the connected account through the Stripe-Account header
+                stripe_account=account_id if not access_token else None,
+                client_id=os.getenv("STRIPE_CLIENT_ID"),
+                http_client=AccountHTTPClient(self.pooled, self.limiter(account), account),
+                **options,
+            )
+            self.clients[key] = client
+            if len(self.clients) > STRIPE_MAX_CLIENTS:
+                self.clients.popitem(last=False)
+            return client
+
+    def close(self):
+        with self.lock:
+            self.clients.clear()
+
+registry.register("stripe_accounts", StripeAccounts, StripeAccounts.close)
+
+
+def account_client(access_token: str = None, account_id: str = None) -> stripe.StripeClient:
+    """Client for one connected account (its access token, or the platform key acting for account_id)"""
+    return registry.get("stripe_accounts").client(access_token, account_id)
+
+def platform_client() -> stripe.StripeClient:
+    """Client for the platform account itself (OAuth token exchange)"""
+    return registry.get("stripe_accounts").client()
@@ -2,10 +2,10 @@ from fastapi import APIRouter, Request as FastAPIRequest, Depends
 from fastapi.responses import JSONResponse, RedirectResponse
 import os
 from dotenv import load_dotenv
-import stripe
-from supabase import create_client
+from clients import get_supabase, get_cipher
+from tracing import traced
+from logging_config import configure_logging
 from datetime import datetime, timezone
-from cryptography.fernet import Fernet
 import logging
 import jwt
 from jwt.exceptions import InvalidTokenError
@@ -15,49 +15,32 @@ from auth import verify_token
 load_dotenv()
 
 # Setup logging
-logging.basicConfig(level=logging.INFO)
-
-# Initialize encryption
-ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY")
-if not ENCRYPTION_KEY:
-    raise ValueError("Missing ENCRYPTION_KEY environment variable")
-cipher = Fernet(ENCRYPTION_KEY)
+configure_logging()
 
 # Create router
 router = APIRouter()
 
-# Get environment variables
+# Get environment variables (checked on startup, see clients.py)
 STRIPE_CLIENT_ID = os.getenv("STRIPE_CLIENT_ID")
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_REDIRECT_URI = os.getenv("STRIPE_REDIRECT_URI")
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
 
-# Validation
-if not all([STRIPE_CLIENT_ID, STRIPE_SECRET_KEY, STRIPE_REDIRECT_URI, 
-            SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, JWT_SECRET]):
-    raise ValueError("Missing one or more required environment variables")
-
-# Initialize Stripe
-stripe.api_key = STRIPE_SECRET_KEY
-
-# Create Supabase client
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
-
 # Encryption helpers
+@traced("fernet.encrypt")
 def encrypt_token(token: str) -> str:
-    return cipher.encrypt(token.encode()).decode()
+    return get_cipher().encrypt(token.encode()).decode()
 
+@traced("fernet.decrypt")
 def decrypt_token(token: str) -> str:
-    return cipher.decrypt(token.encode()).decode()
+    return get_cipher().decrypt(token.encode()).decode()
 
 # Project access verification helper
 async def verify_project_access(user_id: str, project_id: str) -> bool:
     """Verify if user has access to the specified project"""
     try:
         # Check project_to_user table
-        result = supabase.table("project_to_user").select("*").eq("user_id", user_id).eq("project_id", project_id).execute()
+        result = get_supabase().table("project_to_user").select("*").eq("user_id", user_id).eq("project_id", project_id).execute()
         return len(result.data) > 0
     except Exception as e:
         logging.error(f"Error verifying project access: {str(e)}")
@@ -122,6 +105,9 @@ async def test():
 @router.get("/callback")
 async def stripe_callback(request: FastAPIRequest):
     """Handle Stripe OAuth callback - for test mode"""
+    # (imported here so the Stripe SDK only loads when it is first needed)
+    import stripe
+    from .client import account_client, platform_client
     # Get authorization code and state from callback
     code = request.query_params.get("code")
     state = request.query_params.get("state")
@@ -149,10 +135,10 @@ async def stripe_callback(request: FastAPIRequest):
         
         # Exchange code for access token
         logging.info("Exchanging authorization code for access token")
-        response = stripe.OAuth.token(
-            grant_type='authorization_code',
-            code=code,
-        )
+        response = platform_client().oauth.token(params={
+            "grant_type": "authorization_code",
+            "code": code,
+        })
         
         logging.info("Successfully retrieved access token")
         
@@ -166,14 +152,11 @@ async def stripe_callback(request: FastAPIRequest):
         encrypted_refresh_token = encrypt_token(refresh_token) if refresh_token else None
 
         # Get account details from Stripe - BEFORE we try to use account_name
+        account = {}
         account_name = "Unknown Account"  # Default value
         try:
-            # Use the access token to get account details
-            original_api_key = stripe.api_key  # Save original key
-            stripe.api_key = access_token
-            
-            # Get account information
-            account = stripe.Account.retrieve()
+            # Get account information with the connected account's own client (no global API key switch)
+            account = account_client(access_token, stripe_user_id).accounts.retrieve_current()
             
             # Get account name from various fields
             account_name = (account.get("business_profile", {}).get("name") 
@@ -182,20 +165,18 @@ async def stripe_callback(request: FastAPIRequest):
                           or "Unknown Account")
                 
         except Exception as acc_err:
-            # Reset API key to original if needed
-            stripe.api_key = STRIPE_SECRET_KEY
             logging.error(f"Error retrieving Stripe account details: {str(acc_err)}")
             # Continue anyway with default account name
 
         # Store in Supabase
         try:
             # Check if credentials already exist
-            existing = supabase.table("stripe_credentials").select("*").eq(
+            existing = get_supabase().table("stripe_credentials").select("*").eq(
                 "user_id", user_id).eq("project_id", project_id).execute()
             
             if existing.data:
                 # Update existing credentials
-                supabase.table("stripe_credentials").update({
+                get_supabase().table("stripe_credentials").update({
                     "stripe_account_id": stripe_user_id,
                     "access_token": encrypted_access_token,
                     "refresh_token": encrypted_refresh_token,
@@ -205,7 +186,7 @@ async def stripe_callback(request: FastAPIRequest):
                 logging.info(f"Updated Stripe credentials for account {stripe_user_id}")
             else:
                 # Create new credentials
-                supabase.table("stripe_credentials").insert({
+                get_supabase().table("stripe_credentials").insert({
                     "user_id": user_id,
                     "project_id": project_id,
                     "stripe_account_id": stripe_user_id,
@@ -239,12 +220,12 @@ async def stripe_callback(request: FastAPIRequest):
             }
             
             # Check if account already exists for this user/project (not by account_id)
-            existing_account = supabase.table("stripe_accounts").select("*").eq(
+            existing_account = get_supabase().table("stripe_accounts").select("*").eq(
                 "user_id", user_id).eq("project_id", project_id).execute()
                 
             if existing_account.data:
                 # Update account data
-                supabase.table("stripe_accounts").update({
+                get_supabase().table("stripe_accounts").update({
                     "stripe_account_id": stripe_user_id,
                     "account_name": account_data["account_name"],
                     "account_email": account_data["account_email"],
@@ -255,15 +236,10 @@ async def stripe_callback(request: FastAPIRequest):
                 logging.info(f"Updated Stripe account info for user {user_id}, project {project_id}")
             else:
                 # Insert account data
-                supabase.table("stripe_accounts").insert(account_data).execute()
+                get_supabase().table("stripe_accounts").insert(account_data).execute()
                 logging.info(f"Stored Stripe account info for user {user_id}, project {project_id}")
-                
-            # Reset API key
-            stripe.api_key = original_api_key
             
         except Exception as acc_err:
-            # Reset API key to original if needed
-            stripe.api_key = STRIPE_SECRET_KEY
             logging.error(f"Error storing Stripe account details: {str(acc_err)}")
             # Continue anyway, we have the essential connection data
 
@@ -0,0 +1,123 @@
+"""
+Concurrent sync of many connected Stripe accounts in one process.
+
+Each stored connection (a stripe_credentials row: one project's connected
+account) syncs one day through its own client (stripe_data/client.py), on
+a bounded thread pool (STRIPE_SYNC_CONCURRENCY) with one event loop per
+thread, like the GA fan-out. Accounts never share credentials; requests
+to one account, from however many of these syncs, stay within its rate
+limit, and connections are shared through the pooled transport. Errors are
+collected per connection instead of stopping the others.
+
+Sync every connection for a day (e.g. from cron):
+    python -m stripe_data.fanout [--date YYYY-MM-DD] [--concurrency 32]
+"""
+import os
+import time
+import asyncio
+import logging
+import argparse
+import contextvars
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from clients import get_supabase, registry
+from database import fetch_all_rows
+from jobs.runner import is_permanent, retry_after_seconds
+from logging_config import configure_logging
+from .fetch_metrics import sync_connection
+
+STRIPE_SYNC_CONCURRENCY = int(os.getenv("STRIPE_SYNC_CONCURRENCY", "32"))
+
+
+def load_connections(project_ids: list = None) -> list:
+    """Stored Stripe connections, optionally only those of some projects"""
+    def query():
+        builder = get_supabase().table("stripe_credentials") \
+            .select("user_id, project_id, stripe_account_id, access_token, account_name")
+        if project_ids:
+            builder = builder.in_("project_id", project_ids)
+        return builder.order("project_id")
+    return fetch_all_rows(query)
+
+
+#1. One connection
+async def sync_connection_result(creds: dict, target_date: datetime) -> dict:
+    started = time.perf_counter()
+    result = {"project_id": creds["project_id"], "stripe_account_id": creds.get("stripe_account_id")}
+    try:
+        report = await sync_connection(creds, target_date)
+        if report["error"] is not None:
+            raise report["error"]
+        result.update(status="success", written=report["written"], unchanged=report["unchanged"],
+                      failed_sections=report["details"]["failed_sections"], coalesced=report["coalesced"])
+    except Exception as e:
+        result.update(status="error", message=f"{type(e).__name__}: {str(e)}", error=e)
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+def sync_one(creds: dict, target_date: datetime) -> dict:
+    """On a pool thread, in its own event loop"""
+    return asyncio.run(sync_connection_result(creds, target_date))
+
+
+#2. Fan out over the connections and aggregate
+async def sync_accounts(connections: list, target_date: datetime,
+                        concurrency: int = STRIPE_SYNC_CONCURRENCY) -> dict:
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(connections))),
+                            thread_name_prefix="stripe-sync") as executor:
+        results = await asyncio.gather(*[
+            # Each connection runs in a copy of the caller's context, so its spans join the caller's trace
+            loop.run_in_executor(executor, contextvars.copy_context().run, sync_one, creds, target_date)
+            for creds in connections
+        ])
+
+    failed = [r for r in results if r["status"] != "success"]
+    report = {
+        "status": "success" if not failed else ("error" if len(failed) == len(results) else "partial"),
+        "date": target_date.strftime("%Y-%m-%d"),
+        "connections": len(results),
+        "accounts": len({r["stripe_account_id"] or r["project_id"] for r in results}),
+        "succeeded": len(results) - len(failed),
+        "failed": len(failed),
+        "written": sum(r.get("written", 0) for r in results),
+        "unchanged": sum(r.get("unchanged", 0) for r in results),
+        "seconds": round(time.perf_counter() - started, 3),
+        "slowest_connection_seconds": max((r["seconds"] for r in results), default=0),
+        "results": [{k: v for k, v in r.items() if k != "error"} for r in results],
+        "errors": [
+            {
+                "project_id": r["project_id"],
+                "stripe_account_id": r["stripe_account_id"],
+                "message": r["message"],
+                "permanent": is_permanent(r["error"]),
+                "retry_after": retry_after_seconds(r["error"]),
+            }
+            for r in failed
+        ],
+    }
+    logging.info(f"Stripe sync for {report['date']}: {report['succeeded']}/{report['connections']} connections "
+                 f"({report['accounts']} accounts) in {report['seconds']}s "
+                 f"(slowest {report['slowest_connection_seconds']}s)")
+    return report
+
+
+if __name__ == "__main__":
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Sync every stored Stripe connection for one day")
+    parser.add_argument("--date", help="YYYY-MM-DD (default: two days ago)")
+    parser.add_argument("--project", action="append", dest="projects", help="Only these projects (repeatable)")
+    parser.add_argument("--concurrency", type=int, default=STRIPE_SYNC_CONCURRENCY)
+    args = parser.parse_args()
+
+    target_date = datetime.strptime(args.date, "%Y-%m-%d") if args.date else datetime.now() - timedelta(days=2)
+    try:
+        connections = load_connections(args.projects)
+        report = asyncio.run(sync_accounts(connections, target_date, args.concurrency))
+        print(f"{report['succeeded']}/{report['connections']} connections synced in {report['seconds']}s")
+        for error in report["errors"]:
+            print(f"  {error['project_id']} ({error['stripe_account_id']}): {error['message']}")
+    finally:
+        # Writes what the write-behind buffer still holds, then closes the pool and clients
+        registry.close()
@@ -0,0 +1,24 @@
+"""
+Stripe background jobs (see jobs/runner.py):
+- stripe_sync: sync one day of metrics for a project
+"""
+import json
+import logging
+from fastapi.responses import JSONResponse
+from jobs.kinds import STRIPE_SYNC
+from jobs.runner import register_handler, PermanentJobError, TransientJobError
+from .fetch_metrics import get_stripe_metrics
+
+
+async def run_stripe_sync(job: dict):
+    result = await get_stripe_metrics(job["project_id"], job["payload"].date)
+    if isinstance(result, JSONResponse):
+        message = json.loads(result.body).get("message", "Stripe sync failed")
+        # Missing connection or bad input will not fix itself
+        if result.status_code < 500:
+            raise PermanentJobError(message)
+        raise TransientJobError(message)
+    logging.info(f"Stripe sync job {job['job_id']}: {result.get('message')}")
+
+
+register_handler(STRIPE_SYNC, run_stripe_sync)
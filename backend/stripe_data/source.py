@@ -0,0 +1,311 @@
+"""
+Stripe as an ingestion source (see ingestion/pipeline.py).
+
+One source is one connected account for one day. Each section (balance,
+charges, payouts, ...) is one page: the fetch stage lists the day's
+objects through the account's own client (stripe_data/client.py: its
+access token, rate limited per account), following Stripe's pagination,
+and normalize() turns them into daily metrics for stripe_metrics. A
+section that fails is logged and skipped so the others are still stored;
+the run is then partial and the day's watermark does not advance.
+"""
+import logging
+from datetime import datetime
+from ingestion.pipeline import MetricSource, MetricRecord
+from ingestion.sinks import StripeMetricSink
+from monitoring import track_upstream
+from logging_config import SampledLogger
+from .client import account_client
+
+detail_log = SampledLogger("ingestion.detail")
+
+# Snapshot counts only need the first object and total_count
+TOTAL_COUNT_PAGE = 1
+
+
+class StripeSource(MetricSource):
+    name = "stripe"
+
+    def __init__(self, user_id: str, project_id: str, access_token: str, target_date: datetime,
+                 account_name: str = "Unknown Account", account_id: str = None):
+        super().__init__(project_id, account_id or "default")
+        # Every request of this sync goes out as this account, whatever other syncs run meanwhile
+        self.client = account_client(access_token, account_id)
+        self.user_id = user_id
+        self.target_date = target_date
+        self.date = target_date.strftime("%Y-%m-%d")
+        self.account_name = account_name
+        self.descriptions = {}
+        # Local day boundaries
+        day = datetime(target_date.year, target_date.month, target_date.day)
+        self.start_timestamp = int(day.timestamp())
+        self.end_timestamp = int(day.replace(hour=23, minute=59, second=59).timestamp())
+        self.sections = [
+            ("balance", self.fetch_balance, self.normalize_balance),
+            ("charges", self.fetch_charges, self.normalize_charges),
+            ("payouts", self.fetch_payouts, self.normalize_payouts),
+            ("customers", self.fetch_customers, self.normalize_customers),
+            ("subscriptions", self.fetch_subscriptions, self.normalize_subscriptions),
+            ("disputes", self.fetch_disputes, self.normalize_disputes),
+            ("refunds", self.fetch_refunds, self.normalize_refunds),
+            ("products", self.fetch_products, self.normalize_products),
+            ("invoices", self.fetch_invoices, self.normalize_invoices),
+            ("payment_intents", self.fetch_payment_intents, self.normalize_payment_intents),
+            ("checkout_sessions", self.fetch_checkout_sessions, self.normalize_checkout_sessions),
+            ("promotion_codes", self.fetch_promotion_codes, self.normalize_promotion_codes),
+            ("files", self.fetch_files, self.normalize_files),
+            ("setup_intents", self.fetch_setup_intents, self.normalize_setup_intents),
+        ]
+        self.normalizers = {name: normalize for name, _, normalize in self.sections}
+        self.failed_sections = []
+
+    def window(self) -> tuple:
+        return self.date, self.date
+
+    def prepare(self) -> StripeMetricSink:
+        return StripeMetricSink(self.user_id, self.project_id, self.account_name, self.descriptions)
+
+    def details(self) -> dict:
+        return {"account_name": self.account_name, "failed_sections": list(self.failed_sections)}
+
+    def complete(self) -> bool:
+        return not self.failed_sections
+
+    #1. Fetch: one page per section
+    def pages(self, start_date: str, end_date: str):
+        for name, fetch, _ in self.sections:
+            try:
+                data = fetch()
+            except Exception as e:
+                logging.error(f"Error retrieving {name.replace('_', ' ')} metrics: {str(e)}")
+                self.failed_sections.append(name)
+                continue
+            detail_log.info(f"Retrieved {name.replace('_', ' ')} metrics for {self.date}")
+            yield {"section": name, "data": data}
+
+    def list_day(self, service, **params) -> list:
+        """Every object of a list endpoint created on the target day (all pages)"""
+        params.setdefault("created", {"gte": self.start_timestamp, "lte": self.end_timestamp})
+        return self.list_all(service, **params)
+
+    def list_all(self, service, **params) -> list:
+        # Timed as one operation across all pages (ChargeService -> "Charge.list")
+        with track_upstream("stripe", f"{type(service).__name__.removesuffix('Service')}.list"):
+            return list(service.list(params=dict(limit=100, **params)).auto_paging_iter())
+
+    def total_count(self, service, **params):
+        # Stripe only includes total_count when the endpoint supports it
+        with track_upstream("stripe", f"{type(service).__name__.removesuffix('Service')}.count"):
+            return service.list(params=dict(limit=TOTAL_COUNT_PAGE, **params)).get("total_count")
+
+    def fetch_balance(self):
+        with track_upstream("stripe", "Balance.retrieve"):
+            return self.client.balance.retrieve()
+
+    def fetch_charges(self):
+        return self.list_day(self.client.charges)
+
+    def fetch_payouts(self):
+        return self.list_day(self.client.payouts)
+
+    def fetch_customers(self):
+        return {
+            "new": self.list_day(self.client.customers),
+            "total": self.total_count(self.client.customers, created={"lt": self.end_timestamp}),
+        }
+
+    def fetch_subscriptions(self):
+        return {
+            "new": self.list_day(self.client.subscriptions, status="active"),
+            "total_active": self.total_count(self.client.subscriptions, created={"lt": self.end_timestamp},
+                                             status="active"),
+            "canceled": self.list_all(
+                self.client.subscriptions, status="canceled",
+                canceled_at={"gte": self.start_timestamp, "lte": self.end_timestamp}
+            ),
+        }
+
+    def fetch_disputes(self):
+        return {
+            "new": self.list_day(self.client.disputes),
+            "open": self.total_count(self.client.disputes, created={"lt": self.end_timestamp},
+                                     status="needs_response"),
+        }
+
+    def fetch_refunds(self):
+        return self.list_day(self.client.refunds)
+
+    def fetch_products(self):
+        return {
+            "products": self.list_all(self.client.products, active=True),
+            "prices": self.list_all(self.client.prices, active=True),
+        }
+
+    def fetch_invoices(self):
+        return self.list_day(self.client.invoices)
+
+    def fetch_payment_intents(self):
+        return self.list_day(self.client.payment_intents)
+
+    def fetch_checkout_sessions(self):
+        return self.list_day(self.client.checkout.sessions)
+
+    def fetch_promotion_codes(self):
+        return self.list_all(self.client.promotion_codes, active=True)
+
+    def fetch_files(self):
+        return self.list_day(self.client.files)
+
+    def fetch_setup_intents(self):
+        return self.list_day(self.client.setup_intents)
+
+    #2. Normalize: section data to daily metrics
+    def normalize(self, page: dict) -> list:
+        metrics = self.normalizers[page["section"]](page["data"])
+        records = []
+        for metric_name, value, description in metrics:
+            if value is None:
+                continue
+            self.descriptions[metric_name] = description
+            records.append(MetricRecord(self.date, metric_name, value))
+        return records
+
+    def count_by_status(self, objects: list, statuses: list) -> dict:
+        counts = {status: 0 for status in statuses}
+        for obj in objects:
+            status = obj.get("status", "unknown")
+            if status in counts:
+                counts[status] += 1
+        return counts
+
+    def normalize_balance(self, balance) -> list:
+        metrics = [
+            # Convert cents to dollars
+            ("available_balance", sum(b["amount"] for b in balance["available"]) / 100,
+             "Available balance in Stripe account"),
+            ("pending_balance", sum(b["amount"] for b in balance["pending"]) / 100,
+             "Pending balance in Stripe account"),
+        ]
+        # Break down available balance by currency
+        for currency_balance in balance["available"]:
+            currency = currency_balance["currency"]
+            metrics.append((f"available_balance_{currency}", currency_balance["amount"] / 100,
+                            f"Available balance in {currency.upper()}"))
+        return metrics
+
+    def normalize_charges(self, charges: list) -> list:
+        day = self.date
+        successful = [c for c in charges if c["status"] == "succeeded"]
+        total_amount = sum(c["amount"] for c in successful)
+        metrics = [
+            ("daily_charges_count", len(successful), f"Number of successful charges on {day}"),
+            ("daily_charges_volume", total_amount / 100, f"Total charge volume on {day} (USD)"),
+            ("daily_failed_charges", sum(1 for c in charges if c["status"] == "failed"),
+             f"Number of failed charges on {day}"),
+            ("daily_avg_charge", (total_amount / len(successful) if successful else 0) / 100,
+             f"Average charge amount on {day} (USD)"),
+        ]
+        # Payment method types
+        payment_methods = {}
+        for charge in successful:
+            pm_type = (charge.get("payment_method_details") or {}).get("type", "unknown")
+            payment_methods[pm_type] = payment_methods.get(pm_type, 0) + 1
+        for pm_type, count in payment_methods.items():
+            metrics.append((f"payments_{pm_type}", count, f"Payments using {pm_type} on {day}"))
+        return metrics
+
+    def normalize_payouts(self, payouts: list) -> list:
+        day = self.date
+        return [
+            ("daily_payouts_count", len(payouts), f"Number of payouts on {day}"),
+            ("daily_payouts_volume", sum(p["amount"] for p in payouts) / 100, f"Total payout volume on {day} (USD)"),
+        ]
+
+    def normalize_customers(self, data: dict) -> list:
+        day = self.date
+        return [
+            ("daily_new_customers", len(data["new"]), f"New customers on {day}"),
+            ("total_customers", data["total"], f"Total customers as of {day}"),
+        ]
+
+    def normalize_subscriptions(self, data: dict) -> list:
+        day = self.date
+        return [
+            ("daily_new_subscriptions", len(data["new"]), f"New subscriptions on {day}"),
+            ("total_active_subscriptions", data["total_active"], f"Total active subscriptions as of {day}"),
+            ("daily_canceled_subscriptions", len(data["canceled"]), f"Canceled subscriptions on {day}"),
+        ]
+
+    def normalize_disputes(self, data: dict) -> list:
+        day = self.date
+        return [
+            ("daily_new_disputes", len(data["new"]), f"New disputes on {day}"),
+            ("open_disputes", data["open"], f"Open disputes as of {day}"),
+        ]
+
+    def normalize_refunds(self, refunds: list) -> list:
+        day = self.date
+        return [
+            ("daily_refunds_count", len(refunds), f"Number of refunds on {day}"),
+            ("daily_refunds_volume", sum(r["amount"] for r in refunds) / 100, f"Total refund volume on {day} (USD)"),
+        ]
+
+    def normalize_products(self, data: dict) -> list:
+        day = self.date
+        return [
+            ("active_products", len(data["products"]), f"Active products as of {day}"),
+            ("active_prices", len(data["prices"]), f"Active prices as of {day}"),
+        ]
+
+    def normalize_invoices(self, invoices: list) -> list:
+        day = self.date
+        counts = self.count_by_status(invoices, ["draft", "open", "paid", "uncollectible", "void"])
+        metrics = [
+            (f"daily_invoices_{status}", count, f"{status.capitalize()} invoices created on {day}")
+            for status, count in counts.items()
+        ]
+        metrics.append(("daily_invoice_volume", sum(i.get("total", 0) for i in invoices) / 100,
+                        f"Total invoice volume on {day} (USD)"))
+        return metrics
+
+    def normalize_payment_intents(self, intents: list) -> list:
+        day = self.date
+        counts = self.count_by_status(intents, [
+            "requires_payment_method", "requires_confirmation", "requires_action",
+            "processing", "requires_capture", "canceled", "succeeded"
+        ])
+        return [
+            (f"daily_payment_intents_{status}", count, f"Payment intents in {status} status on {day}")
+            for status, count in counts.items()
+        ]
+
+    def normalize_checkout_sessions(self, sessions: list) -> list:
+        day = self.date
+        counts = self.count_by_status(sessions, ["open", "complete", "expired"])
+        return [
+            (f"daily_checkout_sessions_{status}", count, f"Checkout sessions in {status} status on {day}")
+            for status, count in counts.items()
+        ]
+
+    def normalize_promotion_codes(self, codes: list) -> list:
+        day = self.date
+        return [
+            ("active_promotion_codes", len(codes), f"Active promotion codes as of {day}"),
+            ("used_promotion_codes", sum(1 for code in codes if code.get("times_redeemed", 0) > 0),
+             f"Promotion codes that have been used as of {day}"),
+        ]
+
+    def normalize_files(self, files: list) -> list:
+        day = self.date
+        return [("daily_new_files", len(files), f"New files uploaded on {day}")]
+
+    def normalize_setup_intents(self, intents: list) -> list:
+        day = self.date
+        counts = self.count_by_status(intents, [
+            "requires_payment_method", "requires_confirmation", "requires_action",
+            "processing", "canceled", "succeeded"
+        ])
+        return [
+            (f"daily_setup_intents_{status}", count, f"Setup intents in {status} status on {day}")
+            for status, count in counts.items()
+        ]
@@ -0,0 +1,91 @@
+"""
+Bulk import against a scratch Postgres database (TEST_DB_URL); skipped without one.
+Tables come from benchmarks/sync_schema.sql, like the sync benchmark's.
+"""
+import os
+import uuid
+from datetime import date
+import psycopg2
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+TEST_DB_URL = os.getenv("TEST_DB_URL")
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "benchmarks", "sync_schema.sql")
+DAY = date(2025, 1, 1)
+
+pytestmark = pytest.mark.skipif(not TEST_DB_URL, reason="needs a scratch Postgres database in TEST_DB_URL")
+
+
+@pytest.fixture
+def project_id(monkeypatch):
+    import database
+    import events.broker as broker
+    from clients import registry
+
+    conn = psycopg2.connect(TEST_DB_URL)
+    with conn.cursor() as cursor:
+        with open(SCHEMA_PATH) as f:
+            cursor.execute(f.read())
+        # Only read by the importer to attribute Stripe rows when no user is given
+        cursor.execute("CREATE TABLE IF NOT EXISTS project_to_user (user_id TEXT, project_id UUID)")
+    conn.commit()
+
+    monkeypatch.setattr(database, "DATABASE_URL", TEST_DB_URL)
+    registry.discard("db_pool")
+    registry.discard("db_export_pool")
+    monkeypatch.setattr(broker, "EVENTS_BACKEND", "local")
+    project_id, property_id = str(uuid.uuid4()), f"test-{uuid.uuid4().hex[:12]}"
+    yield project_id, property_id
+
+    registry.discard("db_pool")
+    registry.discard("db_export_pool")
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM stripe_metrics WHERE project_id = %s", (project_id,))
+        cursor.execute("DELETE FROM project_sync_versions WHERE project_id = %s", (project_id,))
+        # Cascades to the catalog and facts
+        cursor.execute("DELETE FROM ga_properties WHERE property_id = %s", (property_id,))
+    conn.commit()
+    conn.close()
+
+
+def import_rows(tmp_path, project_id: str, rows: list) -> dict:
+    from exports.columnar import export_schema, import_metrics, rows_to_batch
+    path = str(tmp_path / f"{uuid.uuid4().hex}.parquet")
+    pq.write_table(pa.Table.from_batches([rows_to_batch(rows, export_schema(project_id))]), path)
+    return import_metrics(path, project_id, user_id="test-user")
+
+def stored_rows(project_id: str) -> list:
+    from exports.queries import iter_export_chunks
+    return [tuple(row) for rows in iter_export_chunks(project_id, str(DAY), str(DAY)) for row in rows]
+
+
+def test_repeated_keys_keep_the_last_row(tmp_path, project_id):
+    project_id, property_id = project_id
+    rows = [
+        ("google_analytics", property_id, DAY, "sessions", 1.0),
+        ("stripe", None, DAY, "revenue", 5.0),
+        ("google_analytics", property_id, DAY, "sessions", 2.0),
+        ("google_analytics", property_id, DAY, "activeUsers", 4.0),
+        ("stripe", None, DAY, "revenue", 7.0),
+        ("google_analytics", property_id, DAY, "sessions", 3.0),
+    ]
+    first = import_rows(tmp_path, project_id, rows)
+    assert first["duplicates"] == 3
+    assert sorted(stored_rows(project_id), key=str) == sorted([
+        ("google_analytics", property_id, DAY, "activeUsers", 4.0),
+        ("google_analytics", property_id, DAY, "sessions", 3.0),
+        ("stripe", None, DAY, "revenue", 7.0),
+    ], key=str)
+
+    # The same file again changes nothing
+    second = import_rows(tmp_path, project_id, rows)
+    assert (second["google_analytics"], second["google_analytics_deleted"], second["stripe"]) == (0, 0, 0)
+
+def test_zero_ga_value_removes_the_stored_fact(tmp_path, project_id):
+    project_id, property_id = project_id
+    import_rows(tmp_path, project_id, [("google_analytics", property_id, DAY, "sessions", 9.0)])
+    result = import_rows(tmp_path, project_id, [("google_analytics", property_id, DAY, "sessions", 0.0)])
+    assert result["google_analytics_deleted"] == 1
+    assert stored_rows(project_id) == []
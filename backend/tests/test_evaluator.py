@@ -0,0 +1,48 @@
+from datetime import date, timedelta
+import numpy as np
+from notifications.evaluator import (
+    ALERT_METRICS, BASELINE_DAYS, MIN_BASELINE_VALUE, build_series_array, detect_anomalies, sync_coverage
+)
+
+METRIC_NAMES = [name for names in ALERT_METRICS.values() for name in names]
+MIN_BASELINE = np.array([MIN_BASELINE_VALUE.get(name, 0.0) for name in METRIC_NAMES])
+START = date(2025, 1, 1)
+DATES = np.arange(np.datetime64(START.isoformat()), BASELINE_DAYS + 1)
+LAST_DAY = START + timedelta(days=BASELINE_DAYS)
+
+
+def sessions_rows(project_id: str, days: int, value: float = 100.0, property_id: str = "p1") -> list:
+    return [{"project_id": project_id, "property_id": property_id, "metric_name": "sessions",
+             "date": (START + timedelta(days=i)).isoformat(), "metric_value": value} for i in range(days)]
+
+def score(rows: list, watermarks: dict) -> dict:
+    projects = np.array(sorted({row["project_id"] for row in rows}), dtype=object)
+    synced_until = sync_coverage(rows, projects, watermarks)
+    return detect_anomalies(build_series_array(rows, projects, METRIC_NAMES, DATES, synced_until), MIN_BASELINE)
+
+
+def test_unsynced_latest_day_does_not_alert():
+    # 14 days at 100, the evaluated day not synced yet
+    rows = sessions_rows("a", BASELINE_DAYS)
+    scores = score(rows, {"a": {"p1": LAST_DAY - timedelta(days=1)}})
+    assert np.isnan(scores["latest"][0, METRIC_NAMES.index("sessions")])
+    assert not scores["triggered"].any()
+
+def test_synced_missing_day_counts_as_zero():
+    rows = sessions_rows("a", BASELINE_DAYS)
+    scores = score(rows, {"a": {"p1": LAST_DAY}})
+    m = METRIC_NAMES.index("sessions")
+    assert scores["latest"][0, m] == 0.0
+    assert scores["pct_change"][0, m] == -1.0
+    assert scores["triggered"][0, m]
+
+def test_coverage_is_the_least_synced_property():
+    rows = sessions_rows("a", BASELINE_DAYS, property_id="p1") + sessions_rows("a", BASELINE_DAYS, property_id="p2")
+    watermarks = {"a": {"p1": LAST_DAY, "p2": LAST_DAY - timedelta(days=1)}}
+    assert sync_coverage(rows, np.array(["a"], dtype=object), watermarks)[0] == np.datetime64(LAST_DAY - timedelta(days=1))
+    assert not score(rows, watermarks)["triggered"].any()
+
+def test_property_without_watermark_is_not_covered():
+    rows = sessions_rows("a", BASELINE_DAYS, property_id="p1") + sessions_rows("a", 3, property_id="p2")
+    assert np.isnat(sync_coverage(rows, np.array(["a"], dtype=object), {"a": {"p1": LAST_DAY}})[0])
+    assert np.isnat(sync_coverage([], np.array(["b"], dtype=object), {})[0])
@@ -0,0 +1,27 @@
+import asyncio
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from auth import get_current_user_id
+import google_analytics.fetch_metrics as fetch_metrics
+
+
+def test_quota_checks_access_off_the_event_loop(monkeypatch):
+    checks = []
+
+    def has_project_access(user_id, project_id):
+        try:
+            asyncio.get_running_loop()
+            checks.append("on loop")
+        except RuntimeError:
+            checks.append("off loop")
+        return project_id == "mine"
+
+    monkeypatch.setattr(fetch_metrics, "has_project_access", has_project_access)
+    app = FastAPI()
+    app.include_router(fetch_metrics.router)
+    app.dependency_overrides[get_current_user_id] = lambda: "user-1"
+
+    with TestClient(app) as client:
+        assert client.get("/quota", params={"project_id": "mine"}).json() == {"properties": []}
+        assert client.get("/quota", params={"project_id": "theirs"}).status_code == 403
+    assert checks == ["off loop", "off loop"]
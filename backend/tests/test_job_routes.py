@@ -0,0 +1,51 @@
+import asyncio
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from auth import get_current_user_id
+from jobs import routes
+
+
+def make_client() -> TestClient:
+    app = FastAPI()
+    app.include_router(routes.router)
+    app.dependency_overrides[get_current_user_id] = lambda: "user-1"
+    return TestClient(app)
+
+def running_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+def off_loop(calls: list, name: str, result):
+    # Record each blocking call and whether it ran on the event loop's thread
+    def call(*args):
+        calls.append((name, running_loop()))
+        return result
+    return call
+
+
+def test_project_routes_query_the_database_off_the_event_loop(monkeypatch):
+    calls = []
+    monkeypatch.setattr(routes, "has_project_access", off_loop(calls, "access", True))
+    monkeypatch.setattr(routes, "list_project_jobs", off_loop(calls, "list", []))
+    monkeypatch.setattr(routes, "enqueue_job", off_loop(calls, "enqueue", "job-1"))
+
+    with make_client() as client:
+        assert client.get("/projects/p/jobs").json() == {"jobs": []}
+        response = client.post("/projects/p/jobs", json={"kind": routes.GA_SYNC, "payload": {}})
+    assert response.status_code == 202 and response.json() == {"job_id": "job-1"}
+    assert calls == [("access", False), ("list", False), ("access", False), ("enqueue", False)]
+
+def test_project_jobs_need_access(monkeypatch):
+    monkeypatch.setattr(routes, "has_project_access", lambda user_id, project_id: False)
+    with make_client() as client:
+        assert client.get("/projects/p/jobs").status_code == 403
+
+def test_job_of_another_project_is_not_found(monkeypatch):
+    job = {"job_id": "00000000-0000-0000-0000-000000000001", "user_id": "other", "project_id": "p2"}
+    monkeypatch.setattr(routes, "get_job", lambda job_id: job)
+    monkeypatch.setattr(routes, "has_project_access", lambda user_id, project_id: False)
+    with make_client() as client:
+        assert client.get(f"/jobs/{job['job_id']}").status_code == 404
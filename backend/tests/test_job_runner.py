@@ -0,0 +1,48 @@
+import pytest
+from jobs import runner
+from jobs.kinds import GA_TOKEN_REFRESH
+
+
+@pytest.fixture
+def outcomes(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(runner, "complete_job", lambda job_id, worker_id: recorded.append("completed"))
+    monkeypatch.setattr(runner, "retry_job", lambda job_id, worker_id, delay, error: recorded.append("retried"))
+    monkeypatch.setattr(runner, "dead_letter_job", lambda job_id, worker_id, error: recorded.append("dead"))
+    yield recorded
+    runner.handlers.pop(GA_TOKEN_REFRESH, None)
+
+def run_raising(error: Exception, attempts: int = 1) -> str:
+    async def handler(job):
+        if error:
+            raise error
+    runner.handlers[GA_TOKEN_REFRESH] = handler
+    job = {"job_id": "job-1", "kind": GA_TOKEN_REFRESH, "payload": {}, "attempts": attempts, "max_attempts": 5,
+           "user_id": None, "project_id": None}
+    return runner.execute_job(job, "worker-1")
+
+
+@pytest.mark.parametrize("error", [
+    runner.TransientJobError("upstream busy"),
+    ConnectionError("reset"),
+    TimeoutError(),
+])
+def test_transient_errors_are_retried(outcomes, error):
+    assert run_raising(error) == "retrying"
+    assert outcomes == ["retried"]
+
+@pytest.mark.parametrize("error", [
+    runner.PermanentJobError("revoked"),
+    KeyError("missing"),
+    ValueError("bad data"),
+])
+def test_permanent_and_unexpected_errors_are_dead_lettered(outcomes, error):
+    assert run_raising(error) == "dead"
+    assert outcomes == ["dead"]
+
+def test_transient_error_on_the_last_attempt_is_dead_lettered(outcomes):
+    assert run_raising(runner.TransientJobError("still busy"), attempts=5) == "dead"
+
+def test_success_completes_the_job(outcomes):
+    assert run_raising(None) == "succeeded"
+    assert outcomes == ["completed"]
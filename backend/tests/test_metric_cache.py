@@ -0,0 +1,33 @@
+import os
+import pytest
+import metric_cache
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(metric_cache, "METRIC_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(metric_cache, "_open_series", metric_cache.OrderedDict())
+    monkeypatch.setattr(metric_cache, "get_sync_version", lambda project_id: 1)
+    return tmp_path
+
+
+def test_properties_of_a_project_stay_apart(cache, monkeypatch):
+    monkeypatch.setattr(metric_cache, "load_rows_from_supabase", lambda project_id: [
+        ("google_analytics", "111", "2025-01-02", "sessions", 10.0),
+        ("google_analytics", "222", "2025-01-02", "sessions", 30.0),
+        ("stripe", None, "2025-01-02", "revenue", 5.0),
+        ("google_analytics", "111", "2025-01-01", "sessions", 7.0),
+    ])
+    rows = metric_cache.query_metrics("p", "2025-01-02", "2025-01-02", ["sessions", "revenue"])
+    assert sorted((r["source"], r["property_id"], r["metric_name"], r["value"]) for r in rows) == [
+        ("google_analytics", "111", "sessions", 10.0),
+        ("google_analytics", "222", "sessions", 30.0),
+        ("stripe", None, "revenue", 5.0),
+    ]
+
+def test_publishing_keeps_newer_versions(cache):
+    columns, catalog = metric_cache.build_columns([("stripe", None, "2025-01-01", "revenue", 1.0)])
+    for version in (3, 5, 4):
+        metric_cache.write_series("p", version, columns, catalog)
+    # v4 was written by a worker that read a stale version: it must not remove v5
+    assert sorted(os.listdir(metric_cache.project_cache_dir("p"))) == ["v4", "v5"]
@@ -0,0 +1,95 @@
+import asyncio
+import socket
+import pytest
+from benchmarks import fake_push_server
+from benchmarks.fake_push_server import FakePushServer, DEAD_TOKEN_MARKER
+from notifications import sender
+
+
+class ScriptedRandom:
+    """Stands in for the server's random module: 0.0 (fail) for the first `failures` draws, then 1.0"""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+
+    def random(self) -> float:
+        self.failures -= 1
+        return 0.0 if self.failures >= 0 else 1.0
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def push_server(monkeypatch):
+    # Start a stand-in server and point the sender at it, without backoff sleeps
+    monkeypatch.setattr(sender, "backoff_delay", lambda attempt, retry_after=None: 0)
+    servers = []
+
+    def start(failures: int = 0, **options) -> FakePushServer:
+        monkeypatch.setattr(fake_push_server, "random", ScriptedRandom(failures))
+        server = FakePushServer(port=free_port(), **options).__enter__()
+        servers.append(server)
+        monkeypatch.setattr(sender, "EXPO_PUSH_BASE_URL", server.base_url)
+        return server
+
+    yield start
+    for server in servers:
+        server.__exit__(None, None, None)
+
+def build_messages(count: int, dead_every: int = 0) -> list:
+    return [
+        {"to": f"ExponentPushToken[{DEAD_TOKEN_MARKER if dead_every and i % dead_every == 0 else 'live'}-{i}]",
+         "title": "Traffic alert", "body": "Sessions are up"}
+        for i in range(count)
+    ]
+
+def send(messages: list, on_dead_tokens=None) -> dict:
+    async def run():
+        client = sender.create_push_client()
+        try:
+            return await sender.send_push_notifications(messages, client=client, on_dead_tokens=on_dead_tokens)
+        finally:
+            await client.aclose()
+    return asyncio.run(run())
+
+
+def test_messages_are_sent_in_batches_of_at_most_100(push_server):
+    # The stand-in rejects any request with more than 100 messages
+    server = push_server()
+    report = send(build_messages(250))
+    assert report["sent"] == 250 and report["errors"] == []
+    assert server.stats["send_requests"] == 3
+    assert server.stats["messages"] == 250
+
+def test_dead_tokens_are_passed_on_for_pruning(push_server):
+    push_server()
+    messages = build_messages(20, dead_every=5)
+    pruned = []
+    report = send(messages, on_dead_tokens=pruned.extend)
+    dead = [m["to"] for m in messages if DEAD_TOKEN_MARKER in m["to"]]
+    assert sorted(pruned) == sorted(dead) == sorted(report["dead_tokens"])
+    assert report["sent"] == 16 and report["errors"] == []
+
+def test_unavailable_service_is_retried(push_server):
+    # First request answers 503, the retry succeeds
+    server = push_server(failures=1, error_rate=0.5)
+    report = send(build_messages(3))
+    assert report["sent"] == 3 and report["errors"] == []
+    assert server.stats["send_requests"] == 2
+    assert server.stats["errors"] == 1
+
+def test_rate_limited_messages_are_sent_again(push_server):
+    # One message: its first ticket is MessageRateExceeded, the second send succeeds
+    server = push_server(failures=2, rate_limit_rate=0.5)
+    report = send(build_messages(1))
+    assert report["sent"] == 1 and report["errors"] == []
+    assert server.stats["send_requests"] == 2
+
+def test_batch_fails_after_all_retries(push_server):
+    server = push_server(failures=100, error_rate=0.5)
+    report = send(build_messages(3))
+    assert report["sent"] == 0
+    assert len(report["errors"]) == 3
+    assert server.stats["send_requests"] == sender.MAX_RETRIES + 1
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+from notifications import scheduler
+
+
+def test_tick_commits_claim_before_evaluating_off_the_loop(monkeypatch):
+    events = []
+    loop_thread = {}
+
+    def claim_and_reschedule(limit):
+        events.append("claimed and rescheduled")
+        return [{"user_id": "u1", "frequency": "daily", "timezone": "UTC"}]
+
+    def evaluate_alerts(user_ids):
+        events.append("evaluated")
+        assert threading.get_ident() != loop_thread["id"]
+        return []
+
+    def mark_sent(user_ids, alert_date):
+        events.append("marked")
+
+    monkeypatch.setattr(scheduler, "claim_and_reschedule", claim_and_reschedule)
+    monkeypatch.setattr(scheduler, "evaluate_alerts", evaluate_alerts)
+    monkeypatch.setattr(scheduler, "build_messages", lambda alerts, user_ids: [])
+    monkeypatch.setattr(scheduler, "mark_sent", mark_sent)
+
+    async def tick():
+        loop_thread["id"] = threading.get_ident()
+        return await scheduler.run_tick()
+
+    assert asyncio.run(tick()) == {"claimed": 1, "alerts": 0, "sent": 0}
+    assert events == ["claimed and rescheduled", "evaluated", "marked"]
+
+def test_failed_send_is_queued_for_retry(monkeypatch):
+    queued = []
+    monkeypatch.setattr(scheduler, "claim_and_reschedule",
+                        lambda limit: [{"user_id": "u2", "frequency": "hourly", "timezone": "UTC"},
+                                       {"user_id": "u1", "frequency": "hourly", "timezone": "UTC"}])
+    monkeypatch.setattr(scheduler, "evaluate_alerts", lambda user_ids: 1 / 0)
+    monkeypatch.setattr(scheduler, "enqueue_job", lambda kind, payload: queued.append((kind, payload)))
+    monkeypatch.setattr(scheduler, "mark_sent", lambda user_ids, alert_date: None)
+
+    assert asyncio.run(scheduler.run_tick())["claimed"] == 2
+    assert queued == [(scheduler.NOTIFICATION_SEND, {"user_ids": ["u1", "u2"]})]
+
+def test_users_already_alerted_for_the_day_are_skipped(monkeypatch):
+    candidate = {"project_id": "p", "alert_type": "traffic", "metric_name": "sessions", "date": "2025-01-15",
+                 "value": 0.0, "baseline": 100.0, "z_score": -9.0, "pct_change": -1.0, "direction": "down",
+                 "user_ids": ["u1", "u2"]}
+    built_for = []
+    monkeypatch.setattr(scheduler, "evaluate_alerts", lambda user_ids: [candidate])
+    monkeypatch.setattr(scheduler, "get_alerted_users", lambda user_ids, alert_date: {"u1"})
+    monkeypatch.setattr(scheduler, "build_messages",
+                        lambda alerts, user_ids: built_for.append(user_ids) or [])
+
+    result = asyncio.run(scheduler.send_alerts({"u1", "u2"}))
+    assert built_for == [{"u2"}]
+    assert result["alert_date"] == "2025-01-15"
@@ -0,0 +1,38 @@
+import gc
+import pytest
+import stripe_data.client as stripe_client
+
+
+class FakeStripeClient:
+    def __init__(self, api_key, http_client=None, **options):
+        self.limiter = http_client.limiter
+
+
+@pytest.fixture
+def accounts(monkeypatch):
+    monkeypatch.setattr(stripe_client, "STRIPE_MAX_CLIENTS", 2)
+    monkeypatch.setattr(stripe_client.stripe, "StripeClient", FakeStripeClient)
+    monkeypatch.setattr(stripe_client.transports, "stripe_http_client", lambda pool: None)
+    monkeypatch.setattr(stripe_client.registry, "get", lambda name: None)
+    return stripe_client.StripeAccounts()
+
+
+def test_limiters_are_evicted_with_their_clients(accounts):
+    for i in range(5):
+        accounts.client(f"sk_test_{i}", f"acct_{i}")
+    gc.collect()
+    assert list(accounts.limiters) == ["acct_3", "acct_4"]
+
+def test_clients_of_one_account_share_its_limiter(accounts):
+    first = accounts.client("sk_test_old", "acct_1")
+    second = accounts.client("sk_test_new", "acct_1")
+    assert first.limiter is second.limiter
+
+def test_limiter_of_a_running_sync_outlives_its_evicted_client(accounts):
+    in_use = accounts.client("sk_test_0", "acct_0")
+    for i in range(1, 4):
+        accounts.client(f"sk_test_{i}", f"acct_{i}")
+    gc.collect()
+    assert "acct_0" in accounts.limiters
+    # A new client for the account keeps honouring the same bucket
+    assert accounts.client("sk_test_0", "acct_0").limiter is in_use.limiter
@@ -0,0 +1,61 @@
+import asyncio
+from datetime import datetime
+import pytest
+import events.broker as broker
+import ingestion.pipeline as pipeline
+import ingestion.singleflight as singleflight
+import stripe_data.source as stripe_source
+
+
+class RecordingSink:
+    def __init__(self):
+        self.records = []
+
+    def write(self, records: list) -> dict:
+        self.records.extend(records)
+        return {"written": len(records), "unchanged": 0, "deleted": 0}
+
+
+@pytest.fixture
+def watermarks(monkeypatch):
+    # No database: record watermark moves, stub sync runs, cache versions, sync locks and NOTIFY
+    moved = []
+    monkeypatch.setattr(pipeline, "set_watermark", lambda *args: moved.append(args))
+    monkeypatch.setattr(pipeline, "record_sync_run", lambda *args: None)
+    monkeypatch.setattr(pipeline, "bump_sync_version", lambda project_id: None)
+    monkeypatch.setattr(singleflight, "SYNC_LOCKS", False)
+    monkeypatch.setattr(broker, "EVENTS_BACKEND", "local")
+    monkeypatch.setattr(stripe_source, "account_client", lambda access_token, account_id: None)
+    return moved
+
+def make_source(sections: list) -> stripe_source.StripeSource:
+    source = stripe_source.StripeSource("user-1", "project-1", "sk_test_1", datetime(2025, 1, 1), account_id="acct_1")
+    source.sections = sections
+    source.normalizers = {name: normalize for name, _, normalize in sections}
+    sink = RecordingSink()
+    source.prepare = lambda: sink
+    return source
+
+def fail():
+    raise ConnectionError("Stripe unavailable")
+
+def charges():
+    return [{"amount": 100}]
+
+def normalize_charges(data: list) -> list:
+    return [("charges_count", len(data), "Charges created")]
+
+
+def test_failed_section_keeps_the_watermark(watermarks):
+    source = make_source([("balance", fail, None), ("charges", charges, normalize_charges)])
+    report = asyncio.run(pipeline.run_pipeline(source))
+    assert report["status"] == "partial"
+    assert report["details"]["failed_sections"] == ["balance"]
+    assert report["written"] == 1
+    assert watermarks == []
+
+def test_complete_sync_advances_the_watermark(watermarks):
+    source = make_source([("charges", charges, normalize_charges)])
+    report = asyncio.run(pipeline.run_pipeline(source))
+    assert report["status"] == "success"
+    assert watermarks == [("project-1", "stripe", "acct_1", "2025-01-01")]
@@ -0,0 +1,194 @@
+"""
+Request tracing (OpenTelemetry) and sampled profiling of slow requests.
+
+Every API request gets a span; Supabase REST calls, Google API
+`.execute()` calls, Stripe HTTP requests, Fernet operations and ingestion
+runs open child spans. Spans are exported when TRACING_EXPORTER is set:
+
+    file      one OTel JSON span per line in TRACING_FILE (default traces.jsonl)
+    otlp      OTLP/HTTP to a collector (OTEL_EXPORTER_OTLP_ENDPOINT, default http://localhost:4318)
+    console   stdout
+
+Without an exporter the spans are no-ops. With PROFILE_SAMPLE_RATE > 0 a
+share of requests also runs under a statistical profiler (pyinstrument);
+requests slower than PROFILE_SLOW_SECONDS save a flame graph under
+PROFILE_DIR (speedscope JSON, or HTML with PROFILE_FORMAT=html) and record
+its path on the request span.
+"""
+import os
+import time
+import uuid
+import random
+import logging
+import functools
+from contextlib import contextmanager
+from opentelemetry import trace
+from opentelemetry.trace import Status, StatusCode
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "").lower()
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "datlee-backend")
+
+# Profiling settings
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SLOW_SECONDS = float(os.getenv("PROFILE_SLOW_SECONDS", "2"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/profiles")
+PROFILE_FORMAT = os.getenv("PROFILE_FORMAT", "speedscope")
+
+tracer = trace.get_tracer("datlee")
+
+# Span-emitting googleapiclient request class, defined on first use
+_google_request_class = None
+
+
+#1. Exporter setup
+def configure_tracing():
+    if not TRACING_EXPORTER or TRACING_EXPORTER == "none":
+        return
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+    if TRACING_EXPORTER == "file":
+        out = open(TRACING_FILE, "a", buffering=1)
+        exporter = ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n")
+    elif TRACING_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter()
+    elif TRACING_EXPORTER == "console":
+        exporter = ConsoleSpanExporter()
+    else:
+        raise ValueError(f"Unknown TRACING_EXPORTER {TRACING_EXPORTER!r}; use file, otlp or console")
+
+    provider = TracerProvider(resource=Resource.create({"service.name": TRACING_SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    logging.info(f"Tracing enabled ({TRACING_EXPORTER})")
+
+
+#2. Child spans
+@contextmanager
+def span(name: str, **attributes):
+    with tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+def traced(name: str):
+    """Decorator: run the function in a span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.start_as_current_span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def google_request_builder():
+    """googleapiclient request class whose execute() runs in a span (requestBuilder for build())"""
+    global _google_request_class
+    if _google_request_class is None:
+        from googleapiclient.http import HttpRequest
+
+        class TracedHttpRequest(HttpRequest):
+            def execute(self, *args, **kwargs):
+                with tracer.start_as_current_span(f"google {self.methodId}",
+                                                  attributes={"http.method": self.method}) as current:
+                    try:
+                        return super().execute(*args, **kwargs)
+                    except Exception as e:
+                        status = getattr(getattr(e, "resp", None), "status", None)
+                        if status:
+                            current.set_attribute("http.status_code", int(status))
+                        raise
+
+        _google_request_class = TracedHttpRequest
+    return _google_request_class
+
+def end_request_span(response):
+    current = response.request.extensions.pop("trace_span", None)
+    if current is not None:
+        current.set_attribute("http.status_code", response.status_code)
+        if response.status_code >= 400:
+            current.set_status(Status(StatusCode.ERROR))
+        current.end()
+
+def http_span_hooks(provider: str) -> dict:
+    """httpx event hooks with one span per request (e.g. every page of a Stripe listing); none when not tracing"""
+    if not TRACING_EXPORTER or TRACING_EXPORTER == "none":
+        return {}
+
+    def on_request(request):
+        request.extensions["trace_span"] = tracer.start_span(
+            f"{provider} {request.method} {request.url.path}", attributes={"http.method": request.method})
+
+    return {"request": [on_request], "response": [end_request_span]}
+
+def supabase_span_hooks():
+    """httpx event hooks opening a span per PostgREST call (ends at the response headers)"""
+    def on_request(request):
+        table = request.url.path.rsplit("/", 1)[-1]
+        request.extensions["trace_span"] = tracer.start_span(
+            f"supabase {request.method} {table}", attributes={"db.sql.table": table, "http.method": request.method})
+
+    return on_request, end_request_span
+
+
+#3. Request spans and sampled profiling
+def save_profile(profiler, trace_id: str) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    if PROFILE_FORMAT == "html":
+        path = os.path.join(PROFILE_DIR, f"{trace_id}.html")
+        output = profiler.output_html()
+    else:
+        from pyinstrument.renderers import SpeedscopeRenderer
+        path = os.path.join(PROFILE_DIR, f"{trace_id}.speedscope.json")
+        output = profiler.output(SpeedscopeRenderer())
+    with open(path, "w") as f:
+        f.write(output)
+    return path
+
+async def tracing_middleware(request, call_next):
+    with tracer.start_as_current_span(f"{request.method} {request.url.path}", kind=trace.SpanKind.SERVER,
+                                      attributes={"http.method": request.method,
+                                                  "http.target": request.url.path}) as current:
+        profiler = None
+        if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+            from pyinstrument import Profiler
+            profiler = Profiler(interval=PROFILE_INTERVAL, async_mode="enabled")
+            profiler.start()
+
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            seconds = time.perf_counter() - started
+            route = getattr(request.scope.get("route"), "path_format", None)
+            if route:
+                current.update_name(f"{request.method} {route}")
+                current.set_attribute("http.route", route)
+            current.set_attribute("http.status_code", status)
+            if status >= 500:
+                current.set_status(Status(StatusCode.ERROR))
+
+            if profiler is not None:
+                profiler.stop()
+                if seconds >= PROFILE_SLOW_SECONDS:
+                    context = current.get_span_context()
+                    trace_id = format(context.trace_id, "032x") if context.is_valid else uuid.uuid4().hex
+                    try:
+                        path = save_profile(profiler, trace_id)
+                        current.set_attribute("profile.path", path)
+                        logging.warning(f"Slow request {request.method} {request.url.path} took {seconds:.2f}s; "
+                                        f"profile saved to {path}")
+                    except Exception as e:
+                        logging.error(f"Error saving profile: {str(e)}")
+
+
+configure_tracing()
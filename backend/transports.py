@@ -0,0 +1,116 @@
+"""
+Pooled keep-alive HTTP transports for the Stripe and Google SDKs.
+
+Each upstream gets one httpx client per process (see clients.py), so
+connections and TLS sessions are reused across requests, syncs and
+threads instead of being set up per call:
+
+    Stripe   stripe.default_http_client is a stripe.HTTPXClient over the
+             shared client (the SDK's default opens its own connections)
+    Google   googleapiclient and google-auth talk to an httplib2.Http
+             stand-in over the shared client, so Data/Admin API clients
+             and token refreshes share one pool (httplib2.Http instances
+             are not thread-safe and each keeps its own connections)
+
+HTTP/2 is negotiated over TLS when HTTP2_ENABLED=1 (the default), so
+concurrent requests to a host share a connection; plain http:// endpoints
+such as the local stand-ins stay on HTTP/1.1. Connections per upstream
+are capped by STRIPE_HTTP_MAX_CONNECTIONS and GOOGLE_HTTP_MAX_CONNECTIONS
+and idle ones are kept for HTTP_KEEPALIVE_SECONDS.
+"""
+import os
+import logging
+import httpx
+import httplib2
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1") == "1"
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+STRIPE_HTTP_MAX_CONNECTIONS = int(os.getenv("STRIPE_HTTP_MAX_CONNECTIONS", "32"))
+STRIPE_HTTP_TIMEOUT = float(os.getenv("STRIPE_HTTP_TIMEOUT", "80"))
+GOOGLE_HTTP_MAX_CONNECTIONS = int(os.getenv("GOOGLE_HTTP_MAX_CONNECTIONS", "32"))
+GOOGLE_HTTP_TIMEOUT = float(os.getenv("GA_HTTP_TIMEOUT", "60"))
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logging.warning("HTTP2_ENABLED is set but the h2 package is missing; using HTTP/1.1")
+        return False
+
+def create_http_client(max_connections: int, timeout: float, **kwargs) -> httpx.Client:
+    return httpx.Client(
+        http2=HTTP2_ENABLED and http2_available(),
+        timeout=httpx.Timeout(timeout, connect=HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+        ),
+        **kwargs,
+    )
+
+def close_http_client(client: httpx.Client):
+    client.close()
+
+
+#1. Stripe
+def create_stripe_http():
+    from tracing import http_span_hooks
+    return create_http_client(STRIPE_HTTP_MAX_CONNECTIONS, STRIPE_HTTP_TIMEOUT, event_hooks=http_span_hooks("stripe"))
+
+def stripe_http_client(client: httpx.Client):
+    """stripe.HTTPXClient sending its synchronous requests through `client`"""
+    import stripe
+
+    class PooledStripeHTTPClient(stripe.HTTPXClient):
+        def __init__(self):
+            super().__init__(timeout=STRIPE_HTTP_TIMEOUT)
+            self._client = client
+
+    return PooledStripeHTTPClient()
+
+
+#2. Google
+def create_google_http() -> httpx.Client:
+    # httplib2 follows redirects, and googleapiclient expects it to
+    return create_http_client(GOOGLE_HTTP_MAX_CONNECTIONS, GOOGLE_HTTP_TIMEOUT, follow_redirects=True)
+
+
+class PooledHttp:
+    """
+    The part of httplib2.Http that googleapiclient and google_auth_httplib2
+    use, over a shared (thread-safe) httpx client. Transport errors surface
+    as httpx.TransportError, which job retries treat as transient.
+    """
+
+    follow_redirects = True
+    redirect_codes = frozenset((300, 301, 302, 303, 307, 308))
+
+    def __init__(self, client: httpx.Client):
+        self.client = client
+        self.timeout = GOOGLE_HTTP_TIMEOUT
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=None, connection_type=None,
+                **kwargs):
+        response = self.client.request(method, uri, content=body, headers=headers)
+        info = {}
+        for name, value in response.headers.multi_items():
+            name = name.lower()
+            info[name] = f"{info[name]}, {value}" if name in info else value
+        # The body is already decoded, as httplib2 would leave it
+        info.pop("content-encoding", None)
+        info["status"] = str(response.status_code)
+        resp = httplib2.Response(info)
+        resp.reason = response.reason_phrase
+        return resp, response.content
+
+    def close(self):
+        # Shared pool: closed with the other clients on shutdown
+        pass
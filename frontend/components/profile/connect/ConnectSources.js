@@ -17,6 +17,8 @@ export default function ConnectSources() {
     const [updating, setUpdating] = useState(false);
     const [error, setError] = useState(null);
     const [message, setMessage] = useState(null);
+    const [syncJobId, setSyncJobId] = useState(null);
+    const [syncJob, setSyncJob] = useState(null);
 
     const fetchConnections = useCallback(async () => {
         if (!user || !projectId) return;
@@ -57,10 +59,13 @@ export default function ConnectSources() {
             const params = new URLSearchParams(window.location.search);
             const connection = params.get('connection');
             const message = params.get('message');
+            const syncJob = params.get('sync_job');
             
             if (connection === 'success') {
                 // Show success message and refresh connection status
                 setMessage({ type: 'success', text: 'Connection successful!' });
+                // Initial metrics sync runs in the background; follow its progress
+                if (syncJob) setSyncJobId(syncJob);
                 // Refresh your connections data
                 fetchConnections();
             } else if (connection === 'error') {
@@ -77,6 +82,35 @@ export default function ConnectSources() {
         }
     }, [fetchConnections]);
 
+    useEffect(() => {
+        // Poll the initial sync job until it finishes
+        if (!syncJobId || !session?.access_token) return;
+        let timer;
+        let cancelled = false;
+
+        async function pollSyncJob() {
+            try {
+                const response = await fetch(`/api/api/jobs/${syncJobId}`, {
+                    headers: { 'Authorization': `Bearer ${session.access_token}` }
+                });
+                if (!response.ok) return;
+                const job = await response.json();
+                if (cancelled) return;
+                setSyncJob(job);
+                if (job.status === 'succeeded' || job.status === 'dead') return;
+            } catch (err) {
+                console.error("Error polling sync job:", err);
+            }
+            if (!cancelled) timer = setTimeout(pollSyncJob, 2000);
+        }
+
+        pollSyncJob();
+        return () => {
+            cancelled = true;
+            clearTimeout(timer);
+        };
+    }, [syncJobId, session]);
+
     async function connectGoogleAnalytics() {
         if (!user || !projectId) return;
 
@@ -180,6 +214,15 @@ export default function ConnectSources() {
                     {message.text}
                 </div>
             )}
+            {syncJob && (
+                <div className="mb-6 p-3 bg-blue-50 text-blue-700 rounded border border-blue-200">
+                    {syncJob.status === 'succeeded'
+                        ? 'Google Analytics data synced.'
+                        : syncJob.status === 'dead'
+                            ? 'Google Analytics sync failed.'
+                            : `Syncing Google Analytics properties (${syncJob.progress?.completed ?? 0}/${syncJob.progress?.total ?? '?'})...`}
+                </div>
+            )}
             <div className="grid grid-cols-1 md:grid-cols-2 gap-6">
                 {/* Google Analytics Card */}
                 <div className="p-4 rounded-lg flex flex-col h-full border border-gray-300">